@@ -0,0 +1,86 @@
+"""Cost of slot leader election and proof verification.
+
+    python -m benchmarks.bench_election --validators 10000 --slots 20
+
+Builds a validator set of the given size with random stakes and reports:
+  * validator-set build time (prefix sums),
+  * stake-weighted selection via bisect,
+  * VRF evaluation (one per validator per slot, as every node does for itself),
+  * proof verification, cold and from the per-election cache.
+"""
+import argparse
+import json
+import random
+import time
+from cryptography.hazmat.primitives.asymmetric import ec
+from src.blockchain.consensus.pos import VRF, ProofOfStake
+from src.blockchain.consensus.validator_set import ValidatorSet, ValidatorSetCache
+
+HEIGHT = 1  # height of the block the election is for; every slot uses the same epoch
+NONCE = bytes(32)
+
+
+def _timed(fn, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - started) / repeat
+
+
+def run(validators: int, slots: int, signers: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    stakes = {f"validator{i:06d}": rng.uniform(1, 1000) for i in range(validators)}
+
+    validator_set, build_time = _timed(lambda: ValidatorSet(stakes))
+    points = [rng.uniform(0, validator_set.total_stake) for _ in range(100000)]
+    _, select_time = _timed(lambda: [validator_set.select(p) for p in points])
+
+    # Key generation dominates setup, so only a sample of validators hold real keys;
+    # per-validator VRF cost does not depend on the set size.
+    sample = list(stakes)[:signers]
+    keys = {address: ec.generate_private_key(ec.SECP256K1()) for address in sample}
+    election = ProofOfStake(validator_sets=ValidatorSetCache(loader=lambda epoch: stakes))
+    election.public_keys = {address: key.public_key() for address, key in keys.items()}
+
+    leaders = 0
+    started = time.perf_counter()
+    for slot in range(slots):
+        for address, key in keys.items():
+            if election.elect(key, address, slot, HEIGHT, NONCE):
+                leaders += 1
+    elect_time = (time.perf_counter() - started) / (slots * len(keys))
+
+    # Verification does the same work whether or not the proof wins the slot
+    proofs = [
+        (address, slot, HEIGHT, NONCE, VRF(key).prove(election.seed_for(slot, NONCE))[1].hex())
+        for slot in range(slots) for address, key in keys.items()
+    ]
+
+    _, verify_cold = _timed(lambda: [election.verify_leader(*p) for p in proofs])
+    _, verify_cached = _timed(lambda: [election.verify_leader(*p) for p in proofs])
+    per_proof = len(proofs)
+
+    return {
+        'validators': validators,
+        'validator_set_build_ms': round(build_time * 1000, 2),
+        'weighted_select_us': round(select_time / len(points) * 1e6, 3),
+        'vrf_evaluate_us': round(elect_time * 1e6, 1),
+        'vrf_evaluate_all_validators_ms': round(elect_time * validators * 1000, 1),
+        'leaders_found': leaders,
+        'verify_cold_us': round(verify_cold / per_proof * 1e6, 1),
+        'verify_cached_us': round(verify_cached / per_proof * 1e6, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark slot leader election")
+    parser.add_argument('--validators', type=int, default=10000)
+    parser.add_argument('--slots', type=int, default=20)
+    parser.add_argument('--signers', type=int, default=200, help="validators with real keys")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.validators, args.slots, args.signers, args.seed), indent=2))
+
+
+if __name__ == '__main__':
+    main()
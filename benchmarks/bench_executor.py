@@ -0,0 +1,106 @@
+"""Serial vs optimistic parallel execution of a block's transactions.
+
+    python -m benchmarks.bench_executor --txs 200 --workers 4
+
+Builds two synthetic blocks of signed transfers, each from a distinct sender:
+  * low contention: every transfer goes to its own recipient, so write sets are disjoint,
+  * high contention: every transfer pays the same recipient, so each transaction reads
+    the balance the previous one wrote and has to be re-executed after speculation.
+Each block runs once serially and once with the parallel executor against identical
+fresh databases; the resulting balances and nonces are compared. The databases live in
+/dev/shm when it exists, so per-statement fsyncs don't drown out execution cost.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+import src.utils.database as database
+from src.blockchain.consensus.validator_registry import ValidatorRegistry
+from src.blockchain.db.state_db import StateDB
+from src.blockchain.executor import BlockExecutor
+from src.blockchain.transaction import Transaction
+from src.utils.database import db_connection
+
+
+def _senders(count: int) -> dict:
+    return {f"sender{i:05d}": ec.generate_private_key(ec.SECP256K1()) for i in range(count)}
+
+
+def _block(senders: dict, hot: bool):
+    txs = []
+    for i, (address, key) in enumerate(senders.items()):
+        recipient = "hot-recipient" if hot else f"recipient{i:05d}"
+        tx = Transaction(address, recipient, 1, timestamp=1000.0 + i, nonce=1)
+        tx.sign(key)
+        txs.append(tx)
+    return SimpleNamespace(index=1, timestamp=1000.0, transactions=txs)
+
+
+def _fresh_db(directory: str, name: str, senders: dict):
+    database.DB_FILE = os.path.join(directory, f"{name}.db")
+    database.MIGRATION_DIR = directory
+    database.init_db()
+    state = StateDB()
+    for address, key in senders.items():
+        pem = key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+        ValidatorRegistry.register_validator(address, pem, 1.0)
+        state.update_account(address, pem, nonce=0)
+        state.update_balance(address, 100.0)
+
+
+def _state() -> tuple:
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT address, balance FROM balances ORDER BY address")
+        balances = cursor.fetchall()
+        cursor.execute("SELECT address, nonce FROM accounts ORDER BY address")
+        return balances, cursor.fetchall()
+
+
+def _timed_run(directory: str, name: str, senders: dict, block, workers: int):
+    _fresh_db(directory, name, senders)
+    executor = BlockExecutor(workers=workers)
+    try:
+        started = time.perf_counter()
+        assert executor.execute(block), f"{name} block failed"
+        elapsed = time.perf_counter() - started
+    finally:
+        executor.close()
+    return elapsed, _state(), executor.get_stats()
+
+
+def run(txs: int, workers: int) -> dict:
+    senders = _senders(txs)
+    results = {}
+    with tempfile.TemporaryDirectory(dir="/dev/shm" if os.path.isdir("/dev/shm") else None) as directory:
+        for name, hot in (('low_contention', False), ('high_contention', True)):
+            block = _block(senders, hot)
+            serial, serial_state, _ = _timed_run(directory, f"{name}-serial", senders, block, 1)
+            parallel, parallel_state, stats = _timed_run(directory, f"{name}-parallel", senders, block, workers)
+            results[name] = {
+                'serial_tx_per_sec': round(txs / serial),
+                'parallel_tx_per_sec': round(txs / parallel),
+                'speedup': round(serial / parallel, 2),
+                'reexecutions': stats['reexecutions'],
+                'identical_state': serial_state == parallel_state,
+            }
+    return {'transactions': txs, 'workers': workers, **results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark block transaction execution")
+    parser.add_argument('--txs', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.txs, args.workers), indent=2))
+
+
+if __name__ == '__main__':
+    main()
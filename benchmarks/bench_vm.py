@@ -0,0 +1,165 @@
+"""Contract interpreter throughput.
+
+    python -m benchmarks.bench_vm --instructions 200 --runs 2000
+
+Reports instructions per second for:
+  * before: the previous execution path, which parsed the source on every call and
+    dispatched through an if/elif chain over opcode names (reproduced here on top of
+    the current opcode handlers, so only parsing and dispatch differ),
+  * unoptimized: the cached compiled program run instruction by instruction by the
+    table-driven interpreter,
+  * after: the same with the peephole optimizer's blocks and superinstructions,
+  * loop: a counting loop with a backward JUMPI, which the old loop could not execute,
+  * traced: the same program under an ExecutionTracer (per-opcode counts, gas and time),
+    to show what opting in to profiling costs; with no profiler the untraced loop runs.
+"""
+import argparse
+import json
+import random
+import time
+from src.blockchain.contracts.compiler import OPCODES, ProgramCache, compile_code
+from src.blockchain.contracts.tracer import ExecutionTracer
+from src.blockchain.contracts.vm import SmartContractVM
+
+GAS = 10 ** 12
+
+
+def straight_line_code(instructions: int, seed: int) -> str:
+    """Arithmetic and storage mix without jumps"""
+    rng = random.Random(seed)
+    statements = ["SSTORE a 1", "SSTORE b 2"]
+    templates = ["ADD a a {n}", "SUB b b {n}", "MUL c a {n}", "EQ d a b", "LT e b {n}",
+                 "AND f a {n}", "SSTORE g {n}", "SLOAD h g", "STORE m {n}", "LOAD k m"]
+    while len(statements) < instructions:
+        statements.append(rng.choice(templates).format(n=rng.randint(1, 9)))
+    return "; ".join(statements)
+
+
+def loop_code(iterations: int) -> str:
+    return (f"SSTORE i 0; SSTORE acc 0; ADD i i 1; ADD acc acc i; "
+            f"LT more i {iterations}; JUMPI 2 more; RETURN acc")
+
+
+def _context():
+    return {'sender': "bench", 'timestamp': 0.0, 'storage': {}, 'memory': {}}
+
+
+def run_before(vm: SmartContractVM, code: str):
+    """Parse on every call, then an if/elif chain per instruction"""
+    context = _context()
+    program = compile_code(code)
+    for opcode_id, gas_cost, params in program.instructions:
+        if vm.gas_remaining <= 0:
+            raise RuntimeError("Out of gas")
+        if gas_cost > vm.gas_remaining:
+            raise RuntimeError("Out of gas")
+        opcode = OPCODES[opcode_id]
+        if opcode == 'ADD':
+            vm._op_add(context, params)
+        elif opcode == 'SUB':
+            vm._op_sub(context, params)
+        elif opcode == 'MUL':
+            vm._op_mul(context, params)
+        elif opcode == 'DIV':
+            vm._op_div(context, params)
+        elif opcode == 'STORE':
+            vm._op_store(context, params)
+        elif opcode == 'LOAD':
+            vm._op_load(context, params)
+        elif opcode == 'CALL':
+            vm._op_call(context, params)
+        elif opcode == 'JUMP':
+            vm._op_jump(context, params)
+        elif opcode == 'JUMPI':
+            vm._op_jumpi(context, params)
+        elif opcode == 'SSTORE':
+            vm._op_sstore(context, params)
+        elif opcode == 'SLOAD':
+            vm._op_sload(context, params)
+        elif opcode == 'BALANCE':
+            vm._op_balance(context, params)
+        elif opcode == 'TRANSFER':
+            vm._op_transfer(context, params)
+        elif opcode == 'EQ':
+            vm._op_eq(context, params)
+        elif opcode == 'LT':
+            vm._op_lt(context, params)
+        elif opcode == 'GT':
+            vm._op_gt(context, params)
+        elif opcode == 'AND':
+            vm._op_and(context, params)
+        elif opcode == 'OR':
+            vm._op_or(context, params)
+        elif opcode == 'NOT':
+            vm._op_not(context, params)
+        elif opcode == 'SHA3':
+            vm._op_sha3(context, params)
+        elif opcode == 'REVERT':
+            vm._op_revert(context, params)
+        elif opcode == 'RETURN':
+            vm._op_return(context, params)
+        elif opcode == 'LOG':
+            vm._op_log(context, params)
+        vm.gas_remaining -= gas_cost
+
+
+def run_after(vm: SmartContractVM, code: str):
+    vm._execute(_context(), vm.programs.load(code))
+
+
+def run_traced(vm: SmartContractVM, code: str):
+    vm.tracer = ExecutionTracer("bench")
+    try:
+        run_after(vm, code)
+    finally:
+        vm.tracer = None
+
+
+def _rate(fn, vm, code, runs: int, instructions: int) -> float:
+    vm.gas_remaining = GAS
+    started = time.perf_counter()
+    for _ in range(runs):
+        fn(vm, code)
+    return instructions * runs / (time.perf_counter() - started)
+
+
+def run(instructions: int, runs: int, iterations: int, seed: int) -> dict:
+    vm = SmartContractVM(state_db=None)
+    code = straight_line_code(instructions, seed)
+    count = len(compile_code(code))
+
+    before = _rate(run_before, vm, code, runs, count)
+    unoptimized = _rate(run_after, SmartContractVM(state_db=None, programs=ProgramCache(optimize=False)),
+                        code, runs, count)
+    after = _rate(run_after, vm, code, runs, count)
+    traced = _rate(run_traced, vm, code, runs, count)
+
+    looping = loop_code(iterations)
+    executed = 2 + 4 * iterations + 1
+    loop = _rate(run_after, vm, looping, max(1, runs // 10), executed)
+
+    return {
+        'program_instructions': count,
+        'before_instructions_per_sec': round(before),
+        'after_instructions_per_sec': round(after),
+        'speedup': round(after / before, 2),
+        'unoptimized_instructions_per_sec': round(unoptimized),
+        'optimizer_speedup': round(after / unoptimized, 2),
+        'traced_instructions_per_sec': round(traced),
+        'loop_iterations': iterations,
+        'loop_instructions_per_sec': round(loop),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the contract interpreter")
+    parser.add_argument('--instructions', type=int, default=200)
+    parser.add_argument('--runs', type=int, default=2000)
+    parser.add_argument('--iterations', type=int, default=1000, help="loop benchmark iterations")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.instructions, args.runs, args.iterations, args.seed), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,18 @@ def main():
     parser.add_argument('--host', default='127.0.0.1', help="Host address")
     parser.add_argument('--p2p-port', type=int, default=2000, help="P2P port")
     parser.add_argument('--api-port', type=int, default=5000, help="API port")
+    parser.add_argument('--no-produce', action='store_true', help="Do not produce blocks")
+    parser.add_argument('--slot-time', type=float, default=None, help="Seconds per slot")
+    parser.add_argument('--max-block-txs', type=int, default=None, help="Transactions per block")
+    parser.add_argument('--block-gas-limit', type=int, default=None, help="Contract gas per block")
+    parser.add_argument('--contract-sandbox-workers', type=int, default=0,
+                        help="Run contracts in this many isolated worker processes (0: in-process)")
+    parser.add_argument('--execution-workers', type=int, default=None,
+                        help="Threads executing block transactions in parallel (1: serial)")
+    parser.add_argument('--contract-profiling', action='store_true',
+                        help="Record per-opcode and per-contract gas and time")
+    parser.add_argument('--contract-trace-steps', action='store_true',
+                        help="Also keep step-by-step traces (implies --contract-profiling)")
     
     args = parser.parse_args()
     
@@ -18,7 +30,15 @@ def main():
         node = BlockchainNode(
             host=args.host,
             p2p_port=args.p2p_port,
-            api_port=args.api_port
+            api_port=args.api_port,
+            produce_blocks=not args.no_produce,
+            slot_time=args.slot_time,
+            max_block_txs=args.max_block_txs,
+            block_gas_limit=args.block_gas_limit,
+            contract_sandbox_workers=args.contract_sandbox_workers,
+            execution_workers=args.execution_workers,
+            contract_profiling=args.contract_profiling,
+            contract_trace_steps=args.contract_trace_steps
         )
         
         if node.start():
@@ -10,6 +10,9 @@ from src.blockchain.consensus.validator_registry import ValidatorRegistry
 from src.blockchain.db.state_db import StateDB
 from src.blockchain.contracts.contract_manager import ContractManager
 from src.blockchain.contracts.contract_transaction import ContractTransaction
+from src.blockchain.contracts.compiler import program_cache
+from src.blockchain.contracts.vm import SmartContractVM
+from src.blockchain.contracts.view import call_view, view_cache
 from cryptography.hazmat.primitives.serialization import load_pem_private_key
 from cryptography.hazmat.primitives.asymmetric import ec
 import time
@@ -82,7 +85,9 @@ def get_blockchain_info():
         'timestamp': last_block.timestamp,
         'transaction_count': len(last_block.transactions),
         'validator': last_block.validator,
-        'stake_amount': last_block.stake_amount
+        'stake_amount': last_block.stake_amount,
+        'cumulative_weight': last_block.cumulative_weight,
+        'finalized_height': node.blockchain.finality.finalized_height
     }), 200
 
 @app.route('/blocks', methods=['GET'])
@@ -171,6 +176,63 @@ def get_peers():
     peers = list(node.p2p_network.peers)
     return jsonify({'peers': [f"{host}:{port}" for host, port in peers]}), 200
 
+@app.route('/network/stats', methods=['GET'])
+def get_network_stats():
+    node = current_app.config.get('node')
+    if not node:
+        return jsonify({'error': 'Node not initialized'}), 500
+
+    network = node.p2p_network
+    return jsonify({
+        'traffic': network.traffic.snapshot(),
+        'message_lanes': network.message_handler.get_queue_metrics(),
+        'tx_batching': network.tx_batcher.get_metrics(),
+        'gossip': network.gossip.get_metrics(),
+        'sync': network.sync_scheduler.get_status(),
+        'snapshot': network.snapshot_sync.get_status(),
+        'peers': network.peer_accounting.get_stats(),
+        'address_book': network.peer_discovery.address_book.get_stats()
+    }), 200
+
+@app.route('/producer/stats', methods=['GET'])
+def get_producer_stats():
+    node = current_app.config.get('node')
+    if not node:
+        return jsonify({'error': 'Node not initialized'}), 500
+    if not node.block_producer:
+        return jsonify({'error': 'Block production is disabled'}), 404
+
+    return jsonify({
+        'producer': node.block_producer.get_metrics(),
+        'election': node.blockchain.election.get_metrics()
+    }), 200
+
+@app.route('/execution/stats', methods=['GET'])
+def get_execution_stats():
+    node = current_app.config.get('node')
+    if not node:
+        return jsonify({'error': 'Node not initialized'}), 500
+
+    profiler = SmartContractVM.profiler
+    return jsonify({
+        'executor': node.blockchain.executor.get_stats(),
+        'programs': program_cache.get_stats(),
+        'profiler': profiler.get_stats() if profiler else None,
+        'views': view_cache.get_stats()
+    }), 200
+
+@app.route('/finality', methods=['GET'])
+def get_finality():
+    node = current_app.config.get('node')
+    if not node:
+        return jsonify({'error': 'Node not initialized'}), 500
+
+    limit = request.args.get('limit', 10, type=int)
+    return jsonify({
+        'status': node.blockchain.finality.get_status(),
+        'checkpoints': node.blockchain.finality.get_checkpoints(limit)
+    }), 200
+
 @app.route('/peers/connect', methods=['POST'])
 def connect_to_peer():
     node = current_app.config.get('node')
@@ -392,14 +454,21 @@ def mine_block_post():
         if not transactions:
             return jsonify({'error': 'No transactions in the mempool'}), 400
 
-        new_block = node.blockchain._create_new_block(
-            transactions,
-            validator_private_key,
-            validator_address
+        # Blocks need a slot: mine only if this validator leads the current one
+        blockchain = node.blockchain
+        slot = blockchain.election.slot_at(time.time())
+        last_block = blockchain.get_last_block()
+        nonce = blockchain.epoch_nonce(last_block, last_block.index + 1)
+        proof = nonce and blockchain.election.elect(
+            validator_private_key, validator_address, slot, last_block.index + 1, nonce
         )
+        if not proof:
+            return jsonify({'error': f'Validator does not lead slot {slot}'}), 400
+
+        # Added through the chain's own validation, which also broadcasts it
+        new_block = blockchain.create_block(transactions, validator_private_key, slot, proof, time.time())
 
         if new_block:
-            node.p2p_network.broadcast_block(new_block)
             node.mempool.remove_transactions([tx.tx_hash for tx in transactions])
             return jsonify({
                 'status': 'success',
@@ -504,6 +573,18 @@ def call_contract():
     if not data:
         return jsonify({'error': 'No data provided'}), 400
 
+    # View call: runs against current state, answers directly and never persists
+    if request.args.get('readonly', '').lower() in ('1', 'true', 'yes'):
+        call = data.get('transaction', data)
+        contract_address = call.get('contract_address')
+        if not contract_address:
+            return jsonify({'error': 'Missing contract_address'}), 400
+        success, result, cached = call_view(contract_address, call.get('method', ''),
+                                            call.get('args', {}), call.get('sender', ''))
+        if not success:
+            return jsonify({'error': f'Contract call failed: {result}'}), 400
+        return jsonify({'status': 'success', 'result': result, 'cached': cached}), 200
+
     tx_data = data.get('transaction')
     if not tx_data:
         return jsonify({'error': 'No transaction provided'}), 400
@@ -538,6 +619,28 @@ def view_contract_events(contract_address):
         return jsonify({'message': 'No events found for this contract'}), 404
     return jsonify({'events': events}), 200
 
+@app.route('/contracts/<contract_address>/profile', methods=['GET'])
+def get_contract_profile(contract_address):
+    profiler = SmartContractVM.profiler
+    if not profiler:
+        return jsonify({'error': 'Contract profiling is disabled'}), 404
+
+    profile = profiler.get_contract_profile(contract_address)
+    if not profile:
+        return jsonify({'error': 'No executions recorded for this contract'}), 404
+    return jsonify({'contract_address': contract_address, 'profile': profile}), 200
+
+@app.route('/debug/trace/<tx_hash>', methods=['GET'])
+def get_execution_trace(tx_hash):
+    profiler = SmartContractVM.profiler
+    if not profiler:
+        return jsonify({'error': 'Contract profiling is disabled'}), 404
+
+    trace = profiler.get_trace(tx_hash)
+    if not trace:
+        return jsonify({'error': 'No trace recorded for this transaction'}), 404
+    return jsonify(trace), 200
+
 @app.route('/mempool/clear', methods=['POST'])
 def clear_mempool():
     node = current_app.config.get('node')
@@ -20,6 +20,9 @@ class Block:
     stake_amount: float = 0  # Stake amount used for validation
     difficulty: int = 4
     nonce: int = 0
+    slot: int = -1  # election slot; -1 for blocks produced before slot election
+    vrf_proof: str = ""  # hex VRF proof that the validator leads `slot`
+    cumulative_weight: float = field(default=0.0, repr=False)  # chain weight up to this block; local, not hashed
     hash: str = field(init=False)  # Will be set by calculate_hash
     transactions_hash: str = field(init=False)  # Hash of transactions
 
@@ -88,6 +91,9 @@ class Block:
             'validator': self.validator,
             'stake_amount': self.stake_amount
         }
+        if self.slot >= 0:
+            block_data['slot'] = self.slot
+            block_data['vrf_proof'] = self.vrf_proof
         return hashlib.sha256(
             json.dumps(block_data, sort_keys=True).encode()
         ).hexdigest()
@@ -102,6 +108,10 @@ class Block:
             logger.error(f"Previous hash mismatch: {self.previous_hash} vs {previous_block.hash}")
             return False
 
+        if self.slot >= 0 and self.slot <= previous_block.slot:
+            logger.error(f"Block slot {self.slot} does not follow slot {previous_block.slot}")
+            return False
+
         if self.hash != self.calculate_hash():
             logger.error(f"Block hash invalid: {self.hash} vs {self.calculate_hash()}")
             return False
@@ -127,7 +137,9 @@ class Block:
             'hash': self.hash,
             'validator': self.validator,
             'stake_amount': self.stake_amount,
-            'signature': self.signature
+            'signature': self.signature,
+            'slot': self.slot,
+            'vrf_proof': self.vrf_proof
         }
 
     @classmethod
@@ -143,7 +155,9 @@ class Block:
             previous_hash=data['previous_hash'],
             validator=data['validator'],
             stake_amount=data['stake_amount'],
-            signature=data['signature']
+            signature=data['signature'],
+            slot=data.get('slot', -1),
+            vrf_proof=data.get('vrf_proof', '')
         )
 
         # Set hash from network data
@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, List
+from cryptography.hazmat.primitives.asymmetric import ec
+from src.utils.logger import logger
+
+MAX_BLOCK_TXS = 500
+MAX_BLOCK_BYTES = 1024 * 1024
+BLOCK_GAS_LIMIT = 30_000_000
+LATENCY_SAMPLES = 1000
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class BlockProducer:
+    """Produces a block in every slot this node leads.
+
+    Wakes on each slot boundary, evaluates the slot election and, when
+    elected, fills a block from the mempool within the size and gas
+    budgets and hands it to the chain, which validates, executes and
+    broadcasts it like any other block.
+    """
+
+    def __init__(self, blockchain, mempool, private_key: ec.EllipticCurvePrivateKey, address: str,
+                 slot_time: float = None, max_block_txs: int = MAX_BLOCK_TXS,
+                 max_block_bytes: int = MAX_BLOCK_BYTES, block_gas_limit: int = BLOCK_GAS_LIMIT,
+                 clock: Callable[[], float] = time.time):
+        self.blockchain = blockchain
+        self.mempool = mempool
+        self.private_key = private_key
+        self.address = address
+        self.election = blockchain.election
+        if slot_time:
+            # Must match the rest of the network, otherwise our proofs will not verify
+            self.election.slot_duration = slot_time
+        self.max_block_txs = max_block_txs
+        self.max_block_bytes = max_block_bytes
+        self.block_gas_limit = block_gas_limit
+        self.clock = clock
+
+        self.running = False
+        self._thread = None
+        self._stop = threading.Event()
+        self.lock = threading.Lock()
+
+        self.last_slot = -1
+        self.slots_seen = 0
+        self.slots_led = 0
+        self.blocks_produced = 0
+        self.empty_slots = 0       # led, but nothing to include
+        self.missed_slots = 0      # led, but no block made it into the slot
+        self.skipped_slots = 0     # scheduler woke up too late to see the slot at all
+        self.transactions_included = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    @property
+    def slot_time(self) -> float:
+        return self.election.slot_duration
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="BlockProducer")
+        self._thread.start()
+        logger.info(f"Block producer started ({self.slot_time}s slots)")
+
+    def stop(self):
+        self.running = False
+        self._stop.set()
+
+    def _run(self):
+        while self.running:
+            now = self.clock()
+            slot = self.election.slot_at(now)
+            if slot <= self.last_slot:
+                # Sleep until the next slot boundary
+                self._stop.wait(max(0.0, self.election.slot_start(self.last_slot + 1) - now))
+                continue
+            try:
+                self.produce(slot)
+            except Exception as e:
+                logger.error(f"Block production for slot {slot} failed: {e}")
+
+    def produce(self, slot: int):
+        """Run one slot: returns the new block, or None if we did not produce one"""
+        with self.lock:
+            if self.last_slot >= 0 and slot > self.last_slot + 1:
+                self.skipped_slots += slot - self.last_slot - 1
+            self.last_slot = max(self.last_slot, slot)
+            self.slots_seen += 1
+
+            last_block = self.blockchain.get_last_block()
+            if last_block is None or last_block.slot >= slot:
+                return None
+
+            nonce = self.blockchain.epoch_nonce(last_block, last_block.index + 1)
+            if nonce is None:
+                return None
+            proof = self.election.elect(self.private_key, self.address, slot, last_block.index + 1, nonce)
+            if proof is None:
+                return None
+            self.slots_led += 1
+
+            transactions = self.mempool.select_for_block(
+                self.max_block_txs, self.max_block_bytes, self.block_gas_limit
+            )
+            if not transactions:
+                self.empty_slots += 1
+                return None
+
+            now = self.clock()
+            # The header's timestamp must fall inside the slot, whenever we got to it
+            timestamp = now if self.election.slot_at(now) == slot else self.election.slot_start(slot)
+            block = self.blockchain.create_block(transactions, self.private_key, slot, proof, timestamp)
+            finished = self.clock()
+            if block is None or self.election.slot_at(finished) != slot:
+                self.missed_slots += 1
+                if block is None:
+                    logger.warning(f"Led slot {slot} but failed to produce a block")
+                    return None
+                logger.warning(f"Block #{block.index} for slot {slot} finished after the slot ended")
+
+            self.mempool.remove_transactions([tx.tx_hash for tx in transactions])
+            self.blocks_produced += 1
+            self.transactions_included += len(block.transactions)
+            self.latencies.append(finished - self.election.slot_start(slot))
+            logger.info(f"Produced block #{block.index} in slot {slot} with {len(block.transactions)} txs")
+            return block
+
+    def get_metrics(self) -> dict:
+        with self.lock:
+            latencies = [latency * 1000 for latency in self.latencies]
+            return {
+                'running': self.running,
+                'slot_time': self.slot_time,
+                'max_block_txs': self.max_block_txs,
+                'max_block_bytes': self.max_block_bytes,
+                'block_gas_limit': self.block_gas_limit,
+                'last_slot': self.last_slot,
+                'slots_seen': self.slots_seen,
+                'slots_led': self.slots_led,
+                'blocks_produced': self.blocks_produced,
+                'empty_slots': self.empty_slots,
+                'missed_slots': self.missed_slots,
+                'skipped_slots': self.skipped_slots,
+                'transactions_included': self.transactions_included,
+                'production_latency_ms': {
+                    'p50': round(_percentile(latencies, 50), 2),
+                    'p95': round(_percentile(latencies, 95), 2),
+                    'p99': round(_percentile(latencies, 99), 2),
+                    'max': round(max(latencies), 2) if latencies else 0.0
+                }
+            }
@@ -0,0 +1,173 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+from src.blockchain.block import Block
+
+MAX_REORG_DEPTH = 100  # blocks; journals and side branches below this are pruned
+
+
+@dataclass
+class TreeNode:
+    block: Block
+    weight: float  # cumulative stake weight of the chain up to and including this block
+    children: Set[str] = field(default_factory=set)
+
+    @property
+    def height(self) -> int:
+        return self.block.index
+
+
+def block_weight(block: Block) -> float:
+    """Fork-choice weight a single block adds: the stake backing its producer"""
+    return max(float(block.stake_amount or 0), 0.0)
+
+
+class BlockTree:
+    """Recent blocks of every known branch, for fork choice and reorg planning.
+
+    The main chain and side branches share one tree keyed by block hash.
+    The best tip is the one with the greatest cumulative stake weight;
+    ties go to the lower hash so that every node picks the same tip.
+    """
+
+    def __init__(self, max_depth: int = MAX_REORG_DEPTH):
+        self.max_depth = max_depth
+        self.nodes: Dict[str, TreeNode] = {}
+        self.lock = threading.RLock()
+
+    def reset(self, chain: List[Block]):
+        """Rebuild from the main chain alone, starting at the stored weight of its oldest kept block"""
+        with self.lock:
+            self.nodes = {}
+            window = chain[-(self.max_depth + 1):]
+            if not window:
+                return
+            weight = window[0].cumulative_weight
+            self._insert(window[0], weight)
+            for block in window[1:]:
+                weight += block_weight(block)
+                self._insert(block, weight)
+
+    def _insert(self, block: Block, weight: float) -> TreeNode:
+        block.cumulative_weight = weight
+        node = TreeNode(block, weight)
+        self.nodes[block.hash] = node
+        parent = self.nodes.get(block.previous_hash)
+        if parent is not None:
+            parent.children.add(block.hash)
+        return node
+
+    def contains(self, block_hash: str) -> bool:
+        return block_hash in self.nodes
+
+    def get(self, block_hash: str) -> Optional[TreeNode]:
+        return self.nodes.get(block_hash)
+
+    def add(self, block: Block) -> Optional[TreeNode]:
+        """Attach block under its parent; None if the parent is unknown"""
+        with self.lock:
+            existing = self.nodes.get(block.hash)
+            if existing is not None:
+                return existing
+            parent = self.nodes.get(block.previous_hash)
+            if parent is None:
+                return None
+            return self._insert(block, parent.weight + block_weight(block))
+
+    def remove_subtree(self, block_hash: str) -> int:
+        """Forget a block and all its descendants (e.g. after it failed to apply)"""
+        with self.lock:
+            node = self.nodes.get(block_hash)
+            if node is None:
+                return 0
+            parent = self.nodes.get(node.block.previous_hash)
+            if parent is not None:
+                parent.children.discard(block_hash)
+            removed = 0
+            stack = [block_hash]
+            while stack:
+                current = self.nodes.pop(stack.pop(), None)
+                if current is not None:
+                    removed += 1
+                    stack.extend(current.children)
+            return removed
+
+    def is_heavier(self, candidate_hash: str, tip_hash: str) -> bool:
+        candidate = self.nodes.get(candidate_hash)
+        tip = self.nodes.get(tip_hash)
+        if candidate is None:
+            return False
+        if tip is None:
+            return True
+        if candidate.weight != tip.weight:
+            return candidate.weight > tip.weight
+        return candidate_hash < tip_hash
+
+    def best_tip(self, root: str = None) -> Optional[str]:
+        """Heaviest leaf, optionally only among descendants of root"""
+        with self.lock:
+            candidates = self._descendants(root) if root else self.nodes
+            best = None
+            for block_hash in candidates:
+                node = self.nodes[block_hash]
+                if node.children:
+                    continue
+                if best is None or self.is_heavier(block_hash, best):
+                    best = block_hash
+            return best
+
+    def _descendants(self, root: str) -> Set[str]:
+        found = set()
+        stack = [root] if root in self.nodes else []
+        while stack:
+            block_hash = stack.pop()
+            found.add(block_hash)
+            stack.extend(self.nodes[block_hash].children)
+        return found
+
+    def finalize(self, block_hash: str) -> int:
+        """Keep only block_hash and its descendants; returns blocks dropped"""
+        with self.lock:
+            keep = self._descendants(block_hash)
+            if not keep:
+                return 0
+            dropped = [h for h in self.nodes if h not in keep]
+            for h in dropped:
+                del self.nodes[h]
+            return len(dropped)
+
+    def reorg_path(self, from_hash: str, to_hash: str) -> Optional[Tuple[List[Block], List[Block]]]:
+        """(blocks to undo, newest first; blocks to apply, oldest first) to move from one tip to another"""
+        with self.lock:
+            a = self.nodes.get(from_hash)
+            b = self.nodes.get(to_hash)
+            if a is None or b is None:
+                return None
+            undo, apply = [], []
+            while a.block.hash != b.block.hash:
+                if a.height >= b.height:
+                    undo.append(a.block)
+                    a = self.nodes.get(a.block.previous_hash)
+                else:
+                    apply.append(b.block)
+                    b = self.nodes.get(b.block.previous_hash)
+                if a is None or b is None:
+                    return None  # common ancestor has been pruned
+            apply.reverse()
+            return undo, apply
+
+    def prune(self, tip_height: int):
+        """Drop blocks deeper than max_depth below the tip"""
+        with self.lock:
+            horizon = tip_height - self.max_depth
+            for block_hash in [h for h, node in self.nodes.items() if node.height < horizon]:
+                del self.nodes[block_hash]
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            tips = [h for h, node in self.nodes.items() if not node.children]
+            return {
+                'blocks': len(self.nodes),
+                'tips': len(tips),
+                'max_depth': self.max_depth
+            }
@@ -1,14 +1,21 @@
 import json
+import threading
 import time
 from typing import List, Optional
 from src.blockchain.vex_config import *
-from src.blockchain.consensus.stake_manager import StakeManager
 from src.blockchain.block import Block
 from src.blockchain.transaction import Transaction
 from src.blockchain.consensus.consensus import Consensus
 from src.blockchain.db.repositories import BlockRepository, TransactionRepository
+from src.blockchain.db.undo_journal import UndoJournal
+from src.blockchain.block_tree import BlockTree, block_weight
+from src.blockchain.snapshot import SnapshotManager
 from src.blockchain.consensus.validator_registry import ValidatorRegistry
+from src.blockchain.consensus.validator_set import load_epoch_nonce, record_epoch_stakes, validator_sets
+from src.blockchain.consensus.pos import ProofOfStake
+from src.blockchain.consensus.finality import FinalityGadget
 from src.blockchain.contracts.vm import SmartContractVM
+from src.blockchain.executor import BlockExecutor, BlockState
 from src.blockchain.db.state_db import StateDB
 from src.utils.logger import logger
 from cryptography.hazmat.primitives.asymmetric import ec
@@ -18,11 +25,22 @@ from src.utils.database import db_connection
 from src.utils.cache import LRUCache
 
 class Blockchain:
-    def __init__(self, difficulty: int = 4):
+    def __init__(self, difficulty: int = 4, genesis_key: ec.EllipticCurvePrivateKey = None):
         self.difficulty = difficulty
+        # Validates the genesis block of a new chain, and is the whole of epoch 0's validator set
+        self.genesis_key = genesis_key
 
         self.chain = []
         self.block_cache = LRUCache(capacity=100)  # Cache for blocks
+        self.epoch_nonces = LRUCache(capacity=16)  # hash of an epoch's last block -> next epoch's nonce
+        self.snapshots = SnapshotManager()
+        self.election = ProofOfStake()
+        self.tree = BlockTree()
+        self.finality = FinalityGadget()
+        self.executor = BlockExecutor()
+        self.lock = threading.RLock()
+        self.reorgs = 0
+        self.mempool = None  # set by the node; receives transactions of blocks undone by a reorg
         self.last_block = self.load_last_block()  # Load last block from cache or DB
         self._db_initialized = False  # Track if DB has been initialized
         self.p2p_network = None
@@ -46,7 +64,7 @@ class Blockchain:
                 logger.info("No existing chain found, creating new blockchain")
                 self._reset_blockchain()  # Clean slate
                 self._initialize_new_chain()
-            elif not Consensus.is_chain_valid(self.chain):
+            elif not Consensus.is_chain_valid(self.chain, trusted_anchor=self._snapshot_anchor_hash()):
                 logger.warning("Existing chain is invalid, resetting...")
                 self._reset_blockchain()
                 self._initialize_new_chain()
@@ -65,6 +83,16 @@ class Blockchain:
                 logger.error(f"Failed to create fresh blockchain: {reset_error}")
                 raise RuntimeError("Complete blockchain initialization failure") from reset_error
 
+        self.tree.reset(self.chain)
+        self.finality.load(self.chain[0])
+        if self.finality.finalized_hash != self.chain[0].hash:
+            self.tree.finalize(self.finality.finalized_hash)
+
+    @staticmethod
+    def _snapshot_anchor_hash() -> Optional[str]:
+        anchor = SnapshotManager.get_anchor()
+        return anchor[1] if anchor else None
+
     def load_last_block(self) -> Optional[Block]:
         """Load the last block from cache or database"""
         with db_connection() as conn:
@@ -92,6 +120,10 @@ class Blockchain:
                 # Reset autoincrement counters
                 cursor.execute("DELETE FROM sqlite_sequence WHERE name='blocks'")
                 cursor.execute("DELETE FROM sqlite_sequence WHERE name='transactions'")
+                cursor.execute("UPDATE chain_state SET snapshot_height = NULL, snapshot_hash = NULL")
+                cursor.execute("DELETE FROM state_journal")
+                cursor.execute("DELETE FROM checkpoints")
+                cursor.execute("DELETE FROM attestations")
                 conn.commit()
 
             # Reset StateDB if implemented
@@ -116,6 +148,8 @@ class Blockchain:
         try:
             self._initialize_special_accounts()
             genesis_block = self._create_genesis_block()
+            record_epoch_stakes(0, genesis_block.hash, ProofOfStake.epoch_nonce(0, [genesis_block]))
+            validator_sets.invalidate()
             self.chain = [genesis_block]
             logger.info("New blockchain initialized successfully")
         except Exception as e:
@@ -144,8 +178,8 @@ class Blockchain:
     def _create_genesis_block(self) -> Block:
         """Create genesis block with PoS mechanism"""
         try:
-            # Create private key for genesis validator
-            genesis_private_key = ec.generate_private_key(ec.SECP256K1())
+            # Without a key of ours, epoch 0 is led by a validator nobody holds the key of
+            genesis_private_key = self.genesis_key or ec.generate_private_key(ec.SECP256K1())
 
             # Generate validator address
             validator_address = ValidatorRegistry.get_validator_address(genesis_private_key)
@@ -222,6 +256,8 @@ class Blockchain:
             # Sign genesis block
             genesis_block.sign_block(genesis_private_key, 1000000)
 
+            genesis_block.cumulative_weight = block_weight(genesis_block)
+
             # Save to database with proper error handling
             try:
                 logger.info("Saving genesis block to database...")
@@ -269,7 +305,11 @@ class Blockchain:
         chain = []
         block_count = BlockRepository.get_block_count()
 
-        for index in range(block_count):
+        # A node bootstrapped from a snapshot starts at the snapshot's anchor block
+        anchor = SnapshotManager.get_anchor()
+        base, anchor_hash = anchor if anchor else (0, None)
+
+        for index in range(base, base + block_count):
             block = BlockRepository.get_block_by_index(index)
             if not block:
                 logger.error(f"Invalid block at index {index}")
@@ -277,7 +317,7 @@ class Blockchain:
 
             chain.append(block)
 
-        if not chain or not Consensus.is_chain_valid(chain):
+        if not chain or not Consensus.is_chain_valid(chain, trusted_anchor=anchor_hash):
             logger.error("Loaded chain is invalid")
             return []
 
@@ -290,119 +330,35 @@ class Blockchain:
               selected_validator_address: str = None) -> Optional[Block]:
         """
         Add a new block to the blockchain
+
+        A block extending the tip is applied directly. A block on another
+        branch is kept in the block tree and triggers a reorg once its
+        branch carries more stake weight than the main chain.
         """
         if external_block:
             block_to_add = external_block
         else:
             block_to_add = block
 
-        # Get the last block
-        last_block = self.get_last_block()
-        if not last_block:
-            logger.error("Cannot add block: no last block found.")
-            return None
-
-        # Validate block structure
-        if not block_to_add.is_valid(last_block):
-            logger.error(f"Invalid block structure: {block_to_add.hash}")
-            return None
-
-        # Verify block signature
-        if not block_to_add.verify_signature():
-            logger.error(f"Invalid signature for block: {block_to_add.hash}")
-            return None
-
-        # Initialize state database and VM
-        state_db = StateDB()
-        vm = SmartContractVM(state_db)
-
-        # Process transactions
-        for tx in block_to_add.transactions:
-            # Validate transaction
-            if not tx.is_valid():
-                logger.error(f"Invalid transaction in block: {tx.tx_hash}")
+        with self.lock:
+            # Get the last block
+            last_block = self.get_last_block()
+            if not last_block:
+                logger.error("Cannot add block: no last block found.")
                 return None
 
-            # Check nonce
-            sender_nonce = state_db.get_nonce(tx.sender)
-            if tx.nonce != sender_nonce + 1:
-                logger.error(f"Invalid nonce for tx {tx.tx_hash}")
+            if self.tree.contains(block_to_add.hash):
                 return None
 
-            # Handle different transaction types
-            if tx.contract_type == "NORMAL":
-                # Regular VEX coin transfer
-                sender_balance = state_db.get_balance(tx.sender)
-                total_deduct = tx.amount + getattr(tx, 'fee', 0)
-
-                if sender_balance < total_deduct:
-                    logger.error(f"Insufficient VEX balance for {tx.sender}")
-                    return None
-
-                # Deduct amount + fee from sender
-                state_db.update_balance(tx.sender, sender_balance - total_deduct)
-
-                # Add amount to recipient
-                recipient_balance = state_db.get_balance(tx.recipient)
-                state_db.update_balance(tx.recipient, recipient_balance + tx.amount)
-
-                # Increment sender's nonce
-                state_db.increment_nonce(tx.sender)
-
-            elif tx.contract_type == "CONTRACT":
-                # Smart contract execution
-                logger.info(f"Executing smart contract tx: {tx.tx_hash[:8]}")
-                success, result = vm.execute(
-                    tx,
-                    block_to_add.index,
-                    block_to_add.timestamp
-                )
-
-                if success:
-                    logger.info(f"Contract executed successfully. Result: {result}")
-                    tx.contract_output = result
-                else:
-                    logger.error(f"Contract execution failed: {result}")
-                    return None
+            if block_to_add.previous_hash != last_block.hash and self.tree.contains(block_to_add.previous_hash):
+                return self._add_side_block(block_to_add, last_block)
 
-            elif tx.contract_type == "VEX_REWARD":
-                # VEX block reward transaction (mint new VEX)
-                recipient_balance = state_db.get_balance(tx.recipient)
-                state_db.update_balance(tx.recipient, recipient_balance + tx.amount)
-
-            elif tx.contract_type == "VEX_STAKE":
-                # VEX staking transaction
-                sender_balance = state_db.get_balance(tx.sender)
-                if sender_balance < tx.amount:
-                    logger.error(f"Insufficient VEX balance for staking: {tx.sender}")
-                    return None
-
-                # Move VEX to staking contract
-                state_db.update_balance(tx.sender, sender_balance - tx.amount)
-                staking_balance = state_db.get_balance(tx.recipient)
-                state_db.update_balance(tx.recipient, staking_balance + tx.amount)
-
-                # Update validator stake
-                StakeManager.stake(tx.sender, tx.amount, ValidatorRegistry.get_public_key_pem(tx.sender))
-
-            else:
-                logger.error(f"Unknown transaction type: {tx.contract_type}")
+            if not self._validate_header(block_to_add, last_block):
                 return None
 
-        # Save block to database
-        try:
-            block_id = BlockRepository.save_block(block_to_add)
-            TransactionRepository.save_transactions_bulk(block_to_add.transactions, block_id)
-
-            # Update in-memory chain and cache
-            self.chain.append(block_to_add)
-            self.last_block = block_to_add
-            self.block_cache.put(block_to_add.index, block_to_add)
-
-            logger.info(f"Block #{block_to_add.index} added: {block_to_add.hash[:10]}...")
-
-            # Distribute VEX rewards to validator
-            self._distribute_vex_rewards(block_to_add)
+            if not self._apply_block(block_to_add):
+                return None
+            self._on_new_tip(block_to_add)
 
             # Broadcast the block if it's a local block
             if not external_block and hasattr(self, 'p2p_network') and self.p2p_network:
@@ -413,14 +369,249 @@ class Blockchain:
                     self._save_pending_block(block_to_add)
 
             return block_to_add
+
+    def _validate_header(self, block: Block, parent: Block) -> bool:
+        """Checks that do not depend on state: links, hash, signature and slot leadership"""
+        # Validate block structure
+        if not block.is_valid(parent):
+            logger.error(f"Invalid block structure: {block.hash}")
+            return False
+
+        # Verify block signature
+        if not block.verify_signature():
+            logger.error(f"Invalid signature for block: {block.hash}")
+            return False
+
+        # Verify the producer's VRF proof of slot leadership
+        nonce = self.epoch_nonce(parent, block.index)
+        if nonce is None:
+            logger.error(f"No election nonce for block #{block.index}: its branch history is unknown")
+            return False
+        if not self.election.validate_block(block, nonce):
+            logger.error(f"Validator {block.validator} is not a leader of slot {block.slot}")
+            return False
+
+        # Fork choice weighs blocks by stake: it must be the stake the chain gave the producer
+        stake = validator_sets.for_height(block.index).stake_of(block.validator)
+        if block.stake_amount != stake:
+            logger.error(f"Block #{block.index} declares stake {block.stake_amount} for {block.validator}, "
+                         f"its validator set has {stake}")
+            return False
+
+        return True
+
+    def _apply_block(self, block: Block) -> bool:
+        """Execute block on top of the current tip, journaling every state change"""
+        state = self._execute_transactions(block)
+        if state is None:
+            return False
+        # Distribute VEX rewards to validator
+        self._distribute_vex_rewards(block, state)
+        pinned = self._pin_validator_set(block, state)
+        self.executor.flush(state, journal=(block.hash, block.index))
+        if pinned:
+            validator_sets.invalidate()
+
+        # Save block to database
+        block.cumulative_weight = self.chain[-1].cumulative_weight + block_weight(block)
+        try:
+            block_id = BlockRepository.save_block(block)
+            TransactionRepository.save_transactions_bulk(block.transactions, block_id)
         except Exception as e:
             logger.error(f"Failed to save block: {e}")
-            # Clean up if save failed
-            if block_to_add in self.chain:
-                self.chain.remove(block_to_add)
+            UndoJournal.undo(block.hash)
+            return False
+
+        # Update in-memory chain, cache and block tree
+        self.chain.append(block)
+        self.last_block = block
+        self.block_cache.put(block.index, block)
+        self.tree.add(block)
+        self.tree.prune(block.index)
+        UndoJournal.prune(block.index - self.tree.max_depth)
+
+        logger.info(f"Block #{block.index} added: {block.hash[:10]}...")
+
+        # Periodic state snapshot for fast bootstrap of new nodes
+        self.snapshots.maybe_produce(block)
+        return True
+
+    def _execute_transactions(self, block: Block) -> Optional[BlockState]:
+        return self.executor.run(block)
+
+    def _pin_validator_set(self, block: Block, state: BlockState) -> bool:
+        """The last block of an epoch fixes the stakes and election nonce of the next one"""
+        height = block.index + 1
+        if height % validator_sets.epoch_length != 0:
+            return False
+        state.write(('epoch', validator_sets.epoch_of(height)), (block.hash, self.epoch_nonce(block, height)))
+        return True
+
+    def _ancestor(self, block: Block, height: int) -> Optional[Block]:
+        """block's ancestor at height (block itself at its own height), if we still have it"""
+        while block is not None and block.index > height:
+            main = self.get_block_at_height(block.index)
+            if main is not None and main.hash == block.hash:
+                return self.get_block_at_height(height)
+            node = self.tree.get(block.previous_hash)
+            block = node.block if node is not None else None
+        return block
+
+    def epoch_nonce(self, parent: Block, height: int) -> Optional[bytes]:
+        """Election nonce for a block at height on top of parent, from parent's branch"""
+        epoch = validator_sets.epoch_of(height)
+        start, end = self.election.nonce_heights(epoch)
+        last = self._ancestor(parent, end - 1)
+        if last is not None:
+            nonce = self.epoch_nonces.get(last.hash)
+            if nonce is not None:
+                return nonce
+            blocks = [last]
+            while blocks[-1].index > start:
+                previous = self._ancestor(blocks[-1], blocks[-1].index - 1)
+                if previous is None:
+                    break
+                blocks.append(previous)
+            if blocks[-1].index == start:
+                nonce = ProofOfStake.epoch_nonce(epoch, reversed(blocks))
+                self.epoch_nonces.put(last.hash, nonce)
+                return nonce
+
+        # History from before our snapshot anchor: use the nonce pinned with the epoch
+        pinned = load_epoch_nonce(epoch)
+        if pinned and (last is None or pinned[0] == last.hash):
+            return pinned[1]
+        return None
+
+    def _unapply_block(self, block: Block):
+        """Remove the tip block: restore its state changes and delete it from storage"""
+        UndoJournal.undo(block.hash)
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM transactions WHERE block_id IN (SELECT id FROM blocks WHERE hash = ?)',
+                           (block.hash,))
+            cursor.execute('DELETE FROM blocks WHERE hash = ?', (block.hash,))
+            conn.commit()
+
+        self.chain.pop()
+        self.last_block = self.chain[-1] if self.chain else None
+        self.block_cache = LRUCache(capacity=100)
+        validator_sets.invalidate()
+
+    def _add_side_block(self, block: Block, last_block: Block) -> Optional[Block]:
+        """Store a block that does not extend our tip; reorg if its branch becomes heaviest"""
+        if self.finality.is_final(block.index):
+            logger.warning(f"Block #{block.index} {block.hash[:10]}... conflicts with finalized history")
             return None
+        parent = self.tree.get(block.previous_hash).block
+        if not self._validate_header(block, parent):
+            return None
+
+        self.tree.add(block)
+        logger.info(f"Block #{block.index} {block.hash[:10]}... stored on a side branch")
 
-    def _distribute_vex_rewards(self, block: Block):
+        if self.tree.is_heavier(block.hash, last_block.hash):
+            if not self._reorganize(block.hash):
+                return None
+            self._on_new_tip(self.chain[-1])
+        return block
+
+    def _reorganize(self, new_tip_hash: str) -> bool:
+        """Switch the main chain to the branch ending at new_tip_hash"""
+        path = self.tree.reorg_path(self.chain[-1].hash, new_tip_hash)
+        if path is None:
+            logger.error(f"No common ancestor with branch {new_tip_hash[:10]}..., cannot reorganize")
+            return False
+        undo_blocks, apply_blocks = path
+        if any(self.finality.is_final(block.index) for block in undo_blocks):
+            logger.error(f"Refusing to reorganize onto {new_tip_hash[:10]}...: it would revert a finalized block")
+            return False
+
+        started = time.time()
+        for old_block in undo_blocks:
+            self._unapply_block(old_block)
+
+        applied = []
+        for new_block in apply_blocks:
+            if not self._apply_block(new_block):
+                logger.error(f"Block {new_block.hash[:10]}... failed to apply, restoring previous chain")
+                self.tree.remove_subtree(new_block.hash)
+                for block in reversed(applied):
+                    self._unapply_block(block)
+                for block in reversed(undo_blocks):
+                    self._apply_block(block)
+                return False
+            applied.append(new_block)
+
+        self.reorgs += 1
+        logger.warning(f"Reorganized {len(undo_blocks)} blocks onto {new_tip_hash[:10]}... "
+                       f"({len(apply_blocks)} applied) in {time.time() - started:.3f}s")
+        self._requeue_orphaned_transactions(undo_blocks, apply_blocks)
+        return True
+
+    def get_block_at_height(self, height: int) -> Optional[Block]:
+        """Main-chain block at height, if it is in memory"""
+        if not self.chain:
+            return None
+        offset = height - self.chain[0].index
+        if 0 <= offset < len(self.chain):
+            return self.chain[offset]
+        return None
+
+    def _on_new_tip(self, tip: Block):
+        """Attest to the checkpoint this tip buries deep enough, then finalize what we can"""
+        height = self.finality.due_checkpoint_height(tip.index)
+        checkpoint = self.get_block_at_height(height) if height is not None else None
+        attestation = self.finality.attest(checkpoint) if checkpoint else None
+        if attestation and self.p2p_network:
+            try:
+                self.p2p_network.broadcast_attestation(attestation)
+            except Exception as e:
+                logger.error(f"Attestation broadcast failed: {e}")
+        self._check_finality()
+
+    def add_attestation(self, attestation) -> Optional[bool]:
+        """Record a checkpoint vote from the network; see FinalityGadget.add_attestation"""
+        added = self.finality.add_attestation(attestation)
+        if added:
+            with self.lock:
+                self._check_finality()
+        return added
+
+    def _check_finality(self):
+        self.finality.release_early()
+        for epoch in self.finality.pending_epochs():
+            vote = self.finality.supermajority(epoch)
+            if vote is not None:
+                self._finalize(vote)
+
+    def _finalize(self, vote) -> bool:
+        """Make the voted checkpoint final, moving onto its branch first if needed"""
+        checkpoint = self.get_block_at_height(vote.height)
+        if checkpoint is None or checkpoint.hash != vote.block_hash:
+            if not self.tree.contains(vote.block_hash):
+                return False  # not downloaded yet; checked again as blocks arrive
+            if not self._reorganize(self.tree.best_tip(root=vote.block_hash)):
+                return False
+
+        self.finality.finalize(vote.epoch, vote.block_hash, vote.height)
+        dropped = self.tree.finalize(vote.block_hash)
+        UndoJournal.prune(vote.height + 1)
+        logger.info(f"Checkpoint #{vote.height} final; pruned {dropped} blocks of reorg-able history")
+        return True
+
+    def _requeue_orphaned_transactions(self, removed: List[Block], added: List[Block]):
+        """Return transactions of abandoned blocks to the mempool"""
+        mempool = getattr(self, 'mempool', None)
+        if not mempool:
+            return
+        included = {tx.tx_hash for block in added for tx in block.transactions}
+        for block in removed:
+            for tx in block.transactions:
+                if tx.tx_hash not in included and tx.contract_type != "VEX_REWARD":
+                    mempool.add_transaction(tx)
+
+    def _distribute_vex_rewards(self, block: Block, state: BlockState):
         """Distribute VEX rewards to the block validator"""
         # Calculate reward (example: fixed 10 VEX per block)
         base_reward = 50 # fixed block reward of 50 VEX
@@ -440,11 +631,9 @@ class Blockchain:
 
         logger.info(f"Distributing {total_reward} VEX to validator {block.validator} for block #{block.index}")
 
-        # Update Validator balance
-        state_db = StateDB()
-        validator_balance = state_db.get_balance(block.validator)
-        balance = validator_balance + total_reward
-        state_db.update_balance(block.validator, balance)
+        # Update Validator balance with the rest of the block's writes
+        key = ('balance', block.validator)
+        state.write(key, float(state.read(key) + total_reward))
 
     def _add_external_block(self, block: Block) -> Optional[Block]:
         last_block = self.get_last_block()
@@ -500,6 +689,7 @@ class Blockchain:
                     logger.error(f"Contract execution failed: {result}")
                     # در یک پیاده‌سازی واقعی، ممکن است بخواهید بلاک را رد کنید
 
+        block.cumulative_weight = last_block.cumulative_weight + block_weight(block)
         self.chain.append(block)
 
         try:
@@ -512,6 +702,18 @@ class Blockchain:
             self.chain.pop()
             return None
 
+    def import_snapshot(self, manifest: dict, chunks: dict) -> Block:
+        """Replace state and chain with a verified snapshot; the chain continues from its anchor"""
+        anchor = self.snapshots.import_snapshot(manifest, chunks)
+        validator_sets.invalidate()
+        self.chain = [anchor]
+        self.last_block = anchor
+        self.block_cache = LRUCache(capacity=100)
+        self.block_cache.put(anchor.index, anchor)
+        self.tree.reset(self.chain)
+        self.finality.load(anchor)
+        return anchor
+
     def get_last_block(self) -> Optional[Block]:
         if not self.chain:
             return None
@@ -520,16 +722,14 @@ class Blockchain:
     def is_chain_valid(self) -> bool:
         return Consensus.is_chain_valid(self.chain)
 
-    def resolve_conflicts(self, nodes: List[str]) -> bool:
-        logger.info("Resolving conflicts with network nodes...")
-
-        new_chain = None
-        max_cumulative_diff = Consensus.cumulative_difficulty(self.chain)
-
-        if new_chain and Consensus.is_chain_valid(new_chain):
-            if Consensus.cumulative_difficulty(new_chain) > max_cumulative_diff:
-                self.chain = new_chain
-                logger.info("Chain replaced with longer valid chain")
+    def resolve_conflicts(self, nodes: List[str] = None) -> bool:
+        """Move to the heaviest known branch if it is not the main chain"""
+        logger.info("Resolving conflicts with known branches...")
+        with self.lock:
+            best = self.tree.best_tip()
+            tip = self.chain[-1].hash if self.chain else None
+            if best and best != tip and self.tree.is_heavier(best, tip) and self._reorganize(best):
+                self._on_new_tip(self.chain[-1])
                 return True
 
         logger.info("Current chain remains authoritative")
@@ -547,91 +747,35 @@ class Blockchain:
             ''', (json.dumps(block.to_dict()),))
             conn.commit()
 
-    def _create_new_block(self, transactions: List[Transaction],
-                 validator_private_key: ec.EllipticCurvePrivateKey,
-                 selected_validator_address: str = None) -> Optional[Block]:
-
-        # Get Our Node's Address
-        our_address = ValidatorRegistry.get_validator_address(validator_private_key)
-
-        # Only proceed if we are the selected validator
-        if our_address != selected_validator_address:
-            logger.error(f"Not the selected validator. Expected: {selected_validator_address}, Our: {our_address}")
-            return None
-
-        if not transactions:
-            logger.warning("Cannot add empty block")
-            return None
-
-        last_block = self.get_last_block()
-        if not last_block:
-            logger.error("Chain not initialized")
-            return None
-
-        vm = SmartContractVM(StateDB())
-        successful_txs = []
-        for tx in transactions:
-            if tx.contract_type != "NORMAL":
-                logger.info(f"Executing smart contract tx: {tx.tx_hash[:8]}")
-                success, result = vm.execute(
-                    tx,
-                    last_block.index + 1,
-                    time.time()
-                )
-                if success:
-                    logger.info(f"Contract executed successfully. Result: {result}")
-                    tx.contract_output = result
-                    successful_txs.append(tx)
-                else:
-                    logger.error(f"Contract execution failed: {result}")
-            else:
-                successful_txs.append(tx)
+    def create_block(self, transactions: List[Transaction], validator_private_key: ec.EllipticCurvePrivateKey,
+                     slot: int, vrf_proof: str, timestamp: float = None) -> Optional[Block]:
+        """Build, sign and add our block for slot on top of the tip.
 
-        if not successful_txs:
-            logger.warning("No valid transactions to include in block")
-            return None
+        Transactions that would fail are left out. The block then goes through
+        add_block like any block from the network, so it is checked and
+        executed exactly as its peers will.
+        """
+        with self.lock:
+            last_block = self.get_last_block()
+            if not last_block:
+                logger.error("Chain not initialized")
+                return None
 
-        if selected_validator_address:
-            validator_address = selected_validator_address
-            stake = ValidatorRegistry.get_validator_stake(validator_address)
-        else:
+            height = last_block.index + 1
             validator_address = ValidatorRegistry.get_validator_address(validator_private_key)
-            stake = ValidatorRegistry.get_validator_stake(validator_address)
-
-        if stake <= 0:
-            logger.error(f"Validator {validator_address} has no stake or not registered in DB")
-            return None
-
-        new_block = Block(
-            index=last_block.index + 1,
-            timestamp=int(time.time()),
-            transactions=successful_txs,
-            previous_hash=last_block.hash,
-            validator=validator_address,
-            stake_amount=stake,
-            difficulty=self.difficulty
-        )
-
-        new_block.sign_block(validator_private_key, stake)
-
-        try:
-            block_id = BlockRepository.save_block(new_block)
-            TransactionRepository.save_transactions_bulk(successful_txs, block_id)
-            self.chain.append(new_block)
-
-            logger.info(f"Block #{new_block.index} added to chain: {new_block.hash[:10]}...")
-
-            if hasattr(self, 'p2p_network') and self.p2p_network:
-                try:
-                    self.p2p_network.broadcast_block(new_block)
-                except Exception as e:
-                    logger.error(f"Block broadcast failed: {e}")
-                    self._save_pending_block(new_block)
+            stake = validator_sets.for_height(height).stake_of(validator_address)
+            if stake <= 0:
+                logger.error(f"Validator {validator_address} has no stake in the validator set of block #{height}")
+                return None
 
-            return new_block
+            header = dict(index=height, previous_hash=last_block.hash, validator=validator_address,
+                          stake_amount=stake, difficulty=self.difficulty, slot=slot, vrf_proof=vrf_proof,
+                          timestamp=self.election.slot_start(slot) if timestamp is None else timestamp)
+            included = self.executor.select(Block(transactions=list(transactions), **header))
+            if not included:
+                logger.warning("No valid transactions to include in block")
+                return None
 
-        except Exception as e:
-            logger.error(f"Failed to save block: {e}")
-            if new_block in self.chain:
-                self.chain.remove(new_block)
-            return None
+            new_block = Block(transactions=included, **header)
+            new_block.sign_block(validator_private_key, stake)
+            return self.add_block(new_block)
@@ -1,47 +1,46 @@
 import random
 from typing import List
+from src.blockchain.consensus.validator_set import ValidatorSetCache, validator_sets as default_validator_sets
 from src.utils.logger import logger
 
 class Consensus:
-    def __init__(self, blockchain, stake_manager):
+    def __init__(self, blockchain, stake_manager, validator_sets: ValidatorSetCache = None):
         self.blockchain = blockchain
         self.stake_manager = stake_manager
+        self.validator_sets = validator_sets or default_validator_sets
 
-    def select_validator(self):
-        validators = self.stake_manager.get_active_validators()
+    def select_validator(self, height: int = None):
+        if height is None:
+            last_block = self.blockchain.get_last_block() if self.blockchain else None
+            height = last_block.index + 1 if last_block else 0
+        validators = self.validator_sets.for_height(height)
 
-        if not validators:
+        if not len(validators):
             logger.error("No active validators available")
             return None
 
-        total_stake = sum(validators.values())
-        if total_stake <= 0:
+        if validators.total_stake <= 0:
             logger.error("Total stake is zero or negative")
             return None
 
-        selection_point = random.uniform(0, total_stake)
-        current_sum = 0
-
-        for address, stake in validators.items():
-            current_sum += stake
-            if current_sum >= selection_point:
-                logger.info(f"Selected validator: {address} with stake {stake}")
-                return address
-
-        logger.error("Validator selection failed")
-        return None
+        address = validators.select(random.uniform(0, validators.total_stake))
+        logger.info(f"Selected validator: {address} with stake {validators.stake_of(address)}")
+        return address
 
     @staticmethod
     def validate_block(block: 'Block', previous_block: 'Block') -> bool:
         return block.is_valid(previous_block)
 
     @staticmethod
-    def is_chain_valid(chain: List['Block']) -> bool:
+    def is_chain_valid(chain: List['Block'], trusted_anchor: str = None) -> bool:
+        """Validate links from genesis, or from a trusted snapshot anchor block"""
         if not chain:
             return False
 
         genesis = chain[0]
-        if genesis.index != 0 or genesis.previous_hash != "0":
+        if trusted_anchor is not None and genesis.hash == trusted_anchor:
+            pass
+        elif genesis.index != 0 or genesis.previous_hash != "0":
             logger.error("Invalid genesis block")
             return False
 
@@ -55,7 +54,8 @@ class Consensus:
         return True
 
     @staticmethod
-    def cumulative_difficulty(chain: List['Block']) -> float:
+    def cumulative_weight(chain: List['Block']) -> float:
+        """Fork-choice weight of a chain, read from its tip rather than summed over every block"""
         if not chain:
             return 0
-        return sum(block.difficulty for block in chain)
+        return chain[-1].cumulative_weight
@@ -0,0 +1,329 @@
+import binascii
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+from src.blockchain.consensus.validator_registry import ValidatorRegistry
+from src.blockchain.consensus.validator_set import EPOCH_LENGTH, ValidatorSet, validator_sets as default_validator_sets
+from src.utils.database import db_connection
+from src.utils.logger import logger
+
+ATTESTATION_DOMAIN = b"vex-checkpoint-v1"
+ATTESTATION_DELAY = 2  # blocks built on a checkpoint before we attest to it
+FINALITY_NUMERATOR, FINALITY_DENOMINATOR = 2, 3  # more than 2/3 of the epoch's stake
+MAX_EARLY_ATTESTATIONS = 1024  # votes held until our chain pins their epoch's validator set
+
+
+@dataclass
+class Attestation:
+    """A validator's signed vote that block_hash is the checkpoint of epoch"""
+    validator: str
+    epoch: int
+    block_hash: str
+    height: int
+    signature: str = ""
+
+    def signing_payload(self) -> bytes:
+        return ATTESTATION_DOMAIN + json.dumps(
+            [self.epoch, self.height, self.block_hash], separators=(',', ':')
+        ).encode()
+
+    @property
+    def id(self) -> str:
+        return hashlib.sha256(self.signing_payload() + self.validator.encode()).hexdigest()
+
+    def sign(self, private_key: ec.EllipticCurvePrivateKey):
+        self.signature = private_key.sign(self.signing_payload(), ec.ECDSA(hashes.SHA256())).hex()
+
+    def to_dict(self) -> dict:
+        return {
+            'validator': self.validator,
+            'epoch': self.epoch,
+            'block_hash': self.block_hash,
+            'height': self.height,
+            'signature': self.signature
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Attestation':
+        return cls(
+            validator=str(data['validator']),
+            epoch=int(data['epoch']),
+            block_hash=str(data['block_hash']),
+            height=int(data['height']),
+            signature=str(data['signature'])
+        )
+
+
+class FinalityGadget:
+    """Finalizes epoch checkpoints once a stake supermajority attests to them.
+
+    The checkpoint of epoch e is the main-chain block at height
+    e * epoch_length. Validators sign it once it is ATTESTATION_DELAY blocks
+    deep; when attestations for one hash carry more than 2/3 of the epoch's
+    stake, that block and everything before it are final. Finalized
+    checkpoints and the attestations behind them are recorded per epoch.
+
+    Stake is always that of the epoch's boundary snapshot. A vote for an
+    epoch our chain has not pinned yet is held, once its signature checks
+    out, and counted when the snapshot appears.
+    """
+
+    def __init__(self, validator_sets=None, epoch_length: int = EPOCH_LENGTH,
+                 clock: Callable[[], float] = time.time):
+        self.validator_sets = validator_sets or default_validator_sets
+        self.epoch_length = epoch_length
+        self.clock = clock
+        self.lock = threading.RLock()
+
+        self.signer = None  # (private key, address) when this node attests
+        self.attested_epochs = set()
+        self.pending: Dict[int, Dict[str, Attestation]] = {}  # epoch -> validator -> vote
+        self.early: Dict[int, Dict[str, Attestation]] = {}    # same, for epochs not pinned yet
+        self.public_keys: Dict[str, ec.EllipticCurvePublicKey] = {}
+
+        self.finalized_epoch = -1
+        self.finalized_height = -1
+        self.finalized_hash = None
+
+        self.accepted = 0
+        self.rejected = 0
+        self.equivocations = 0
+
+    def set_signer(self, private_key: ec.EllipticCurvePrivateKey, address: str):
+        self.signer = (private_key, address)
+
+    def checkpoint_height(self, epoch: int) -> int:
+        return epoch * self.epoch_length
+
+    def epoch_of(self, height: int) -> int:
+        return height // self.epoch_length
+
+    def load(self, base_block):
+        """Restore the latest finalized checkpoint; the chain's base block is final by definition"""
+        with self.lock:
+            self.pending = {}
+            self.early = {}
+            self.attested_epochs = set()
+            self.finalized_epoch = self.epoch_of(base_block.index)
+            self.finalized_height = base_block.index
+            self.finalized_hash = base_block.hash
+            with db_connection() as conn:
+                row = conn.execute('''
+                    SELECT epoch, height, block_hash FROM checkpoints
+                    WHERE height >= ? ORDER BY epoch DESC LIMIT 1
+                ''', (base_block.index,)).fetchone()
+                if row:
+                    self.finalized_epoch, self.finalized_height, self.finalized_hash = row
+                    self.attested_epochs.add(row[0])
+
+    def is_final(self, height: int) -> bool:
+        return height <= self.finalized_height
+
+    def attest(self, checkpoint) -> Optional[Attestation]:
+        """Sign checkpoint with our key if we have stake in its epoch and have not voted yet"""
+        if self.signer is None:
+            return None
+        private_key, address = self.signer
+        epoch = self.epoch_of(checkpoint.index)
+        with self.lock:
+            if epoch in self.attested_epochs or epoch <= self.finalized_epoch:
+                return None
+            validators = self.validator_sets.pinned(epoch)
+            if validators is None or validators.stake_of(address) <= 0:
+                return None
+            attestation = Attestation(address, epoch, checkpoint.hash, checkpoint.index)
+            attestation.sign(private_key)
+            self.attested_epochs.add(epoch)
+        self.add_attestation(attestation)
+        return attestation
+
+    def due_checkpoint_height(self, tip_height: int) -> Optional[int]:
+        """Height of the checkpoint to attest to once the tip reaches tip_height"""
+        height = tip_height - ATTESTATION_DELAY
+        if height < 0 or height % self.epoch_length:
+            return None
+        return height
+
+    def add_attestation(self, attestation: Attestation) -> Optional[bool]:
+        """Record a vote. None if it is invalid, False if it adds nothing new, True otherwise"""
+        with self.lock:
+            if attestation.epoch <= self.finalized_epoch:
+                return False
+            previous = self.pending.get(attestation.epoch, {}).get(attestation.validator)
+            if previous is not None and previous.block_hash == attestation.block_hash:
+                return False
+
+        validators = self.validator_sets.pinned(attestation.epoch)
+        if validators is None:
+            return self._hold_early(attestation)
+        if not self._valid(attestation, validators):
+            with self.lock:
+                self.rejected += 1
+            return None
+
+        with self.lock:
+            if attestation.epoch <= self.finalized_epoch:
+                return False
+            votes = self.pending.setdefault(attestation.epoch, {})
+            previous = votes.get(attestation.validator)
+            if previous is not None:
+                if previous.block_hash != attestation.block_hash:
+                    # Two checkpoints signed for one epoch: keep the first, never count both
+                    self.equivocations += 1
+                    logger.warning(f"Validator {attestation.validator} attested to two checkpoints "
+                                   f"in epoch {attestation.epoch}")
+                return False
+            votes[attestation.validator] = attestation
+            self.accepted += 1
+        self._save_attestation(attestation)
+        return True
+
+    def _hold_early(self, attestation: Attestation) -> Optional[bool]:
+        """Keep a vote for an epoch whose validator set we have not pinned yet; not counted yet"""
+        if not self._valid(attestation):
+            with self.lock:
+                self.rejected += 1
+            return None
+        with self.lock:
+            votes = self.early.setdefault(attestation.epoch, {})
+            if attestation.validator not in votes and \
+                    sum(len(held) for held in self.early.values()) < MAX_EARLY_ATTESTATIONS:
+                votes[attestation.validator] = attestation
+        return False
+
+    def release_early(self) -> int:
+        """Count held votes whose epoch is now pinned; returns how many were added"""
+        with self.lock:
+            ready = [epoch for epoch in self.early
+                     if epoch <= self.finalized_epoch or self.validator_sets.pinned(epoch) is not None]
+            held = [attestation for epoch in ready for attestation in self.early.pop(epoch).values()]
+        return sum(1 for attestation in held if self.add_attestation(attestation))
+
+    def _valid(self, attestation: Attestation, validators: ValidatorSet = None) -> bool:
+        """Checkpoint height and signature; stake too, given the epoch's validators"""
+        if attestation.height != self.checkpoint_height(attestation.epoch):
+            return False
+        if validators is not None and validators.stake_of(attestation.validator) <= 0:
+            return False
+        public_key = self._public_key(attestation.validator)
+        if public_key is None:
+            return False
+        try:
+            public_key.verify(binascii.unhexlify(attestation.signature), attestation.signing_payload(),
+                              ec.ECDSA(hashes.SHA256()))
+            return True
+        except (InvalidSignature, ValueError, binascii.Error):
+            return False
+
+    def _public_key(self, address: str) -> Optional[ec.EllipticCurvePublicKey]:
+        public_key = self.public_keys.get(address)
+        if public_key is None:
+            pem = ValidatorRegistry.get_public_key_pem(address)
+            if not pem:
+                return None
+            try:
+                public_key = load_pem_public_key(pem.encode())
+            except ValueError:
+                return None
+            self.public_keys[address] = public_key
+        return public_key
+
+    def _save_attestation(self, attestation: Attestation):
+        try:
+            with db_connection() as conn:
+                conn.execute('''
+                    INSERT OR IGNORE INTO attestations
+                        (epoch, validator, block_hash, height, signature, received_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (attestation.epoch, attestation.validator, attestation.block_hash,
+                      attestation.height, attestation.signature, self.clock()))
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to record attestation: {e}")
+
+    def pending_epochs(self) -> list:
+        with self.lock:
+            return sorted(self.pending)
+
+    def supermajority(self, epoch: int) -> Optional[Attestation]:
+        """A vote for the checkpoint more than 2/3 of the epoch's stake agrees on, if any"""
+        validators = self.validator_sets.pinned(epoch)
+        if validators is None or validators.total_stake <= 0:
+            return None
+        with self.lock:
+            tally: Dict[str, float] = {}
+            sample: Dict[str, Attestation] = {}
+            for attestation in self.pending.get(epoch, {}).values():
+                tally[attestation.block_hash] = tally.get(attestation.block_hash, 0.0) + \
+                    validators.stake_of(attestation.validator)
+                sample[attestation.block_hash] = attestation
+        for block_hash, stake in tally.items():
+            if stake * FINALITY_DENOMINATOR > validators.total_stake * FINALITY_NUMERATOR:
+                return sample[block_hash]
+        return None
+
+    def finalize(self, epoch: int, block_hash: str, height: int):
+        """Record epoch's checkpoint as final and forget older votes"""
+        validators = self.validator_sets.pinned(epoch) or ValidatorSet({}, epoch)
+        with self.lock:
+            if epoch <= self.finalized_epoch:
+                return
+            attested = sum(validators.stake_of(a.validator) for a in self.pending.get(epoch, {}).values()
+                           if a.block_hash == block_hash)
+            self.finalized_epoch, self.finalized_height, self.finalized_hash = epoch, height, block_hash
+            for old in [e for e in self.pending if e <= epoch]:
+                del self.pending[old]
+            for old in [e for e in self.early if e <= epoch]:
+                del self.early[old]
+
+        with db_connection() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO checkpoints
+                    (epoch, block_hash, height, attested_stake, total_stake, finalized_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (epoch, block_hash, height, attested, validators.total_stake, self.clock()))
+            conn.execute("DELETE FROM attestations WHERE epoch < ?", (epoch,))
+            conn.commit()
+        logger.info(f"Finalized epoch {epoch} checkpoint #{height} {block_hash[:10]}...")
+
+    @staticmethod
+    def checkpoint_hash(height: int) -> Optional[str]:
+        """Hash of the finalized checkpoint at height, if we know of one"""
+        with db_connection() as conn:
+            row = conn.execute("SELECT block_hash FROM checkpoints WHERE height = ?", (height,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def get_checkpoints(limit: int = 10) -> list:
+        with db_connection() as conn:
+            rows = conn.execute('''
+                SELECT epoch, block_hash, height, attested_stake, total_stake, finalized_at
+                FROM checkpoints ORDER BY epoch DESC LIMIT ?
+            ''', (limit,)).fetchall()
+        return [
+            {'epoch': r[0], 'block_hash': r[1], 'height': r[2], 'attested_stake': r[3],
+             'total_stake': r[4], 'finalized_at': r[5]}
+            for r in rows
+        ]
+
+    def get_status(self) -> dict:
+        with self.lock:
+            return {
+                'finalized_epoch': self.finalized_epoch,
+                'finalized_height': self.finalized_height,
+                'finalized_hash': self.finalized_hash,
+                'pending_epochs': self.pending_epochs(),
+                'early_attestations': sum(len(held) for held in self.early.values()),
+                'attested_epochs': len(self.attested_epochs),
+                'attestations_accepted': self.accepted,
+                'attestations_rejected': self.rejected,
+                'equivocations': self.equivocations,
+                'epoch_length': self.epoch_length
+            }
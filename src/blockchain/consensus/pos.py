@@ -1,56 +1,173 @@
-from src.blockchain.block import Block
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional, Tuple
 from cryptography.hazmat.primitives.asymmetric import ec
-from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+from src.blockchain.consensus.validator_registry import ValidatorRegistry
+from src.blockchain.consensus.validator_set import ValidatorSetCache, validator_sets as default_validator_sets
+from src.blockchain.consensus.vrf import VRF
+from src.utils.logger import logger
 
-class VRF:
-    def __init__(self, private_key):
-        self.private_key = private_key
+SLOT_DURATION = 2.0          # seconds per slot
+MAX_CLOCK_DRIFT = 2.0        # seconds a block's slot may start ahead of our clock
+ACTIVE_SLOT_COEFF = 0.5      # probability that a slot has at least one leader
+ELECTION_DOMAIN = b"vex-pos-v1"
+VERIFIED_CACHE_SIZE = 4096
 
-    def prove(self, seed):
-        # Generate VRF proof
-        signature = self.private_key.sign(
-            seed,
-            ec.ECDSA(hashes.SHA256()))
 
-        return signature
+def block_randomness(block) -> bytes:
+    """What a block adds to the next epoch's nonce: its VRF output, or its hash if it has no slot"""
+    if block.slot >= 0 and block.vrf_proof:
+        return VRF.output(bytes.fromhex(block.vrf_proof))
+    return block.hash.encode()
+
+
+def leader_threshold(stake: float, total_stake: float, active_slot_coeff: float = ACTIVE_SLOT_COEFF) -> float:
+    """Probability that a validator holding stake leads a given slot"""
+    if stake <= 0 or total_stake <= 0:
+        return 0.0
+    return 1.0 - (1.0 - active_slot_coeff) ** (stake / total_stake)
+
+
+def is_leader(output: bytes, stake: float, total_stake: float,
+              active_slot_coeff: float = ACTIVE_SLOT_COEFF) -> bool:
+    return int.from_bytes(output, 'big') / 2 ** 256 < leader_threshold(stake, total_stake, active_slot_coeff)
 
-    @staticmethod
-    def verify(public_key, seed, signature):
-        # Verify VRF proof
-        try:
-            public_key.verify(
-                signature,
-                seed,
-                ec.ECDSA(hashes.SHA256()))
-            return True
-        except Exception:
-            return False
 
 class ProofOfStake:
-    def __init__(self):
-        self.validators = {}
-        self.staking_contract = "0xStakingContract"
+    """Slot-based leader election.
 
-    def add_validator(self, address: str, stake: float):
-        self.validators[address] = stake
+    Time is divided into slots; in each slot every validator evaluates the
+    VRF on (epoch nonce, slot) and is a leader if the output falls below a
+    threshold that grows with its share of the stake of the epoch its block
+    height falls in. Leaders put the slot and proof into their block so
+    peers can check eligibility. Slots may have no leader or several; fork
+    choice settles the latter.
 
-    def select_validator(self, seed):
+    The epoch nonce hashes the VRF outputs of the branch's blocks in the
+    epoch before, so it is fixed before the epoch starts and, the outputs
+    being unique, a producer can at most withhold its block to change it.
+    """
 
-        # Calculate validator weights based on their stake
-        total_stake = sum(self.validators.values())
+    def __init__(self, validator_sets: ValidatorSetCache = None, genesis_time: float = 0.0,
+                 slot_duration: float = SLOT_DURATION, active_slot_coeff: float = ACTIVE_SLOT_COEFF,
+                 cache_size: int = VERIFIED_CACHE_SIZE, max_drift: float = MAX_CLOCK_DRIFT,
+                 clock: Callable[[], float] = time.time):
+        self.validator_sets = validator_sets or default_validator_sets
+        self.genesis_time = genesis_time
+        self.slot_duration = slot_duration
+        self.active_slot_coeff = active_slot_coeff
+        self.cache_size = cache_size
+        self.max_drift = max_drift
+        self.clock = clock
+        self.verified = OrderedDict()   # (validator, slot, height, nonce) -> (proof, eligible)
+        self.public_keys = {}
+        self.lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
 
-        vrf = VRF(private_key=self.staking_contract)
-        proof = vrf.prove(seed)
-        random_value = int.from_bytes(proof, 'big') % total_stake
+    def slot_at(self, timestamp: float) -> int:
+        return max(0, int((timestamp - self.genesis_time) // self.slot_duration))
+
+    def slot_start(self, slot: int) -> float:
+        return self.genesis_time + slot * self.slot_duration
+
+    def nonce_heights(self, epoch: int) -> Tuple[int, int]:
+        """[start, end) heights of the blocks epoch's nonce is made of; genesis alone for epoch 0"""
+        length = self.validator_sets.epoch_length
+        return max(0, (epoch - 1) * length), max(1, epoch * length)
+
+    @staticmethod
+    def epoch_nonce(epoch: int, blocks: Iterable) -> bytes:
+        """Nonce of epoch from the blocks at its nonce_heights, oldest first"""
+        digest = hashlib.sha256(ELECTION_DOMAIN + b"/epoch" + epoch.to_bytes(8, 'big'))
+        for block in blocks:
+            digest.update(block_randomness(block))
+        return digest.digest()
+
+    @staticmethod
+    def seed_for(slot: int, nonce: bytes) -> bytes:
+        return hashlib.sha256(nonce + slot.to_bytes(8, 'big')).digest()
 
-        # Select validator based on random value
-        current_sum = 0
-        for address, stake in self.validators.items():
-            current_sum += stake
-            if current_sum >= random_value:
-                return address, proof
+    def elect(self, private_key: ec.EllipticCurvePrivateKey, address: str, slot: int,
+              height: int, nonce: bytes) -> Optional[str]:
+        """Our VRF proof (hex) if address leads slot with a block at height, else None"""
+        validators = self.validator_sets.for_height(height)
+        stake = validators.stake_of(address)
+        if stake <= 0:
+            return None
+        output, proof = VRF(private_key).prove(self.seed_for(slot, nonce))
+        if not is_leader(output, stake, validators.total_stake, self.active_slot_coeff):
+            return None
+        return proof.hex()
 
-        return None
+    def verify_leader(self, validator: str, slot: int, height: int, nonce: bytes, proof_hex: str) -> bool:
+        """Check a block producer's VRF proof for slot; results are cached per election"""
+        key = (validator, slot, height, nonce)
+        with self.lock:
+            cached = self.verified.get(key)
+            if cached is not None and cached[0] == proof_hex:
+                self.verified.move_to_end(key)
+                self.cache_hits += 1
+                return cached[1]
+            self.cache_misses += 1
+
+        eligible = self._verify(validator, slot, height, nonce, proof_hex)
+        with self.lock:
+            self.verified[key] = (proof_hex, eligible)
+            self.verified.move_to_end(key)
+            while len(self.verified) > self.cache_size:
+                self.verified.popitem(last=False)
+        return eligible
+
+    def _verify(self, validator: str, slot: int, height: int, nonce: bytes, proof_hex: str) -> bool:
+        public_key = self._public_key(validator)
+        if public_key is None:
+            logger.warning(f"No public key for slot leader {validator}")
+            return False
+        try:
+            proof = bytes.fromhex(proof_hex)
+        except (TypeError, ValueError):
+            return False
+
+        output = VRF.verify(public_key, self.seed_for(slot, nonce), proof)
+        if output is None:
+            return False
+        validators = self.validator_sets.for_height(height)
+        return is_leader(output, validators.stake_of(validator), validators.total_stake, self.active_slot_coeff)
+
+    def _public_key(self, address: str) -> Optional[ec.EllipticCurvePublicKey]:
+        public_key = self.public_keys.get(address)
+        if public_key is None:
+            pem = ValidatorRegistry.get_public_key_pem(address)
+            if not pem:
+                return None
+            try:
+                public_key = load_pem_public_key(pem.encode())
+            except ValueError:
+                return None
+            self.public_keys[address] = public_key
+        return public_key
+
+    def validate_block(self, block, nonce: bytes) -> bool:
+        """Whether block's producer led its slot; nonce is the epoch nonce of the block's branch"""
+        if block.slot is None or block.slot < 0:
+            logger.warning(f"Block #{block.index} has no election slot")
+            return False
+        if self.slot_at(block.timestamp) != block.slot:
+            logger.warning(f"Block #{block.index} timestamp {block.timestamp} is outside slot {block.slot}")
+            return False
+        if self.slot_start(block.slot) > self.clock() + self.max_drift:
+            logger.warning(f"Block #{block.index} is for future slot {block.slot}")
+            return False
+        return self.verify_leader(block.validator, block.slot, block.index, nonce, block.vrf_proof)
 
-    def validate_block(self, block: Block, validator: str) -> bool:
-        return block.validator == validator and Block.verify_signature(block.signature)
+    def get_metrics(self) -> dict:
+        with self.lock:
+            return {
+                'cached_proofs': len(self.verified),
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses
+            }
@@ -1,5 +1,6 @@
 from typing import Dict
 from src.blockchain.consensus.validator_registry import ValidatorRegistry
+from src.blockchain.consensus.validator_set import validator_sets
 from src.utils.database import db_connection
 from src.utils.logger import logger
 from src.blockchain.db.state_db import StateDB
@@ -50,7 +51,10 @@ class StakeManager:
                 WHERE address = ? AND stake >= ?
             ''', (amount, address, amount))
             conn.commit()
-            return cursor.rowcount > 0
+            unstaked = cursor.rowcount > 0
+        if unstaked:
+            validator_sets.invalidate()
+        return unstaked
 
     @staticmethod
     def claim_reward(validator_address: str) -> float:
@@ -62,8 +66,10 @@ class StakeManager:
             total_fees = sum(tx.fee for tx in block.transactions if hasattr(tx, 'fee'))
             base_reward = total_fees * StakeManager.REWARD_RATE
 
-            validator_stake = ValidatorRegistry.get_validator_stake(block.validator)
-            total_stake = sum(StakeManager.get_active_validators().values())
+            # Stake share from the epoch snapshot; the reward itself takes effect next epoch
+            validators = validator_sets.for_height(block.index)
+            validator_stake = validators.stake_of(block.validator)
+            total_stake = validators.total_stake
             stake_ratio = validator_stake / total_stake if total_stake > 0 else 0
 
             final_reward = base_reward * (1 + stake_ratio)
@@ -99,6 +105,7 @@ class StakeManager:
                 conn.commit()
 
                 logger.warning(f"Validator {validator_address} slashed {penalty} for block {block_hash}")
+            validator_sets.invalidate()
 
         except Exception as e:
             logger.error(f"Slashing failed: {e}")
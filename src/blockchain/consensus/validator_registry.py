@@ -4,6 +4,7 @@ import cryptography.hazmat.primitives.serialization as serialization
 from src.utils.database import db_connection
 from typing import Dict
 from src.utils.crypto import address_from_public_key
+from src.blockchain.consensus.validator_set import validator_sets
 from src.utils.logger import logger
 
 class ValidatorRegistry:
@@ -18,6 +19,7 @@ class ValidatorRegistry:
                 VALUES (?, ?, ?, CURRENT_TIMESTAMP)
             ''', (address, public_key_pem, stake))
             conn.commit()
+        validator_sets.invalidate()
 
     @staticmethod
     def get_validator_stake(address: str) -> float:
@@ -0,0 +1,175 @@
+import json
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+from typing import Callable, Dict, List, Optional, Tuple
+from src.utils.database import db_connection
+from src.utils.logger import logger
+
+EPOCH_LENGTH = 100     # blocks per validator-set epoch
+CACHED_EPOCHS = 4      # validator sets kept in memory
+
+
+def _staked(cursor) -> Dict[str, float]:
+    cursor.execute('SELECT address, stake FROM validators WHERE stake > 0 ORDER BY address')
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def write_epoch_stakes(cursor, epoch: int, boundary_hash: str = None, nonce: bytes = None):
+    """Pin the stakes in the validators table as epoch's validator set, in cursor's transaction.
+
+    Done when the chain applies the last block before the epoch (and at
+    genesis for epoch 0), so the set follows from chain state alone. The
+    epoch's election nonce and the block it was derived up to are kept
+    alongside for nodes that start from a snapshot without that history.
+    """
+    stakes = _staked(cursor)
+    cursor.execute('''
+        INSERT OR REPLACE INTO validator_epochs (epoch, stakes, boundary_hash, nonce) VALUES (?, ?, ?, ?)
+    ''', (epoch, json.dumps(stakes, sort_keys=True), boundary_hash, nonce.hex() if nonce else None))
+
+
+def record_epoch_stakes(epoch: int, boundary_hash: str = None, nonce: bytes = None):
+    """write_epoch_stakes in a transaction of its own"""
+    with db_connection() as conn:
+        write_epoch_stakes(conn.cursor(), epoch, boundary_hash, nonce)
+        conn.commit()
+
+
+def load_epoch_nonce(epoch: int) -> Optional[Tuple[str, bytes]]:
+    """(boundary block hash, nonce) pinned for epoch, if any"""
+    with db_connection() as conn:
+        row = conn.execute('SELECT boundary_hash, nonce FROM validator_epochs WHERE epoch = ?',
+                           (epoch,)).fetchone()
+    if not row or row[1] is None:
+        return None
+    return row[0], bytes.fromhex(row[1])
+
+
+def load_epoch_stakes(epoch: int) -> Dict[str, float]:
+    """Stakes pinned for epoch, or for the latest epoch before it whose boundary the chain has reached"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT stakes FROM validator_epochs WHERE epoch <= ? ORDER BY epoch DESC LIMIT 1',
+                       (epoch,))
+        row = cursor.fetchone()
+        if row:
+            return json.loads(row[0])
+        # A chain stored before epochs were pinned
+        return _staked(cursor)
+
+
+def load_pinned_stakes(epoch: int) -> Optional[Dict[str, float]]:
+    """Stakes pinned for epoch itself, or None if the chain has not reached its boundary"""
+    with db_connection() as conn:
+        row = conn.execute('SELECT stakes FROM validator_epochs WHERE epoch = ?', (epoch,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+class ValidatorSet:
+    """Immutable stake snapshot with prefix sums for O(log n) weighted selection"""
+
+    def __init__(self, stakes: Dict[str, float], epoch: int = 0):
+        self.epoch = epoch
+        self.addresses: List[str] = [address for address, stake in stakes.items() if stake > 0]
+        self.stakes: List[float] = [stakes[address] for address in self.addresses]
+        self.cumulative: List[float] = list(accumulate(self.stakes))
+        self.total_stake: float = self.cumulative[-1] if self.cumulative else 0.0
+        self._index = {address: i for i, address in enumerate(self.addresses)}
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def __contains__(self, address):
+        return address in self._index
+
+    def stake_of(self, address: str) -> float:
+        index = self._index.get(address)
+        return self.stakes[index] if index is not None else 0.0
+
+    def select(self, point: float) -> Optional[str]:
+        """Validator owning `point` in [0, total_stake)"""
+        if not self.addresses:
+            return None
+        index = bisect_right(self.cumulative, point)
+        return self.addresses[min(index, len(self.addresses) - 1)]
+
+    def as_dict(self) -> Dict[str, float]:
+        return dict(zip(self.addresses, self.stakes))
+
+
+class ValidatorSetCache:
+    """The validator sets of the last few epochs used, by epoch.
+
+    An epoch is a range of epoch_length block heights; slot election, block
+    weights and finality all use this one definition. Stake changes inside
+    an epoch reach the validators table at once but only enter a set at the
+    next epoch boundary, when the chain pins them.
+    """
+
+    def __init__(self, loader: Callable[[int], Dict[str, float]] = load_epoch_stakes,
+                 epoch_length: int = EPOCH_LENGTH, size: int = CACHED_EPOCHS,
+                 pinned_loader: Callable[[int], Optional[Dict[str, float]]] = load_pinned_stakes):
+        self.loader = loader
+        self.pinned_loader = pinned_loader
+        self.epoch_length = epoch_length
+        self.size = size
+        self.lock = threading.Lock()
+        self._sets: "OrderedDict[int, ValidatorSet]" = OrderedDict()
+        self._pinned: "OrderedDict[int, ValidatorSet]" = OrderedDict()
+        self.loads = 0
+
+    def epoch_of(self, height: int) -> int:
+        return max(height, 0) // self.epoch_length
+
+    def for_height(self, height: int) -> ValidatorSet:
+        return self.for_epoch(self.epoch_of(height))
+
+    def for_epoch(self, epoch: int) -> ValidatorSet:
+        with self.lock:
+            validators = self._sets.get(epoch)
+            if validators is not None:
+                self._sets.move_to_end(epoch)
+                return validators
+            try:
+                stakes = self.loader(epoch)
+            except Exception as e:
+                logger.error(f"Failed to load validator set for epoch {epoch}: {e}")
+                return ValidatorSet({}, epoch)
+            validators = ValidatorSet(stakes, epoch)
+            self.loads += 1
+            self._sets[epoch] = validators
+            while len(self._sets) > self.size:
+                self._sets.popitem(last=False)
+            return validators
+
+    def pinned(self, epoch: int) -> Optional[ValidatorSet]:
+        """epoch's own boundary snapshot; None until the chain has pinned it, never an older set"""
+        with self.lock:
+            validators = self._pinned.get(epoch)
+            if validators is not None:
+                self._pinned.move_to_end(epoch)
+                return validators
+            try:
+                stakes = self.pinned_loader(epoch)
+            except Exception as e:
+                logger.error(f"Failed to load pinned validator set for epoch {epoch}: {e}")
+                return None
+            if stakes is None:
+                return None
+            validators = ValidatorSet(stakes, epoch)
+            self.loads += 1
+            self._pinned[epoch] = validators
+            while len(self._pinned) > self.size:
+                self._pinned.popitem(last=False)
+            return validators
+
+    def invalidate(self):
+        """Drop every cached set, after pinned stakes were written or undone"""
+        with self.lock:
+            self._sets.clear()
+            self._pinned.clear()
+
+
+validator_sets = ValidatorSetCache()
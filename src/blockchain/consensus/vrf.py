@@ -0,0 +1,202 @@
+import hashlib
+import hmac
+from typing import Optional, Tuple
+from cryptography.hazmat.primitives.asymmetric import ec
+
+# secp256k1
+P = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEFFFFFC2F
+Q = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+G = (0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+     0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8)
+
+SUITE_STRING = b"\xfe"  # ECVRF-SECP256K1-SHA256-TAI
+C_LEN = 16              # challenge bytes
+Q_LEN = 32
+PT_LEN = 33             # compressed point
+PROOF_LEN = PT_LEN + C_LEN + Q_LEN
+
+# Points are affine (x, y) tuples; None is the point at infinity. Arithmetic runs
+# in Jacobian coordinates (X, Y, Z) so a scalar multiplication needs one inversion.
+
+
+def _double(point):
+    x, y, z = point
+    if not y:
+        return None
+    yy = y * y % P
+    s = 4 * x * yy % P
+    m = 3 * x * x % P
+    x3 = (m * m - 2 * s) % P
+    return x3, (m * (s - x3) - 8 * yy * yy) % P, 2 * y * z % P
+
+
+def _add(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    x1, y1, z1 = a
+    x2, y2, z2 = b
+    z1z1 = z1 * z1 % P
+    z2z2 = z2 * z2 % P
+    u1 = x1 * z2z2 % P
+    u2 = x2 * z1z1 % P
+    s1 = y1 * z2 * z2z2 % P
+    s2 = y2 * z1 * z1z1 % P
+    if u1 == u2:
+        return _double(a) if s1 == s2 else None
+    h = u2 - u1
+    r = s2 - s1
+    hh = h * h % P
+    hhh = h * hh % P
+    v = u1 * hh % P
+    x3 = (r * r - hhh - 2 * v) % P
+    return x3, (r * (v - x3) - s1 * hhh) % P, h * z1 * z2 % P
+
+
+def _affine(point):
+    if point is None:
+        return None
+    x, y, z = point
+    z_inv = pow(z, -1, P)
+    z_inv2 = z_inv * z_inv % P
+    return x * z_inv2 % P, y * z_inv2 * z_inv % P
+
+
+def _mul_jacobian(k: int, point):
+    result = None
+    addend = (point[0], point[1], 1)
+    for bit in bin(k)[2:]:
+        result = _double(result) if result is not None else None
+        if bit == '1':
+            result = _add(result, addend)
+    return result
+
+
+def multiply(k: int, point):
+    k %= Q
+    if point is None or k == 0:
+        return None
+    return _affine(_mul_jacobian(k, point))
+
+
+def combine(k1: int, p1, k2: int, p2):
+    """k1*p1 + k2*p2"""
+    parts = [_mul_jacobian(k % Q, p) for k, p in ((k1, p1), (k2, p2)) if p is not None and k % Q]
+    result = None
+    for part in parts:
+        result = _add(result, part)
+    return _affine(result)
+
+
+def encode_point(point) -> bytes:
+    """SEC1 compressed encoding; the point at infinity is a single zero byte"""
+    if point is None:
+        return b"\x00"
+    x, y = point
+    return bytes([2 + (y & 1)]) + x.to_bytes(32, 'big')
+
+
+def decode_point(data: bytes):
+    """Point from its compressed encoding, or None if data is not a valid curve point"""
+    if len(data) != PT_LEN or data[0] not in (2, 3):
+        return None
+    x = int.from_bytes(data[1:], 'big')
+    if x >= P:
+        return None
+    y2 = (pow(x, 3, P) + 7) % P
+    y = pow(y2, (P + 1) // 4, P)
+    if y * y % P != y2:
+        return None
+    if (y & 1) != data[0] - 2:
+        y = P - y
+    return x, y
+
+
+def _hash(*parts: bytes) -> bytes:
+    return hashlib.sha256(b"".join(parts)).digest()
+
+
+def encode_to_curve(salt: bytes, alpha: bytes):
+    """Try-and-increment hash to a curve point (RFC 9381 section 5.4.1.1)"""
+    for counter in range(256):
+        candidate = _hash(SUITE_STRING, b"\x01", salt, alpha, bytes([counter]), b"\x00")
+        point = decode_point(b"\x02" + candidate)
+        if point is not None:
+            return point
+    raise ValueError("No curve point found for VRF input")
+
+
+def challenge(*points) -> int:
+    digest = _hash(SUITE_STRING, b"\x02", *(encode_point(p) for p in points), b"\x00")
+    return int.from_bytes(digest[:C_LEN], 'big')
+
+
+def nonce(secret: int, h_string: bytes) -> int:
+    """Deterministic nonce of RFC 6979 section 3.2 over SHA-256 (RFC 9381 section 5.4.2.1)"""
+    x = secret.to_bytes(Q_LEN, 'big')
+    h1 = (int.from_bytes(_hash(h_string), 'big') % Q).to_bytes(Q_LEN, 'big')
+    v = b"\x01" * 32
+    k = b"\x00" * 32
+    k = hmac.new(k, v + b"\x00" + x + h1, hashlib.sha256).digest()
+    v = hmac.new(k, v, hashlib.sha256).digest()
+    k = hmac.new(k, v + b"\x01" + x + h1, hashlib.sha256).digest()
+    v = hmac.new(k, v, hashlib.sha256).digest()
+    while True:
+        v = hmac.new(k, v, hashlib.sha256).digest()
+        candidate = int.from_bytes(v, 'big')
+        if 1 <= candidate < Q:
+            return candidate
+        k = hmac.new(k, v + b"\x00", hashlib.sha256).digest()
+        v = hmac.new(k, v, hashlib.sha256).digest()
+
+
+class VRF:
+    """ECVRF over secp256k1: RFC 9381's P256-SHA256-TAI construction on our curve.
+
+    Gamma = x * H(public key, seed) is fixed by the key and the seed, and the
+    output is the hash of Gamma alone, so each (key, seed) has exactly one
+    valid output however the proof's nonce is chosen. The proof is Gamma
+    plus a Chaum-Pedersen proof (c, s) that Gamma and the public key share
+    the same discrete log.
+    """
+
+    def __init__(self, private_key: ec.EllipticCurvePrivateKey):
+        self.secret = private_key.private_numbers().private_value
+        numbers = private_key.public_key().public_numbers()
+        self.public_point = (numbers.x, numbers.y)
+
+    def prove(self, seed: bytes) -> Tuple[bytes, bytes]:
+        """(output, proof) for seed"""
+        h = encode_to_curve(encode_point(self.public_point), seed)
+        gamma = multiply(self.secret, h)
+        k = nonce(self.secret, encode_point(h))
+        c = challenge(self.public_point, h, gamma, multiply(k, G), multiply(k, h))
+        s = (k + c * self.secret) % Q
+        proof = encode_point(gamma) + c.to_bytes(C_LEN, 'big') + s.to_bytes(Q_LEN, 'big')
+        return VRF.output(proof), proof
+
+    @staticmethod
+    def output(proof: bytes) -> bytes:
+        """The output a proof commits to; only meaningful once the proof has been verified"""
+        return _hash(SUITE_STRING, b"\x03", proof[:PT_LEN], b"\x00")
+
+    @staticmethod
+    def verify(public_key: ec.EllipticCurvePublicKey, seed: bytes, proof: bytes) -> Optional[bytes]:
+        """The VRF output if proof is valid for seed, else None"""
+        if len(proof) != PROOF_LEN:
+            return None
+        gamma = decode_point(proof[:PT_LEN])
+        c = int.from_bytes(proof[PT_LEN:PT_LEN + C_LEN], 'big')
+        s = int.from_bytes(proof[PT_LEN + C_LEN:], 'big')
+        if gamma is None or s >= Q:
+            return None
+        numbers = public_key.public_numbers()
+        y = (numbers.x, numbers.y)
+
+        h = encode_to_curve(encode_point(y), seed)
+        u = combine(s, G, -c, y)
+        v = combine(s, h, -c, gamma)
+        if challenge(y, h, gamma, u, v) != c:
+            return None
+        return VRF.output(proof)
@@ -0,0 +1,138 @@
+import heapq
+import json
+from dataclasses import asdict, dataclass
+from typing import List, Optional, Tuple
+from src.blockchain.contracts.compiler import OPCODE_IDS, OPCODES, Program
+
+ANALYZER_VERSION = 1
+
+JUMP = OPCODE_IDS['JUMP']
+JUMPI = OPCODE_IDS['JUMPI']
+REVERT = OPCODE_IDS['REVERT']
+
+
+@dataclass(frozen=True)
+class ContractAnalysis:
+    """What can be known about a compiled contract without running it.
+
+    max_gas is the most gas any execution can use; it is None when the code can
+    loop, since the bound then depends on the data. min_gas is the least gas a
+    successful execution needs: a transaction with less can only fail.
+    """
+    code_hash: str
+    instructions: int
+    has_loops: bool
+    max_gas: Optional[int]
+    min_gas: Optional[int]
+    always_reverts: bool
+    unreachable: Tuple[int, ...]
+    opcodes: Tuple[str, ...]
+
+    def to_json(self) -> str:
+        return json.dumps({'version': ANALYZER_VERSION, **asdict(self)}, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, data: str) -> Optional['ContractAnalysis']:
+        """None if the stored form is unreadable or from another analyzer version"""
+        try:
+            decoded = json.loads(data)
+            if decoded.pop('version', None) != ANALYZER_VERSION:
+                return None
+            decoded['unreachable'] = tuple(decoded['unreachable'])
+            decoded['opcodes'] = tuple(decoded['opcodes'])
+            return cls(**decoded)
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+
+def _successors(program: Program, pc: int) -> List[int]:
+    """Next program counters; len(program) is a successful exit, REVERT has none"""
+    opcode, _, operands = program.instructions[pc]
+    if opcode == JUMP:
+        return [operands[0]]
+    if opcode == JUMPI:
+        return [pc + 1, operands[0]] if operands[0] != pc + 1 else [pc + 1]
+    if opcode == REVERT:
+        return []
+    return [pc + 1]
+
+
+def _reachable_order(program: Program) -> Tuple[List[int], bool]:
+    """Reachable instructions in DFS post-order, and whether any cycle is reachable"""
+    end = len(program)
+    state = {}  # pc -> 1 while on the DFS stack, 2 when done
+    order = []
+    has_loops = False
+    if not end:
+        return order, has_loops
+
+    stack = [(0, iter(_successors(program, 0)))]
+    state[0] = 1
+    while stack:
+        pc, successors = stack[-1]
+        for successor in successors:
+            if successor == end:
+                continue
+            if state.get(successor) == 1:
+                has_loops = True
+            elif successor not in state:
+                state[successor] = 1
+                stack.append((successor, iter(_successors(program, successor))))
+                break
+        else:
+            stack.pop()
+            state[pc] = 2
+            order.append(pc)
+    return order, has_loops
+
+
+def _min_gas_to_exit(program: Program) -> Optional[int]:
+    """Cheapest gas from pc 0 to a successful exit (Dijkstra; costs are never negative)"""
+    end = len(program)
+    if not end:
+        return 0
+    best = {0: 0}
+    queue = [(0, 0)]
+    while queue:
+        gas, pc = heapq.heappop(queue)
+        if pc == end:
+            return gas
+        if gas > best.get(pc, gas):
+            continue
+        cost = program.instructions[pc][1]
+        for successor in _successors(program, pc):
+            total = gas + cost
+            if total < best.get(successor, total + 1):
+                best[successor] = total
+                heapq.heappush(queue, (total, successor))
+    return None
+
+
+def analyze(program: Program) -> ContractAnalysis:
+    """Control-flow analysis of a program the compiler accepted (opcodes, arity and jump targets
+    are already checked there)"""
+    order, has_loops = _reachable_order(program)
+    reachable = set(order)
+
+    max_gas = None
+    if not has_loops:
+        # Post-order visits successors first, so each instruction's worst case is ready
+        worst = {len(program): 0}
+        for pc in order:
+            cost = program.instructions[pc][1]
+            successors = _successors(program, pc)
+            # REVERT raises before its gas is charged
+            worst[pc] = cost + max(worst[s] for s in successors) if successors else 0
+        max_gas = worst.get(0, 0)
+
+    min_gas = _min_gas_to_exit(program)
+    return ContractAnalysis(
+        code_hash=program.code_hash,
+        instructions=len(program),
+        has_loops=has_loops,
+        max_gas=max_gas,
+        min_gas=min_gas,
+        always_reverts=min_gas is None,
+        unreachable=tuple(pc for pc in range(len(program)) if pc not in reachable),
+        opcodes=tuple(sorted({OPCODES[program.instructions[pc][0]] for pc in reachable}))
+    )
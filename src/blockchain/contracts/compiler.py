@@ -0,0 +1,256 @@
+import hashlib
+import json
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional, Tuple
+from src.blockchain.contracts.limits import MAX_INT_BITS
+from src.utils.cache import LRUCache
+
+COMPILER_VERSION = 2  # 2: jump targets resolved to instruction indices
+PROGRAM_CACHE_SIZE = 1024
+
+# Opcode ids are positions in this tuple; only ever append so persisted programs stay valid
+OPCODES = (
+    'ADD', 'SUB', 'MUL', 'DIV', 'STORE', 'LOAD', 'CALL', 'JUMP', 'JUMPI', 'SSTORE', 'SLOAD',
+    'BALANCE', 'TRANSFER', 'EQ', 'LT', 'GT', 'AND', 'OR', 'NOT', 'SHA3', 'REVERT', 'RETURN', 'LOG'
+)
+OPCODE_IDS = {name: opcode for opcode, name in enumerate(OPCODES)}
+
+GAS_COSTS = {
+    'ADD': 3,
+    'SUB': 3,
+    'MUL': 5,
+    'DIV': 5,
+    'STORE': 100,
+    'LOAD': 50,
+    'CALL': 500,
+    'CREATE': 2000,
+    'JUMP': 10,
+    'JUMPI': 10,
+    'SSTORE': 200,
+    'SLOAD': 100,
+    'BALANCE': 100,
+    'TRANSFER': 500,
+    'EQ': 3,
+    'LT': 3,
+    'GT': 3,
+    'AND': 3,
+    'OR': 3,
+    'NOT': 3,
+    'SHA3': 30,
+    'REVERT': 0
+}
+DEFAULT_GAS_COST = 10
+# Digits of the largest literal a contract may contain: any 256-bit value fits. Also keeps
+# int() clear of Python's limit on converting long digit strings
+MAX_LITERAL_DIGITS = len(str(2 ** MAX_INT_BITS))
+
+# Operand kinds per opcode and how many are required. 'name' is a variable or key kept
+# as text, 'value' an int literal or a variable reference, 'line' a jump target and
+# 'text' the rest of the instruction. Operands beyond the spec are ignored.
+#
+# A jump target is the 0-based index of a `;`-separated statement in the source (or
+# the statement count, meaning "stop"); the compiler resolves it to an instruction index.
+OPERANDS = {
+    'ADD': (('name', 'value', 'value'), 3),
+    'SUB': (('name', 'value', 'value'), 3),
+    'MUL': (('name', 'value', 'value'), 3),
+    'DIV': (('name', 'value', 'value'), 3),
+    'EQ': (('name', 'value', 'value'), 3),
+    'LT': (('name', 'value', 'value'), 3),
+    'GT': (('name', 'value', 'value'), 3),
+    'AND': (('name', 'value', 'value'), 3),
+    'OR': (('name', 'value', 'value'), 3),
+    'NOT': (('name', 'value'), 2),
+    'SHA3': (('name', 'value'), 2),
+    'STORE': (('name', 'value'), 2),
+    'LOAD': (('name', 'name'), 2),
+    'SSTORE': (('name', 'value'), 2),
+    'SLOAD': (('name', 'name'), 2),
+    'BALANCE': (('name', 'name'), 2),
+    'TRANSFER': (('name', 'value'), 2),
+    'CALL': (('name',), 1),
+    'JUMP': (('line',), 1),
+    'JUMPI': (('line', 'value'), 2),
+    'RETURN': (('value',), 0),
+    'REVERT': (('text',), 0),
+    'LOG': (('text',), 0),
+}
+
+# One instruction: (opcode id, gas cost, operands)
+Instruction = Tuple[int, int, tuple]
+
+
+class CompileError(ValueError):
+    pass
+
+
+def code_hash(code: str) -> str:
+    return hashlib.sha256(code.encode()).hexdigest()
+
+
+def _is_int_literal(token: str) -> bool:
+    return token.isdigit() or (token[0] == '-' and token[1:].isdigit())
+
+
+def _literal(token: str, opcode: str, index: int) -> int:
+    if len(token.lstrip('-')) > MAX_LITERAL_DIGITS:
+        raise CompileError(f"Instruction {index}: {opcode} literal longer than {MAX_LITERAL_DIGITS} digits")
+    try:
+        return int(token)
+    except ValueError:  # str.isdigit() also accepts digits int() does not, such as superscripts
+        raise CompileError(f"Instruction {index}: {opcode} literal {token!r} is not an integer")
+
+
+def _operands(opcode: str, params: list, index: int) -> tuple:
+    kinds, required = OPERANDS[opcode]
+    if kinds == ('text',):
+        return (" ".join(params),) if params else ()
+    if len(params) < required:
+        raise CompileError(f"Instruction {index}: {opcode} requires {required} parameters")
+
+    operands = []
+    for kind, token in zip(kinds, params):
+        if kind == 'value' and _is_int_literal(token):
+            operands.append(_literal(token, opcode, index))
+        elif kind == 'line':
+            try:
+                operands.append(_literal(token, opcode, index))
+            except CompileError:
+                raise CompileError(f"Instruction {index}: {opcode} target must be a line number")
+        else:
+            operands.append(token)
+    return tuple(operands)
+
+
+@dataclass(frozen=True)
+class Program:
+    """Compiled contract: instructions ready to run without touching the source text"""
+    code_hash: str
+    instructions: Tuple[Instruction, ...]
+    # OptimizedCode for the interpreter's fast path, attached by the program cache; never stored
+    optimized: Any = field(default=None, compare=False, repr=False)
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'version': COMPILER_VERSION,
+            'code_hash': self.code_hash,
+            'instructions': [[opcode, gas, list(operands)] for opcode, gas, operands in self.instructions]
+        }, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, data: str) -> Optional['Program']:
+        """None if the stored form is unreadable or from another compiler version"""
+        try:
+            decoded = json.loads(data)
+            if decoded.get('version') != COMPILER_VERSION:
+                return None
+            return cls(decoded['code_hash'], tuple(
+                (opcode, gas, tuple(operands)) for opcode, gas, operands in decoded['instructions']
+            ))
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return None
+
+
+JUMP_OPCODES = {OPCODE_IDS['JUMP'], OPCODE_IDS['JUMPI']}
+
+
+def compile_code(code: str) -> Program:
+    """Parse `;`-separated source into a Program; raises CompileError on bad code"""
+    statements = code.split(';') if code else []
+    instructions = []
+    first_pc = []  # statement index -> index of the first instruction at or after it
+    for index, statement in enumerate(statements):
+        first_pc.append(len(instructions))
+        parts = statement.strip().split()
+        if not parts:
+            continue
+        opcode = parts[0].upper()
+        if opcode not in OPCODE_IDS:
+            raise CompileError(f"Unknown opcode: {opcode}")
+        instructions.append((
+            OPCODE_IDS[opcode],
+            GAS_COSTS.get(opcode, DEFAULT_GAS_COST),
+            _operands(opcode, parts[1:], index)
+        ))
+    first_pc.append(len(instructions))
+
+    for pc, (opcode, gas, operands) in enumerate(instructions):
+        if opcode in JUMP_OPCODES:
+            target = operands[0]
+            if not 0 <= target < len(first_pc):
+                raise CompileError(f"Jump target {target} is outside the program "
+                                   f"({len(statements)} statements)")
+            instructions[pc] = (opcode, gas, (first_pc[target],) + operands[1:])
+    return Program(code_hash(code or ""), tuple(instructions))
+
+
+class ProgramCache:
+    """Bounded LRU of compiled programs keyed by code hash, shared by all VM instances"""
+
+    def __init__(self, capacity: int = PROGRAM_CACHE_SIZE, optimize: bool = True):
+        self.programs = LRUCache(capacity=capacity)
+        self.optimize = optimize
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.compiles = 0
+
+    def get(self, key: str) -> Optional[Program]:
+        with self.lock:
+            program = self.programs.get(key)
+            if program is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return program
+
+    def put(self, program: Program):
+        with self.lock:
+            self.programs.put(program.code_hash, program)
+
+    def load(self, code: str, compiled: str = None,
+             on_compile: Callable[[Program], None] = None) -> Program:
+        """Program for code: from the cache, else the stored compiled form, else a fresh compile.
+
+        on_compile is called with freshly compiled programs, so callers can persist them.
+        """
+        key = code_hash(code or "")
+        program = self.get(key)
+        if program is not None:
+            return program
+
+        program = Program.from_json(compiled) if compiled else None
+        if program is None or program.code_hash != key:
+            program = compile_code(code)
+            with self.lock:
+                self.compiles += 1
+            if on_compile:
+                on_compile(program)
+        if self.optimize:
+            from src.blockchain.contracts.optimizer import optimize
+            program = optimize(program)
+        self.put(program)
+        return program
+
+    def clear(self):
+        with self.lock:
+            self.programs = LRUCache(capacity=self.programs.capacity)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.programs.cache),
+                'capacity': self.programs.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'compiles': self.compiles,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+program_cache = ProgramCache()
@@ -1,5 +1,6 @@
 from src.blockchain.contracts.contract_repository import ContractRepository
 from src.blockchain.contracts.vm import SmartContractVM
+from src.blockchain.contracts.view import call_view
 from typing import Optional, Dict
 from src.utils.logger import logger
 
@@ -17,9 +18,10 @@ class ContractManager:
             # Validate contract code
             if not SmartContractVM.validate_code(code):
                 raise ValueError("Invalid contract code")
-                
-            # Save to repository
-            if ContractRepository.save_contract(contract_address, code, sender):
+            analysis = SmartContractVM.analyze_code(code)
+
+            # Save to repository, with the analysis mempool admission checks against
+            if ContractRepository.save_contract(contract_address, code, sender, analysis.to_json()):
                 # Initialize empty state
                 ContractRepository.save_contract_state(contract_address, {})
                 return contract_address
@@ -34,9 +36,13 @@ class ContractManager:
         contract_address: str,
         method: str,
         args: Dict,
-        amount: float = 0
+        amount: float = 0,
+        readonly: bool = False
     ) -> tuple:
-        """Execute a contract method"""
+        """Execute a contract method; readonly calls never persist state or events"""
+        if readonly:
+            success, result, _ = call_view(contract_address, method, args, sender)
+            return success, result
         try:
             # Get contract code
             contract = ContractRepository.get_contract(contract_address)
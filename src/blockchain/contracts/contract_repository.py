@@ -1,22 +1,24 @@
 import json
 from typing import Dict, Optional
 from src.utils.database import db_connection
+from src.blockchain.db.state_db import save_code
 from src.utils.logger import logger
 
 class ContractRepository:
     """Repository for managing smart contract storage and retrieval"""
     
     @staticmethod
-    def save_contract(address: str, code: str, creator: str) -> bool:
+    def save_contract(address: str, code: str, creator: str, analysis: str = None) -> bool:
         """Save a new contract to the database"""
         try:
             with db_connection() as conn:
                 cursor = conn.cursor()
+                digest = save_code(cursor, code, analysis=analysis)
                 cursor.execute('''
                 INSERT INTO contracts (
-                    address, code, creator, created_at
-                ) VALUES (?, ?, ?, datetime('now'))
-                ''', (address, code, creator))
+                    address, code, code_hash, creator, created_at
+                ) VALUES (?, '', ?, ?, datetime('now'))
+                ''', (address, digest, creator))
                 conn.commit()
                 return True
         except Exception as e:
@@ -30,8 +32,10 @@ class ContractRepository:
             with db_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                SELECT address, code, creator, created_at 
-                FROM contracts WHERE address = ?
+                SELECT contracts.address, code_store.code, contracts.creator, contracts.created_at
+                FROM contracts
+                JOIN contract_code AS code_store ON code_store.code_hash = contracts.code_hash
+                WHERE contracts.address = ?
                 ''', (address,))
                 row = cursor.fetchone()
                 
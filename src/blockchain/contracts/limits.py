@@ -0,0 +1,43 @@
+from dataclasses import dataclass
+
+MAX_INSTRUCTIONS = 100_000
+MAX_MEMORY_SLOTS = 1024
+MAX_STORAGE_WRITES = 4096
+MAX_STORAGE_SLOTS = 4096
+MAX_INT_BITS = 256
+
+
+class ExecutionLimitExceeded(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class ExecutionLimits:
+    """Per-call bounds enforced by the interpreter itself, on top of gas"""
+    max_instructions: int = MAX_INSTRUCTIONS      # executed, so loops count every pass
+    max_memory_slots: int = MAX_MEMORY_SLOTS      # distinct memory keys
+    max_storage_writes: int = MAX_STORAGE_WRITES  # writes to contract storage in one call
+    max_storage_slots: int = MAX_STORAGE_SLOTS    # distinct storage keys after the call
+    max_int_bits: int = MAX_INT_BITS              # magnitude of arithmetic results
+
+
+DEFAULT_LIMITS = ExecutionLimits()
+
+
+class BoundedStore(dict):
+    """dict that refuses writes past a key count or a write count"""
+
+    def __init__(self, initial, kind: str, max_keys: int, max_writes: int = None):
+        super().__init__(initial or {})
+        self.kind = kind
+        self.max_keys = max_keys
+        self.max_writes = max_writes
+        self.writes = 0
+
+    def __setitem__(self, key, value):
+        self.writes += 1
+        if self.max_writes is not None and self.writes > self.max_writes:
+            raise ExecutionLimitExceeded(f"More than {self.max_writes} {self.kind} writes")
+        if key not in self and len(self) >= self.max_keys:
+            raise ExecutionLimitExceeded(f"More than {self.max_keys} {self.kind} slots")
+        dict.__setitem__(self, key, value)
@@ -0,0 +1,179 @@
+from dataclasses import dataclass, replace
+from typing import List, Tuple
+from src.blockchain.contracts.compiler import OPCODE_IDS, OPCODES, OPERANDS, Instruction, Program
+
+# Opcodes that only exist in optimized code; ids continue after the source opcodes.
+#   BLOCK      a straight-line run of instructions, params are its parts
+#   SLOAD_ADD  `SLOAD m k; ADD k m n`, the storage counter idiom
+#   SET        a folded ADD/SUB/MUL: store a constant, still checked against max_int_bits
+#   TOUCH      a memory store overwritten before it is read: charged, and fails on a full
+#              memory as the store would, but writes nothing
+INTERNAL_OPCODES = ('BLOCK', 'SLOAD_ADD', 'SET', 'TOUCH')
+BLOCK, SLOAD_ADD, SET, TOUCH = range(len(OPCODES), len(OPCODES) + len(INTERNAL_OPCODES))
+
+JUMP = OPCODE_IDS['JUMP']
+JUMPI = OPCODE_IDS['JUMPI']
+REVERT = OPCODE_IDS['REVERT']
+STORE = OPCODE_IDS['STORE']
+LOAD = OPCODE_IDS['LOAD']
+SLOAD = OPCODE_IDS['SLOAD']
+SSTORE = OPCODE_IDS['SSTORE']
+ADD = OPCODE_IDS['ADD']
+
+# Handlers that write context['memory'][params[0]]
+MEMORY_WRITERS = {STORE, LOAD, SLOAD, OPCODE_IDS['BALANCE']}
+
+# Arithmetic on two int literals: opcode -> (replacement opcode, result)
+FOLDS = {
+    ADD: (SET, lambda a, b: a + b),
+    OPCODE_IDS['SUB']: (SET, lambda a, b: a - b),
+    OPCODE_IDS['MUL']: (SET, lambda a, b: a * b),
+    OPCODE_IDS['DIV']: (SSTORE, lambda a, b: a // b if b else None),
+    OPCODE_IDS['EQ']: (SSTORE, lambda a, b: 1 if a == b else 0),
+    OPCODE_IDS['LT']: (SSTORE, lambda a, b: 1 if a < b else 0),
+    OPCODE_IDS['GT']: (SSTORE, lambda a, b: 1 if a > b else 0),
+    OPCODE_IDS['AND']: (SSTORE, lambda a, b: a & b),
+    OPCODE_IDS['OR']: (SSTORE, lambda a, b: a | b),
+    OPCODE_IDS['NOT']: (SSTORE, lambda a: ~a),
+}
+
+# One optimized instruction: (opcode, gas needed to run it whole, gas the interpreter loop
+# charges after it, params, source instructions it stands for)
+Entry = Tuple[int, int, int, tuple, int]
+
+
+@dataclass(frozen=True)
+class OptimizedCode:
+    """A program rewritten for the interpreter's fast path.
+
+    origins maps each entry back to its first source instruction, so execution
+    can continue instruction by instruction when an entry would run into the
+    gas or instruction limit part way.
+    """
+    instructions: Tuple[Entry, ...]
+    origins: Tuple[int, ...]
+
+
+def _fold(instruction: Instruction) -> Instruction:
+    """Arithmetic on literals becomes a store of the result, with the same gas"""
+    opcode, gas, operands = instruction
+    fold = FOLDS.get(opcode)
+    if fold is None or not all(type(value) is int for value in operands[1:]):
+        return instruction
+    replacement, compute = fold
+    result = compute(*operands[1:])
+    if result is None:
+        return instruction  # leave division by zero to fail at run time
+    return replacement, gas, (operands[0], result)
+
+
+def _memory_reads(instruction: Instruction) -> set:
+    """Names an instruction may look up in memory"""
+    opcode, _, operands = instruction
+    if opcode == LOAD:
+        return {operands[1]}
+    if opcode == SET:
+        return set()  # folded arithmetic, operands are constants
+    kinds = OPERANDS[OPCODES[opcode]][0]
+    return {value for kind, value in zip(kinds, operands) if kind == 'value' and type(value) is str}
+
+
+def _is_dead_store(run: List[Instruction], index: int) -> bool:
+    """Whether run[index], a STORE of a literal, is overwritten before anything reads it.
+
+    Memory writes in between must go to keys already present, so the missing
+    key can't change which write hits the memory slot limit.
+    """
+    opcode, _, operands = run[index]
+    if opcode != STORE or type(operands[1]) is not int:
+        return False
+    key = operands[0]
+    present = {params[0] for op, _, params in run[:index] if op in MEMORY_WRITERS}
+    for instruction in run[index + 1:]:
+        if key in _memory_reads(instruction):
+            return False
+        opcode, _, operands = instruction
+        if opcode in MEMORY_WRITERS:
+            if operands[0] == key:
+                return True
+            if operands[0] not in present:
+                return False
+    return False
+
+
+def _parts(run: List[Instruction]) -> List[Instruction]:
+    """Peephole pass over a straight-line run"""
+    parts = []
+    index = 0
+    while index < len(run):
+        opcode, gas, operands = run[index]
+        following = run[index + 1] if index + 1 < len(run) else None
+        if (opcode == SLOAD and following is not None and following[0] == ADD
+                and following[2][0] == operands[1] and following[2][1] == operands[0]):
+            # The SLOAD's gas is charged inside the handler, once its half is done
+            parts.append((SLOAD_ADD, following[1], (operands[0], operands[1], following[2][2], gas)))
+            index += 2
+            continue
+        if _is_dead_store(run, index):
+            parts.append((TOUCH, gas, (operands[0],)))
+        else:
+            parts.append(run[index])
+        index += 1
+    return parts
+
+
+def _fusable(instruction: Instruction) -> bool:
+    # Zero-gas instructions (REVERT) would fail a gas check the block can't make for them
+    return instruction[0] != REVERT and instruction[1] > 0
+
+
+def _entry(run: List[Instruction]) -> Entry:
+    needed = sum(gas for _, gas, _ in run)
+    parts = _parts(run)
+    if len(parts) == 1:
+        opcode, gas, params = parts[0]
+        return opcode, needed, gas, params, len(run)
+    return BLOCK, needed, 0, tuple(parts), len(run)
+
+
+def _retarget(opcode: int, params: tuple, new_pc: dict) -> tuple:
+    if opcode in (JUMP, JUMPI):
+        return (new_pc[params[0]],) + params[1:]
+    if opcode == BLOCK:
+        *body, (last_opcode, gas, last_params) = params
+        return tuple(body) + ((last_opcode, gas, _retarget(last_opcode, last_params, new_pc)),)
+    return params
+
+
+def optimize(program: Program) -> Program:
+    """program with optimized code attached; what it computes and charges is unchanged.
+
+    Straight-line runs (ending at the latest in a jump, and never crossing a
+    jump target) become one BLOCK entry whose gas is checked once, literal
+    arithmetic is folded, dead memory stores are dropped and the
+    SLOAD/ADD counter idiom is fused.
+    """
+    instructions = [_fold(instruction) for instruction in program.instructions]
+    end = len(instructions)
+    leaders = {0}
+    for pc, (opcode, _, operands) in enumerate(instructions):
+        if opcode in (JUMP, JUMPI):
+            leaders.update((operands[0], pc + 1))
+
+    entries, origins = [], []
+    pc = 0
+    while pc < end:
+        stop = pc + 1
+        while (stop < end and stop not in leaders and _fusable(instructions[stop - 1])
+               and _fusable(instructions[stop]) and instructions[stop - 1][0] not in (JUMP, JUMPI)):
+            stop += 1
+        entries.append(_entry(instructions[pc:stop]))
+        origins.append(pc)
+        pc = stop
+
+    # Every jump target is a leader, so it starts an entry
+    new_pc = {origin: index for index, origin in enumerate(origins)}
+    new_pc[end] = len(entries)
+    entries = [(opcode, needed, charge, _retarget(opcode, params, new_pc), width)
+               for opcode, needed, charge, params, width in entries]
+    return replace(program, optimized=OptimizedCode(tuple(entries), tuple(origins)))
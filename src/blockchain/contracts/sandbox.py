@@ -0,0 +1,186 @@
+import multiprocessing
+import os
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+import src.utils.database as database
+from src.utils.logger import logger
+
+SANDBOX_TIMEOUT = 5.0                   # wall-clock seconds per contract call
+SANDBOX_MEMORY_LIMIT = 100 * 1024 * 1024  # bytes of address space a worker may add for contracts
+
+# Imported once by the fork server so each new worker starts with them loaded
+WORKER_MODULES = ["src.blockchain.contracts.vm", "src.blockchain.db.state_db", "src.blockchain.executor"]
+
+# (success, output or error, gas remaining, logs, state writes, compiled programs)
+SandboxResult = Tuple[bool, Any, int, List[dict], dict, dict]
+
+
+def _address_space_size() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _limit_memory(memory_limit: int):
+    """Cap this worker's address space at its current size plus memory_limit"""
+    try:
+        import resource
+    except ImportError:
+        return  # not available on this platform; the parent's timeout still applies
+    current = _address_space_size()
+    if current is None or not memory_limit:
+        return
+    limit = current + memory_limit
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _worker_main(conn, memory_limit: int, limits, db_file: str):
+    """Sandbox process: run contract calls until told to stop.
+
+    A call runs against the database plus the caller's unflushed writes and
+    sends its own writes back instead of committing them, so nothing reaches
+    the database unless the caller's block does.
+    """
+    from src.blockchain.contracts.vm import SmartContractVM
+    from src.blockchain.db.state_db import StateDB
+    from src.blockchain.executor import BlockState, MultiVersionStore, StateOverlay
+
+    database.DB_FILE = db_file  # a fresh interpreter does not share the node's setting
+    _limit_memory(memory_limit)
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+        tx, block_number, timestamp, unflushed = job
+        base = BlockState(StateDB())
+        base.values.update(unflushed)
+        overlay = StateOverlay(MultiVersionStore(), base, 0)
+        vm = SmartContractVM(overlay, limits=limits)
+        try:
+            success, result = vm.execute_local(tx, block_number, timestamp)
+            if success:
+                conn.send((success, result, vm.gas_remaining, vm.logs, overlay.writes, overlay.compiled))
+            else:
+                conn.send((success, result, vm.gas_remaining, vm.logs, {}, {}))
+        except MemoryError:
+            conn.send((False, "Out of memory", 0, [], {}, {}))
+
+
+@dataclass
+class _Worker:
+    process: Any
+    conn: Any
+
+
+class SandboxPool:
+    """Pre-forked worker processes for running untrusted contract code.
+
+    Each worker caps its own address space, so a runaway contract only
+    takes down its worker; the node process is never limited. Calls that
+    exceed the timeout get their worker killed and replaced. Safe to call
+    from any thread: a call blocks until a worker is free.
+
+    Workers come from a fork server by default, so they never inherit the
+    node's threads or locks mid-use; "fork" starts faster and suits tests
+    and benchmarks.
+    """
+
+    def __init__(self, workers: int = 2, timeout: float = SANDBOX_TIMEOUT,
+                 memory_limit: int = SANDBOX_MEMORY_LIMIT, limits=None, start_method: str = "forkserver"):
+        self.context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            self.context.set_forkserver_preload(WORKER_MODULES)
+        self.limits = limits
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.size = workers
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.closed = False
+
+        self.executed = 0
+        self.timeouts = 0
+        self.crashes = 0
+        self.respawns = 0
+
+        for _ in range(workers):
+            self.idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        parent, child = self.context.Pipe()
+        process = self.context.Process(target=_worker_main,
+                                       args=(child, self.memory_limit, self.limits, database.DB_FILE),
+                                       daemon=True, name="ContractSandbox")
+        process.start()
+        child.close()
+        return _Worker(process, parent)
+
+    def _replace(self, worker: _Worker):
+        worker.process.kill()
+        worker.process.join(timeout=1)
+        worker.conn.close()
+        with self.lock:
+            self.respawns += 1
+        self.idle.put(self._spawn())
+
+    def execute(self, tx, block_number: int, timestamp: float, unflushed: dict = None) -> SandboxResult:
+        """Run tx on top of unflushed, the caller's writes not yet in the database"""
+        if self.closed:
+            return False, "Sandbox pool is closed", 0, [], {}, {}
+        worker = self.idle.get()
+        try:
+            worker.conn.send((tx, block_number, timestamp, unflushed or {}))
+            if not worker.conn.poll(self.timeout):
+                with self.lock:
+                    self.timeouts += 1
+                logger.warning(f"Contract call exceeded {self.timeout}s in sandbox, restarting worker")
+                self._replace(worker)
+                return False, f"Execution timed out after {self.timeout}s", 0, [], {}, {}
+            result = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            with self.lock:
+                self.crashes += 1
+            logger.error(f"Contract sandbox worker died: {e}")
+            self._replace(worker)
+            return False, "Sandbox worker crashed", 0, [], {}, {}
+
+        with self.lock:
+            self.executed += 1
+        self.idle.put(worker)
+        return result
+
+    def close(self):
+        self.closed = True
+        for _ in range(self.size):
+            try:
+                worker = self.idle.get(timeout=self.timeout)
+            except queue.Empty:
+                break
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            worker.process.join(timeout=1)
+            if worker.process.is_alive():
+                worker.process.kill()
+            worker.conn.close()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                'workers': self.size,
+                'idle': self.idle.qsize(),
+                'timeout': self.timeout,
+                'memory_limit': self.memory_limit,
+                'executed': self.executed,
+                'timeouts': self.timeouts,
+                'crashes': self.crashes,
+                'respawns': self.respawns
+            }
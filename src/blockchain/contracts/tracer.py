@@ -0,0 +1,147 @@
+import threading
+import time
+from typing import Optional
+from src.utils.cache import LRUCache
+from src.blockchain.contracts.compiler import OPCODES
+
+MAX_TRACE_STEPS = 10_000  # per execution; longer traces keep their first steps
+TRACE_HISTORY = 256       # executions whose traces are kept for /debug/trace
+
+
+def _opcode_table(counters) -> dict:
+    """{opcode name: {'count', 'gas', 'seconds'}} for opcodes that ran"""
+    return {
+        OPCODES[opcode]: {'count': count, 'gas': gas, 'seconds': round(seconds, 6)}
+        for opcode, (count, gas, seconds) in enumerate(counters) if count
+    }
+
+
+def _merge(into: list, counters: list):
+    for opcode, (count, gas, seconds) in enumerate(counters):
+        if count:
+            totals = into[opcode]
+            totals[0] += count
+            totals[1] += gas
+            totals[2] += seconds
+
+
+class ExecutionTracer:
+    """Per-opcode counts, gas and wall time of one contract execution, plus optional steps"""
+
+    def __init__(self, tx_hash: str, record_steps: bool = False):
+        self.tx_hash = tx_hash
+        self.record_steps = record_steps
+        self.counters = [[0, 0, 0.0] for _ in OPCODES]  # by opcode id: count, gas, seconds
+        self.steps = []
+        self.truncated = False
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def step(self, pc: int, opcode: int, gas_cost: int, gas_remaining: int, params: tuple, seconds: float):
+        counters = self.counters[opcode]
+        counters[0] += 1
+        counters[1] += gas_cost
+        counters[2] += seconds
+        if self.record_steps:
+            if len(self.steps) < MAX_TRACE_STEPS:
+                self.steps.append({'pc': pc, 'op': OPCODES[opcode], 'params': list(params),
+                                   'gas_cost': gas_cost, 'gas_remaining': gas_remaining})
+            else:
+                self.truncated = True
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+
+    @property
+    def instructions(self) -> int:
+        return sum(count for count, _, _ in self.counters)
+
+
+class GasProfiler:
+    """Aggregates tracer results per opcode and per contract, and keeps recent traces.
+
+    Installed as SmartContractVM.profiler; while it is None the VM runs its
+    untraced loop and nothing here is touched.
+    """
+
+    def __init__(self, record_steps: bool = False, history: int = TRACE_HISTORY):
+        self.record_steps = record_steps
+        self.lock = threading.Lock()
+        self.executions = 0
+        self.failures = 0
+        self.opcodes = [[0, 0, 0.0] for _ in OPCODES]
+        self.contracts = {}
+        self.traces = LRUCache(capacity=history)
+
+    def tracer(self, tx) -> ExecutionTracer:
+        return ExecutionTracer(tx.tx_hash, self.record_steps)
+
+    def record(self, tracer: ExecutionTracer, contract_address: Optional[str], success: bool,
+               error: Optional[str], gas_used: int):
+        tracer.finish()
+        trace = {
+            'tx_hash': tracer.tx_hash,
+            'contract': contract_address,
+            'success': success,
+            'error': error,
+            'gas_used': gas_used,
+            'instructions': tracer.instructions,
+            'seconds': round(tracer.seconds, 6),
+            'opcodes': _opcode_table(tracer.counters)
+        }
+        if tracer.record_steps:
+            trace['steps'] = tracer.steps
+            trace['truncated'] = tracer.truncated
+
+        with self.lock:
+            self.executions += 1
+            self.failures += not success
+            _merge(self.opcodes, tracer.counters)
+            if tracer.tx_hash:
+                self.traces.put(tracer.tx_hash, trace)
+            if contract_address:
+                profile = self.contracts.setdefault(contract_address, {
+                    'calls': 0, 'failures': 0, 'gas_used': 0, 'instructions': 0, 'seconds': 0.0,
+                    'opcodes': [[0, 0, 0.0] for _ in OPCODES]
+                })
+                profile['calls'] += 1
+                profile['failures'] += not success
+                profile['gas_used'] += gas_used
+                profile['instructions'] += tracer.instructions
+                profile['seconds'] += tracer.seconds
+                _merge(profile['opcodes'], tracer.counters)
+
+    def get_trace(self, tx_hash: str) -> Optional[dict]:
+        with self.lock:
+            return self.traces.get(tx_hash)
+
+    def get_contract_profile(self, contract_address: str) -> Optional[dict]:
+        with self.lock:
+            profile = self.contracts.get(contract_address)
+            if profile is None:
+                return None
+            return {**profile, 'seconds': round(profile['seconds'], 6),
+                    'opcodes': _opcode_table(profile['opcodes'])}
+
+    def get_stats(self, top: int = 10) -> dict:
+        with self.lock:
+            busiest = sorted(self.contracts.items(), key=lambda item: item[1]['seconds'], reverse=True)
+            return {
+                'executions': self.executions,
+                'failures': self.failures,
+                'record_steps': self.record_steps,
+                'opcodes': _opcode_table(self.opcodes),
+                'top_contracts': [
+                    {'contract': address, 'calls': profile['calls'], 'gas_used': profile['gas_used'],
+                     'seconds': round(profile['seconds'], 6)}
+                    for address, profile in busiest[:top]
+                ]
+            }
+
+    def reset(self):
+        with self.lock:
+            self.executions = 0
+            self.failures = 0
+            self.opcodes = [[0, 0, 0.0] for _ in OPCODES]
+            self.contracts = {}
+            self.traces = LRUCache(capacity=self.traces.capacity)
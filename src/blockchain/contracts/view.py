@@ -0,0 +1,127 @@
+import hashlib
+import json
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Optional, Tuple
+from src.utils.cache import LRUCache
+from src.blockchain.contracts.vm import SmartContractVM
+from src.blockchain.db.state_db import StateDB
+from src.blockchain.executor import BlockState, MultiVersionStore, StateOverlay
+
+VIEW_GAS_LIMIT = 1_000_000
+VIEW_CACHE_CONTRACTS = 256  # contracts with memoized results
+VIEW_CACHE_CALLS = 256      # distinct calls (method, args, caller) per contract
+
+
+@dataclass
+class ViewCall:
+    """Transaction-shaped request for a read-only contract call"""
+    contract_address: str
+    contract_args: dict = field(default_factory=dict)
+    sender: str = ""
+    gas_limit: int = VIEW_GAS_LIMIT
+    amount: float = 0
+    contract_type: str = "CALL"
+    contract_code: Optional[str] = None
+    tx_hash: str = ""
+
+
+def storage_version(storage_json: Optional[str]) -> str:
+    """Version of a contract's state: the hash of its storage as stored"""
+    return hashlib.sha256((storage_json or "").encode()).hexdigest()
+
+
+class ViewResultCache:
+    """Results of read-only calls per contract, valid for one storage version.
+
+    Seeing a new version of a contract drops everything cached for it.
+    """
+
+    def __init__(self, contracts: int = VIEW_CACHE_CONTRACTS, calls: int = VIEW_CACHE_CALLS):
+        self.contracts = LRUCache(capacity=contracts)  # address -> (version, LRUCache of results)
+        self.calls = calls
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _call_key(call: tuple) -> str:
+        return json.dumps(call, sort_keys=True, default=str)
+
+    def get(self, contract_address: str, version: str, call: tuple) -> Optional[Any]:
+        with self.lock:
+            entry = self.contracts.get(contract_address)
+            if entry is not None and entry[0] != version:
+                self.contracts.cache.pop(contract_address)
+                self.invalidations += 1
+                entry = None
+            result = entry[1].get(self._call_key(call)) if entry else None
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return result
+
+    def put(self, contract_address: str, version: str, call: tuple, result: Any):
+        with self.lock:
+            entry = self.contracts.get(contract_address)
+            if entry is None or entry[0] != version:
+                entry = (version, LRUCache(capacity=self.calls))
+                self.contracts.put(contract_address, entry)
+            entry[1].put(self._call_key(call), result)
+
+    def clear(self):
+        with self.lock:
+            self.contracts = LRUCache(capacity=self.contracts.capacity)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'contracts': len(self.contracts.cache),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+view_cache = ViewResultCache()
+
+
+def call_view(contract_address: str, method: str = "", args: dict = None, sender: str = "",
+              cache: ViewResultCache = None) -> Tuple[bool, Any, bool]:
+    """Run a contract call against a snapshot of its state without persisting anything.
+
+    Returns (success, result or error, whether the result came from the cache).
+    Successful results that read nothing but the contract's code and storage
+    and the caller's balance (part of the key, as the VM loads it for TRANSFER)
+    are memoized under the storage version they ran against.
+    """
+    cache = cache or view_cache
+    args = args or {}
+    state_db = StateDB()
+    storage_json = state_db.load_storage_json(contract_address)
+    version = storage_version(storage_json)
+    balance = state_db.get_balance(sender)
+    call = (method, args, sender, balance)
+
+    cached = cache.get(contract_address, version, call)
+    if cached is not None:
+        return True, cached, True
+
+    # Pin what the cache key was computed from; writes stay in the overlay
+    base = BlockState(state_db)
+    base.values[('storage', contract_address)] = storage_json if storage_json is not None else "{}"
+    base.values[('balance', sender)] = balance
+    overlay = StateOverlay(MultiVersionStore(), base, 0)
+    if overlay.load_contract(contract_address) is None:
+        return False, "Contract not found", False
+
+    vm = SmartContractVM(overlay)
+    success, result = vm.execute_local(ViewCall(contract_address, args, sender), 0, 0.0)
+    keyed = {('contract', contract_address), ('storage', contract_address), ('balance', sender)}
+    if success and result is not None and overlay.reads.keys() <= keyed:
+        cache.put(contract_address, version, call, result)
+    return success, result, False
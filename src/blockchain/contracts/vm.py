@@ -1,8 +1,13 @@
 import hashlib
+import time
 from typing import Any, Tuple
 from src.utils.logger import logger
 from src.blockchain.gas_tracker import GasTracker
 from src.blockchain.transaction import Transaction
+from src.blockchain.contracts.compiler import GAS_COSTS, OPCODES, CompileError, Program, program_cache
+from src.blockchain.contracts.analyzer import ContractAnalysis, analyze
+from src.blockchain.contracts.limits import DEFAULT_LIMITS, BoundedStore, ExecutionLimitExceeded, ExecutionLimits
+from src.blockchain.contracts.optimizer import INTERNAL_OPCODES
 
 class SmartContractVM:
     def __init__(self, state_db):
@@ -10,152 +15,193 @@ class SmartContractVM:
         self.gas_tracker = GasTracker()
 
 
-    GAS_COSTS = {
-        'ADD': 3,
-        'SUB': 3,
-        'MUL': 5,
-        'DIV': 5,
-        'STORE': 100,
-        'LOAD': 50,
-        'CALL': 500,
-        'CREATE': 2000,
-        'JUMP': 10,
-        'JUMPI': 10,
-        'SSTORE': 200,
-        'SLOAD': 100,
-        'BALANCE': 100,
-        'TRANSFER': 500,
-        'EQ': 3,
-        'LT': 3,
-        'GT': 3,
-        'AND': 3,
-        'OR': 3,
-        'NOT': 3,
-        'SHA3': 30,
-        'REVERT': 0
-    }
+    GAS_COSTS = GAS_COSTS
 
-    def __init__(self, state_db):
+    # Optional SandboxPool; when set, execute() runs contracts in isolated worker processes
+    sandbox = None
+    # Optional GasProfiler; when set, executions run the traced interpreter loop and report to it
+    profiler = None
+
+    def __init__(self, state_db, programs=None, limits: ExecutionLimits = None):
+        """Execution state lives on the instance: use one VM per thread"""
         self.state_db = state_db
+        self.programs = programs or program_cache
+        self.limits = limits or DEFAULT_LIMITS
+        # Handlers indexed by opcode id, source opcodes first, then the optimizer's
+        self.dispatch = tuple(getattr(self, f"_op_{name.lower()}") for name in OPCODES + INTERNAL_OPCODES)
+        self.tracer = None
         self.gas_used = 0
         self.output = None
         self.error = None
         self.logs = []
 
+    @staticmethod
+    def analyze_code(code: str) -> ContractAnalysis:
+        """Static analysis of contract source; raises CompileError for invalid code"""
+        return analyze(program_cache.load(code))
+
+    @staticmethod
+    def validate_code(code: str) -> bool:
+        """Whether code compiles and has at least one path that completes without REVERT"""
+        try:
+            analysis = SmartContractVM.analyze_code(code)
+        except CompileError as e:
+            logger.warning(f"Invalid contract code: {e}")
+            return False
+        if analysis.always_reverts:
+            logger.warning("Invalid contract code: every path reverts")
+            return False
+        return True
+
     def execute(self, tx: 'Transaction', block_number: int, timestamp: float) -> Tuple[bool, Any]:
+        if self.sandbox is not None:
+            success, result, self.gas_remaining, self.logs, writes, compiled = self.sandbox.execute(
+                tx, block_number, timestamp, self.state_db.unflushed())
+            if success:
+                self.state_db.apply_changes(writes, compiled)
+            self.error = None if success else result
+            self.output = result if success else None
+            return success, result
+        return self.execute_local(tx, block_number, timestamp)
+
+    def execute_local(self, tx: 'Transaction', block_number: int, timestamp: float) -> Tuple[bool, Any]:
+        """Run tx in this thread; limits are enforced by the interpreter, not the process"""
+        profiler = self.profiler
+        if profiler is None:
+            self.tracer = None
+            return self._execute_tx(tx, block_number, timestamp)
+
+        self.tracer = profiler.tracer(tx)
+        success, result = self._execute_tx(tx, block_number, timestamp)
+        self.gas_used = tx.gas_limit - self.gas_remaining
+        address = result if success and tx.contract_type == "CREATE" else getattr(tx, 'contract_address', None)
+        profiler.record(self.tracer, address, success, None if success else result, self.gas_used)
+        return success, result
+
+    def _execute_tx(self, tx: 'Transaction', block_number: int, timestamp: float) -> Tuple[bool, Any]:
         self.gas_used = 0
         self.output = None
         self.error = None
         self.logs = []
         self.gas_remaining = tx.gas_limit
-
-        import resource
-        resource.setrlimit(resource.RLIMIT_AS, (100 * 1024 * 1024 , 100 * 1024 * 1024))  # تنظیم محدودیت حافظه
-
-        import signal
-        signal.alarm(5)
+        limits = self.limits
 
         try:
+            if tx.contract_type == "CREATE":
+                code = tx.contract_code
+                program = self.programs.load(code)
+            else:
+                code, program = self._load_program(tx.contract_address)
+
             context = {
                 'sender': tx.sender,
                 'value': tx.amount,
                 'block_number': block_number,
                 'timestamp': timestamp,
                 'input': tx.contract_args,
-                'storage': {},
-                'memory': {},
+                'storage': BoundedStore({}, "storage", limits.max_storage_slots, limits.max_storage_writes),
+                'memory': BoundedStore({}, "memory", limits.max_memory_slots),
                 'balance': self._get_balance(tx.sender),
-                'code': tx.contract_code if tx.contract_type == "CREATE" else self._load_contract_code(tx.contract_address)
+                'code': code
             }
 
             if tx.contract_type == "CALL":
-                context['storage'] = self._load_storage(tx.contract_address)
-
-            instructions = context['code'].split(';') if context['code'] else []
-            for instruction in instructions:
-                if self.gas_remaining <= 0:
-                    raise RuntimeError("Out of gas")
-
-                parts = instruction.strip().split()
-                if not parts:
-                    continue
-
-                opcode = parts[0].upper()
-                params = parts[1:]
-
-                gas_cost = self.GAS_COSTS.get(opcode, 10)
-                if gas_cost > self.gas_remaining:
-                    raise RuntimeError(f"Out of gas (needed: {gas_cost}, has {self.gas_remaining})")
-
-                if opcode == 'ADD':
-                    self._op_add(context, params)
-                elif opcode == 'SUB':
-                    self._op_sub(context, params)
-                elif opcode == 'MUL':
-                    self._op_mul(context, params)
-                elif opcode == 'DIV':
-                    self._op_div(context, params)
-                elif opcode == 'STORE':
-                    self._op_store(context, params)
-                elif opcode == 'LOAD':
-                    self._op_load(context, params)
-                elif opcode == 'CALL':
-                    self._op_call(context, params)
-                elif opcode == 'JUMP':
-                    self._op_jump(context, params)
-                elif opcode == 'JUMPI':
-                    self._op_jumpi(context, params)
-                elif opcode == 'SSTORE':
-                    self._op_sstore(context, params)
-                elif opcode == 'SLOAD':
-                    self._op_sload(context, params)
-                elif opcode == 'BALANCE':
-                    self._op_balance(context, params)
-                elif opcode == 'TRANSFER':
-                    self._op_transfer(context, params)
-                elif opcode == 'EQ':
-                    self._op_eq(context, params)
-                elif opcode == 'LT':
-                    self._op_lt(context, params)
-                elif opcode == 'GT':
-                    self._op_gt(context, params)
-                elif opcode == 'AND':
-                    self._op_and(context, params)
-                elif opcode == 'OR':
-                    self._op_or(context, params)
-                elif opcode == 'NOT':
-                    self._op_not(context, params)
-                elif opcode == 'SHA3':
-                    self._op_sha3(context, params)
-                elif opcode == 'REVERT':
-                    self._op_revert(context, params)
-                elif opcode == 'RETURN':
-                    self._op_return(context, params)
-                elif opcode == 'LOG':
-                    self._op_log(context, params)
-                else:
-                    raise RuntimeError(f"Unknown opcode: {opcode}")
-
-                self.gas_remaining -= gas_cost
+                context['storage'] = BoundedStore(self._load_storage(tx.contract_address), "storage",
+                                                  limits.max_storage_slots, limits.max_storage_writes)
+
+            self._execute(context, program)
 
             if tx.contract_type == "CREATE":
                 contract_address = self._create_contract_address(tx)
-                self._save_contract(contract_address, context['code'], tx.sender)
+                self._save_contract(contract_address, context['code'], tx.sender, program)
                 self.output = contract_address
 
             if tx.contract_type == "CALL":
-                self._save_storage(tx.contract_address, context['storage'])
+                self._save_storage(tx.contract_address, dict(context['storage']))
 
-            result = self._execute(context, tx)
-
-            return True, result
+            return True, self.output
 
         except Exception as e:
             self.error = str(e)
             logger.error(f"Contract execution failed: {self.error}")
             return False, self.error
-        finally:
-            signal.alarm(0)
+
+    def _execute(self, context, program: Program):
+        """Run a compiled program from pc 0 until it steps past the last instruction"""
+        if self.tracer is not None:
+            return self._execute_traced(context, program)
+        optimized = program.optimized
+        if optimized is None:
+            return self._execute_plain(context, program, 0, self.limits.max_instructions)
+
+        # Entries stand for one or more source instructions whose gas and instruction
+        # budget are checked together; parts charge their gas as each one completes
+        code = optimized.instructions
+        dispatch = self.dispatch
+        end = len(code)
+        budget = self.limits.max_instructions
+        pc = 0
+        while pc < end:
+            opcode, gas_needed, gas_cost, params, width = code[pc]
+            remaining = self.gas_remaining
+            if width > budget or gas_needed > remaining or remaining <= 0:
+                # A limit may be hit part way: finish instruction by instruction so
+                # the failure comes at the same instruction with the same gas used
+                return self._execute_plain(context, program, optimized.origins[pc], budget)
+            budget -= width
+            target = dispatch[opcode](context, params)
+            self.gas_remaining -= gas_cost
+            pc = pc + 1 if target is None else target
+        return self.output
+
+    def _execute_plain(self, context, program: Program, pc: int, budget: int):
+        """Run program's source instructions from pc with budget instructions left"""
+        instructions = program.instructions
+        dispatch = self.dispatch
+        end = len(instructions)
+        while pc < end:
+            budget -= 1
+            if budget < 0:
+                raise ExecutionLimitExceeded(f"Instruction budget of {self.limits.max_instructions} exhausted")
+            opcode, gas_cost, params = instructions[pc]
+            if self.gas_remaining <= 0:
+                raise RuntimeError("Out of gas")
+
+            if gas_cost > self.gas_remaining:
+                raise RuntimeError(f"Out of gas (needed: {gas_cost}, has {self.gas_remaining})")
+
+            # Handlers return a jump target, or None to fall through
+            target = dispatch[opcode](context, params)
+            self.gas_remaining -= gas_cost
+            pc = pc + 1 if target is None else target
+        return self.output
+
+    def _execute_traced(self, context, program: Program):
+        """_execute, reporting every instruction's gas and wall time to self.tracer"""
+        instructions = program.instructions
+        dispatch = self.dispatch
+        tracer = self.tracer
+        clock = time.perf_counter
+        end = len(instructions)
+        budget = self.limits.max_instructions
+        pc = 0
+        while pc < end:
+            budget -= 1
+            if budget < 0:
+                raise ExecutionLimitExceeded(f"Instruction budget of {self.limits.max_instructions} exhausted")
+            opcode, gas_cost, params = instructions[pc]
+            if self.gas_remaining <= 0:
+                raise RuntimeError("Out of gas")
+
+            if gas_cost > self.gas_remaining:
+                raise RuntimeError(f"Out of gas (needed: {gas_cost}, has {self.gas_remaining})")
+
+            started = clock()
+            target = dispatch[opcode](context, params)
+            tracer.step(pc, opcode, gas_cost, self.gas_remaining, params, clock() - started)
+            self.gas_remaining -= gas_cost
+            pc = pc + 1 if target is None else target
+        return self.output
 
     def _op_add(self, context, params):
         if len(params) < 3:
@@ -163,7 +209,7 @@ class SmartContractVM:
         var_name = params[0]
         a = self._get_value(context, params[1])
         b = self._get_value(context, params[2])
-        context['storage'][var_name] = a + b
+        context['storage'][var_name] = self._bounded(a + b)
 
     def _op_sub(self, context, params):
         if len(params) < 3:
@@ -171,7 +217,7 @@ class SmartContractVM:
         var_name = params[0]
         a = self._get_value(context, params[1])
         b = self._get_value(context, params[2])
-        context['storage'][var_name] = a - b
+        context['storage'][var_name] = self._bounded(a - b)
 
     def _op_mul(self, context, params):
         if len(params) < 3:
@@ -179,7 +225,7 @@ class SmartContractVM:
         var_name = params[0]
         a = self._get_value(context, params[1])
         b = self._get_value(context, params[2])
-        context['storage'][var_name] = a * b
+        context['storage'][var_name] = self._bounded(a * b)
 
     def _op_div(self, context, params):
         if len(params) < 3:
@@ -211,18 +257,6 @@ class SmartContractVM:
         contract_address = params[0]
         logger.info(f"Contract call to {contract_address}")
 
-    def _op_jump(self, context, params):
-        if len(params) < 1:
-            raise RuntimeError("JUMP requires line number")
-        logger.warning("JUMP opcode not implemented")
-
-    def _op_jumpi(self, context, params):
-        if len(params) < 2:
-            raise RuntimeError("JUMPI requires line number and condition")
-        condition = self._get_value(context, params[1])
-        if condition:
-            logger.warning("JUMPI opcode not implemented")
-
     def _op_sstore(self, context, params):
         if len(params) < 2:
             raise RuntimeError("SSTORE requires 2 parameters")
@@ -332,28 +366,58 @@ class SmartContractVM:
     def _op_jump(self, context, params):
         if len(params) < 1:
             raise RuntimeError("JUMP requires line number")
-        line_num = int(params[0])
-        context['pc'] = line_num
+        return params[0]
 
     def _op_jumpi(self, context, params):
         if len(params) < 2:
             raise RuntimeError("JUMPI requires line number and condition")
         condition = self._get_value(context, params[1])
         if condition:
-            line_num = int(params[0])
-            context['pc'] = line_num
-
-    def _get_value(self, context, value_str):
-        if value_str.isdigit() or (value_str[0] == '-' and value_str[1:].isdigit()):
-            return int(value_str)
-
-        if value_str in context['memory']:
-            return context['memory'][value_str]
-
-        if value_str in context['storage']:
-            return context['storage'][value_str]
-
-        raise RuntimeError(f"Undefined variable: {value_str}")
+            return params[0]
+        return None
+
+    def _op_block(self, context, parts):
+        dispatch = self.dispatch
+        target = None
+        for opcode, gas_cost, params in parts:
+            target = dispatch[opcode](context, params)
+            self.gas_remaining -= gas_cost
+        return target
+
+    def _op_sload_add(self, context, params):
+        dest, key, value, sload_gas = params
+        storage = context['storage']
+        loaded = storage.get(key, 0)
+        context['memory'][dest] = loaded
+        self.gas_remaining -= sload_gas
+        storage[key] = self._bounded(loaded + self._get_value(context, value))
+
+    def _op_set(self, context, params):
+        context['storage'][params[0]] = self._bounded(params[1])
+
+    def _op_touch(self, context, params):
+        memory = context['memory']
+        if params[0] not in memory and len(memory) >= self.limits.max_memory_slots:
+            raise ExecutionLimitExceeded(f"More than {self.limits.max_memory_slots} memory slots")
+
+    def _bounded(self, value):
+        """Keep arithmetic results from growing without bound (MUL doubles the size each time)"""
+        if type(value) is int and value.bit_length() > self.limits.max_int_bits:
+            raise ExecutionLimitExceeded(f"Integer result exceeds {self.limits.max_int_bits} bits")
+        return value
+
+    def _get_value(self, context, value):
+        # Int literals were parsed by the compiler; anything else is a variable reference
+        if type(value) is int:
+            return value
+
+        if value in context['memory']:
+            return context['memory'][value]
+
+        if value in context['storage']:
+            return context['storage'][value]
+
+        raise RuntimeError(f"Undefined variable: {value}")
 
     def _create_contract_address(self, tx):
         return hashlib.sha256(f"{tx.sender}{tx.tx_hash}".encode()).hexdigest()[:40]
@@ -361,8 +425,21 @@ class SmartContractVM:
     def _load_contract_code(self, contract_address):
         return self.state_db.load_contract_code(contract_address)
 
-    def _save_contract(self, address, code, creator):
-        self.state_db.save_contract(address, code, creator)
+    def _load_program(self, contract_address):
+        """(source, compiled program) of a deployed contract; stores the program when (re)compiled"""
+        contract = self.state_db.load_contract(contract_address)
+        if contract is None:
+            return None, self.programs.load("")
+        code, compiled = contract
+        program = self.programs.load(
+            code, compiled,
+            on_compile=lambda fresh: self.state_db.save_compiled(contract_address, fresh.to_json())
+        )
+        return code, program
+
+    def _save_contract(self, address, code, creator, program: Program = None):
+        program = program or self.programs.load(code)
+        self.state_db.save_contract(address, code, creator, program.to_json(), analyze(program).to_json())
 
     def _load_storage(self, contract_address):
         return self.state_db.load_storage(contract_address)
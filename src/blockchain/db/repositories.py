@@ -16,8 +16,9 @@ class BlockRepository:
                 INSERT INTO blocks (
                     "index", timestamp, previous_hash,
                     hash, nonce, difficulty,
-                    validator, stake_amount, signature
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    validator, stake_amount, signature,
+                    slot, vrf_proof, cumulative_weight
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     block.index,
                     block.timestamp,
@@ -27,7 +28,10 @@ class BlockRepository:
                     block.difficulty,
                     block.validator,
                     block.stake_amount,
-                    block.signature
+                    block.signature,
+                    block.slot,
+                    block.vrf_proof,
+                    block.cumulative_weight
                 ))
                 conn.commit()
                 return cursor.lastrowid
@@ -63,7 +67,10 @@ class BlockRepository:
                 difficulty=row_dict['difficulty'],
                 validator=row_dict.get('validator', ''),
                 stake_amount=row_dict.get('stake_amount', 0),
-                signature=row_dict.get('signature', '')
+                signature=row_dict.get('signature', ''),
+                slot=row_dict.get('slot') if row_dict.get('slot') is not None else -1,
+                vrf_proof=row_dict.get('vrf_proof') or '',
+                cumulative_weight=row_dict.get('cumulative_weight') or 0.0
             )
             block.hash = row_dict['hash']
             return block
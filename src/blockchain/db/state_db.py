@@ -2,6 +2,33 @@ import json
 import time
 from trie import HexaryTrie
 from src.utils.database import db_connection
+from src.blockchain.contracts.compiler import code_hash
+from src.blockchain.consensus.validator_set import write_epoch_stakes
+from src.blockchain.db.undo_journal import UndoJournal
+
+# Table written for each kind of buffered change
+_TABLES = {
+    'contract': 'contracts',
+    'storage': 'contract_state',
+    'balance': 'balances',
+    'nonce': 'accounts',
+    'validator': 'validators',
+    'epoch': 'validator_epochs',
+}
+
+def save_code(cursor, code, compiled=None, analysis=None) -> str:
+    """Store code in contract_code unless it is already there; returns its hash.
+
+    compiled and analysis only fill in what an earlier deploy of the same code left empty.
+    """
+    digest = code_hash(code or "")
+    cursor.execute('''
+        INSERT INTO contract_code (code_hash, code, compiled, analysis) VALUES (?, ?, ?, ?)
+        ON CONFLICT(code_hash) DO UPDATE SET
+            compiled = coalesce(contract_code.compiled, excluded.compiled),
+            analysis = coalesce(contract_code.analysis, excluded.analysis)
+    ''', (digest, code or "", compiled, analysis))
+    return digest
 
 class StateDB:
     def __init__(self):
@@ -54,21 +81,122 @@ class StateDB:
             conn.commit()
 
     def load_contract_code(self, contract_address):
+        return self._load_code_column(contract_address, 'code')
+
+    def load_contract(self, contract_address):
+        """(code, compiled program JSON or None), or None if there is no such contract"""
         with db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT code FROM contracts WHERE address = ?', (contract_address,))
+            cursor.execute('''
+                SELECT code_store.code, code_store.compiled FROM contracts
+                JOIN contract_code AS code_store ON code_store.code_hash = contracts.code_hash
+                WHERE contracts.address = ?
+            ''', (contract_address,))
             row = cursor.fetchone()
-            return row[0] if row else None
+            return (row[0], row[1]) if row else None
+
+    def save_contract(self, address, code, creator, compiled=None, analysis=None):
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            digest = save_code(cursor, code, compiled, analysis)
+            cursor.execute('''
+                INSERT INTO contracts (address, code, code_hash, creator, created_at)
+                VALUES (?, '', ?, ?, ?)
+            ''', (address, digest, creator, time.time()))
+            conn.commit()
 
-    def save_contract(self, address, code, creator):
+    def load_analysis(self, address):
+        """Static analysis JSON stored at deploy, or None"""
+        return self._load_code_column(address, 'analysis')
+
+    def save_compiled(self, address, compiled):
         with db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                INSERT INTO contracts (address, code, creator, created_at)
-                VALUES (?, ?, ?, ?)
-            ''', (address, code, creator, time.time()))
+                UPDATE contract_code SET compiled = ?
+                WHERE code_hash = (SELECT code_hash FROM contracts WHERE address = ?)
+            ''', (compiled, address))
             conn.commit()
 
+    def _load_code_column(self, address, column):
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT code_store.{column} FROM contracts
+                JOIN contract_code AS code_store ON code_store.code_hash = contracts.code_hash
+                WHERE contracts.address = ?
+            ''', (address,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+    def unflushed(self) -> dict:
+        """Writes not yet in the database; StateDB writes through"""
+        return {}
+
+    def load_validator(self, address):
+        """(public_key_pem, stake) of a registered validator, or None"""
+        with db_connection() as conn:
+            row = conn.execute('SELECT public_key_pem, stake FROM validators WHERE address = ?',
+                               (address,)).fetchone()
+            return tuple(row) if row else None
+
+    def apply_changes(self, changes: dict, compiled: dict = None, journal: tuple = None) -> int:
+        """Write buffered state in one transaction; returns the number of state rows written.
+
+        changes maps (kind, key) to the value as the block executor keeps it:
+        'balance' and 'nonce' by address, 'storage' as JSON text, 'contract'
+        as (code, compiled, creator, analysis), 'validator' as
+        (public_key_pem, stake) and 'epoch' as the (boundary_hash, nonce) an
+        epoch's validator set is pinned with. With journal, a
+        (block_hash, block_height) pair, the previous image of every row
+        written is recorded for UndoJournal.undo in the same transaction.
+        """
+        rows = {kind: [] for kind in _TABLES}
+        for (kind, key), value in changes.items():
+            rows[kind].append((key, value))
+
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            if journal:
+                for kind, table in _TABLES.items():
+                    UndoJournal.record(cursor, *journal, table, [key for key, _ in rows[kind]])
+
+            # Contracts first: contract_state references them
+            for address, (code, program, creator, analysis) in rows['contract']:
+                digest = save_code(cursor, code, program, analysis)
+                cursor.execute('''
+                    INSERT INTO contracts (address, code, code_hash, creator, created_at)
+                    VALUES (?, '', ?, ?, ?)
+                ''', (address, digest, creator, time.time()))
+            cursor.executemany('''
+                INSERT OR REPLACE INTO contract_state (contract_address, storage) VALUES (?, ?)
+            ''', rows['storage'])
+            cursor.executemany('''
+                INSERT OR REPLACE INTO balances (address, balance) VALUES (?, ?)
+            ''', rows['balance'])
+            cursor.executemany('''
+                INSERT INTO accounts (address, public_key_pem, nonce) VALUES (?, '', ?)
+                ON CONFLICT(address) DO UPDATE SET nonce = excluded.nonce
+            ''', rows['nonce'])
+            cursor.executemany('''
+                INSERT INTO validators (address, public_key_pem, stake, last_active)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(address) DO UPDATE SET public_key_pem = excluded.public_key_pem,
+                                                   stake = excluded.stake, last_active = excluded.last_active
+            ''', [(address, pem, stake) for address, (pem, stake) in rows['validator']])
+            # Epochs last: their validator sets include this flush's validators
+            for epoch, (boundary_hash, nonce) in rows['epoch']:
+                write_epoch_stakes(cursor, epoch, boundary_hash, nonce)
+            cursor.executemany('''
+                UPDATE contract_code SET compiled = ?
+                WHERE code_hash = (SELECT code_hash FROM contracts WHERE address = ?)
+            ''', [(program, address) for address, program in (compiled or {}).items()])
+            conn.commit()
+
+        for address, balance in rows['balance']:
+            self.trie.set(address.encode(), str(balance).encode())
+        return len(changes)
+
     def load_storage(self, contract_address):
         with db_connection() as conn:
             cursor = conn.cursor()
@@ -76,6 +204,14 @@ class StateDB:
             row = cursor.fetchone()
             return json.loads(row[0]) if row else {}
 
+    def load_storage_json(self, contract_address):
+        """Storage exactly as stored (JSON text), or None if the contract has none yet"""
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT storage FROM contract_state WHERE contract_address = ?', (contract_address,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+
     def save_storage(self, contract_address, storage):
         with db_connection() as conn:
             cursor = conn.cursor()
@@ -155,12 +291,13 @@ class StateDB:
             row = cursor.fetchone()
             current_nonce = row[0] if row else 0
 
-            # Update nonce
+            # Update nonce, keeping the account's public key
             new_nonce = current_nonce + 1
             cursor.execute('''
-                INSERT OR REPLACE INTO accounts (address, public_key_pem, nonce)
-                VALUES (?, ?, ?)
-            ''', (address, None, new_nonce))
+                INSERT INTO accounts (address, public_key_pem, nonce)
+                VALUES (?, '', ?)
+                ON CONFLICT(address) DO UPDATE SET nonce = excluded.nonce
+            ''', (address, new_nonce))
             conn.commit()  # FIX: Changed cursor.commit() to conn.commit()
             return new_nonce
 
@@ -0,0 +1,83 @@
+import json
+from typing import Iterable
+from src.utils.database import JOURNALED_TABLES, db_connection
+from src.utils.logger import logger
+
+
+class UndoJournal:
+    """Per-block journal of state changes, written by the block's state flush.
+
+    Before a block's writes reach a journaled table, the previous image of
+    every row they touch is recorded in the same database transaction, so
+    only the block's own writes are ever journaled. Undoing the block
+    restores those images newest-first; the cost is proportional to the
+    number of rows the block touched.
+    """
+
+    @staticmethod
+    def record(cursor, block_hash: str, block_height: int, table: str, row_keys: Iterable):
+        """Journal the current image of table's rows at row_keys, in cursor's transaction"""
+        key, columns = JOURNALED_TABLES[table]
+        for row_key in row_keys:
+            cursor.execute(f"SELECT json_array({', '.join(columns)}) FROM {table} WHERE {key} = ?", (row_key,))
+            row = cursor.fetchone()
+            cursor.execute('''
+                INSERT INTO state_journal (block_hash, block_height, tbl, row_key, old_row)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (block_hash, block_height, table, row_key, row[0] if row else None))
+
+    @staticmethod
+    def has_entries(block_hash: str) -> bool:
+        with db_connection() as conn:
+            row = conn.execute("SELECT 1 FROM state_journal WHERE block_hash = ? LIMIT 1", (block_hash,)).fetchone()
+            return row is not None
+
+    @staticmethod
+    def undo(block_hash: str) -> int:
+        """Restore the state from before block_hash was applied; returns rows restored"""
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN")
+            cursor.execute('''
+                SELECT tbl, row_key, old_row FROM state_journal
+                WHERE block_hash = ? ORDER BY seq DESC
+            ''', (block_hash,))
+            entries = cursor.fetchall()
+
+            for table, row_key, old_row in entries:
+                key, columns = JOURNALED_TABLES[table]
+                if old_row is None:
+                    cursor.execute(f"DELETE FROM {table} WHERE {key} = ?", (row_key,))
+                else:
+                    # Rows journaled before a column was added to the table carry fewer values
+                    values = json.loads(old_row)
+                    cursor.execute(
+                        f"INSERT OR REPLACE INTO {table} ({', '.join(columns[:len(values)])}) "
+                        f"VALUES ({', '.join('?' for _ in values)})",
+                        values
+                    )
+
+            cursor.execute("DELETE FROM state_journal WHERE block_hash = ?", (block_hash,))
+            conn.commit()
+
+        logger.info(f"Undid {len(entries)} state changes of block {block_hash[:10]}...")
+        return len(entries)
+
+    @staticmethod
+    def discard(block_hash: str):
+        with db_connection() as conn:
+            conn.execute("DELETE FROM state_journal WHERE block_hash = ?", (block_hash,))
+            conn.commit()
+
+    @staticmethod
+    def prune(below_height: int):
+        """Drop journals of blocks too deep to be reorganized"""
+        with db_connection() as conn:
+            conn.execute("DELETE FROM state_journal WHERE block_height < ?", (below_height,))
+            conn.commit()
+
+    @staticmethod
+    def clear():
+        with db_connection() as conn:
+            conn.execute("DELETE FROM state_journal")
+            conn.commit()
@@ -0,0 +1,403 @@
+import json
+import threading
+from bisect import bisect_left, insort
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from src.utils.logger import logger
+from src.blockchain.consensus.validator_registry import ValidatorRegistry
+from src.blockchain.contracts.vm import SmartContractVM
+from src.blockchain.db.state_db import StateDB
+
+EXECUTION_WORKERS = 4
+
+# Transactions that read the validator registry outside the block's state (a staker's
+# public key) aren't run speculatively; they run on their own between batches
+BARRIER_TYPES = {"VEX_STAKE"}
+# Transaction types run by the contract VM, as admitted by the mempool
+CONTRACT_TYPES = {"CONTRACT", "CREATE", "CALL"}
+
+# (writer tx index, incarnation) of a value, or None for the block's base state
+Version = Optional[Tuple[int, int]]
+
+
+def apply_transaction(state, vm, tx, block) -> Optional[str]:
+    """Apply one block transaction to state (a StateDB or a StateOverlay); the error, or None"""
+    if not tx.is_valid():
+        return f"Invalid transaction in block: {tx.tx_hash}"
+
+    sender_nonce = state.get_nonce(tx.sender)
+    if tx.nonce != sender_nonce + 1:
+        return f"Invalid nonce for tx {tx.tx_hash}"
+
+    if tx.contract_type == "NORMAL":
+        # Regular VEX coin transfer
+        sender_balance = state.get_balance(tx.sender)
+        total_deduct = tx.amount + getattr(tx, 'fee', 0)
+        if sender_balance < total_deduct:
+            return f"Insufficient VEX balance for {tx.sender}"
+
+        state.update_balance(tx.sender, sender_balance - total_deduct)
+        recipient_balance = state.get_balance(tx.recipient)
+        state.update_balance(tx.recipient, recipient_balance + tx.amount)
+        state.increment_nonce(tx.sender)
+
+    elif tx.contract_type in CONTRACT_TYPES:
+        success, result = vm.execute(tx, block.index, block.timestamp)
+        if not success:
+            return f"Contract execution failed: {result}"
+        tx.contract_output = result
+
+    elif tx.contract_type == "VEX_REWARD":
+        # VEX block reward transaction (mint new VEX)
+        recipient_balance = state.get_balance(tx.recipient)
+        state.update_balance(tx.recipient, recipient_balance + tx.amount)
+
+    elif tx.contract_type == "VEX_STAKE":
+        sender_balance = state.get_balance(tx.sender)
+        if sender_balance < tx.amount:
+            return f"Insufficient VEX balance for staking: {tx.sender}"
+
+        # Move VEX to staking contract and register the sender as a validator
+        state.update_balance(tx.sender, sender_balance - tx.amount)
+        staking_balance = state.get_balance(tx.recipient)
+        state.update_balance(tx.recipient, staking_balance + tx.amount)
+        validator = state.load_validator(tx.sender)
+        if validator and validator[1] > 0:
+            logger.info(f"Validator {tx.sender} already exists with stake {validator[1]}")
+        else:
+            state.save_validator(tx.sender, ValidatorRegistry.get_public_key_pem(tx.sender), tx.amount)
+
+    else:
+        return f"Unknown transaction type: {tx.contract_type}"
+
+    return None
+
+
+class MultiVersionStore:
+    """Values written by each transaction of a batch, latest incarnation only.
+
+    Keys are (kind, address) pairs; a reader at index i sees the write of the
+    highest index below i, or falls through to the base state.
+    """
+
+    def __init__(self):
+        self.writers: Dict[tuple, List[int]] = {}  # key -> sorted writer indices
+        self.values: Dict[tuple, Tuple[int, Any]] = {}  # (key, index) -> (incarnation, value)
+        self.written: Dict[int, set] = {}  # index -> keys it wrote
+        self.lock = threading.Lock()
+
+    def read(self, key: tuple, index: int) -> Tuple[Version, Any]:
+        with self.lock:
+            writers = self.writers.get(key)
+            position = bisect_left(writers, index) if writers else 0
+            if position == 0:
+                return None, None
+            writer = writers[position - 1]
+            incarnation, value = self.values[(key, writer)]
+            return (writer, incarnation), value
+
+    def record(self, index: int, incarnation: int, writes: dict):
+        """Replace everything index wrote before with this incarnation's writes"""
+        with self.lock:
+            for key in self.written.get(index, set()) - writes.keys():
+                self.writers[key].remove(index)
+                del self.values[(key, index)]
+            for key, value in writes.items():
+                if (key, index) not in self.values:
+                    insort(self.writers.setdefault(key, []), index)
+                self.values[(key, index)] = (incarnation, value)
+            self.written[index] = set(writes)
+
+    def is_current(self, reads: Dict[tuple, Version], index: int) -> bool:
+        """Whether every read would still see the same version"""
+        return all(self.read(key, index)[0] == version for key, version in reads.items())
+
+
+class BlockState:
+    """State as a block's transactions see it, held in memory until the block commits.
+
+    Each key is read from the database at most once per block; the writes of
+    the transactions applied so far are buffered on top and reach the database
+    in one transaction on flush(). A block that fails is simply dropped.
+    """
+
+    def __init__(self, state_db: StateDB):
+        self.state_db = state_db
+        self.values = {}    # key -> current value, read from the database or buffered
+        self.writes = {}    # key -> value not yet flushed
+        self.compiled = {}  # address -> compiled program not yet flushed
+        self.lock = threading.Lock()  # speculative workers read concurrently
+
+    def apply(self, overlay: 'StateOverlay'):
+        """Make a finished transaction's writes part of the block"""
+        self.values.update(overlay.writes)
+        self.writes.update(overlay.writes)
+        self.compiled.update(overlay.compiled)
+
+    def write(self, key: tuple, value):
+        """Buffer a write made outside any transaction, such as the block reward"""
+        self.values[key] = value
+        self.writes[key] = value
+
+    def flush(self, journal: tuple = None) -> int:
+        """Write everything buffered so far; returns the number of state rows written"""
+        rows = self.state_db.apply_changes(self.writes, self.compiled, journal)
+        self.writes = {}
+        self.compiled = {}
+        return rows
+
+    def read(self, key: tuple):
+        if key in self.values:
+            return self.values[key]
+        with self.lock:
+            if key not in self.values:
+                self.values[key] = self._load(key)
+            return self.values[key]
+
+    def _load(self, key: tuple):
+        kind, address = key
+        if kind == 'balance':
+            return self.state_db.get_balance(address)
+        if kind == 'nonce':
+            return self.state_db.get_nonce(address)
+        if kind == 'storage':
+            return json.dumps(self.state_db.load_storage(address))
+        if kind == 'validator':
+            return self.state_db.load_validator(address)
+        return self.state_db.load_contract(address)  # 'contract'
+
+
+class StateOverlay:
+    """The StateDB calls a transaction makes, against the multi-version store.
+
+    Reads come from lower transactions' writes or the base state and are
+    recorded with their version; writes are buffered until the batch commits.
+    Values are kept in the form the database would return them, so results
+    match serial execution exactly.
+    """
+
+    def __init__(self, store: MultiVersionStore, base: BlockState, index: int):
+        self.store = store
+        self.base = base
+        self.index = index
+        self.reads: Dict[tuple, Version] = {}
+        self.seen = {}
+        self.writes = {}
+        self.compiled = {}
+
+    def unflushed(self) -> dict:
+        """The block's and this transaction's writes, for a sandboxed contract to run on"""
+        return {**self.base.writes, **self.writes}
+
+    def apply_changes(self, changes: dict, compiled: dict = None):
+        """Take the writes of a contract that ran in the sandbox"""
+        self.writes.update(changes)
+        self.compiled.update(compiled or {})
+
+    def _read(self, key: tuple):
+        if key in self.writes:
+            return self.writes[key]
+        if key not in self.seen:
+            version, value = self.store.read(key, self.index)
+            self.reads[key] = version
+            self.seen[key] = self.base.read(key) if version is None else value
+        return self.seen[key]
+
+    def get_balance(self, address):
+        return self._read(('balance', address))
+
+    def update_balance(self, address, new_balance):
+        self.writes[('balance', address)] = float(new_balance)  # balances are REAL columns
+
+    def add_balance(self, address, amount):
+        self.update_balance(address, self.get_balance(address) + amount)
+
+    def get_nonce(self, address: str) -> int:
+        return self._read(('nonce', address))
+
+    def increment_nonce(self, address: str) -> int:
+        nonce = self.get_nonce(address) + 1
+        self.writes[('nonce', address)] = nonce
+        return nonce
+
+    def load_contract(self, contract_address):
+        contract = self._read(('contract', contract_address))
+        return (contract[0], contract[1]) if contract else None
+
+    def load_contract_code(self, contract_address):
+        contract = self._read(('contract', contract_address))
+        return contract[0] if contract else None
+
+    def save_contract(self, address, code, creator, compiled=None, analysis=None):
+        if self._read(('contract', address)) is not None:
+            raise RuntimeError(f"Contract {address} already exists")
+        self.writes[('contract', address)] = (code, compiled, creator, analysis)
+
+    def save_compiled(self, address, compiled):
+        # A cache of the code; doesn't change what any transaction computes
+        self.compiled[address] = compiled
+
+    def load_storage(self, contract_address):
+        return json.loads(self._read(('storage', contract_address)))
+
+    def save_storage(self, contract_address, storage):
+        if self._read(('contract', contract_address)) is None:
+            raise RuntimeError(f"No contract at {contract_address}")
+        self.writes[('storage', contract_address)] = json.dumps(storage)
+
+    def load_validator(self, address):
+        return self._read(('validator', address))
+
+    def save_validator(self, address, public_key_pem, stake):
+        self.writes[('validator', address)] = (public_key_pem, float(stake))
+
+
+class BlockExecutor:
+    """Runs a block's transactions, optimistically in parallel when workers > 1.
+
+    Block-STM style: every transaction of a batch first runs speculatively on a
+    worker thread against a StateOverlay. Then, in block order, each one's
+    read versions are checked against the writes of the transactions before it;
+    a stale transaction is re-executed (by then everything before it is final)
+    before the next is checked. The validated write sets are then applied to
+    the block's state in block order, so the outcome is exactly that of serial
+    execution. The database sees the block once, when all of it has succeeded.
+    """
+
+    def __init__(self, workers: int = EXECUTION_WORKERS):
+        self.workers = workers
+        self.pool = None
+        self.lock = threading.Lock()
+
+        self.blocks = 0
+        self.transactions = 0
+        self.executions = 0
+        self.reexecutions = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="BlockExecutor")
+            return self.pool
+
+    def execute(self, block, state_db: StateDB = None) -> bool:
+        """Run block's transactions; their changes are written only if every one succeeds"""
+        state = self.run(block, state_db)
+        if state is None:
+            return False
+        self.flush(state)
+        return True
+
+    def run(self, block, state_db: StateDB = None) -> Optional[BlockState]:
+        """Run block's transactions into a BlockState, or None if one fails; nothing is written"""
+        state = BlockState(state_db or StateDB())
+        with self.lock:
+            self.blocks += 1
+            self.transactions += len(block.transactions)
+        return state if self._execute_block(block, state) else None
+
+    def select(self, block, state_db: StateDB = None) -> list:
+        """The transactions of a draft block that apply in order, skipping those that fail.
+
+        Nothing is written: the block built from them is executed for real once
+        it is added to the chain.
+        """
+        state = BlockState(state_db or StateDB())
+        return [tx for tx in block.transactions if self._apply_serial(tx, block, state)]
+
+    def _execute_block(self, block, state: BlockState) -> bool:
+        if self.workers <= 1 or len(block.transactions) < 2:
+            return self.execute_serial(block, state)
+
+        batch = []
+        for tx in block.transactions:
+            if not self._is_barrier(tx):
+                batch.append(tx)
+                continue
+            if batch and not self._execute_batch(batch, block, state):
+                return False
+            batch = []
+            if not self._apply_serial(tx, block, state):
+                return False
+        return not batch or self._execute_batch(batch, block, state)
+
+    def execute_serial(self, block, state: BlockState) -> bool:
+        return all(self._apply_serial(tx, block, state) for tx in block.transactions)
+
+    def _apply_serial(self, tx, block, state: BlockState) -> bool:
+        overlay = StateOverlay(MultiVersionStore(), state, 0)
+        error = apply_transaction(overlay, SmartContractVM(overlay), tx, block)
+        if error is None:
+            state.apply(overlay)
+        if error:
+            logger.error(error)
+        return error is None
+
+    def flush(self, state: BlockState, journal: tuple = None):
+        """Write a block's state, journaled under journal's (block_hash, block_height) if given"""
+        rows = state.flush(journal)
+        with self.lock:
+            self.flushes += 1
+            self.rows_flushed += rows
+
+    @staticmethod
+    def _is_barrier(tx) -> bool:
+        # Sandboxed contracts run in another process, which can't report what they read
+        return tx.contract_type in BARRIER_TYPES or (
+            tx.contract_type in CONTRACT_TYPES and SmartContractVM.sandbox is not None
+        )
+
+    def _run(self, store, base, txs, block, index, incarnation) -> Tuple[StateOverlay, Optional[str]]:
+        overlay = StateOverlay(store, base, index)
+        try:
+            error = apply_transaction(overlay, SmartContractVM(overlay), txs[index], block)
+        except Exception as e:
+            # A speculative run can see an inconsistent mix of versions; validation decides
+            error = f"Transaction {txs[index].tx_hash} failed: {e}"
+        store.record(index, incarnation, overlay.writes)
+        return overlay, error
+
+    def _execute_batch(self, txs: list, block, base: BlockState) -> bool:
+        store = MultiVersionStore()
+        results = list(self._get_pool().map(
+            lambda index: self._run(store, base, txs, block, index, 0), range(len(txs))
+        ))
+
+        reexecuted = 0
+        for index in range(len(txs)):
+            overlay, error = results[index]
+            if not store.is_current(overlay.reads, index):
+                reexecuted += 1
+                overlay, error = self._run(store, base, txs, block, index, 1)
+                results[index] = (overlay, error)
+            if error:
+                logger.error(error)
+                return False
+
+        with self.lock:
+            self.executions += len(txs) + reexecuted
+            self.reexecutions += reexecuted
+        for overlay, _ in results:
+            base.apply(overlay)
+        return True
+
+    def close(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown(wait=False)
+                self.pool = None
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'blocks': self.blocks,
+                'transactions': self.transactions,
+                'executions': self.executions,
+                'reexecutions': self.reexecutions,
+                'flushes': self.flushes,
+                'rows_flushed': self.rows_flushed,
+                'conflict_rate': round(self.reexecutions / self.executions, 4) if self.executions else 0.0
+            }
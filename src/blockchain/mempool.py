@@ -1,6 +1,10 @@
 import heapq
+import json
 from typing import List
+from src.blockchain.contracts.analyzer import ContractAnalysis
+from src.blockchain.contracts.compiler import CompileError
 from src.blockchain.contracts.contract_repository import ContractRepository
+from src.blockchain.contracts.vm import SmartContractVM
 from src.blockchain.db.state_db import StateDB
 from src.blockchain.transaction import Transaction
 from src.utils.logger import logger
@@ -43,6 +47,11 @@ class Mempool:
                 logger.error("Invalid transaction")
                 return False
 
+            rejection = self._check_contract_gas(transaction)
+            if rejection:
+                logger.error(f"Rejected transaction {transaction.tx_hash[:8]}...: {rejection}")
+                return False
+
             # Check if transaction already exists
             if transaction.tx_hash in self.transactions:
                 logger.warning("Transaction already in mempool")
@@ -64,6 +73,39 @@ class Mempool:
             logger.error(f"Error adding transaction to mempool: {e}")
             return False
 
+    @staticmethod
+    def _check_contract_gas(transaction):
+        """Why a contract transaction can't succeed, judging by the code's static analysis, or None.
+
+        Only the cheapest successful path is held against the gas limit: a limit
+        below the worst case can still be enough for the branch actually taken.
+        """
+        if transaction.contract_type not in ("CONTRACT", "CREATE", "CALL"):
+            return None
+        code = getattr(transaction, 'contract_code', None)
+        address = getattr(transaction, 'contract_address', None)
+        try:
+            if code:
+                analysis = SmartContractVM.analyze_code(code)
+            elif address:
+                stored = StateDB().load_analysis(address)
+                analysis = ContractAnalysis.from_json(stored) if stored else None
+                if analysis is None:
+                    code = StateDB().load_contract_code(address)
+                    if code is None:
+                        return None  # may be deployed by a transaction ahead of it
+                    analysis = SmartContractVM.analyze_code(code)
+            else:
+                return None
+        except CompileError as e:
+            return f"invalid contract code: {e}"
+
+        if analysis.always_reverts:
+            return "contract code reverts on every path"
+        if transaction.gas_limit < analysis.min_gas:
+            return f"gas limit {transaction.gas_limit} below the {analysis.min_gas} any successful run needs"
+        return None
+
     def get_transactions(self, max_count: int = 10) -> List[Transaction]:
         """fetch transactions for creating new block"""
         sorted_txs = sorted(
@@ -72,6 +114,41 @@ class Mempool:
         )
         return sorted_txs[:max_count]
 
+    def select_for_block(self, max_count: int, max_bytes: int, gas_limit: int) -> List[Transaction]:
+        """Highest-fee transactions that fit the block's count, size and gas budgets.
+
+        A sender's transactions are taken in nonce order: the queue holds each
+        sender's next transaction, ordered by fee. A transaction that doesn't
+        fit ends its sender's run, since the ones after it would have a gap.
+        """
+        by_sender = {}
+        for tx in self.transactions.values():
+            by_sender.setdefault(tx.sender, []).append(tx)
+        for txs in by_sender.values():
+            txs.sort(key=lambda tx: (tx.nonce, tx.timestamp))
+
+        queue = []
+        for sender, txs in by_sender.items():
+            heapq.heappush(queue, (-getattr(txs[0], 'fee', 0), txs[0].timestamp, sender, 0))
+
+        selected = []
+        size = 0
+        gas = 0
+        while queue and len(selected) < max_count:
+            _, _, sender, position = heapq.heappop(queue)
+            tx = by_sender[sender][position]
+            tx_size = len(json.dumps(tx.to_dict()))
+            tx_gas = tx.gas_limit if tx.contract_type != "NORMAL" else 0
+            if size + tx_size > max_bytes or gas + tx_gas > gas_limit:
+                continue
+            selected.append(tx)
+            size += tx_size
+            gas += tx_gas
+            if position + 1 < len(by_sender[sender]):
+                following = by_sender[sender][position + 1]
+                heapq.heappush(queue, (-getattr(following, 'fee', 0), following.timestamp, sender, position + 1))
+        return selected
+
     def remove_transactions(self, tx_hashes: List[str]):
         """remove validated transactions"""
         with db_connection() as conn:
@@ -11,17 +11,35 @@ from src.utils.logger import logger
 from src.wallet.wallet import Wallet
 from src.utils.database import init_db
 from src.blockchain.consensus.stake_manager import StakeManager
+from src.blockchain.block_producer import BlockProducer
+from src.blockchain.contracts.vm import SmartContractVM
+from src.blockchain.contracts.sandbox import SandboxPool
+from src.blockchain.contracts.tracer import GasProfiler
+from src.blockchain.consensus.validator_registry import ValidatorRegistry
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat, load_pem_private_key
 
 class BlockchainNode:
-    def __init__(self, host='0.0.0.0', p2p_port=6000, api_port=5000):
+    def __init__(self, host='0.0.0.0', p2p_port=6000, api_port=5000, produce_blocks=True,
+                 slot_time=None, max_block_txs=None, block_gas_limit=None, contract_sandbox_workers=0,
+                 execution_workers=None, contract_profiling=False, contract_trace_steps=False):
         self.host = host
         self.p2p_port = p2p_port
         self.api_port = api_port
 
-        # Initialize core modules first
-        self.blockchain = Blockchain()
-        self.mempool = Mempool()
+        # Create Node-specific  data directory
+        self.data_dir = f"data/node_{p2p_port}"
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        # Initialize node wallet before the chain: a new chain's genesis validator is the node key
+        init_db()
         self.wallet = Wallet(self)
+        self.node_wallet_path = os.path.join(self.data_dir, 'wallet.json')
+        self._init_node_wallet()
+        self.node_key = node_key = self._load_node_key()
+
+        # Initialize core modules
+        self.blockchain = Blockchain(genesis_key=node_key[0] if node_key else None)
+        self.mempool = Mempool()
         self.consensus = Consensus(self.blockchain, stake_manager=StakeManager())
         self.p2p_network = P2PNetwork(host, p2p_port, self.blockchain)  # Use initialized blockchain
 
@@ -37,6 +55,7 @@ class BlockchainNode:
 
         # Inject dependencies Manualy (Automatic had error)
         self.mempool.blockchain = self.blockchain
+        self.blockchain.mempool = self.mempool
         self.wallet.blockchain = self.blockchain
         self.consensus.blockchain = self.blockchain
         self.p2p_network.blockchain = self.blockchain
@@ -46,16 +65,29 @@ class BlockchainNode:
         self.mempool.p2p_network = self.p2p_network
         self.p2p_network.set_mempool(self.mempool)
 
-        # Create Node-specific  data directory
-        self.data_dir = f"data/node_{p2p_port}"
-        os.makedirs(self.data_dir, exist_ok=True)
+        # Register validator
+        self._register_as_validator(node_key)
 
-        # Initialize node wallet
-        self.node_wallet_path = os.path.join(self.data_dir, 'wallet.json')
-        self._init_node_wallet()
+        # Slot-driven block production and checkpoint attestation with the node's validator key
+        self.block_producer = None
+        if node_key:
+            self.blockchain.finality.set_signer(*node_key)
+            if produce_blocks:
+                self.block_producer = self._create_block_producer(node_key, slot_time, max_block_txs,
+                                                                  block_gas_limit)
 
-        # Register validator
-        self._register_as_validator()
+        if execution_workers is not None:
+            self.blockchain.executor.workers = execution_workers
+
+        # Opt-in tracing of contract execution; off, the VM runs its untraced loop
+        if contract_profiling or contract_trace_steps:
+            SmartContractVM.profiler = GasProfiler(record_steps=contract_trace_steps)
+
+        # Optionally run contract code in isolated worker processes instead of in-process
+        self.contract_sandbox = None
+        if contract_sandbox_workers:
+            self.contract_sandbox = SandboxPool(workers=contract_sandbox_workers)
+            SmartContractVM.sandbox = self.contract_sandbox
 
         self.p2p_thread = None
         self.api_thread = None
@@ -69,7 +101,7 @@ class BlockchainNode:
     def _init_node_wallet(self):
         """Initialize node's wallet if it doesn't exist"""
         if not os.path.exists(self.node_wallet_path):
-            password = 12345 # This is For test comment it
+            password = "12345" # This is For test comment it
             # password = os.getenv("NODE_WALLET_PASSWORD", "default_password")
             address, private_key = self.wallet.create_account(
                 f"node_{self.p2p_port}",
@@ -95,20 +127,46 @@ class BlockchainNode:
             # Import into main wallet
             self.wallet.import_private_key(
                 f"node_{self.p2p_port}",
-                node_wallet_data['privare_key'],
-                password=1234
+                node_wallet_data['private_key'],
+                password=str(node_wallet_data['password'])
             )
             logger.info(f"Loaded existing node wallet: {node_wallet_data['address']}")
 
-    def _register_as_validator(self):
+    def _load_node_key(self):
+        """(private key, address) of the node's validator wallet, or None"""
+        try:
+            with open(self.node_wallet_path, 'r') as f:
+                node_wallet_data = json.load(f)
+            private_key = load_pem_private_key(node_wallet_data['private_key'].encode(), password=None)
+            # The address blocks and attestations are checked against, not the wallet's
+            return private_key, ValidatorRegistry.get_validator_address(private_key)
+        except Exception as e:
+            logger.error(f"Block production and attestation disabled, node key unavailable: {e}")
+            return None
+
+    def _create_block_producer(self, node_key, slot_time, max_block_txs, block_gas_limit):
+        private_key, address = node_key
+        options = {}
+        if max_block_txs:
+            options['max_block_txs'] = max_block_txs
+        if block_gas_limit:
+            options['block_gas_limit'] = block_gas_limit
+        return BlockProducer(
+            self.blockchain, self.mempool, private_key, address,
+            slot_time=slot_time, **options
+        )
+
+    def _register_as_validator(self, node_key):
         """Register node as validator eith its stake"""
-        node_account = self.wallet.accounts.get(f"node_{self.p2p_port}")
-        if not node_account:
+        if not node_key:
             logger.error("Node wallet not found")
             return
 
-        address = node_account['address']
-        public_key_pem = node_account['public_key']
+        private_key, address = node_key
+        public_key_pem = private_key.public_key().public_bytes(
+            encoding=Encoding.PEM,
+            format=PublicFormat.SubjectPublicKeyInfo
+        ).decode()
 
         # Auto-stake a fixed amount (e.g., 1000 coins)
         stake_amount = 1000.0
@@ -205,6 +263,8 @@ class BlockchainNode:
 
             self._start_p2p_service()
             self._start_api_service()
+            if self.block_producer:
+                self.block_producer.start()
 
             self._start_monitoring()
 
@@ -323,6 +383,14 @@ class BlockchainNode:
         self._running = False
         logger.info("Shutting down node...")
 
+        if self.block_producer:
+            self.block_producer.stop()
+
+        self.blockchain.executor.close()
+        if self.contract_sandbox is not None:
+            SmartContractVM.sandbox = None
+            self.contract_sandbox.close()
+
         # Stop P2P network first
         if self.p2p_network is not None:
             self.p2p_network.stop()
@@ -0,0 +1,319 @@
+import binascii
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import Dict, List, Optional
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+from src.blockchain.block import Block
+from src.blockchain.consensus.validator_registry import ValidatorRegistry
+from src.utils.database import db_connection
+from src.utils.logger import logger
+
+# 2: contract code in its own table, by hash; 3: pinned validator sets; 4: epoch nonces;
+# 5: consensus columns only
+SNAPSHOT_VERSION = 5
+ENDORSEMENT_DOMAIN = b"vex-snapshot-v1"
+SNAPSHOT_DIR = "data/snapshots"
+SNAPSHOT_INTERVAL = 1000   # blocks between snapshots
+SNAPSHOTS_KEPT = 2
+CHUNK_ROWS = 1000
+
+# State tables in insertion order (contracts before contract_state for the foreign key)
+SNAPSHOT_TABLES = {
+    'contract_code': ('code_hash', 'code'),
+    'accounts': ('address', 'public_key_pem', 'nonce'),
+    'balances': ('address', 'balance'),
+    'validators': ('address', 'public_key_pem', 'stake'),
+    'stakes': ('tx_hash', 'address', 'amount', 'block_number', 'timestamp'),
+    # code is '' since contract_code; still carried for tables created with it NOT NULL
+    'contracts': ('address', 'code', 'code_hash', 'creator', 'created_at'),
+    'contract_state': ('contract_address', 'storage'),
+    'validator_epochs': ('epoch', 'stakes', 'boundary_hash', 'nonce'),
+}
+TABLE_ORDER = {
+    'contract_code': 'code_hash',
+    'accounts': 'address',
+    'balances': 'address',
+    'validators': 'address',
+    'stakes': 'tx_hash',
+    'contracts': 'address',
+    'contract_state': 'contract_address',
+    'validator_epochs': 'epoch',
+}
+
+
+# Rows a snapshot leaves out: code no contract uses any more (its deploy was reorganized
+# away) would make snapshots of the same state differ between nodes
+TABLE_FILTERS = {
+    'contract_code': 'WHERE code_hash IN (SELECT code_hash FROM contracts)',
+}
+
+
+def _canonical(data) -> bytes:
+    return json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+
+
+def chunk_hash(chunk: dict) -> str:
+    return hashlib.sha256(_canonical({
+        'table': chunk['table'],
+        'index': chunk['index'],
+        'rows': chunk['rows']
+    })).hexdigest()
+
+
+def content_hash(manifest: dict) -> str:
+    """Hash binding the snapshot height, anchor block and every chunk"""
+    return hashlib.sha256(_canonical({
+        'version': manifest['version'],
+        'height': manifest['height'],
+        'block_hash': manifest['block']['hash'],
+        'chunks': [chunk['hash'] for chunk in manifest['chunks']]
+    })).hexdigest()
+
+
+def endorse(manifest: dict, private_key: ec.EllipticCurvePrivateKey, address: str) -> dict:
+    """A validator's signature vouching for the snapshot's content hash"""
+    payload = ENDORSEMENT_DOMAIN + manifest['content_hash'].encode()
+    return {'validator': address, 'signature': private_key.sign(payload, ec.ECDSA(hashes.SHA256())).hex()}
+
+
+def endorser(manifest: dict, endorsement: Optional[dict]) -> Optional[str]:
+    """The validator whose endorsement of manifest checks out, if any"""
+    try:
+        address = str(endorsement['validator'])
+        signature = binascii.unhexlify(endorsement['signature'])
+        pem = ValidatorRegistry.get_public_key_pem(address)
+        if not pem:
+            return None
+        load_pem_public_key(pem.encode()).verify(
+            signature, ENDORSEMENT_DOMAIN + manifest['content_hash'].encode(), ec.ECDSA(hashes.SHA256())
+        )
+        return address
+    except (KeyError, TypeError, ValueError, binascii.Error, InvalidSignature):
+        return None
+
+
+class SnapshotManager:
+    """Produces, stores and imports chunked state snapshots.
+
+    A snapshot is a manifest (height, anchor block, chunk hashes and a content
+    hash over all of them) plus chunk files of at most `chunk_rows` rows from
+    one state table each, so it can be streamed to peers a chunk at a time.
+    """
+
+    def __init__(self, snapshot_dir: str = SNAPSHOT_DIR, interval: int = SNAPSHOT_INTERVAL,
+                 keep: int = SNAPSHOTS_KEPT, chunk_rows: int = CHUNK_ROWS):
+        self.snapshot_dir = snapshot_dir
+        self.interval = interval
+        self.keep = keep
+        self.chunk_rows = chunk_rows
+        self.lock = threading.Lock()
+        self._latest = None
+
+    # Production
+
+    def maybe_produce(self, block: Block):
+        """Produce a snapshot if block is on a snapshot boundary"""
+        if not self.interval or block.index <= 0 or block.index % self.interval:
+            return None
+        try:
+            return self.produce(block)
+        except Exception as e:
+            logger.error(f"Snapshot at height {block.index} failed: {e}")
+            return None
+
+    def produce(self, block: Block) -> dict:
+        """Write a snapshot of the current state, anchored at block"""
+        chunks = []
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            # One read transaction so every table is read at the same state
+            cursor.execute("BEGIN")
+            for table, columns in SNAPSHOT_TABLES.items():
+                cursor.execute(
+                    f"SELECT {', '.join(columns)} FROM {table} {TABLE_FILTERS.get(table, '')} "
+                    f"ORDER BY {TABLE_ORDER[table]}"
+                )
+                while True:
+                    rows = cursor.fetchmany(self.chunk_rows)
+                    if not rows:
+                        break
+                    chunk = {'table': table, 'index': len(chunks), 'rows': [list(row) for row in rows]}
+                    chunk['hash'] = chunk_hash(chunk)
+                    chunks.append(chunk)
+            conn.commit()
+
+        anchor = block.to_dict()
+        anchor['difficulty'] = block.difficulty
+        anchor['nonce'] = block.nonce
+        anchor['cumulative_weight'] = block.cumulative_weight
+        manifest = {
+            'version': SNAPSHOT_VERSION,
+            'height': block.index,
+            'block': anchor,
+            'tables': {table: list(columns) for table, columns in SNAPSHOT_TABLES.items()},
+            'chunks': [
+                {'index': chunk['index'], 'table': chunk['table'], 'rows': len(chunk['rows']), 'hash': chunk['hash']}
+                for chunk in chunks
+            ]
+        }
+        manifest['content_hash'] = content_hash(manifest)
+
+        with self.lock:
+            final_dir = os.path.join(self.snapshot_dir, str(block.index))
+            tmp_dir = final_dir + ".tmp"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            for chunk in chunks:
+                with open(os.path.join(tmp_dir, f"chunk_{chunk['index']}.json"), 'w') as f:
+                    json.dump(chunk, f)
+            with open(os.path.join(tmp_dir, "manifest.json"), 'w') as f:
+                json.dump(manifest, f)
+            shutil.rmtree(final_dir, ignore_errors=True)
+            os.replace(tmp_dir, final_dir)
+            self._latest = manifest
+            self._prune()
+
+        logger.info(f"Snapshot at height {block.index}: {len(chunks)} chunks, "
+                    f"content hash {manifest['content_hash'][:12]}...")
+        return manifest
+
+    def _heights(self) -> List[int]:
+        if not os.path.isdir(self.snapshot_dir):
+            return []
+        return sorted(int(name) for name in os.listdir(self.snapshot_dir) if name.isdigit())
+
+    def _prune(self):
+        for height in self._heights()[:-self.keep or None]:
+            shutil.rmtree(os.path.join(self.snapshot_dir, str(height)), ignore_errors=True)
+
+    # Serving
+
+    def latest_manifest(self) -> Optional[dict]:
+        with self.lock:
+            if self._latest is None:
+                heights = self._heights()
+                if heights:
+                    self._latest = self.load_manifest(heights[-1])
+            return self._latest
+
+    def load_manifest(self, height: int) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.snapshot_dir, str(int(height)), "manifest.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load_chunk(self, height: int, index: int) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.snapshot_dir, str(int(height)), f"chunk_{int(index)}.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # Verification and import
+
+    @staticmethod
+    def verify_manifest(manifest: dict) -> bool:
+        try:
+            if manifest.get('version') != SNAPSHOT_VERSION:
+                return False
+            if set(manifest['tables']) - set(SNAPSHOT_TABLES):
+                return False
+            block = Block.from_dict(manifest['block'])
+            if block.index != manifest['height'] or block.hash != block.calculate_hash():
+                return False
+            return manifest['content_hash'] == content_hash(manifest)
+        except (KeyError, TypeError, ValueError):
+            return False
+
+    @staticmethod
+    def verify_chunk(manifest: dict, chunk: dict) -> bool:
+        try:
+            expected = manifest['chunks'][chunk['index']]
+            return (expected['table'] == chunk['table']
+                    and expected['rows'] == len(chunk['rows'])
+                    and expected['hash'] == chunk_hash(chunk))
+        except (KeyError, IndexError, TypeError):
+            return False
+
+    def import_snapshot(self, manifest: dict, chunks: Dict[int, dict]) -> Block:
+        """Replace local state and chain with the snapshot in a single transaction"""
+        if not self.verify_manifest(manifest):
+            raise ValueError("Snapshot manifest failed verification")
+        for index in range(len(manifest['chunks'])):
+            if index not in chunks or not self.verify_chunk(manifest, chunks[index]):
+                raise ValueError(f"Snapshot chunk {index} is missing or corrupt")
+
+        anchor = Block.from_dict(manifest['block'])
+        block_data = manifest['block']
+        anchor.cumulative_weight = float(block_data.get('cumulative_weight', anchor.stake_amount or 0))
+
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN")
+            cursor.execute("DELETE FROM gas_usage")
+            cursor.execute("DELETE FROM transactions")
+            cursor.execute("DELETE FROM blocks")
+            for table in reversed(list(SNAPSHOT_TABLES)):
+                cursor.execute(f"DELETE FROM {table}")
+
+            for index in range(len(manifest['chunks'])):
+                chunk = chunks[index]
+                columns = SNAPSHOT_TABLES[chunk['table']]
+                cursor.executemany(
+                    f"INSERT INTO {chunk['table']} ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' for _ in columns)})",
+                    chunk['rows']
+                )
+
+            cursor.execute('''
+                INSERT INTO blocks (
+                    "index", timestamp, previous_hash,
+                    hash, nonce, difficulty,
+                    validator, stake_amount, signature,
+                    slot, vrf_proof, cumulative_weight
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (anchor.index, anchor.timestamp, anchor.previous_hash, anchor.hash,
+                  block_data.get('nonce', 0), block_data.get('difficulty', anchor.difficulty),
+                  anchor.validator, anchor.stake_amount, anchor.signature,
+                  anchor.slot, anchor.vrf_proof, anchor.cumulative_weight))
+            block_id = cursor.lastrowid
+            cursor.executemany('''
+                INSERT OR IGNORE INTO transactions (
+                    block_id, tx_hash, sender, recipient,
+                    amount, data, timestamp, signature
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(block_id, tx.tx_hash, tx.sender, tx.recipient, tx.amount,
+                   json.dumps(tx.data), tx.timestamp, tx.signature) for tx in anchor.transactions])
+
+            cursor.execute('''
+                UPDATE chain_state
+                SET total_blocks = 1, last_block_hash = ?, last_block_timestamp = ?,
+                    snapshot_height = ?, snapshot_hash = ?, last_updated = strftime('%s', 'now')
+                WHERE id = 1
+            ''', (anchor.hash, anchor.timestamp, anchor.index, anchor.hash))
+            conn.commit()
+
+        rows = sum(chunk['rows'] for chunk in manifest['chunks'])
+        logger.info(f"Imported snapshot at height {anchor.index} ({rows} rows)")
+        return anchor
+
+    @staticmethod
+    def get_anchor() -> Optional[tuple]:
+        """(height, hash) of the snapshot the local chain starts from, if any"""
+        try:
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT snapshot_height, snapshot_hash FROM chain_state WHERE id = 1")
+                row = cursor.fetchone()
+        except Exception:
+            return None
+        if row and row[0] is not None:
+            return row[0], row[1]
+        return None
@@ -66,7 +66,12 @@ class Transaction:
             "data": self.data,
             "timestamp": self.timestamp,
             "signature": self.signature,
-            "contract_type": self.contract_type
+            "contract_type": self.contract_type,
+            "nonce": self.nonce,
+            "fee": self.fee,
+            "gas_limit": self.gas_limit,
+            "gas_price": self.gas_price,
+            "chain_id": self.chain_id
         }
 
     @classmethod
@@ -80,7 +85,12 @@ class Transaction:
             timestamp=data['timestamp'],
             signature=data.get('signature', ''),
             tx_hash=data.get('tx_hash'),
-            contract_type=data.get('contract_type', 'NORMAL')
+            contract_type=data.get('contract_type', 'NORMAL'),
+            nonce=data.get('nonce', 0),
+            fee=data.get('fee', 0.01),
+            gas_limit=data.get('gas_limit', 1000000),
+            gas_price=data.get('gas_price', 0.0001),
+            chain_id=data.get('chain_id', 1)
         )
 
     def calculate_hash(self) -> str:
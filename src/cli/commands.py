@@ -1,8 +1,6 @@
 # Deprecated
 
 import time
-import random
-from src.blockchain.block import Block
 from src.blockchain.contracts.contract_transaction import ContractTransaction
 from src.blockchain.transaction import Transaction
 from src.blockchain.consensus.stake_manager import StakeManager
@@ -135,28 +133,16 @@ class CommandExecutor:
         display_validators(validators)
 
     def mine_block(self):
-        """Manual block mining - Only mine if we are the selected validator"""
+        """Manual block mining - Only mine if the node's validator key leads the current slot"""
         if not self.node.blockchain.chain:
             print_error("Blockchain is not initialized")
             return
 
-        # Get validators from our wallet that have stake
-        my_validators = self._get_validators_in_wallet()
-        for account_name, account in self.node.wallet.accounts.items():
-            address = account.get('address')
-            stake = ValidatorRegistry.get_validator_stake(address) if address else 0
-            if stake > 0:
-                my_validators.append({
-                    'address': address,
-                    'stake': stake,
-                    'private_key': account.get('private_key'),
-                    'name': account_name
-                })
-
-        if not my_validators:
-            print_error("No validators found in your wallet with stake")
-            print_info("Please stake coins with one of your accounts first")
+        node_key = getattr(self.node, 'node_key', None)
+        if not node_key:
+            print_error("Node validator key not available")
             return
+        private_key, address = node_key
 
         transactions = list(self.node.mempool.transactions.values())
         if not transactions:
@@ -164,62 +150,18 @@ class CommandExecutor:
             return
 
         try:
-            # Select a validator from our wallet (weighted by stake)
-            total_stake = sum(v['stake'] for v in my_validators)
-            if total_stake <= 0:
-                print_error("Total stake is zero or negative")
-                return
-
-            selection_point = random.uniform(0, total_stake)
-            current_sum = 0
-            selected_validator = None
-
-            for validator in my_validators:
-                current_sum += validator['stake']
-                if current_sum >= selection_point:
-                    selected_validator = validator
-                    break
-
-            if not selected_validator:
-                print_error("Validator selection failed")
+            # Blocks need a slot: mine only if our validator leads the current one
+            blockchain = self.node.blockchain
+            slot = blockchain.election.slot_at(time.time())
+            last_block = blockchain.get_last_block()
+            nonce = blockchain.epoch_nonce(last_block, last_block.index + 1)
+            proof = nonce and blockchain.election.elect(private_key, address, slot, last_block.index + 1, nonce)
+            if not proof:
+                print_warning(f"Validator {address[:10]}... does not lead slot {slot}, try again later")
                 return
 
-            print_info(f"Selected validator: {selected_validator['name']} ({selected_validator['address'][:10]}...)")
-
-            # Load private key
-            private_key_pem = selected_validator['private_key']
-            if not private_key_pem:
-                print_error(f"Private Key not found for validator: {selected_validator['address']}")
-                return
-
-            from cryptography.hazmat.primitives.serialization import load_pem_private_key
-            private_key = load_pem_private_key(
-                private_key_pem.encode('utf-8'),
-                password=None
-            )
-
-            # Create new block
-            last_block = self.node.blockchain.get_last_block()
-
-            new_block = Block(
-                index=last_block.index + 1,
-                timestamp=int(time.time()),
-                transactions=transactions,
-                previous_hash=last_block.hash,
-                validator=selected_validator['address'],
-                stake_amount=selected_validator['stake'],
-                difficulty=self.node.blockchain.difficulty
-            )
-
-            # Sign the block
-            new_block.sign_block(private_key, new_block.stake_amount)
-
-            # Add block to blockchain
-            added_block = self.node.blockchain.add_block(
-                block=new_block,
-                external_block=None,
-                selected_validator_address=selected_validator['address']
-            )
+            # Added through the chain's own validation, which also broadcasts it
+            added_block = blockchain.create_block(transactions, private_key, slot, proof, time.time())
 
             if added_block:
                 print_success(f"✅ Block #{added_block.index} mined successfully!")
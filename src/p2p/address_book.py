@@ -0,0 +1,183 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from src.utils.database import db_connection
+from src.utils.logger import logger
+
+Peer = Tuple[str, int]
+
+MAX_ENTRIES = 1000
+DEFAULT_LATENCY = 1.0      # seconds assumed for peers we never reached
+RETRY_BASE = 5.0           # seconds before retrying a peer after its first failure
+RETRY_MAX = 3600.0
+MAX_FAILURES = 10          # consecutive failures before an entry is forgotten
+
+
+@dataclass
+class PeerEntry:
+    """What we know about one peer's listening address"""
+    host: str
+    port: int
+    last_seen: float = 0.0
+    last_success: float = 0.0
+    last_attempt: float = 0.0
+    latency: Optional[float] = None
+    failures: int = 0
+
+    @property
+    def address(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    @property
+    def peer(self) -> Peer:
+        return (self.host, self.port)
+
+    def retry_at(self) -> float:
+        if not self.failures:
+            return 0.0
+        return self.last_attempt + min(RETRY_MAX, RETRY_BASE * 2 ** (self.failures - 1))
+
+    def rank(self) -> tuple:
+        """Lower is better: reachable peers first, then by latency, then by recency"""
+        latency = self.latency if self.latency is not None else DEFAULT_LATENCY
+        return (self.failures, latency, -self.last_success)
+
+
+class AddressBook:
+    """Known peer addresses with reachability stats, persisted in the nodes table"""
+
+    def __init__(self, persist: bool = True, clock: Callable[[], float] = time.time):
+        self.persist = persist
+        self.clock = clock
+        self.entries: Dict[Peer, PeerEntry] = {}
+        self.lock = threading.Lock()
+        if persist:
+            self.load()
+
+    def load(self):
+        """Load previously seen peers from the database"""
+        try:
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT host, port, last_seen, last_success, latency, failures
+                    FROM nodes WHERE host IS NOT NULL AND port IS NOT NULL
+                ''')
+                rows = cursor.fetchall()
+        except Exception as e:
+            logger.warning(f"Could not load address book: {e}")
+            return
+
+        with self.lock:
+            for host, port, last_seen, last_success, latency, failures in rows:
+                self.entries[(host, int(port))] = PeerEntry(
+                    host=host,
+                    port=int(port),
+                    last_seen=last_seen or 0.0,
+                    last_success=last_success or 0.0,
+                    latency=latency,
+                    failures=failures or 0
+                )
+        logger.info(f"Loaded {len(rows)} peers from address book")
+
+    def _save(self, entry: PeerEntry):
+        if not self.persist:
+            return
+        try:
+            with db_connection() as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO nodes
+                        (address, host, port, last_seen, last_success, latency, failures)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (entry.address, entry.host, entry.port, entry.last_seen,
+                      entry.last_success, entry.latency, entry.failures))
+                conn.commit()
+        except Exception as e:
+            logger.warning(f"Could not save peer {entry.address}: {e}")
+
+    def _delete(self, entry: PeerEntry):
+        if not self.persist:
+            return
+        try:
+            with db_connection() as conn:
+                conn.execute("DELETE FROM nodes WHERE address = ?", (entry.address,))
+                conn.commit()
+        except Exception as e:
+            logger.warning(f"Could not delete peer {entry.address}: {e}")
+
+    def add(self, host: str, port: int) -> bool:
+        """Remember an advertised address; True if it was new"""
+        peer = (host, int(port))
+        with self.lock:
+            if peer in self.entries:
+                return False
+            entry = PeerEntry(host=host, port=int(port), last_seen=self.clock())
+            self.entries[peer] = entry
+            evicted = self._evict() if len(self.entries) > MAX_ENTRIES else None
+
+        if evicted is not None:
+            self._delete(evicted)
+        self._save(entry)
+        return True
+
+    def _evict(self) -> Optional[PeerEntry]:
+        worst = max(self.entries.values(), key=lambda entry: (entry.rank(), -entry.last_seen))
+        return self.entries.pop(worst.peer)
+
+    def record_attempt(self, peer: Peer):
+        with self.lock:
+            entry = self.entries.get(peer)
+            if entry:
+                entry.last_attempt = self.clock()
+
+    def record_success(self, peer: Peer, latency: float):
+        """A dial succeeded; latency is smoothed so one slow connect doesn't demote a peer"""
+        with self.lock:
+            entry = self.entries.get(peer)
+            if entry is None:
+                entry = PeerEntry(host=peer[0], port=peer[1])
+                self.entries[peer] = entry
+            now = self.clock()
+            entry.last_seen = entry.last_success = now
+            entry.failures = 0
+            entry.latency = latency if entry.latency is None else 0.7 * entry.latency + 0.3 * latency
+        self._save(entry)
+
+    def record_failure(self, peer: Peer):
+        with self.lock:
+            entry = self.entries.get(peer)
+            if entry is None:
+                return
+            entry.failures += 1
+            entry.last_attempt = self.clock()
+            forget = entry.failures >= MAX_FAILURES and not entry.last_success
+            if forget:
+                del self.entries[peer]
+
+        if forget:
+            self._delete(entry)
+        else:
+            self._save(entry)
+
+    def best(self, count: int, exclude: Iterable[Peer] = ()) -> List[Peer]:
+        """Up to count dialable peers, best first; peers in backoff are skipped"""
+        excluded = set(exclude)
+        now = self.clock()
+        with self.lock:
+            candidates = [
+                entry for entry in self.entries.values()
+                if entry.peer not in excluded and entry.retry_at() <= now
+            ]
+        candidates.sort(key=PeerEntry.rank)
+        return [entry.peer for entry in candidates[:count]]
+
+    def get_stats(self) -> List[dict]:
+        with self.lock:
+            entries = sorted(self.entries.values(), key=PeerEntry.rank)
+            return [{
+                'address': entry.address,
+                'latency_ms': round(entry.latency * 1000, 1) if entry.latency is not None else None,
+                'failures': entry.failures,
+                'last_success': entry.last_success
+            } for entry in entries]
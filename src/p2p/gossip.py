@@ -0,0 +1,201 @@
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Set, Tuple
+from src.utils.logger import logger
+
+Peer = Tuple[str, int]
+
+SEEN_CACHE_SIZE = 20000      # message ids remembered to suppress duplicates
+MESSAGE_CACHE_SIZE = 5000    # recent payloads kept to answer iwant requests
+IWANT_TIMEOUT = 3.0          # seconds before asking another peer for the same id
+MAX_IDS_PER_ANNOUNCEMENT = 512
+
+
+class GossipRouter:
+    """Bounded-fanout gossip instead of sending everything to every peer.
+
+    Blocks are pushed eagerly to a stable mesh of peers and transactions to a
+    random subset; every other peer only gets a lazy `ihave` announcement with
+    the message ids and pulls what it is missing with `iwant`. Fanout is either
+    a fixed number or ceil(sqrt(n)) when `fanout` is None.
+    """
+
+    def __init__(self, network, fanout: Optional[int] = None, lazy: bool = True,
+                 rng: random.Random = None):
+        self.network = network
+        self.fanout = fanout
+        self.lazy = lazy
+        self.rng = rng or random.Random()
+
+        self.mesh: Set[Peer] = set()
+        self.seen = OrderedDict()
+        self.messages = OrderedDict()   # id -> (kind, payload)
+        self.requested = {}             # id -> time of our last iwant
+        self.lock = threading.RLock()
+
+        self.eager_sent = 0
+        self.lazy_sent = 0
+
+    # Peer selection
+
+    def target_count(self, peer_count: int) -> int:
+        if peer_count <= 0:
+            return 0
+        if self.fanout is not None:
+            return min(self.fanout, peer_count)
+        return min(peer_count, max(1, math.ceil(math.sqrt(peer_count))))
+
+    def refresh_mesh(self) -> Set[Peer]:
+        """Drop departed peers from the block mesh and top it up to the fanout"""
+        with self.lock:
+            peers = set(self.network.peers)
+            self.mesh &= peers
+            wanted = self.target_count(len(peers))
+            if len(self.mesh) > wanted:
+                self.mesh = set(self.rng.sample(sorted(self.mesh), wanted))
+            elif len(self.mesh) < wanted:
+                candidates = sorted(peers - self.mesh)
+                self.mesh |= set(self.rng.sample(candidates, wanted - len(self.mesh)))
+            return set(self.mesh)
+
+    def remove_peer(self, peer: Peer):
+        with self.lock:
+            self.mesh.discard(peer)
+
+    def _split_peers(self, kind: str, exclude: Iterable[Peer]) -> Tuple[List[Peer], List[Peer]]:
+        """(eager, lazy) recipients for a new message"""
+        excluded = set(exclude or ())
+        peers = [peer for peer in self.network.peers if peer not in excluded]
+        if kind == "block":
+            eager = [peer for peer in self.refresh_mesh() if peer not in excluded]
+            if not eager:
+                eager = self.rng.sample(peers, self.target_count(len(peers)))
+        else:
+            eager = self.rng.sample(peers, self.target_count(len(peers)))
+
+        eager_set = set(eager)
+        lazy = [peer for peer in peers if peer not in eager_set] if self.lazy else []
+        return eager, lazy
+
+    # Seen / message caches
+
+    def mark_seen(self, msg_id: str) -> bool:
+        """Record an id; True if it had not been seen before"""
+        with self.lock:
+            if msg_id in self.seen:
+                self.seen.move_to_end(msg_id)
+                return False
+            self.seen[msg_id] = True
+            self.requested.pop(msg_id, None)
+            while len(self.seen) > SEEN_CACHE_SIZE:
+                self.seen.popitem(last=False)
+            return True
+
+    def has_seen(self, msg_id: str) -> bool:
+        with self.lock:
+            return msg_id in self.seen
+
+    def _cache(self, msg_id: str, kind: str, payload):
+        with self.lock:
+            self.messages[msg_id] = (kind, payload)
+            self.messages.move_to_end(msg_id)
+            while len(self.messages) > MESSAGE_CACHE_SIZE:
+                self.messages.popitem(last=False)
+
+    # Publishing
+
+    def publish_block(self, message: dict, block_hash: str, exclude: Iterable[Peer] = None) -> int:
+        """Push a block message to the mesh and announce it to everyone else; returns peers reached"""
+        self.mark_seen(block_hash)
+        self._cache(block_hash, "block", message)
+        eager, lazy = self._split_peers("block", exclude)
+        self._send_all(message, eager, lazy, "block", [block_hash])
+        return len(eager) + len(lazy)
+
+    def publish_transactions(self, tx_dicts: List[dict], exclude: Iterable[Peer] = None) -> int:
+        """Push a transaction batch to a random subset and announce it to everyone else; returns peers reached"""
+        tx_hashes = []
+        for tx_data in tx_dicts:
+            tx_hash = tx_data.get('tx_hash')
+            if tx_hash:
+                self.mark_seen(tx_hash)
+                self._cache(tx_hash, "tx", tx_data)
+                tx_hashes.append(tx_hash)
+
+        eager, lazy = self._split_peers("tx", exclude)
+        message = {"type": "transactions", "data": tx_dicts}
+        self._send_all(message, eager, lazy, "tx", tx_hashes)
+        return len(eager) + len(lazy)
+
+    def _send_all(self, message: dict, eager: List[Peer], lazy: List[Peer], kind: str, ids: List[str]):
+        for peer in eager:
+            self._send(dict(message), peer)
+        self.eager_sent += len(eager)
+
+        if ids:
+            for start in range(0, len(ids), MAX_IDS_PER_ANNOUNCEMENT):
+                announcement = {"type": "ihave", "kind": kind, "ids": ids[start:start + MAX_IDS_PER_ANNOUNCEMENT]}
+                for peer in lazy:
+                    self._send(dict(announcement), peer)
+            self.lazy_sent += len(lazy)
+
+    def _send(self, message: dict, peer: Peer):
+        try:
+            self.network.send_message(message, peer)
+        except Exception as e:
+            logger.error(f"Gossip send to {peer} failed: {e}")
+
+    # Lazy pull
+
+    def handle_ihave(self, ids: List[str], peer: Peer):
+        """Request the announced ids we have neither seen nor recently asked for"""
+        now = time.monotonic()
+        with self.lock:
+            wanted = []
+            for msg_id in ids[:MAX_IDS_PER_ANNOUNCEMENT]:
+                if not isinstance(msg_id, str) or msg_id in self.seen:
+                    continue
+                if now - self.requested.get(msg_id, float('-inf')) < IWANT_TIMEOUT:
+                    continue
+                self.requested[msg_id] = now
+                wanted.append(msg_id)
+            if len(self.requested) > SEEN_CACHE_SIZE:
+                cutoff = now - IWANT_TIMEOUT
+                self.requested = {k: t for k, t in self.requested.items() if t > cutoff}
+
+        if wanted:
+            self._send({"type": "iwant", "ids": wanted}, peer)
+
+    def handle_iwant(self, ids: List[str], peer: Peer):
+        """Send cached payloads for the requested ids"""
+        blocks = []
+        txs = []
+        with self.lock:
+            for msg_id in ids[:MAX_IDS_PER_ANNOUNCEMENT]:
+                cached = self.messages.get(msg_id)
+                if cached is None:
+                    continue
+                kind, payload = cached
+                if kind == "block":
+                    blocks.append(payload)
+                else:
+                    txs.append(payload)
+
+        for message in blocks:
+            self._send(dict(message), peer)
+        if txs:
+            self._send({"type": "transactions", "data": txs}, peer)
+
+    def get_metrics(self) -> dict:
+        with self.lock:
+            return {
+                'fanout': self.fanout if self.fanout is not None else 'sqrt',
+                'mesh': [f"{host}:{port}" for host, port in sorted(self.mesh)],
+                'eager_sent': self.eager_sent,
+                'lazy_sent': self.lazy_sent,
+                'seen': len(self.seen),
+                'cached': len(self.messages)
+            }
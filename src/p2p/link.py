@@ -0,0 +1,57 @@
+import random
+import threading
+
+
+class LinkConditioner:
+    """Artificial latency and packet loss for outgoing messages (testing and simulation)"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, loss: float = 0.0,
+                 rng: random.Random = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = rng or random.Random()
+
+    def should_drop(self) -> bool:
+        return self.loss > 0 and self.rng.random() < self.loss
+
+    def delay(self) -> float:
+        if self.jitter:
+            return max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+        return self.latency
+
+
+class TrafficStats:
+    """Message and byte counters for a node's P2P traffic"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.messages_sent = 0
+        self.messages_received = 0
+        self.messages_dropped = 0
+
+    def record_sent(self, size: int):
+        with self.lock:
+            self.bytes_sent += size
+            self.messages_sent += 1
+
+    def record_received(self, size: int):
+        with self.lock:
+            self.bytes_received += size
+            self.messages_received += 1
+
+    def record_dropped(self):
+        with self.lock:
+            self.messages_dropped += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'messages_sent': self.messages_sent,
+                'messages_received': self.messages_received,
+                'messages_dropped': self.messages_dropped
+            }
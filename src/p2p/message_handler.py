@@ -1,13 +1,160 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
 from src.blockchain.block import Block
+from src.blockchain.consensus.finality import Attestation
+from src.blockchain.snapshot import endorse
 from src.blockchain.transaction import Transaction
 from src.utils.logger import logger
 
+MAX_BLOCKS_PER_REQUEST = 128
+
+# Lanes in priority order; workers always serve the highest non-empty lane
+LANES = ("blocks", "sync", "transactions", "peers")
+LANE_CAPACITY = {"blocks": 1000, "sync": 1000, "transactions": 10000, "peers": 200}
+MESSAGE_LANES = {
+    "new_block": "blocks",
+    "attestation": "blocks",
+    "get_status": "sync",
+    "status": "sync",
+    "get_blocks": "sync",
+    "blocks": "sync",
+    "get_blockchain": "sync",
+    "blockchain": "sync",
+    "get_mempool": "sync",
+    "handshake": "sync",
+    "handshake_ack": "sync",
+    "iwant": "sync",
+    "get_snapshot_manifest": "sync",
+    "snapshot_manifest": "sync",
+    "get_snapshot_chunk": "sync",
+    "snapshot_chunk": "sync",
+    "mempool": "transactions",
+    "new_transaction": "transactions",
+    "transactions": "transactions",
+    "get_peers": "peers",
+    "peers": "peers",
+}
+DEFAULT_WORKERS = 4
+SHED_WATERMARK = 500  # queued higher-priority messages above which the lowest lane is shed
+
+@dataclass
+class Lane:
+    """Bounded queue for one class of messages"""
+    name: str
+    capacity: int
+    queue: deque = field(default_factory=deque)
+    serial: bool = False  # at most one worker at a time, preserving arrival order
+    busy: bool = False
+    processed: int = 0
+    dropped: int = 0
+    shed: int = 0
+    max_depth: int = 0
+    wait_time: float = 0.0
+
 class MessageHandler:
-    def __init__(self, network, blockchain, mempool):
+    def __init__(self, network, blockchain, mempool, workers: int = DEFAULT_WORKERS):
         self.network = network
         self.blockchain = blockchain
         self.mempool = mempool
-    
+
+        self.lanes = {
+            name: Lane(name, LANE_CAPACITY[name], serial=(name == "blocks")) for name in LANES
+        }
+        self.workers = workers
+        self._threads = []
+        self.condition = threading.Condition()
+
+    @staticmethod
+    def lane_for(message):
+        msg_type = message.get("type")
+        if msg_type == "ihave":
+            return "blocks" if message.get("kind") == "block" else "transactions"
+        return MESSAGE_LANES.get(msg_type, "peers")
+
+    def submit(self, message, addr):
+        """Queue a message for the worker pool; False if it was dropped"""
+        lane = self.lanes[self.lane_for(message)]
+        with self.condition:
+            if lane.name == LANES[-1] and self._backlog(exclude=lane.name) > SHED_WATERMARK:
+                lane.shed += 1
+                return False
+            if len(lane.queue) >= lane.capacity:
+                lane.dropped += 1
+                if lane.dropped % 100 == 1:
+                    logger.warning(f"Message lane '{lane.name}' is full, dropping {message.get('type')}")
+                return False
+            lane.queue.append((message, addr, time.monotonic()))
+            lane.max_depth = max(lane.max_depth, len(lane.queue))
+            self.condition.notify()
+
+        self._ensure_workers()
+        return True
+
+    def _backlog(self, exclude=None):
+        return sum(len(lane.queue) for lane in self.lanes.values() if lane.name != exclude)
+
+    def _ensure_workers(self):
+        if len(self._threads) >= self.workers:
+            return
+        with self.condition:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._worker, daemon=True, name=f"MessageWorker-{len(self._threads)}"
+                )
+                self._threads.append(thread)
+                thread.start()
+
+    def _next(self):
+        """Pop the next message from the highest-priority lane that can be served"""
+        for name in LANES:
+            lane = self.lanes[name]
+            if lane.queue and not (lane.serial and lane.busy):
+                message, addr, queued_at = lane.queue.popleft()
+                lane.busy = True
+                lane.wait_time += time.monotonic() - queued_at
+                return lane, message, addr
+        return None
+
+    def _worker(self):
+        while getattr(self.network, 'running', True):
+            with self.condition:
+                item = self._next()
+                while item is None:
+                    self.condition.wait(timeout=1.0)
+                    if not getattr(self.network, 'running', True):
+                        return
+                    item = self._next()
+
+            lane, message, addr = item
+            try:
+                self.handle_message(message, addr)
+            finally:
+                with self.condition:
+                    lane.busy = False
+                    lane.processed += 1
+                    if lane.serial and lane.queue:
+                        self.condition.notify()
+
+    def get_queue_metrics(self):
+        """Depth, throughput and drop counters for each lane"""
+        with self.condition:
+            return {
+                'workers': self.workers,
+                'lanes': {
+                    lane.name: {
+                        'depth': len(lane.queue),
+                        'capacity': lane.capacity,
+                        'max_depth': lane.max_depth,
+                        'processed': lane.processed,
+                        'dropped': lane.dropped,
+                        'shed': lane.shed,
+                        'avg_wait_ms': round(lane.wait_time / lane.processed * 1000, 2) if lane.processed else 0.0
+                    } for lane in self.lanes.values()
+                }
+            }
+
     def handle_message(self, message, addr):
         """Handle incoming messages from peers"""
         try:
@@ -25,9 +172,39 @@ class MessageHandler:
             elif msg_type == "mempool":
                 self.handle_mempool(message.get("data", []))
             elif msg_type == "new_block":
-                self.handle_new_block(message.get("data", {}))
+                self.handle_new_block(message.get("data", {}), addr)
             elif msg_type == "new_transaction":
                 self.handle_new_transaction(message.get("data", {}))
+            elif msg_type == "transactions":
+                self.handle_transactions(message.get("data", []))
+            elif msg_type == "get_status":
+                self.handle_get_status(addr)
+            elif msg_type == "status":
+                self.handle_status(message.get("data", {}), addr)
+            elif msg_type == "get_blocks":
+                self.handle_get_blocks(message.get("start", 0), message.get("end", 0), addr)
+            elif msg_type == "blocks":
+                self.handle_blocks(message.get("start", 0), message.get("data", []), addr)
+            elif msg_type == "attestation":
+                self.handle_attestation(message.get("data", {}), addr)
+            elif msg_type == "get_snapshot_manifest":
+                self.handle_get_snapshot_manifest(addr)
+            elif msg_type == "snapshot_manifest":
+                self.network.snapshot_sync.on_manifest(addr, message.get("data"), message.get("endorsement"))
+            elif msg_type == "get_snapshot_chunk":
+                self.handle_get_snapshot_chunk(message.get("height"), message.get("index"), addr)
+            elif msg_type == "snapshot_chunk":
+                self.network.snapshot_sync.on_chunk(
+                    addr, message.get("height"), message.get("index"), message.get("data")
+                )
+            elif msg_type == "handshake":
+                self.handle_handshake(message.get("data", {}), addr)
+            elif msg_type == "handshake_ack":
+                self.handle_handshake_ack(message.get("data", {}), addr)
+            elif msg_type == "ihave":
+                self.network.gossip.handle_ihave(message.get("ids", []), addr)
+            elif msg_type == "iwant":
+                self.network.gossip.handle_iwant(message.get("ids", []), addr)
             elif msg_type == "get_peers":
                 self.handle_get_peers(addr)
             elif msg_type == "peers":
@@ -40,6 +217,25 @@ class MessageHandler:
         except Exception as e:
             logger.error(f"Error handling message from {addr}: {e}")
 
+    def _penalize(self, addr, offense):
+        """Report peer misbehavior to the network's accounting"""
+        accounting = getattr(self.network, 'peer_accounting', None)
+        if accounting and addr:
+            accounting.penalize(addr, offense)
+
+    def handle_handshake(self, data, addr):
+        """Authenticate a peer's node key and answer with our half of the session"""
+        reply = self.network.sessions.accept_handshake(addr, data)
+        if reply is None:
+            self._penalize(addr, "bad_signature")
+            return
+        self.network.send_message(reply, addr)
+
+    def handle_handshake_ack(self, data, addr):
+        """Install the session negotiated with a peer"""
+        if self.network.sessions.complete_handshake(data) is None:
+            logger.warning(f"Unexpected or invalid handshake_ack from {addr}")
+
     def handle_get_blockchain(self, addr):
         """Send blockchain to requesting peer"""
         try:
@@ -52,21 +248,95 @@ class MessageHandler:
             logger.error(f"Error sending blockchain to {addr}: {e}")
 
     def handle_blockchain(self, chain_data):
-        """Process received blockchain"""
+        """Process received blockchain through the block tree, so forks reorg with undo journals"""
         if not chain_data:
             logger.error("Empty blockchain received")
             return
 
         try:
-            received_chain = [Block.from_dict(block) for block in chain_data]
-            
-            if (self.blockchain.is_chain_valid(received_chain) and 
-                len(received_chain) > len(self.blockchain.chain)):
-                self.blockchain.chain = received_chain
-                logger.info("Blockchain replaced with longer valid chain")
+            added = 0
+            for block_data in chain_data:
+                block = Block.from_dict(block_data)
+                if self.blockchain.tree.contains(block.hash):
+                    continue
+                if self.blockchain.add_block(None, external_block=block):
+                    added += 1
+            if added:
+                logger.info(f"Accepted {added} blocks from received chain")
         except Exception as e:
             logger.error(f"Error processing blockchain: {e}")
 
+    def handle_get_status(self, addr):
+        """Send our chain height to requesting peer"""
+        try:
+            last_block = self.blockchain.get_last_block()
+            self.network.send_message({
+                "type": "status",
+                "data": {
+                    "height": last_block.index if last_block else -1,
+                    "hash": last_block.hash if last_block else None
+                }
+            }, addr)
+        except Exception as e:
+            logger.error(f"Error sending status to {addr}: {e}")
+
+    def handle_status(self, status, addr):
+        """Track peer height and start downloading if the peer is ahead"""
+        height = status.get("height")
+        if height is None:
+            return
+        if self.network.snapshot_sync.on_status(addr, height):
+            return
+        self.network.sync_scheduler.update_peer_height(addr, height)
+
+    def handle_get_snapshot_manifest(self, addr):
+        """Offer our latest state snapshot (data is None if we have none), endorsed if we validate"""
+        try:
+            manifest = self.blockchain.snapshots.latest_manifest()
+            message = {"type": "snapshot_manifest", "data": manifest}
+            signer = self.blockchain.finality.signer
+            if manifest and signer:
+                message["endorsement"] = endorse(manifest, *signer)
+            self.network.send_message(message, addr)
+        except Exception as e:
+            logger.error(f"Error sending snapshot manifest to {addr}: {e}")
+
+    def handle_get_snapshot_chunk(self, height, index, addr):
+        """Send one chunk of a stored snapshot"""
+        try:
+            chunk = self.blockchain.snapshots.load_chunk(height, index)
+            self.network.send_message({
+                "type": "snapshot_chunk",
+                "height": height,
+                "index": index,
+                "data": chunk
+            }, addr)
+        except (TypeError, ValueError):
+            self._penalize(addr, "malformed_message")
+        except Exception as e:
+            logger.error(f"Error sending snapshot chunk {index} to {addr}: {e}")
+
+    def handle_get_blocks(self, start, end, addr):
+        """Send a range of blocks to requesting peer"""
+        try:
+            end = min(end, start + MAX_BLOCKS_PER_REQUEST - 1)
+            chain = self.blockchain.chain
+            base = chain[0].index if chain else 0
+            blocks = [
+                block.to_dict() for block in chain[max(start - base, 0):max(end - base + 1, 0)]
+            ]
+            self.network.send_message({
+                "type": "blocks",
+                "start": start,
+                "data": blocks
+            }, addr)
+        except Exception as e:
+            logger.error(f"Error sending blocks {start}-{end} to {addr}: {e}")
+
+    def handle_blocks(self, start, blocks_data, addr):
+        """Hand a downloaded block range to the sync scheduler"""
+        self.network.sync_scheduler.on_blocks(addr, start, blocks_data)
+
     def handle_get_mempool(self, addr):
         """Send mempool to requesting peer"""
         try:
@@ -92,7 +362,7 @@ class MessageHandler:
         except Exception as e:
             logger.error(f"Error processing mempool: {e}")
 
-    def handle_new_block(self, block_data):
+    def handle_new_block(self, block_data, addr=None):
         """Process new block from network"""
         if not block_data:
             logger.error("Empty block data received")
@@ -100,18 +370,63 @@ class MessageHandler:
 
         try:
             block = Block.from_dict(block_data)
-            last_block = self.blockchain.get_last_block()
-            
-            if block.index > last_block.index and block.is_valid(last_block):
-                if self.blockchain.add_block([], validator_private_key=None, external_block=block):
-                    logger.info(f"Added new block #{block.index} from network")
-                    
-                    # Remove transactions from mempool
+            gossip = self.network.gossip
+            if gossip.has_seen(block.hash):
+                return
+
+            tree = self.blockchain.tree
+            if tree.contains(block.hash):
+                gossip.mark_seen(block.hash)
+                return
+            parent = tree.get(block.previous_hash)
+            if parent is None:
+                # Unknown parent: too old, or we are behind and block sync will fetch it.
+                # Not marked seen, so a later announcement can still fetch it
+                return
+
+            if not block.is_valid(parent.block):
+                if block.index == parent.block.index + 1:
+                    gossip.mark_seen(block.hash)
+                    self._penalize(addr, "invalid_block")
+                return
+
+            if self.blockchain.add_block([], validator_private_key=None, external_block=block):
+                logger.info(f"Added new block #{block.index} from network")
+
+                # Relay to our own mesh (marking it seen); the sender already has it
+                gossip.publish_block(
+                    {"type": "new_block", "data": block_data}, block.hash, exclude=[addr]
+                )
+
+                # Remove transactions from mempool once the block is on the main chain
+                if self.blockchain.get_last_block().hash == block.hash:
                     tx_hashes = [tx.tx_hash for tx in block.transactions]
                     self.mempool.remove_transactions(tx_hashes)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Malformed block from {addr}: {e}")
+            self._penalize(addr, "malformed_message")
         except Exception as e:
             logger.error(f"Error processing new block: {e}")
 
+    def handle_attestation(self, data, addr=None):
+        """Record a checkpoint vote and relay it if it was new to us"""
+        try:
+            attestation = Attestation.from_dict(data)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Malformed attestation from {addr}: {e}")
+            self._penalize(addr, "malformed_message")
+            return
+
+        if not self.network.gossip.mark_seen(attestation.id):
+            return
+        added = self.blockchain.add_attestation(attestation)
+        if added is None:
+            self._penalize(addr, "bad_attestation")
+        elif added:
+            self.network.gossip.publish_block(
+                {"type": "attestation", "data": data}, attestation.id, exclude=[addr]
+            )
+
     def handle_new_transaction(self, tx_data):
         """Process new transaction from network"""
         if not tx_data:
@@ -126,6 +441,28 @@ class MessageHandler:
         except Exception as e:
             logger.error(f"Error processing new transaction: {e}")
 
+    def handle_transactions(self, txs_data):
+        """Process a batch of transactions from network"""
+        if not isinstance(txs_data, list):
+            logger.error("Malformed transaction batch received")
+            return
+
+        added = 0
+        for tx_data in txs_data:
+            try:
+                # Only the recomputed hash of an admitted tx is trusted as a gossip id
+                tx = Transaction.from_dict(tx_data)
+                if self.network.gossip.has_seen(tx.tx_hash) or tx.tx_hash in self.mempool.transactions:
+                    continue
+                if self.mempool.add_transaction(tx):
+                    self.network.gossip.mark_seen(tx.tx_hash)
+                    added += 1
+            except Exception as e:
+                logger.error(f"Error processing transaction in batch: {e}")
+
+        if added:
+            logger.info(f"Added {added}/{len(txs_data)} transactions from network batch")
+
     def handle_get_peers(self, addr):
         """Send peer list to requesting peer"""
         try:
@@ -3,20 +3,42 @@ import threading
 import json
 from src.p2p.message_handler import MessageHandler
 from src.p2p.peer_discovery import PeerDiscovery
+from src.p2p.sync_scheduler import BlockDownloadScheduler
+from src.p2p.peer_accounting import PeerAccounting
+from src.p2p.tx_batcher import TransactionBatcher
+from src.p2p.gossip import GossipRouter
+from src.p2p.snapshot_sync import SnapshotSync
+from src.p2p.link import TrafficStats
+from src.p2p.session import SessionManager, SESSION_FRAME_MARKER, SESSION_HEADER_SIZE, verify_detached
 from src.blockchain.chain import Blockchain
 from src.utils.logger import logger
-from src.utils.crypto import sign_data, verify_signature
+from src.utils.crypto import sign_data
+from cryptography.hazmat.primitives.asymmetric import ec
+
+HANDSHAKE_TYPES = ("handshake", "handshake_ack")
 
 class P2PNetwork:
-    def __init__(self, host, port, blockchain: Blockchain):
+    def __init__(self, host, port, blockchain: Blockchain, bootstrap_nodes=None):
         self.host = host
         self.port = port
         self.blockchain = blockchain
         self.mempool = None
         self.peers = set()
         self.running = True
-        self.peer_discovery = PeerDiscovery(self)
+        self.peer_accounting = PeerAccounting()
+        self.traffic = TrafficStats()
+        self.link = None  # optional LinkConditioner for simulated latency/loss
+
+        # Node identity key: authenticates the handshake, sessions MAC everything else
+        self.node_key = ec.generate_private_key(ec.SECP256K1())
+        self.sessions = SessionManager(self.node_key)
+        self.public_key_pem = self.sessions.public_key_pem
+        self.peer_discovery = PeerDiscovery(self, bootstrap_nodes=bootstrap_nodes)
         self.message_handler = MessageHandler(self, blockchain, self.mempool)
+        self.sync_scheduler = BlockDownloadScheduler(self)
+        self.gossip = GossipRouter(self)
+        self.tx_batcher = TransactionBatcher(self)
+        self.snapshot_sync = SnapshotSync(self)
         
         # Start listening socket
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -51,6 +73,10 @@ class P2PNetwork:
         while self.running:
             try:
                 conn, addr = self.socket.accept()
+                if self.peer_accounting.is_banned(addr):
+                    logger.info(f"Rejected connection from banned peer {addr[0]}")
+                    conn.close()
+                    continue
                 logger.info(f"New connection from {addr}")
                 conn.settimeout(10.0)  # Set connection timeout
                 threading.Thread(
@@ -84,34 +110,68 @@ class P2PNetwork:
                         if not raw_length:
                             return
                         
-                        # Receive actual message
+                        # Reject oversize frames before reading them
                         length = int(raw_length.decode().strip())
-                        data = conn.recv(length)
+                        if length > MAX_MSG_SIZE:
+                            logger.warning(f"Message from {peer_id} exceeds max size: {length} bytes")
+                            self.peer_accounting.penalize(addr, "oversize_frame")
+                            break
+
+                        # Receive actual message
+                        data = self._recv_exact(conn, length)
                         if not data:
                             break
+                        self.traffic.record_received(len(raw_length) + len(data))
 
-                        if length > MAX_MSG_SIZE:
-                            logger.warning(f"Message from {peer_id} exceeds max size: {length} bytes")
-                            continue
+                        if data[:1] == SESSION_FRAME_MARKER:
+                            # Session frame: a keyed hash instead of a signature
+                            session, body = self.sessions.open_frame(data)
+                            if session is None:
+                                self._handshake_unknown_session(data, addr)
+                                continue
+                            if body is None:
+                                logger.warning(f"Invalid session MAC from {peer_id}")
+                                if self.peer_accounting.penalize(addr, "bad_signature"):
+                                    break
+                                continue
 
-                        # Parse message
-                        message = json.loads(data.decode())
-                        
-                        # Verify message signature
-                        if not self.verify_message(message):
-                            logger.warning(f"Invalid message signature from {peer_id}")
-                            continue
-                        
-                        # Process message
-                        self.message_handler.handle_message(message, addr)
+                            message = json.loads(body.decode())
+                            peer = session.peer
+                            if not self.peer_accounting.allow(peer, message.get("type"), length):
+                                if self.peer_accounting.is_banned(peer):
+                                    break
+                                continue
+                        else:
+                            # Parse message
+                            message = json.loads(data.decode())
+                            peer = self._resolve_peer(message, addr)
+
+                            # Charge the peer before doing any expensive work for it
+                            if not self.peer_accounting.allow(peer, message.get("type"), length):
+                                if self.peer_accounting.is_banned(peer):
+                                    break
+                                continue
+
+                            # Verify message signature
+                            if not self.verify_message(message):
+                                logger.warning(f"Invalid message signature from {peer_id}")
+                                if self.peer_accounting.penalize(peer, "bad_signature"):
+                                    break
+                                continue
+
+
+                        # Hand off to the worker pool so slow handlers don't block this reader
+                        self.message_handler.submit(message, peer)
                     except socket.timeout:
                         # Send keep-alive
                         try:
                             conn.send(b'PING')
                         except:
                             break
-                    except json.JSONDecodeError:
+                    except (json.JSONDecodeError, ValueError):
                         logger.warning(f"Invalid JSON from {peer_id}")
+                        if self.peer_accounting.penalize(addr, "malformed_message"):
+                            break
                     except Exception as e:
                         logger.error(f"Error handling message from {peer_id}: {e}")
                         break
@@ -121,16 +181,57 @@ class P2PNetwork:
             logger.info(f"Connection closed with {peer_id}")
             if addr in self.peers:
                 self.peers.remove(addr)
+                self.sync_scheduler.remove_peer(addr)
+                self.gossip.remove_peer(addr)
+                self.snapshot_sync.remove_peer(addr)
+
+    @staticmethod
+    def _recv_exact(conn, length):
+        """Read exactly length bytes from the socket (or fewer if it closes)"""
+        chunks = []
+        remaining = length
+        while remaining > 0:
+            chunk = conn.recv(min(remaining, 65536))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b''.join(chunks)
+
+    def _handshake_unknown_session(self, data, addr):
+        """A peer used a session we don't know (e.g. we restarted): renegotiate"""
+        try:
+            body = json.loads(data[SESSION_HEADER_SIZE:].decode())
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return
+        peer = self._resolve_peer(body, addr)
+        if self.peer_accounting.allow(peer, "handshake"):
+            self._start_handshake(peer)
+
+    def _start_handshake(self, peer):
+        handshake = self.sessions.create_handshake(peer)
+        if handshake:
+            self.send_message(handshake, peer)
+
+    def _resolve_peer(self, message, addr):
+        """Map a connection address to the sender's listening address"""
+        listen_port = message.get('listen_port')
+        if isinstance(listen_port, int):
+            return (addr[0], listen_port)
+        return addr
 
     def connect_to_peer(self, host, port):
-        """Connect to a new peer"""
+        """Connect to a new peer; True if it is connected afterwards"""
         peer = (host, port)
         
         if peer == (self.host, self.port):
-            return  # Don't connect to self
+            return False  # Don't connect to self
         
         if peer in self.peers:
-            return  # Already connected
+            return True  # Already connected
+
+        if self.peer_accounting.is_banned(peer):
+            return False  # Temporarily banned for misbehavior
         
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -146,12 +247,13 @@ class P2PNetwork:
                 daemon=True
             ).start()
             
-            # Request blockchain and mempool
-            self.send_message({"type": "get_blockchain"}, peer)
+            # Request chain height (drives block download) and mempool
+            self.send_message({"type": "get_status"}, peer)
             self.send_message({"type": "get_mempool"}, peer)
-            
+            return True
         except Exception as e:
             logger.error(f"Failed to connect to {host}:{port}: {e}")
+            return False
     
     def broadcast_message(self, message):
         """Broadcast a message to all peers"""
@@ -166,69 +268,115 @@ class P2PNetwork:
                 # Remove disconnected peer
                 if peer in self.peers:
                     self.peers.remove(peer)
+                    self.sync_scheduler.remove_peer(peer)
+                    self.gossip.remove_peer(peer)
+                    self.snapshot_sync.remove_peer(peer)
 
     def send_message(self, message, peer):
         """Send a message to a specific peer"""
         host, port = peer
+        needs_session = False
         try:
-            # Sign message
-            signature = self.sign_message(message)
-            message['signature'] = signature
-            message['public_key'] = self.public_key_pem
+            message['listen_port'] = self.port
+
+            session = self.sessions.session_for(peer)
+            if session is not None:
+                data = session.seal(json.dumps(message).encode())
+            else:
+                # No session yet: fall back to a signed message and negotiate one
+                signature = self.sign_message(message)
+                message['signature'] = signature
+                message['public_key'] = self.public_key_pem
+                data = json.dumps(message).encode()
+                needs_session = message.get('type') not in HANDSHAKE_TYPES
 
-            data = json.dumps(message).encode()
             length = f"{len(data):<10}".encode()
-            
+        except Exception as e:
+            logger.error(f"Error encoding message to {host}:{port}: {e}")
+            return
+
+        if self.link is not None:
+            if self.link.should_drop():
+                self.traffic.record_dropped()
+            else:
+                delay = self.link.delay()
+                if delay > 0:
+                    timer = threading.Timer(delay, self._transmit, args=(peer, length + data))
+                    timer.daemon = True
+                    timer.start()
+                else:
+                    self._transmit(peer, length + data)
+        elif not self._transmit(peer, length + data):
+            return
+
+        if needs_session:
+            self._start_handshake(peer)
+
+    def _transmit(self, peer, frame):
+        """Write one frame to the peer; drop the peer if it is unreachable"""
+        host, port = peer
+        try:
             # Create a new socket for each message
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
                 sock.settimeout(5.0)
                 sock.connect((host, port))
-                sock.sendall(length + data)
+                sock.sendall(frame)
+            self.traffic.record_sent(len(frame))
+            return True
         except Exception as e:
             logger.error(f"Error sending message to {host}:{port}: {e}")
             # Remove disconnected peer
             if peer in self.peers:
                 self.peers.remove(peer)
+                self.sync_scheduler.remove_peer(peer)
+                self.gossip.remove_peer(peer)
+                self.snapshot_sync.remove_peer(peer)
+            self.sessions.forget_peer(peer)
+            return False
 
     def sign_message(self, message):
         data = json.dumps(message, sort_keys=True).encode()
-        return sign_data(data, self.blockchain.wallet.private_key)
+        return sign_data(self.node_key, data).hex()
     
     def verify_message(self, message):
-        signature = message.pop('signature')
-        public_key_pem = message.pop('public_key')
+        signature = message.pop('signature', None)
+        public_key_pem = message.pop('public_key', None)
+        if not signature or not public_key_pem:
+            return False
         data = json.dumps(message, sort_keys=True).encode()
-        return verify_signature(data, signature, public_key_pem)
+        return verify_detached(public_key_pem, signature, data)
     
     def broadcast_block(self, block):
-        """Broadcast a new block to the network"""
-        if len(block.transactions) > 10:
-            self.broadcast_message({
-                "type": "compact_block",
-                "data": block.to_compact()
-            })
-        else:
-            self.broadcast_message({
-                "type": "new_block",
-                "data": block.to_dict()
-            })
+        """Gossip a new block to the mesh and announce it to the other peers"""
+        # Always the full block: peers have no way to rebuild a block from transaction
+        # ids they are missing, so a compact form would strand them
+        self.gossip.publish_block({
+            "type": "new_block",
+            "data": block.to_dict()
+        }, block.hash)
     
+    def broadcast_attestation(self, attestation):
+        """Gossip our checkpoint vote; attestations travel the block path"""
+        self.gossip.publish_block({
+            "type": "attestation",
+            "data": attestation.to_dict()
+        }, attestation.id)
+
     def broadcast_transaction(self, transaction):
-        """Broadcast a new transaction to the network"""
-        self.broadcast_message({
-            "type": "new_transaction",
-            "data": transaction.to_dict()
-        })
+        """Queue a new transaction for the next batched broadcast"""
+        if not self.peers:
+            return
+        self.tx_batcher.add(transaction)
     
     def sync_blockchain(self):
-        """Sync blockchain with a random peer"""
+        """Ask every peer for its height; the scheduler downloads from all of them"""
         if not self.peers:
             return
-        
-        peer = list(self.peers)[0]
-        self.send_message({
-            "type": "get_blockchain"
-        }, peer)
+
+        for peer in list(self.peers):
+            self.send_message({
+                "type": "get_status"
+            }, peer)
     
     def sync_mempool(self):
         """Sync mempool with a random peer"""
@@ -0,0 +1,207 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Tuple, Union
+from src.utils.logger import logger
+
+# Tokens charged per message, roughly proportional to the work the server does for it
+MESSAGE_COSTS = {
+    "get_blockchain": 100,  # serializes the full chain
+    "get_mempool": 20,
+    "get_blocks": 10,
+    "get_peers": 2,
+    "get_status": 1,
+    "handshake": 20,        # ECDSA verify + ECDH
+    "get_snapshot_manifest": 5,
+    "get_snapshot_chunk": 20,  # reads and ships up to a thousand rows
+    "blockchain": 50,       # full chain validation
+    "blocks": 10,
+    "new_block": 5,
+    "attestation": 5,       # ECDSA verify
+    "mempool": 10,
+    "new_transaction": 1,
+    "transactions": 1,
+    "peers": 2,
+    "status": 1,
+    "ihave": 1,
+    "iwant": 5,
+}
+DEFAULT_MESSAGE_COST = 5
+
+# (refill tokens per second, burst capacity) per message type
+MESSAGE_LIMITS = {
+    "get_blockchain": (1.0, 200),
+    "get_mempool": (2.0, 60),
+    "get_blocks": (40.0, 400),
+    "get_peers": (1.0, 10),
+    "handshake": (0.5, 60),
+    "get_snapshot_chunk": (20.0, 200),
+    "new_transaction": (200.0, 1000),
+    "transactions": (200.0, 1000),
+}
+DEFAULT_LIMIT = (50.0, 500)
+
+# Misbehavior points per offense. Hitting a rate limit is what an honest but bursty
+# peer does too, so it only bans a peer that keeps flooding for a long time
+PENALTIES = {
+    "invalid_block": 50,
+    "bad_signature": 20,
+    "oversize_frame": 50,
+    "malformed_message": 10,
+    "bad_snapshot": 50,
+    "bad_attestation": 20,
+    "rate_limited": 0.02,
+}
+
+BAN_THRESHOLD = 100
+BAN_DURATION = 3600        # seconds
+SCORE_DECAY_PER_SECOND = 0.1
+BANDWIDTH_LIMIT = (1 * 1024 * 1024, 16 * 1024 * 1024)  # bytes/sec, burst
+
+
+class TokenBucket:
+    """Classic token bucket; tokens refill continuously up to capacity"""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, amount: float = 1) -> bool:
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+
+@dataclass
+class PeerRecord:
+    """Accounting state for a single peer"""
+    buckets: Dict[str, TokenBucket] = field(default_factory=dict)
+    bandwidth: TokenBucket = None
+    score: float = 0.0
+    score_updated: float = 0.0
+    banned_until: float = 0.0
+    dropped: int = 0
+    accepted: int = 0
+
+
+class PeerAccounting:
+    """Per-peer rate limiting, misbehavior scoring and temporary bans.
+
+    Peers are keyed by (host, listening port), the address the network resolves
+    every message to, so nodes sharing a host or a NAT get separate budgets
+    and a ban for one of them does not cut off the others.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic,
+                 ban_threshold: float = BAN_THRESHOLD, ban_duration: float = BAN_DURATION):
+        self.clock = clock
+        self.ban_threshold = ban_threshold
+        self.ban_duration = ban_duration
+        self.peers: Dict[Union[Tuple[str, int], str], PeerRecord] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(addr) -> Union[Tuple[str, int], str]:
+        return tuple(addr[:2]) if isinstance(addr, (tuple, list)) else str(addr)
+
+    @classmethod
+    def _label(cls, addr) -> str:
+        key = cls._key(addr)
+        return f"{key[0]}:{key[1]}" if isinstance(key, tuple) else key
+
+    def _record(self, addr) -> PeerRecord:
+        key = self._key(addr)
+        record = self.peers.get(key)
+        if record is None:
+            record = PeerRecord(
+                bandwidth=TokenBucket(*BANDWIDTH_LIMIT, clock=self.clock),
+                score_updated=self.clock()
+            )
+            self.peers[key] = record
+        return record
+
+    def _decay(self, record: PeerRecord):
+        now = self.clock()
+        record.score = max(0.0, record.score - (now - record.score_updated) * SCORE_DECAY_PER_SECOND)
+        record.score_updated = now
+
+    def is_banned(self, addr) -> bool:
+        with self.lock:
+            record = self.peers.get(self._key(addr))
+            return record is not None and record.banned_until > self.clock()
+
+    def allow(self, addr, msg_type: str, size: int = 0) -> bool:
+        """Charge a message against the peer's budgets; False means drop it"""
+        with self.lock:
+            record = self._record(addr)
+            if record.banned_until > self.clock():
+                record.dropped += 1
+                return False
+
+            bucket = record.buckets.get(msg_type)
+            if bucket is None:
+                rate, capacity = MESSAGE_LIMITS.get(msg_type, DEFAULT_LIMIT)
+                bucket = TokenBucket(rate, capacity, clock=self.clock)
+                record.buckets[msg_type] = bucket
+
+            cost = MESSAGE_COSTS.get(msg_type, DEFAULT_MESSAGE_COST)
+            if not bucket.consume(cost) or (size and not record.bandwidth.consume(size)):
+                record.dropped += 1
+                rate_limited = True
+            else:
+                record.accepted += 1
+                rate_limited = False
+
+        if rate_limited:
+            self.penalize(addr, "rate_limited")
+            return False
+        return True
+
+    def penalize(self, addr, offense: str, points: float = None) -> bool:
+        """Add misbehavior points; returns True if the peer is now banned"""
+        if points is None:
+            points = PENALTIES.get(offense, 10)
+
+        with self.lock:
+            record = self._record(addr)
+            self._decay(record)
+            record.score += points
+
+            if record.score >= self.ban_threshold and record.banned_until <= self.clock():
+                record.banned_until = self.clock() + self.ban_duration
+                logger.warning(f"Banning peer {self._label(addr)} for {self.ban_duration}s "
+                               f"(score {record.score:.0f}, last offense: {offense})")
+                return True
+
+        if offense != "rate_limited":
+            logger.warning(f"Peer {self._label(addr)} misbehaved: {offense} (+{points})")
+        return False
+
+    def unban(self, addr):
+        with self.lock:
+            record = self.peers.get(self._key(addr))
+            if record:
+                record.banned_until = 0.0
+                record.score = 0.0
+
+    def get_stats(self) -> Dict[str, dict]:
+        with self.lock:
+            now = self.clock()
+            return {
+                self._label(key): {
+                    'score': round(record.score, 1),
+                    'banned': record.banned_until > now,
+                    'accepted': record.accepted,
+                    'dropped': record.dropped
+                } for key, record in self.peers.items()
+            }
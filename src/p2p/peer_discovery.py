@@ -1,44 +1,114 @@
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from src.p2p.address_book import AddressBook
 from src.utils.logger import logger
 
 class PeerDiscovery:
-    def __init__(self, network):
+    def __init__(self, network, address_book: AddressBook = None, target_peers: int = 8,
+                 max_parallel_dials: int = 8, bootstrap_nodes=None):
         self.network = network
-        self.known_peers = set()
-        self.bootstrap_nodes = [
-            ("localhost", 6000),
-            ("127.0.0.1", 2000)
-        ]
-        self.min_peers = 1
-    
+        self.address_book = address_book if address_book is not None else AddressBook()
+        if bootstrap_nodes is None:
+            bootstrap_nodes = [
+                ("localhost", 6000),
+                ("127.0.0.1", 2000)
+            ]
+        self.bootstrap_nodes = list(bootstrap_nodes)
+        self.target_peers = target_peers
+        self.max_parallel_dials = max_parallel_dials
+        self.dialer = ThreadPoolExecutor(max_workers=max_parallel_dials, thread_name_prefix="PeerDial")
+        self.dialing = set()
+        self.lock = threading.Lock()
+
+        self.fast_interval = 5       # seconds between rounds while below target
+        self.slow_interval = 60      # seconds between rounds once healthy
+        self.peer_exchange_interval = 300
+
+        for peer in self.bootstrap_nodes:
+            if not self._is_self(peer):
+                self.address_book.add(*peer)
+
     def start(self):
         """Start peer discovery process"""
         threading.Thread(target=self.discover_peers, daemon=True).start()
-    
+
     def discover_peers(self):
-        """Discover new peers periodically"""
-        while True:
+        """Keep the peer set topped up from the address book"""
+        last_exchange = 0
+        while self.network.running:
             try:
-                # Connect to bootstrap nodes
-                for node in self.bootstrap_nodes:
-                    if node not in self.network.peers:
-                        self.network.connect_to_peer(*node)
-                
+                self.fill_peers(wait=True)
+
                 # Ask known peers for their peer lists
-                for peer in list(self.network.peers):
-                    self.network.send_message({
-                        "type": "get_peers"
-                    }, peer)
-                
-                # Sleep for 5 minutes
-                time.sleep(300)
+                if time.time() - last_exchange >= self.peer_exchange_interval or self._needs_peers():
+                    for peer in list(self.network.peers):
+                        self.network.send_message({
+                            "type": "get_peers"
+                        }, peer)
+                    last_exchange = time.time()
+
+                time.sleep(self.fast_interval if self._needs_peers() else self.slow_interval)
             except Exception as e:
                 logger.error(f"Error in peer discovery: {e}")
-                time.sleep(60)
-    
+                time.sleep(self.fast_interval)
+
+    def _is_self(self, peer) -> bool:
+        host, port = peer
+        return port == self.network.port and host in (self.network.host, "localhost", "127.0.0.1", "0.0.0.0")
+
+    def _needs_peers(self) -> bool:
+        return len(self.network.peers) < self.target_peers
+
+    def fill_peers(self, wait: bool = False) -> int:
+        """Dial the best known addresses in parallel until the target is reached"""
+        with self.lock:
+            missing = self.target_peers - len(self.network.peers) - len(self.dialing)
+            if missing <= 0:
+                return 0
+            exclude = set(self.network.peers) | self.dialing
+            candidates = [
+                peer for peer in self.address_book.best(missing + 1, exclude=exclude)
+                if not self._is_self(peer)
+            ][:missing]
+            self.dialing.update(candidates)
+
+        futures = [self.dialer.submit(self._dial, peer) for peer in candidates]
+        if wait:
+            for future in futures:
+                future.result()
+        return len(candidates)
+
+    def _dial(self, peer):
+        try:
+            self.address_book.record_attempt(peer)
+            started = time.monotonic()
+            if self.network.connect_to_peer(*peer):
+                self.address_book.record_success(peer, time.monotonic() - started)
+            else:
+                self.address_book.record_failure(peer)
+        except Exception as e:
+            logger.error(f"Error dialing {peer[0]}:{peer[1]}: {e}")
+            self.address_book.record_failure(peer)
+        finally:
+            with self.lock:
+                self.dialing.discard(peer)
+
     def handle_peers_response(self, peers):
-        """Handle list of peers from another node"""
-        for host, port in peers:
-            if (host, port) not in self.network.peers and (host, port) != (self.network.host, self.network.port):
-                self.network.connect_to_peer(host, port)
\ No newline at end of file
+        """Remember peers advertised by another node and dial if we are short"""
+        added = 0
+        for entry in peers:
+            try:
+                host, port = entry
+                port = int(port)
+            except (TypeError, ValueError):
+                continue
+            if self._is_self((host, port)):
+                continue
+            if self.address_book.add(host, port):
+                added += 1
+
+        if added:
+            logger.info(f"Learned {added} new peer addresses")
+        if self._needs_peers():
+            self.fill_peers()
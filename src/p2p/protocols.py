@@ -6,5 +6,19 @@ class P2PProtocols:
     MEMPOOL = "mempool"
     NEW_BLOCK = "new_block"
     NEW_TRANSACTION = "new_transaction"
+    TRANSACTIONS = "transactions"
     GET_PEERS = "get_peers"
-    PEERS = "peers"
\ No newline at end of file
+    PEERS = "peers"
+    GET_STATUS = "get_status"
+    STATUS = "status"
+    GET_BLOCKS = "get_blocks"
+    BLOCKS = "blocks"
+    IHAVE = "ihave"
+    IWANT = "iwant"
+    HANDSHAKE = "handshake"
+    HANDSHAKE_ACK = "handshake_ack"
+    GET_SNAPSHOT_MANIFEST = "get_snapshot_manifest"
+    SNAPSHOT_MANIFEST = "snapshot_manifest"
+    GET_SNAPSHOT_CHUNK = "get_snapshot_chunk"
+    SNAPSHOT_CHUNK = "snapshot_chunk"
+    ATTESTATION = "attestation"
\ No newline at end of file
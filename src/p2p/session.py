@@ -0,0 +1,312 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from src.utils.logger import logger
+
+SESSION_FRAME_MARKER = b"S"
+SESSION_ID_SIZE = 16       # bytes, hex encoded on the wire
+COUNTER_SIZE = 8           # bytes, hex encoded on the wire
+MAC_SIZE = 32              # bytes, hex encoded on the wire
+SESSION_TTL = 3600         # seconds before a session must be renegotiated
+REPLAY_WINDOW = 1024       # out-of-order frames tolerated per session
+HANDSHAKE_RETRY = 10       # seconds between handshake attempts to one peer
+HKDF_INFO = b"vex-p2p-session-v1"
+SESSION_HEADER_SIZE = 1 + (SESSION_ID_SIZE + COUNTER_SIZE + MAC_SIZE) * 2
+
+Peer = Tuple[str, int]
+
+
+def _public_bytes(public_key) -> bytes:
+    return public_key.public_bytes(
+        encoding=serialization.Encoding.X962,
+        format=serialization.PublicFormat.UncompressedPoint
+    )
+
+
+def _sign(private_key, data: bytes) -> str:
+    return private_key.sign(data, ec.ECDSA(hashes.SHA256())).hex()
+
+
+def verify_detached(public_key_pem: str, signature: str, data: bytes) -> bool:
+    """Verify a hex ECDSA/SHA256 signature against a PEM public key"""
+    try:
+        public_key = serialization.load_pem_public_key(public_key_pem.encode())
+        public_key.verify(bytes.fromhex(signature), data, ec.ECDSA(hashes.SHA256()))
+        return True
+    except (InvalidSignature, ValueError, TypeError):
+        return False
+
+
+@dataclass
+class Session:
+    """Symmetric channel state established by a handshake"""
+    session_id: str
+    peer: Peer
+    peer_public_key_pem: str
+    send_key: bytes
+    recv_key: bytes
+    created_at: float = field(default_factory=time.time)
+    confirmed: bool = False
+    send_counter: int = 0
+    highest_received: int = -1
+    replay_mask: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def expired(self, now: float = None) -> bool:
+        return (now or time.time()) - self.created_at > SESSION_TTL
+
+    @staticmethod
+    def _mac(key: bytes, header: bytes, body: bytes) -> str:
+        return hashlib.blake2b(header + body, key=key, digest_size=MAC_SIZE).hexdigest()
+
+    def seal(self, body: bytes) -> bytes:
+        """Wrap a serialized message in an authenticated session frame"""
+        with self.lock:
+            counter = self.send_counter
+            self.send_counter += 1
+        header = self.session_id.encode() + f"{counter:0{COUNTER_SIZE * 2}x}".encode()
+        return SESSION_FRAME_MARKER + header + self._mac(self.send_key, header, body).encode() + body
+
+    def open(self, header: bytes, mac: bytes, body: bytes) -> bool:
+        """Check the frame MAC and reject replays; True if the body can be trusted"""
+        expected = self._mac(self.recv_key, header, body).encode()
+        if not hmac.compare_digest(expected, mac):
+            return False
+
+        counter = int(header[SESSION_ID_SIZE * 2:], 16)
+        with self.lock:
+            if counter > self.highest_received:
+                shift = counter - self.highest_received
+                if shift >= REPLAY_WINDOW:
+                    self.replay_mask = 1
+                else:
+                    self.replay_mask = ((self.replay_mask << shift) | 1) & ((1 << REPLAY_WINDOW) - 1)
+                self.highest_received = counter
+                return True
+
+            offset = self.highest_received - counter
+            if offset >= REPLAY_WINDOW or self.replay_mask & (1 << offset):
+                return False
+            self.replay_mask |= 1 << offset
+            return True
+
+
+class SessionManager:
+    """Authenticates peers once with ECDSA and derives per-peer session keys.
+
+    Handshake (A initiates, B responds):
+        A -> B  handshake      {public_key, ephemeral, nonce, signature_A(eph_A|nonce_A)}
+        B -> A  handshake_ack  {echo=nonce_A, public_key, ephemeral, nonce,
+                                signature_B(eph_A|nonce_A|eph_B|nonce_B)}
+    Both sides run ECDH on the ephemeral keys and expand the shared secret with
+    HKDF into one key per direction. Afterwards every frame carries a keyed
+    BLAKE2b MAC instead of an ECDSA signature. The responder only starts using
+    a session for outgoing frames once the initiator has sent a valid frame on it.
+    """
+
+    def __init__(self, node_key: ec.EllipticCurvePrivateKey):
+        self.node_key = node_key
+        self.public_key_pem = node_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+        self.sessions: Dict[str, Session] = {}
+        self.peer_sessions: Dict[Peer, Session] = {}
+        self.pending: Dict[str, Tuple[Peer, ec.EllipticCurvePrivateKey, float]] = {}
+        self.attempts: Dict[Peer, float] = {}
+        self.lock = threading.Lock()
+
+    # Handshake
+
+    def create_handshake(self, peer: Peer) -> Optional[dict]:
+        """Start a handshake with peer; None if one is already in progress"""
+        now = time.time()
+        with self.lock:
+            if now - self.attempts.get(peer, 0) < HANDSHAKE_RETRY:
+                return None
+            self.attempts[peer] = now
+            for key, (_, _, started) in list(self.pending.items()):
+                if now - started > HANDSHAKE_RETRY:
+                    del self.pending[key]
+            ephemeral = ec.generate_private_key(ec.SECP256K1())
+            nonce = os.urandom(16)
+            self.pending[nonce.hex()] = (peer, ephemeral, now)
+
+        eph_bytes = _public_bytes(ephemeral.public_key())
+        return {
+            "type": "handshake",
+            "data": {
+                "public_key": self.public_key_pem,
+                "ephemeral": eph_bytes.hex(),
+                "nonce": nonce.hex(),
+                "signature": _sign(self.node_key, eph_bytes + nonce)
+            }
+        }
+
+    def accept_handshake(self, peer: Peer, data: dict) -> Optional[dict]:
+        """Responder side: verify the initiator and return the handshake_ack message"""
+        try:
+            peer_eph = bytes.fromhex(data["ephemeral"])
+            peer_nonce = bytes.fromhex(data["nonce"])
+            peer_pem = data["public_key"]
+        except (KeyError, ValueError, TypeError):
+            return None
+
+        if not verify_detached(peer_pem, data.get("signature", ""), peer_eph + peer_nonce):
+            logger.warning(f"Invalid handshake signature from {peer}")
+            return None
+
+        ephemeral = ec.generate_private_key(ec.SECP256K1())
+        nonce = os.urandom(16)
+        eph_bytes = _public_bytes(ephemeral.public_key())
+        transcript = peer_eph + peer_nonce + eph_bytes + nonce
+
+        session = self._derive(peer, peer_pem, ephemeral, peer_eph, transcript, initiator=False)
+        if session is None:
+            return None
+        self._register(session)
+
+        return {
+            "type": "handshake_ack",
+            "data": {
+                "echo": data["nonce"],
+                "public_key": self.public_key_pem,
+                "ephemeral": eph_bytes.hex(),
+                "nonce": nonce.hex(),
+                "signature": _sign(self.node_key, transcript)
+            }
+        }
+
+    def complete_handshake(self, data: dict) -> Optional[Session]:
+        """Initiator side: verify the responder's ack and install the session"""
+        with self.lock:
+            pending = self.pending.pop(str(data.get("echo")), None)
+        if pending is None:
+            return None
+
+        peer, ephemeral, _ = pending
+        nonce = bytes.fromhex(data["echo"])
+        try:
+            peer_eph = bytes.fromhex(data["ephemeral"])
+            peer_nonce = bytes.fromhex(data["nonce"])
+            peer_pem = data["public_key"]
+        except (KeyError, ValueError, TypeError):
+            return None
+
+        transcript = _public_bytes(ephemeral.public_key()) + nonce + peer_eph + peer_nonce
+        if not verify_detached(peer_pem, data.get("signature", ""), transcript):
+            logger.warning(f"Invalid handshake_ack signature from {peer}")
+            return None
+
+        session = self._derive(peer, peer_pem, ephemeral, peer_eph, transcript, initiator=True)
+        if session:
+            session.confirmed = True
+            self._register(session)
+            logger.info(f"Session established with {peer[0]}:{peer[1]}")
+        return session
+
+    def _derive(self, peer, peer_pem, ephemeral, peer_eph, transcript, initiator) -> Optional[Session]:
+        try:
+            peer_public = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256K1(), peer_eph)
+            shared = ephemeral.exchange(ec.ECDH(), peer_public)
+        except ValueError as e:
+            logger.warning(f"Handshake key exchange with {peer} failed: {e}")
+            return None
+
+        material = HKDF(
+            algorithm=hashes.SHA256(),
+            length=64 + SESSION_ID_SIZE,
+            salt=hashlib.sha256(transcript).digest(),
+            info=HKDF_INFO
+        ).derive(shared)
+
+        initiator_key, responder_key = material[:32], material[32:64]
+        return Session(
+            session_id=material[64:].hex(),
+            peer=peer,
+            peer_public_key_pem=peer_pem,
+            send_key=initiator_key if initiator else responder_key,
+            recv_key=responder_key if initiator else initiator_key
+        )
+
+    def _register(self, session: Session):
+        with self.lock:
+            self.sessions[session.session_id] = session
+            if session.confirmed:
+                self.attempts.pop(session.peer, None)
+                self._promote(session)
+            else:
+                # The initiator will confirm shortly; don't race it with our own handshake
+                self.attempts[session.peer] = time.time()
+
+    def _promote(self, session: Session):
+        """Make session the one used for outgoing frames to its peer"""
+        old = self.peer_sessions.get(session.peer)
+        if old is session:
+            return
+        if old is not None:
+            # Keep the old session for in-flight frames for a short while
+            old.created_at = min(old.created_at, time.time() - SESSION_TTL + 60)
+        self.peer_sessions[session.peer] = session
+
+    # Frames
+
+    def session_for(self, peer: Peer) -> Optional[Session]:
+        with self.lock:
+            session = self.peer_sessions.get(peer)
+            if session is not None and session.expired():
+                self._drop(session)
+                return None
+            return session
+
+    def open_frame(self, data: bytes) -> Tuple[Optional[Session], Optional[bytes]]:
+        """Verify a session frame and return (session, body).
+
+        (None, None) means the session is unknown or expired and the sender
+        should handshake again; (session, None) means the MAC or counter is bad.
+        """
+        id_end = 1 + SESSION_ID_SIZE * 2
+        header_end = id_end + COUNTER_SIZE * 2
+        mac_end = SESSION_HEADER_SIZE
+        if len(data) < mac_end:
+            return None, None
+
+        session_id = data[1:id_end].decode(errors="replace")
+        with self.lock:
+            session = self.sessions.get(session_id)
+        if session is None or session.expired():
+            if session is not None:
+                with self.lock:
+                    self._drop(session)
+            return None, None
+
+        body = data[mac_end:]
+        if not session.open(data[1:header_end], data[header_end:mac_end], body):
+            return session, None
+
+        if not session.confirmed:
+            # The initiator has proven it holds the session key
+            with self.lock:
+                session.confirmed = True
+                self._promote(session)
+        return session, body
+
+    def _drop(self, session: Session):
+        self.sessions.pop(session.session_id, None)
+        if self.peer_sessions.get(session.peer) is session:
+            del self.peer_sessions[session.peer]
+
+    def forget_peer(self, peer: Peer):
+        with self.lock:
+            session = self.peer_sessions.get(peer)
+            if session is not None:
+                self._drop(session)
+            self.attempts.pop(peer, None)
@@ -0,0 +1,240 @@
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+from src.blockchain.consensus.validator_set import validator_sets as default_validator_sets
+from src.blockchain.snapshot import SnapshotManager, endorser
+from src.utils.logger import logger
+
+Peer = Tuple[str, int]
+
+SNAPSHOT_SYNC_MIN_GAP = 500   # blocks behind before a snapshot beats replaying the chain
+MAX_INFLIGHT_PER_PEER = 2
+CHUNK_TIMEOUT = 15.0
+MANIFEST_TIMEOUT = 10.0
+
+
+class SnapshotSync:
+    """Bootstraps a fresh node from a peer's state snapshot instead of replaying from genesis.
+
+    A manifest fixes the snapshot once its anchor is a checkpoint we know
+    to be final, or once validators holding more than half of the stake we
+    know of have endorsed its content hash. Chunks are then fetched in
+    parallel from every peer that serves the same content hash, verified
+    against the manifest and imported in one transaction. Block download
+    then continues from the snapshot height.
+    """
+
+    def __init__(self, network, min_gap: int = SNAPSHOT_SYNC_MIN_GAP,
+                 max_inflight_per_peer: int = MAX_INFLIGHT_PER_PEER, chunk_timeout: float = CHUNK_TIMEOUT,
+                 validator_sets=None):
+        self.network = network
+        self.validator_sets = validator_sets or default_validator_sets
+        self.min_gap = min_gap
+        self.max_inflight_per_peer = max_inflight_per_peer
+        self.chunk_timeout = chunk_timeout
+
+        self.active = False
+        self.finished = False
+        self.manifest: Optional[dict] = None
+        self.offers: Dict[str, dict] = {}                # content hash -> manifest, until one is trusted
+        self.offered_by: Dict[str, Set[Peer]] = {}
+        self.endorsements: Dict[str, Set[str]] = {}      # content hash -> endorsing validators
+        self.sources: Set[Peer] = set()
+        self.chunks: Dict[int, dict] = {}
+        self.inflight: Dict[int, Tuple[Peer, float]] = {}
+        self.peer_heights: Dict[Peer, int] = {}
+        self.asked: Dict[Peer, float] = {}
+        self.started_at = 0.0
+        self.lock = threading.RLock()
+        self._worker = None
+
+    def _local_height(self) -> int:
+        last_block = self.network.blockchain.get_last_block()
+        return last_block.index if last_block else -1
+
+    def on_status(self, peer: Peer, height: int) -> bool:
+        """Handle a peer's height; True if snapshot sync owns it (skip block download)"""
+        with self.lock:
+            if self.finished:
+                return False
+            if not self.active:
+                if self._local_height() > 0 or height - self._local_height() < self.min_gap:
+                    return False
+                self.active = True
+                self.started_at = time.time()
+                logger.info(f"Chain is {height} blocks behind, bootstrapping from a snapshot")
+                self._ensure_worker()
+
+            self.peer_heights[peer] = height
+            if self.manifest is None and peer not in self.asked:
+                self.asked[peer] = time.time()
+                self.network.send_message({"type": "get_snapshot_manifest"}, peer)
+            elif self.manifest is not None and peer not in self.sources:
+                self.network.send_message({"type": "get_snapshot_manifest"}, peer)
+            return True
+
+    def on_manifest(self, peer: Peer, manifest: Optional[dict], endorsement: Optional[dict] = None):
+        with self.lock:
+            if not self.active or not manifest:
+                return
+            if not SnapshotManager.verify_manifest(manifest):
+                logger.warning(f"Invalid snapshot manifest from {peer}")
+                self._penalize(peer)
+                return
+
+            if self.manifest is None:
+                if manifest['height'] <= self._local_height():
+                    return
+                key = manifest['content_hash']
+                if endorsement is not None:
+                    validator = endorser(manifest, endorsement)
+                    if validator is None:
+                        logger.warning(f"Bad snapshot endorsement from {peer}")
+                        self._penalize(peer)
+                        return
+                    self.endorsements.setdefault(key, set()).add(validator)
+                self.offers.setdefault(key, manifest)
+                self.offered_by.setdefault(key, set()).add(peer)
+                if not self._trusted(key):
+                    return
+                self._adopt(key)
+            elif manifest['content_hash'] == self.manifest['content_hash']:
+                self.sources.add(peer)
+            self._request_chunks()
+            self._maybe_import()
+
+    def _trusted(self, key: str) -> bool:
+        """Anchored at a checkpoint we know is final, or endorsed by a majority of the stake we know"""
+        manifest = self.offers[key]
+        finality = getattr(self.network.blockchain, 'finality', None)
+        if finality is not None and finality.checkpoint_hash(manifest['height']) == manifest['block']['hash']:
+            return True
+        validators = self.validator_sets.for_height(self._local_height())
+        endorsed = sum(validators.stake_of(validator) for validator in self.endorsements.get(key, ()))
+        return endorsed * 2 > validators.total_stake > 0
+
+    def _adopt(self, key: str):
+        self.manifest = self.offers[key]
+        self.sources = set(self.offered_by[key])
+        self.offers, self.offered_by, self.endorsements = {}, {}, {}
+        logger.info(f"Using snapshot at height {self.manifest['height']} "
+                    f"({len(self.manifest['chunks'])} chunks) from {len(self.sources)} peers")
+
+    def on_chunk(self, peer: Peer, height: int, index: int, chunk: Optional[dict]):
+        with self.lock:
+            if not self.active or self.manifest is None or height != self.manifest['height']:
+                return
+            owner = self.inflight.get(index)
+            if owner is None or owner[0] != peer:
+                return
+            del self.inflight[index]
+
+            if not chunk or not SnapshotManager.verify_chunk(self.manifest, chunk):
+                logger.warning(f"Bad snapshot chunk {index} from {peer}")
+                self.sources.discard(peer)
+                self._penalize(peer)
+            else:
+                self.chunks[index] = chunk
+
+            self._request_chunks()
+            self._maybe_import()
+
+    def remove_peer(self, peer: Peer):
+        with self.lock:
+            self.sources.discard(peer)
+            self.peer_heights.pop(peer, None)
+            for index, (owner, _) in list(self.inflight.items()):
+                if owner == peer:
+                    del self.inflight[index]
+            if self.active:
+                self._request_chunks()
+
+    def _request_chunks(self):
+        if self.manifest is None or not self.sources:
+            return
+        load = {peer: 0 for peer in self.sources}
+        for owner, _ in self.inflight.values():
+            if owner in load:
+                load[owner] += 1
+
+        for index in range(len(self.manifest['chunks'])):
+            if index in self.chunks or index in self.inflight:
+                continue
+            peer = min(load, key=load.get)
+            if load[peer] >= self.max_inflight_per_peer:
+                break
+            load[peer] += 1
+            self.inflight[index] = (peer, time.time())
+            self.network.send_message({
+                "type": "get_snapshot_chunk",
+                "height": self.manifest['height'],
+                "index": index
+            }, peer)
+
+    def check_timeouts(self):
+        with self.lock:
+            if not self.active:
+                return
+            now = time.time()
+            for index, (peer, requested_at) in list(self.inflight.items()):
+                if now - requested_at > self.chunk_timeout:
+                    logger.warning(f"Snapshot chunk {index} from {peer} timed out")
+                    del self.inflight[index]
+                    if len(self.sources) > 1:
+                        self.sources.discard(peer)
+            self._request_chunks()
+
+            if self.manifest is None and self.asked and now - max(self.asked.values()) > MANIFEST_TIMEOUT:
+                logger.warning("No peer offered a snapshot at a final checkpoint or endorsed by "
+                               "a stake majority, falling back to block download")
+                self._finish()
+
+    def _maybe_import(self):
+        if self.manifest is None or len(self.chunks) < len(self.manifest['chunks']):
+            return
+        try:
+            anchor = self.network.blockchain.import_snapshot(self.manifest, self.chunks)
+            logger.info(f"Snapshot sync finished in {time.time() - self.started_at:.1f}s "
+                        f"at height {anchor.index}")
+        except Exception as e:
+            logger.error(f"Snapshot import failed: {e}")
+        self._finish()
+
+    def _finish(self):
+        """Leave snapshot mode and let the block scheduler take over from our height"""
+        self.active = False
+        self.finished = True
+        self.chunks = {}
+        self.inflight = {}
+        self.offers, self.offered_by, self.endorsements = {}, {}, {}
+        heights = dict(self.peer_heights)
+        for peer, height in heights.items():
+            self.network.sync_scheduler.update_peer_height(peer, height)
+
+    def _penalize(self, peer: Peer):
+        accounting = getattr(self.network, 'peer_accounting', None)
+        if accounting:
+            accounting.penalize(peer, "bad_snapshot")
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, daemon=True, name="SnapshotSync")
+            self._worker.start()
+
+    def _run(self):
+        while self.active and getattr(self.network, 'running', True):
+            time.sleep(1.0)
+            self.check_timeouts()
+
+    def get_status(self) -> dict:
+        with self.lock:
+            return {
+                'active': self.active,
+                'finished': self.finished,
+                'height': self.manifest['height'] if self.manifest else None,
+                'chunks_total': len(self.manifest['chunks']) if self.manifest else 0,
+                'chunks_received': len(self.chunks),
+                'chunks_inflight': len(self.inflight),
+                'sources': len(self.sources),
+                'offers': len(self.offers)
+            }
@@ -0,0 +1,367 @@
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from src.utils.logger import logger
+
+Peer = Tuple[str, int]
+
+
+@dataclass
+class ChunkRequest:
+    """A height range assigned to a single peer"""
+    start: int
+    end: int
+    peer: Peer
+    requested_at: float = field(default_factory=time.time)
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start + 1
+
+
+@dataclass
+class PeerStats:
+    """Download statistics for a single peer"""
+    throughput: float = 0.0  # blocks per second (EWMA)
+    blocks_received: int = 0
+    chunks_completed: int = 0
+    stalls: int = 0
+    inflight: int = 0
+
+    def record(self, blocks: int, elapsed: float, alpha: float = 0.3):
+        rate = blocks / max(elapsed, 1e-3)
+        if self.throughput <= 0:
+            self.throughput = rate
+        else:
+            self.throughput = alpha * rate + (1 - alpha) * self.throughput
+        self.blocks_received += blocks
+        self.chunks_completed += 1
+
+
+class BlockDownloadScheduler:
+    """Splits a missing height range into chunks and downloads them from several peers.
+
+    Chunks are assigned to the fastest peers with free capacity, stalled chunks are
+    reassigned to other peers, and completed chunks are handed to an in-order apply
+    queue so blocks are always added to the chain sequentially.
+    """
+
+    def __init__(self, network, chunk_size: int = 64, max_inflight_per_peer: int = 2,
+                 stall_timeout: float = 15.0, max_stalls: int = 3,
+                 apply_block: Optional[Callable[[dict], bool]] = None):
+        self.network = network
+        self.chunk_size = chunk_size
+        self.max_inflight_per_peer = max_inflight_per_peer
+        self.stall_timeout = stall_timeout
+        self.max_stalls = max_stalls
+        self.apply_block = apply_block or self._apply_block
+
+        self.lock = threading.RLock()
+        self.peer_heights: Dict[Peer, int] = {}
+        self.peer_stats: Dict[Peer, PeerStats] = {}
+        self.pending: deque = deque()
+        self.inflight: Dict[int, ChunkRequest] = {}
+        self.excluded: Dict[int, Set[Peer]] = {}
+        self.completed: Dict[int, List[dict]] = {}
+        self.sources: Dict[int, Peer] = {}  # height -> peer that served it, until applied
+        self.apply_queue: queue.Queue = queue.Queue()
+
+        self.next_height = 0      # next height to hand to the apply queue
+        self.planned_height = -1  # highest height already split into chunks
+        self.target_height = -1
+        self.syncing = False
+        self._worker = None
+
+    # Peer bookkeeping
+
+    def update_peer_height(self, peer: Peer, height: int):
+        """Record a peer's advertised chain height and extend the sync target"""
+        with self.lock:
+            self.peer_heights[peer] = height
+            self.peer_stats.setdefault(peer, PeerStats())
+
+        if height > self._local_height():
+            self.start(height)
+
+    def remove_peer(self, peer: Peer):
+        """Forget a peer and requeue everything it was downloading"""
+        with self.lock:
+            self.peer_heights.pop(peer, None)
+            self.peer_stats.pop(peer, None)
+            for start, request in list(self.inflight.items()):
+                if request.peer == peer:
+                    del self.inflight[start]
+                    self.pending.appendleft((request.start, request.end))
+        self._assign()
+
+    def healthy_peers(self) -> List[Peer]:
+        """Peers that can serve blocks, fastest first"""
+        with self.lock:
+            peers = [
+                peer for peer, stats in self.peer_stats.items()
+                if stats.stalls < self.max_stalls and peer in self.peer_heights
+            ]
+            return sorted(peers, key=lambda p: self.peer_stats[p].throughput, reverse=True)
+
+    # Scheduling
+
+    def start(self, target_height: int):
+        """Plan chunks up to target_height and start downloading"""
+        with self.lock:
+            if not self.syncing:
+                self.next_height = self._local_height() + 1
+                self.planned_height = self.next_height - 1
+                self.syncing = True
+                logger.info(f"Starting block download from height {self.next_height} to {target_height}")
+
+            if target_height > self.target_height:
+                self.target_height = target_height
+            self._plan_chunks()
+
+        self._ensure_worker()
+        self._assign()
+
+    def _plan_chunks(self):
+        while self.planned_height < self.target_height:
+            start = self.planned_height + 1
+            end = min(start + self.chunk_size - 1, self.target_height)
+            self.pending.append((start, end))
+            self.planned_height = end
+
+    def _assign(self):
+        """Hand pending chunks to peers that have spare capacity"""
+        requests = []
+        with self.lock:
+            if not self.syncing:
+                return
+
+            for peer in self.healthy_peers():
+                stats = self.peer_stats[peer]
+                height = self.peer_heights.get(peer, -1)
+
+                while stats.inflight < self.max_inflight_per_peer and self.pending:
+                    chunk = self._next_chunk_for(peer, height)
+                    if chunk is None:
+                        break
+                    start, end = chunk
+                    request = ChunkRequest(start, end, peer)
+                    self.inflight[start] = request
+                    stats.inflight += 1
+                    requests.append(request)
+
+        for request in requests:
+            self._send_request(request)
+
+    def _next_chunk_for(self, peer: Peer, peer_height: int) -> Optional[Tuple[int, int]]:
+        for i, (start, end) in enumerate(self.pending):
+            if end > peer_height or peer in self.excluded.get(start, ()):
+                continue
+            del self.pending[i]
+            return start, end
+        return None
+
+    def _send_request(self, request: ChunkRequest):
+        try:
+            self.network.send_message({
+                "type": "get_blocks",
+                "start": request.start,
+                "end": request.end
+            }, request.peer)
+        except Exception as e:
+            logger.error(f"Failed to request blocks {request.start}-{request.end} from {request.peer}: {e}")
+            self._requeue(request, penalize=True)
+
+    def _requeue(self, request: ChunkRequest, penalize: bool = False):
+        with self.lock:
+            if self.inflight.get(request.start) is request:
+                del self.inflight[request.start]
+                stats = self.peer_stats.get(request.peer)
+                if stats:
+                    stats.inflight = max(0, stats.inflight - 1)
+                    if penalize:
+                        stats.stalls += 1
+                        stats.throughput /= 2
+                self.excluded.setdefault(request.start, set()).add(request.peer)
+                self.pending.appendleft((request.start, request.end))
+
+    def check_stalls(self):
+        """Reassign chunks whose peer has not answered within stall_timeout"""
+        now = time.time()
+        with self.lock:
+            stalled = [
+                request for request in self.inflight.values()
+                if now - request.requested_at > self.stall_timeout
+            ]
+        for request in stalled:
+            logger.warning(f"Block range {request.start}-{request.end} stalled on {request.peer}, reassigning")
+            self._requeue(request, penalize=True)
+
+        if stalled:
+            with self.lock:
+                # Give excluded chunks another chance once every healthy peer has failed them
+                healthy = set(self.healthy_peers())
+                for start, peers in list(self.excluded.items()):
+                    if healthy and healthy <= peers:
+                        del self.excluded[start]
+            self._assign()
+
+    # Responses
+
+    def on_blocks(self, peer: Peer, start: int, blocks: List[dict]):
+        """Handle a `blocks` response for the range beginning at start"""
+        with self.lock:
+            request = self.inflight.get(start)
+            if request is None or request.peer != peer:
+                # Late answer for a chunk that was reassigned or already applied; the
+                # chunk's current owner will deliver it
+                return
+            self._release(request)
+
+            contiguous = len(blocks) <= request.size and all(
+                isinstance(block, dict) and block.get('index') == start + offset
+                for offset, block in enumerate(blocks)
+            )
+            if not blocks or not contiguous:
+                self.excluded.setdefault(start, set()).add(peer)
+                self.pending.appendleft((request.start, request.end))
+            else:
+                if len(blocks) < request.size:
+                    # Partial chunk: keep what we got and requeue the remainder
+                    self.pending.appendleft((start + len(blocks), request.end))
+
+                self.peer_stats.setdefault(peer, PeerStats()).record(len(blocks), time.time() - request.requested_at)
+                self.completed[start] = blocks
+                for height in range(start, start + len(blocks)):
+                    self.sources[height] = peer
+                self.excluded.pop(start, None)
+                self._drain_completed()
+
+        if not contiguous:
+            logger.warning(f"Peer {peer} answered blocks {request.start}-{request.end} with other heights")
+            self._penalize(peer, "malformed_message")
+        self._assign()
+
+    def _release(self, request: ChunkRequest):
+        del self.inflight[request.start]
+        stats = self.peer_stats.get(request.peer)
+        if stats:
+            stats.inflight = max(0, stats.inflight - 1)
+
+    def _drain_completed(self):
+        """Move contiguous completed chunks onto the apply queue"""
+        while self.next_height in self.completed:
+            blocks = self.completed.pop(self.next_height)
+            for block_data in blocks:
+                self.apply_queue.put(block_data)
+            self.next_height += len(blocks)
+
+    # Applying
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, daemon=True, name="BlockSync")
+            self._worker.start()
+
+    def _run(self):
+        while self.syncing and getattr(self.network, 'running', True):
+            try:
+                block_data = self.apply_queue.get(timeout=1.0)
+            except queue.Empty:
+                self.check_stalls()
+                self._check_done()
+                continue
+            self.apply_next(block_data)
+
+    def apply_next(self, block_data: dict) -> bool:
+        """Apply one block from the queue; restart from its height on failure"""
+        height = block_data.get('index')
+        try:
+            applied = self.apply_block(block_data)
+        except Exception as e:
+            logger.error(f"Error applying synced block {height}: {e}")
+            applied = False
+
+        with self.lock:
+            peer = self.sources.pop(height, None)
+        if not applied:
+            logger.warning(f"Synced block {height} from {peer} rejected, re-downloading from that height")
+            if peer is not None:
+                self._drop_peer(peer, "invalid_block")
+            self._restart_from(self._local_height() + 1)
+            return False
+
+        self._check_done()
+        return True
+
+    def _drop_peer(self, peer: Peer, offense: str):
+        """Stop downloading from a peer that served bad data and report it"""
+        with self.lock:
+            stats = self.peer_stats.get(peer)
+            if stats:
+                stats.stalls = self.max_stalls
+        self._penalize(peer, offense)
+
+    def _penalize(self, peer: Peer, offense: str):
+        accounting = getattr(self.network, 'peer_accounting', None)
+        if accounting:
+            accounting.penalize(peer, offense)
+
+    def _restart_from(self, height: int):
+        with self.lock:
+            while not self.apply_queue.empty():
+                try:
+                    self.apply_queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.completed.clear()
+            self.sources.clear()
+            self.pending.clear()
+            for request in self.inflight.values():
+                stats = self.peer_stats.get(request.peer)
+                if stats:
+                    stats.inflight = max(0, stats.inflight - 1)
+            self.inflight.clear()
+            self.next_height = height
+            self.planned_height = height - 1
+            self._plan_chunks()
+        self._assign()
+
+    def _check_done(self):
+        with self.lock:
+            if self.syncing and self._local_height() >= self.target_height:
+                self.syncing = False
+                self.excluded.clear()
+                logger.info(f"Block download complete at height {self.target_height}")
+
+    def _local_height(self) -> int:
+        blockchain = getattr(self.network, 'blockchain', None)
+        last_block = blockchain.get_last_block() if blockchain else None
+        return last_block.index if last_block else -1
+
+    def _apply_block(self, block_data: dict) -> bool:
+        from src.blockchain.block import Block
+        block = Block.from_dict(block_data)
+        return self.network.blockchain.add_block(None, external_block=block) is not None
+
+    def get_status(self) -> dict:
+        """Snapshot of the download progress for monitoring"""
+        with self.lock:
+            return {
+                'syncing': self.syncing,
+                'next_height': self.next_height,
+                'target_height': self.target_height,
+                'pending_chunks': len(self.pending),
+                'inflight_chunks': len(self.inflight),
+                'queued_blocks': self.apply_queue.qsize(),
+                'peers': {
+                    f"{peer[0]}:{peer[1]}": {
+                        'height': self.peer_heights.get(peer),
+                        'throughput': round(stats.throughput, 2),
+                        'blocks_received': stats.blocks_received,
+                        'stalls': stats.stalls
+                    } for peer, stats in self.peer_stats.items()
+                }
+            }
@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Tuple
+from src.utils.logger import logger
+
+DEFAULT_WINDOW = 0.05      # seconds a transaction may wait for others to join its batch
+DEFAULT_MAX_BATCH = 256    # transactions per batch before flushing early
+METRICS_HISTORY = 1000     # recent batches kept for percentiles
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class TransactionBatcher:
+    """Collects outgoing transactions and sends them as one message per peer.
+
+    A batch is flushed when the oldest queued transaction has waited `window`
+    seconds or when `max_batch` transactions are queued, whichever comes first.
+    """
+
+    def __init__(self, network, window: float = DEFAULT_WINDOW, max_batch: int = DEFAULT_MAX_BATCH,
+                 clock: Callable[[], float] = time.monotonic):
+        self.network = network
+        self.window = window
+        self.max_batch = max_batch
+        self.clock = clock
+
+        self.pending: List[Tuple[dict, float]] = []
+        self.queued_hashes = set()
+        self.condition = threading.Condition()
+        self._worker = None
+
+        # Metrics
+        self.batch_sizes = deque(maxlen=METRICS_HISTORY)
+        self.latencies = deque(maxlen=METRICS_HISTORY)  # seconds queued, per transaction
+        self.batches_sent = 0
+        self.transactions_sent = 0
+        self.messages_sent = 0
+
+    def add(self, transaction):
+        """Queue a transaction for the next batch"""
+        tx_data = transaction.to_dict() if hasattr(transaction, 'to_dict') else transaction
+        tx_hash = tx_data.get('tx_hash')
+
+        with self.condition:
+            if tx_hash and tx_hash in self.queued_hashes:
+                return
+            if tx_hash:
+                self.queued_hashes.add(tx_hash)
+            self.pending.append((tx_data, self.clock()))
+            if len(self.pending) == 1 or len(self.pending) >= self.max_batch:
+                self.condition.notify()
+
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, daemon=True, name="TxBatcher")
+            self._worker.start()
+
+    def _run(self):
+        while getattr(self.network, 'running', True):
+            with self.condition:
+                while not self.pending:
+                    if not self.condition.wait(timeout=1.0) and not getattr(self.network, 'running', True):
+                        return
+
+                # Wait until the oldest transaction's window closes or the batch is full
+                deadline = self.pending[0][1] + self.window
+                while len(self.pending) < self.max_batch:
+                    remaining = deadline - self.clock()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(timeout=remaining)
+
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing transaction batch: {e}")
+
+    def _take_batch(self) -> List[Tuple[dict, float]]:
+        with self.condition:
+            batch = self.pending[:self.max_batch]
+            self.pending = self.pending[self.max_batch:]
+            for tx_data, _ in batch:
+                self.queued_hashes.discard(tx_data.get('tx_hash'))
+            return batch
+
+    def flush(self) -> int:
+        """Send everything queued (in batches of at most max_batch); returns transactions sent"""
+        sent = 0
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return sent
+
+            now = self.clock()
+            tx_dicts = [tx_data for tx_data, _ in batch]
+
+            gossip = getattr(self.network, 'gossip', None)
+            if gossip is not None:
+                messages = gossip.publish_transactions(tx_dicts)
+            else:
+                messages = self._send_to_all({"type": "transactions", "data": tx_dicts})
+
+            with self.condition:
+                self.batch_sizes.append(len(batch))
+                self.latencies.extend(now - queued_at for _, queued_at in batch)
+                self.batches_sent += 1
+                self.transactions_sent += len(batch)
+                self.messages_sent += messages
+            sent += len(batch)
+
+    def _send_to_all(self, message: dict) -> int:
+        peers = list(self.network.peers)
+        for peer in peers:
+            try:
+                self.network.send_message(dict(message), peer)
+            except Exception as e:
+                logger.error(f"Error sending transaction batch to {peer}: {e}")
+        return len(peers)
+
+    def get_metrics(self) -> dict:
+        """Batch size and queueing latency statistics for monitoring"""
+        with self.condition:
+            sizes = list(self.batch_sizes)
+            latencies = [latency * 1000 for latency in self.latencies]
+            return {
+                'window_ms': self.window * 1000,
+                'max_batch': self.max_batch,
+                'queued': len(self.pending),
+                'batches_sent': self.batches_sent,
+                'transactions_sent': self.transactions_sent,
+                'messages_sent': self.messages_sent,
+                'avg_batch_size': round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+                'max_batch_size': max(sizes) if sizes else 0,
+                'latency_ms': {
+                    'p50': round(_percentile(latencies, 50), 2),
+                    'p95': round(_percentile(latencies, 95), 2),
+                    'p99': round(_percentile(latencies, 99), 2),
+                    'max': round(max(latencies), 2) if latencies else 0.0
+                }
+            }
@@ -0,0 +1,439 @@
+"""Multi-node network simulator for propagation and throughput benchmarking.
+
+Starts N nodes as separate processes on loopback, each with its own data
+directory (and therefore its own database and logs), connects them in a
+random topology, injects signed transactions and reports propagation
+latency percentiles, throughput and per-node bandwidth. Every node starts
+from node 0's genesis; node 0 also produces blocks from the load, and
+their propagation is reported the same way.
+
+    python -m src.sim.simulator --nodes 8 --degree 3 --tx-rate 100 --duration 10
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+READY_TIMEOUT = 60
+PRODUCER_STAKE = 1e9        # so node 0 leads nearly every slot it can
+SENDER_BALANCE = 1e6
+
+
+@dataclass
+class SimulationConfig:
+    nodes: int = 5
+    degree: int = 3              # links per node (ring plus random chords)
+    tx_rate: float = 50.0        # transactions per second, summed over all nodes
+    duration: float = 10.0       # seconds of load
+    settle: float = 5.0          # seconds to let propagation finish after the load stops
+    latency: float = 0.0         # seconds of one-way delay per message
+    jitter: float = 0.0
+    loss: float = 0.0            # probability of dropping a message
+    block_time: float = 1.0      # seconds per slot of node 0's block producer; 0 produces no blocks
+    host: str = "127.0.0.1"
+    base_port: int = 17000
+    seed: int = 1
+    data_dir: Optional[str] = None
+    keep_data: bool = False
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0, 'count': 0}
+    ordered = sorted(values)
+
+    def pick(pct):
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    return {
+        'p50': round(pick(50) * 1000, 2),
+        'p95': round(pick(95) * 1000, 2),
+        'p99': round(pick(99) * 1000, 2),
+        'max': round(ordered[-1] * 1000, 2),
+        'count': len(ordered)
+    }
+
+
+def build_topology(nodes: int, degree: int, seed: int) -> Dict[int, List[int]]:
+    """Connected undirected graph: a ring plus random chords up to degree"""
+    rng = random.Random(seed)
+    links = {i: set() for i in range(nodes)}
+    if nodes < 2:
+        return {i: [] for i in links}
+
+    for i in range(nodes):
+        j = (i + 1) % nodes
+        if i != j:
+            links[i].add(j)
+            links[j].add(i)
+
+    target = min(degree, nodes - 1)
+    for i in range(nodes):
+        candidates = [j for j in range(nodes) if j != i and j not in links[i]]
+        rng.shuffle(candidates)
+        while len(links[i]) < target and candidates:
+            j = candidates.pop()
+            links[i].add(j)
+            links[j].add(i)
+    return {i: sorted(peers) for i, peers in links.items()}
+
+
+def _propagation(reports: List[dict], origin_field: str,
+                 arrival_field: str) -> Tuple[Dict[str, tuple], List[float], List[float], List[float]]:
+    """Items by origin, their per-hop and full-network latencies, and when each reached every node"""
+    origins = {}
+    for report in reports:
+        for item, sent_at in report.get(origin_field, {}).items():
+            origins[item] = (report['node'], sent_at)
+
+    node_count = len(reports)
+    hop_latencies = []
+    full_latencies = []
+    completed_at = []
+    for item, (origin, sent_at) in origins.items():
+        arrivals = [
+            report[arrival_field][item] - sent_at
+            for report in reports
+            if report['node'] != origin and item in report.get(arrival_field, {})
+        ]
+        hop_latencies.extend(arrivals)
+        if len(arrivals) == node_count - 1:
+            full = max(arrivals) if arrivals else 0.0
+            full_latencies.append(full)
+            completed_at.append(sent_at + full)
+    return origins, hop_latencies, full_latencies, completed_at
+
+
+def _delivery_ratio(delivered: int, items: int, node_count: int) -> float:
+    expected = items * (node_count - 1)
+    return round(delivered / expected, 4) if expected else 1.0
+
+
+def summarize(reports: List[dict], elapsed: float) -> dict:
+    """Combine per-node reports into network-wide propagation and bandwidth numbers"""
+    node_count = len(reports)
+    sent, hop_latencies, full_latencies, completed_at = _propagation(reports, 'sent', 'arrivals')
+    first_sent = min((sent_at for _, sent_at in sent.values()), default=0.0)
+    span = (max(completed_at) - first_sent) if completed_at else 0.0
+
+    produced, block_hops, block_full, _ = _propagation(reports, 'produced', 'blocks')
+    block_txs = sum(report.get('produced_txs', 0) for report in reports)
+
+    return {
+        'nodes': node_count,
+        'transactions': len(sent),
+        'fully_propagated': len(full_latencies),
+        'delivery_ratio': _delivery_ratio(len(hop_latencies), len(sent), node_count),
+        'propagation_ms': _percentiles(hop_latencies),
+        'full_propagation_ms': _percentiles(full_latencies),
+        'tps': round(len(full_latencies) / span, 2) if span > 0 else 0.0,
+        'blocks': {
+            'produced': len(produced),
+            'transactions': block_txs,
+            'fully_propagated': len(block_full),
+            'delivery_ratio': _delivery_ratio(len(block_hops), len(produced), node_count),
+            'propagation_ms': _percentiles(block_hops),
+            'full_propagation_ms': _percentiles(block_full),
+            'tps': round(block_txs / elapsed, 2) if elapsed else 0.0
+        },
+        'bandwidth': {
+            str(report['node']): {
+                'bytes_sent_per_sec': round(report['traffic']['bytes_sent'] / elapsed, 1) if elapsed else 0.0,
+                'bytes_received_per_sec': round(report['traffic']['bytes_received'] / elapsed, 1) if elapsed else 0.0,
+                **report['traffic']
+            } for report in reports
+        }
+    }
+
+
+def _save_genesis(genesis_db: str):
+    """Copy this node's database, so the other nodes start from the same genesis and state"""
+    import sqlite3
+    from src.utils import database
+
+    source = sqlite3.connect(database.DB_FILE)
+    target = sqlite3.connect(genesis_db)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+
+def _node_main(index: int, config: SimulationConfig, node_dir: str, genesis_db: str, conn):
+    """Entry point of one simulated node process; node 0 creates the genesis and produces blocks"""
+    # Every relative path the node uses (data/, logs/) lands in its own directory
+    os.makedirs(os.path.join(node_dir, "data", "migrations"), exist_ok=True)
+    os.chdir(node_dir)
+    if index:
+        shutil.copy(genesis_db, os.path.join("data", "blockchain.db"))
+
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from src.utils.database import init_db
+    from src.utils.crypto import address_from_public_key
+
+    init_db()
+
+    from src.blockchain.block_producer import BlockProducer
+    from src.blockchain.chain import Blockchain
+    from src.blockchain.db.state_db import StateDB
+    from src.blockchain.mempool import Mempool
+    from src.blockchain.transaction import Transaction
+    from src.blockchain.consensus.validator_registry import ValidatorRegistry
+    from src.p2p.link import LinkConditioner
+    from src.p2p.network import P2PNetwork
+
+    producer_key = None
+    if index == 0:
+        # Registered before the genesis block pins the first epoch's validator set
+        producer_key = ec.generate_private_key(ec.SECP256K1())
+        producer_pem = producer_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+        producer_address = ValidatorRegistry.get_validator_address(producer_key)
+        ValidatorRegistry.register_validator(producer_address, producer_pem, PRODUCER_STAKE)
+
+    blockchain = Blockchain()
+    if index == 0:
+        _save_genesis(genesis_db)
+    if config.block_time:
+        blockchain.election.slot_duration = config.block_time  # proofs only verify with the same slots
+    mempool = Mempool()
+    network = P2PNetwork(config.host, config.base_port + index, blockchain, bootstrap_nodes=[])
+    network.peer_discovery.target_peers = 0  # keep the simulated topology fixed
+    blockchain.p2p_network = network
+    mempool.blockchain = blockchain
+    mempool.p2p_network = network
+    network.set_mempool(mempool)
+
+    # Track when each block was added to this node's chain; for node 0, when it was produced
+    blocks = {}
+    add_block = blockchain.add_block
+
+    def tracked_add_block(*args, **kwargs):
+        added = add_block(*args, **kwargs)
+        if added is not None:
+            blocks.setdefault(added.hash, time.time())
+        return added
+
+    blockchain.add_block = tracked_add_block
+    producer = None
+    if producer_key is not None and config.block_time:
+        producer = BlockProducer(blockchain, mempool, producer_key, producer_address)
+    if config.latency or config.jitter or config.loss:
+        network.link = LinkConditioner(config.latency, config.jitter, config.loss,
+                                       rng=random.Random(config.seed * 1000 + index))
+
+    # Track when each transaction first reached this node's mempool
+    arrivals = {}
+    add_transaction = mempool.add_transaction
+
+    def tracked_add(tx):
+        added = add_transaction(tx)
+        if added:
+            arrivals.setdefault(tx.tx_hash, time.time())
+        return added
+
+    mempool.add_transaction = tracked_add
+
+    sender_key = ec.generate_private_key(ec.SECP256K1())
+    sender_pem = sender_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    sender = address_from_public_key(sender_pem)
+    conn.send(("ready", {'sender': sender, 'public_key': sender_pem}))
+
+    sent = {}
+    try:
+        while True:
+            command, payload = conn.recv()
+            if command == "register":
+                for address, pem in payload:
+                    ValidatorRegistry.register_validator(address, pem, 0.0)
+                    # An account row keeps the key once the sender's nonce is written
+                    StateDB().update_account(address, pem, nonce=0)
+                    StateDB().update_balance(address, SENDER_BALANCE)
+                conn.send(("ok", None))
+            elif command == "produce":
+                if producer is not None:
+                    producer.start()
+                conn.send(("ok", producer is not None))
+            elif command == "connect":
+                for peer_index in payload:
+                    network.connect_to_peer(config.host, config.base_port + peer_index)
+                conn.send(("ok", len(network.peers)))
+            elif command == "load":
+                count, interval, start_at = payload
+                time.sleep(max(0.0, start_at - time.time()))
+                for seq in range(count):
+                    due = start_at + seq * interval
+                    time.sleep(max(0.0, due - time.time()))
+                    sent_at = time.time()
+                    tx = Transaction(
+                        sender=sender,
+                        recipient=f"sim-{index}",
+                        amount=1.0,
+                        data={'sim_node': index, 'seq': seq},
+                        timestamp=sent_at,
+                        nonce=seq + 1
+                    )
+                    tx.sign(sender_key)
+                    if tracked_add(tx):
+                        sent[tx.tx_hash] = sent_at
+                conn.send(("ok", len(sent)))
+            elif command == "report":
+                if producer is not None:
+                    producer.stop()
+                conn.send(("report", {
+                    'node': index,
+                    'sent': dict(sent),
+                    'arrivals': dict(arrivals),
+                    'produced': dict(blocks) if producer is not None else {},
+                    'produced_txs': producer.transactions_included if producer else 0,
+                    'blocks': dict(blocks),
+                    'traffic': network.traffic.snapshot(),
+                    'peers': len(network.peers)
+                }))
+            elif command == "stop":
+                break
+    finally:
+        if producer is not None:
+            producer.stop()
+        network.stop()
+        conn.close()
+
+
+class Simulator:
+    """Runs a simulated network and collects its measurements"""
+
+    def __init__(self, config: SimulationConfig):
+        self.config = config
+        self.context = multiprocessing.get_context("spawn")
+        self.processes = []
+        self.pipes = []
+        self.data_dir = None
+
+    def _call(self, index: int, command: str, payload=None, timeout: float = READY_TIMEOUT):
+        conn = self.pipes[index]
+        conn.send((command, payload))
+        if not conn.poll(timeout):
+            raise TimeoutError(f"Node {index} did not answer '{command}'")
+        return conn.recv()[1]
+
+    def start(self) -> List[dict]:
+        config = self.config
+        self.data_dir = config.data_dir or tempfile.mkdtemp(prefix="vex-sim-")
+        genesis_db = os.path.join(self.data_dir, "genesis.db")
+        identities = []
+        for index in range(config.nodes):
+            parent_conn, child_conn = self.context.Pipe()
+            node_dir = os.path.join(self.data_dir, f"node_{index}")
+            process = self.context.Process(
+                target=_node_main, args=(index, config, node_dir, genesis_db, child_conn), daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+            self.pipes.append(parent_conn)
+            if index == 0:
+                # The others copy node 0's genesis, which exists once it is ready
+                identities.append(self._ready(0))
+
+        for index in range(1, config.nodes):
+            identities.append(self._ready(index))
+        return identities
+
+    def _ready(self, index: int) -> dict:
+        conn = self.pipes[index]
+        if not conn.poll(READY_TIMEOUT):
+            raise TimeoutError(f"Node {index} failed to start")
+        return conn.recv()[1]
+
+    def run(self) -> dict:
+        config = self.config
+        try:
+            identities = self.start()
+            senders = [(identity['sender'], identity['public_key']) for identity in identities]
+            for index in range(config.nodes):
+                self._call(index, "register", senders)
+
+            topology = build_topology(config.nodes, config.degree, config.seed)
+            for index, peers in topology.items():
+                self._call(index, "connect", peers)
+
+            # Exchange a round of messages so sessions are negotiated before measuring
+            time.sleep(1.0 + 2 * config.latency)
+            self._call(0, "produce")
+
+            per_node = config.tx_rate / config.nodes if config.nodes else 0
+            count = int(per_node * config.duration)
+            interval = 1.0 / per_node if per_node else 0.0
+            start_at = time.time() + 0.5
+            for conn in self.pipes:
+                conn.send(("load", (count, interval, start_at)))
+            for index, conn in enumerate(self.pipes):
+                if not conn.poll(config.duration + READY_TIMEOUT):
+                    raise TimeoutError(f"Node {index} did not finish its load")
+                conn.recv()
+
+            time.sleep(config.settle)
+            reports = [self._call(index, "report") for index in range(config.nodes)]
+            elapsed = time.time() - start_at
+
+            summary = summarize(reports, elapsed)
+            summary['config'] = {k: v for k, v in asdict(config).items() if k != 'data_dir'}
+            return summary
+        finally:
+            self.stop()
+
+    def stop(self):
+        for conn in self.pipes:
+            try:
+                conn.send(("stop", None))
+            except (OSError, BrokenPipeError):
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        self.pipes = []
+        if self.data_dir and not self.config.keep_data and not self.config.data_dir:
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate a local network of nodes")
+    parser.add_argument('--nodes', type=int, default=5)
+    parser.add_argument('--degree', type=int, default=3)
+    parser.add_argument('--tx-rate', type=float, default=50.0, help="transactions/sec across the network")
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--settle', type=float, default=5.0)
+    parser.add_argument('--latency', type=float, default=0.0, help="one-way link latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--loss', type=float, default=0.0, help="message loss probability")
+    parser.add_argument('--block-time', type=float, default=1.0, help="slot seconds of node 0; 0 disables blocks")
+    parser.add_argument('--base-port', type=int, default=17000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--data-dir', default=None)
+    parser.add_argument('--keep-data', action='store_true')
+    args = parser.parse_args(argv)
+
+    config = SimulationConfig(
+        nodes=args.nodes, degree=args.degree, tx_rate=args.tx_rate, duration=args.duration,
+        settle=args.settle, latency=args.latency, jitter=args.jitter, loss=args.loss, block_time=args.block_time,
+        base_port=args.base_port, seed=args.seed, data_dir=args.data_dir, keep_data=args.keep_data
+    )
+    print(json.dumps(Simulator(config).run(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
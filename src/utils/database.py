@@ -19,6 +19,38 @@ def db_connection():
     finally:
         conn.close()
 
+def _add_missing_columns(cursor, table, columns):
+    """Add columns introduced after a table was first created"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cursor.fetchall()}
+    added = []
+    for name, definition in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+            added.append(name)
+    return added
+
+def _backfill_cumulative_weight(cursor):
+    """Fill blocks.cumulative_weight for chains stored before the column existed"""
+    cursor.execute('SELECT id, stake_amount FROM blocks ORDER BY "index"')
+    weight, updates = 0.0, []
+    for block_id, stake_amount in cursor.fetchall():
+        weight += max(float(stake_amount or 0), 0.0)
+        updates.append((weight, block_id))
+    cursor.executemany("UPDATE blocks SET cumulative_weight = ? WHERE id = ?", updates)
+
+# State tables whose changes are journaled per block so a reorg can undo them:
+# table -> (key column, columns restored on undo)
+JOURNALED_TABLES = {
+    'accounts': ('address', ('address', 'public_key_pem', 'nonce')),
+    'balances': ('address', ('address', 'balance')),
+    'validators': ('address', ('address', 'public_key_pem', 'stake', 'last_active')),
+    'stakes': ('tx_hash', ('tx_hash', 'address', 'amount', 'block_number', 'timestamp')),
+    'contracts': ('address', ('id', 'address', 'code', 'creator', 'created_at', 'code_hash')),
+    'contract_state': ('contract_address', ('contract_address', 'storage')),
+    'validator_epochs': ('epoch', ('epoch', 'stakes', 'boundary_hash', 'nonce')),
+}
+
 def init_db():
     os.makedirs("data", exist_ok=True)
 
@@ -63,7 +95,10 @@ def init_db():
             difficulty INTEGER NOT NULL,
             validator TEXT,
             stake_amount REAL,
-            signature TEXT
+            signature TEXT,
+            slot INTEGER DEFAULT -1,
+            vrf_proof TEXT,
+            cumulative_weight REAL NOT NULL DEFAULT 0  -- fork-choice weight of the chain ending here
         );
 
         -- جدول تراکنش‌ها
@@ -83,7 +118,12 @@ def init_db():
         -- جدول نودهای شبکه
         CREATE TABLE IF NOT EXISTS nodes (
             address TEXT PRIMARY KEY,
-            last_seen REAL DEFAULT (strftime('%s', 'now'))
+            last_seen REAL DEFAULT (strftime('%s', 'now')),
+            host TEXT,
+            port INTEGER,
+            last_success REAL,
+            latency REAL,
+            failures INTEGER NOT NULL DEFAULT 0
         );
 
        -- جدول ولیدیتورها
@@ -116,13 +156,22 @@ def init_db():
             fee REAL DEFAULT 0
         );
 
+        -- Contract code, stored once however many contracts were deployed with it
+        CREATE TABLE IF NOT EXISTS contract_code (
+            code_hash TEXT PRIMARY KEY,  -- sha256 of the source
+            code TEXT NOT NULL,
+            compiled TEXT,  -- JSON instruction array produced by the contract compiler
+            analysis TEXT  -- JSON static analysis (gas bounds, loops) made at deploy
+        );
+
         -- جدول قراردادها
         CREATE TABLE IF NOT EXISTS contracts (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             address TEXT NOT NULL UNIQUE,
-            code TEXT NOT NULL,
+            code TEXT NOT NULL DEFAULT '',  -- unused; the source lives in contract_code
             creator TEXT NOT NULL,
-            created_at REAL NOT NULL
+            created_at REAL NOT NULL,
+            code_hash TEXT  -- contract_code row
         );
 
         -- جدول وضعیت ذخیره‌سازی قراردادها
@@ -202,6 +251,25 @@ def init_db():
         CREATE INDEX IF NOT EXISTS idx_gas_usage_tx ON gas_usage(tx_hash);
         ''')
 
+        # Columns added after the first release; CREATE IF NOT EXISTS won't add them
+        added = _add_missing_columns(cursor, 'blocks', {
+            'slot': 'INTEGER DEFAULT -1',
+            'vrf_proof': 'TEXT',
+            'cumulative_weight': 'REAL NOT NULL DEFAULT 0'
+        })
+        if 'cumulative_weight' in added:
+            _backfill_cumulative_weight(cursor)
+        _add_missing_columns(cursor, 'contracts', {
+            'code_hash': 'TEXT'
+        })
+        _add_missing_columns(cursor, 'nodes', {
+            'host': 'TEXT',
+            'port': 'INTEGER',
+            'last_success': 'REAL',
+            'latency': 'REAL',
+            'failures': 'INTEGER NOT NULL DEFAULT 0'
+        })
+
         # ایجاد جدول وضعیت زنجیره (برای ذخیره آخرین حالت)
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS chain_state (
@@ -211,15 +279,72 @@ def init_db():
             last_block_hash TEXT,
             last_block_timestamp REAL,
             last_updated REAL DEFAULT (strftime('%s', 'now')),
-            schema_version INTEGER DEFAULT 1  -- ADDED THIS LINE
+            schema_version INTEGER DEFAULT 1,  -- ADDED THIS LINE
+            snapshot_height INTEGER,  -- chain starts at this snapshot anchor instead of genesis
+            snapshot_hash TEXT
         )
         ''')
 
+        _add_missing_columns(cursor, 'chain_state', {
+            'snapshot_height': 'INTEGER',
+            'snapshot_hash': 'TEXT'
+        })
+
         # ایجاد رکورد اولیه برای وضعیت زنجیره
         cursor.execute('''
         INSERT OR IGNORE INTO chain_state (id, total_blocks, total_transactions)
         VALUES (1, 0, 0)
         ''')
 
+        # Validator stakes pinned when the chain reaches each epoch boundary
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS validator_epochs (
+            epoch INTEGER PRIMARY KEY,
+            stakes TEXT NOT NULL,  -- JSON object of address -> stake
+            boundary_hash TEXT,    -- last block the epoch's election nonce was derived from
+            nonce TEXT
+        )
+        ''')
+        _add_missing_columns(cursor, 'validator_epochs', {
+            'boundary_hash': 'TEXT',
+            'nonce': 'TEXT'
+        })
+
+        # Per-block undo journal for reorgs
+        cursor.executescript('''
+        CREATE TABLE IF NOT EXISTS state_journal (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            block_hash TEXT NOT NULL,
+            block_height INTEGER NOT NULL,
+            tbl TEXT NOT NULL,
+            row_key TEXT NOT NULL,
+            old_row TEXT  -- JSON array of the row before the change; NULL if it did not exist
+        );
+        CREATE INDEX IF NOT EXISTS idx_state_journal_block ON state_journal(block_hash);
+        CREATE INDEX IF NOT EXISTS idx_state_journal_height ON state_journal(block_height);
+        ''')
+
+        # Finality: checkpoints a stake supermajority attested to, and the votes per epoch
+        cursor.executescript('''
+        CREATE TABLE IF NOT EXISTS checkpoints (
+            epoch INTEGER PRIMARY KEY,
+            block_hash TEXT NOT NULL,
+            height INTEGER NOT NULL,
+            attested_stake REAL NOT NULL,
+            total_stake REAL NOT NULL,
+            finalized_at REAL NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS attestations (
+            epoch INTEGER NOT NULL,
+            validator TEXT NOT NULL,
+            block_hash TEXT NOT NULL,
+            height INTEGER NOT NULL,
+            signature TEXT NOT NULL,
+            received_at REAL NOT NULL,
+            PRIMARY KEY (epoch, validator)
+        );
+        ''')
+
         conn.commit()
         logger.info("Database initialized successfully with all tables and indexes")
@@ -1,5 +1,6 @@
 import pytest
 import os
+import src.utils.database as database
 from src.utils.database import init_db, db_connection
 
 @pytest.fixture(scope="function")
@@ -12,6 +13,14 @@ def clean_db():
     if os.path.exists("data/blockchain.db"):
         os.remove("data/blockchain.db")
 
+@pytest.fixture
+def tmp_db(tmp_path, monkeypatch):
+    """A fresh database in tmp_path, used by every db_connection() for the test"""
+    monkeypatch.setattr(database, "DB_FILE", str(tmp_path / "chain.db"))
+    monkeypatch.setattr(database, "MIGRATION_DIR", str(tmp_path))
+    database.init_db()
+    return tmp_path
+
 @pytest.fixture
 def sample_transaction():
     """تراکنش نمونه برای تست"""
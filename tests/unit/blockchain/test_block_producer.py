@@ -0,0 +1,192 @@
+import shutil
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+import src.utils.database as database
+from src.blockchain.block import Block
+from src.blockchain.block_producer import BlockProducer
+from src.blockchain.chain import Blockchain
+from src.blockchain.consensus.pos import ProofOfStake
+from src.blockchain.consensus.validator_registry import ValidatorRegistry
+from src.blockchain.consensus.validator_set import ValidatorSetCache, validator_sets
+from src.blockchain.db.state_db import StateDB
+from src.blockchain.mempool import Mempool
+from src.blockchain.node import BlockchainNode
+from src.blockchain.transaction import Transaction
+
+NONCE = b"\x07" * 32
+
+class FakeChain:
+    def __init__(self, election):
+        self.election = election
+        self.blocks = [Block(index=0, timestamp=0.0, transactions=[], previous_hash="0")]
+        self.fail = False
+
+    def get_last_block(self):
+        return self.blocks[-1]
+
+    def epoch_nonce(self, parent, height):
+        return NONCE
+
+    def create_block(self, transactions, private_key, slot, vrf_proof, timestamp=None):
+        if self.fail:
+            return None
+        last = self.blocks[-1]
+        block = Block(index=last.index + 1, timestamp=timestamp, transactions=transactions,
+                      previous_hash=last.hash, validator="me", slot=slot, vrf_proof=vrf_proof)
+        self.blocks.append(block)
+        return block
+
+class FakeMempool:
+    def __init__(self, count):
+        self.transactions = {}
+        for i in range(count):
+            tx = Transaction(sender="a", recipient="b", amount=1.0, data={'i': i}, timestamp=float(i))
+            self.transactions[tx.tx_hash] = tx
+        self.removed = []
+
+    def select_for_block(self, max_count, max_bytes, gas_limit):
+        return list(self.transactions.values())[:max_count]
+
+    def remove_transactions(self, tx_hashes):
+        self.removed.extend(tx_hashes)
+        for tx_hash in tx_hashes:
+            self.transactions.pop(tx_hash, None)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def _producer(txs=10, clock=None, **kwargs):
+    key = ec.generate_private_key(ec.SECP256K1())
+    election = ProofOfStake(validator_sets=ValidatorSetCache(loader=lambda epoch: {"me": 100.0}))
+    election.public_keys = {"me": key.public_key()}
+    chain = FakeChain(election)
+    producer = BlockProducer(chain, FakeMempool(txs), key, "me", slot_time=1.0,
+                             clock=clock or FakeClock(), **kwargs)
+    return producer, chain
+
+def _led_slots(producer, count):
+    return [slot for slot in range(1, 200)
+            if producer.election.elect(producer.private_key, "me", slot, 1, NONCE)][:count]
+
+def test_produces_verifiable_blocks_in_led_slots_only():
+    clock = FakeClock()
+    producer, chain = _producer(txs=10, clock=clock, max_block_txs=3)
+    led = _led_slots(producer, 2)
+    idle = next(slot for slot in range(led[0] + 1, 200)
+                if not producer.election.elect(producer.private_key, "me", slot, 2, NONCE))
+
+    clock.now = led[0] + 0.1
+    block = producer.produce(led[0])
+    assert block.slot == led[0] and len(block.transactions) == 3
+    assert producer.election.verify_leader("me", block.slot, block.index, NONCE, block.vrf_proof)
+    assert len(producer.mempool.removed) == 3
+
+    clock.now = idle + 0.1
+    assert producer.produce(idle) is None
+
+    metrics = producer.get_metrics()
+    assert metrics['blocks_produced'] == 1
+    assert metrics['slots_led'] == 1
+    assert metrics['production_latency_ms']['max'] == 100.0
+
+def test_counts_empty_missed_and_skipped_slots():
+    clock = FakeClock()
+    producer, chain = _producer(txs=0, clock=clock)
+    first, second, third = _led_slots(producer, 3)
+
+    clock.now = first
+    assert producer.produce(first) is None
+    assert producer.empty_slots == 1
+
+    producer.mempool = FakeMempool(2)
+    chain.fail = True
+    clock.now = second
+    assert producer.produce(second) is None
+    assert producer.missed_slots == 1
+
+    chain.fail = False
+    clock.now = third + 1.5  # finished after the slot ended
+    assert producer.produce(third) is not None
+    assert producer.missed_slots == 2
+    assert producer.skipped_slots == (second - first - 1) + (third - second - 1)
+
+def _register(address, stake):
+    key = ec.generate_private_key(ec.SECP256K1())
+    address = address or ValidatorRegistry.get_validator_address(key)
+    pem = key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    ValidatorRegistry.register_validator(address, pem, stake)
+    StateDB().update_account(address, pem, nonce=0)
+    return address, key
+
+def test_produced_block_is_accepted_by_another_node(tmp_path, monkeypatch):
+    def use(name):
+        monkeypatch.setattr(database, "DB_FILE", str(tmp_path / name))
+        validator_sets.invalidate()
+    monkeypatch.setattr(database, "MIGRATION_DIR", str(tmp_path))
+    use("producer.db")
+    database.init_db()
+    address, key = _register(None, 1000000.0)
+    alice, alice_key = _register("alice", 1.0)
+    producing = Blockchain()
+    StateDB().update_balance(alice, 100.0)
+    shutil.copy(tmp_path / "producer.db", tmp_path / "peer.db")  # same genesis and state
+
+    mempool = Mempool()
+    mempool.p2p_network = None
+    for nonce in (2, 1):  # arrival order is not nonce order
+        tx = Transaction(alice, "bob", 10.0, nonce=nonce, timestamp=float(nonce))
+        tx.sign(alice_key)
+        assert mempool.add_transaction(tx)
+
+    clock = FakeClock()
+    producer = BlockProducer(producing, mempool, key, address, clock=clock)
+    nonce = producing.epoch_nonce(producing.get_last_block(), 1)
+    slot = next(slot for slot in range(1, 1000) if producer.election.elect(key, address, slot, 1, nonce))
+    clock.now = producer.election.slot_start(slot) + 0.1
+    block = producer.produce(slot)
+    assert [tx.nonce for tx in block.transactions] == [1, 2]
+    assert block.stake_amount == 1000000.0
+    produced_state = StateDB().get_balance(alice), StateDB().get_balance("bob"), StateDB().get_balance(address)
+
+    use("peer.db")
+    peer = Blockchain()
+    assert peer.add_block(None, external_block=Block.from_dict(block.to_dict())) is not None
+    assert peer.get_last_block().hash == block.hash
+    assert (StateDB().get_balance(alice), StateDB().get_balance("bob"), StateDB().get_balance(address)) == produced_state
+
+def test_freshly_started_node_produces_block_one(tmp_db, monkeypatch):
+    # BlockchainNode's own startup order: wallet, chain, then validator registration
+    monkeypatch.chdir(tmp_db)
+    validator_sets.invalidate()
+    node = BlockchainNode(host="127.0.0.1", p2p_port=0, api_port=0)
+    try:
+        producer = node.block_producer
+        assert validator_sets.for_height(1).stake_of(producer.address) > 0
+
+        alice, alice_key = _register("alice", 1.0)
+        StateDB().update_balance(alice, 100.0)
+        node.mempool.p2p_network = None
+        tx = Transaction(alice, "bob", 10.0, nonce=1)
+        tx.sign(alice_key)
+        assert node.mempool.add_transaction(tx)
+
+        clock = FakeClock()
+        producer.clock = clock
+        nonce = node.blockchain.epoch_nonce(node.blockchain.get_last_block(), 1)
+        slot = next(slot for slot in range(1, 1000)
+                    if producer.election.elect(producer.private_key, producer.address, slot, 1, nonce))
+        clock.now = producer.election.slot_start(slot) + 0.1
+        block = producer.produce(slot)
+
+        assert block is not None and block.index == 1
+        assert node.blockchain.get_last_block().hash == block.hash
+        assert [t.tx_hash for t in block.transactions] == [tx.tx_hash]
+    finally:
+        node.p2p_network.stop()
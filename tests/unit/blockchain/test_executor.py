@@ -0,0 +1,169 @@
+import random
+from types import SimpleNamespace
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+import src.utils.database as database
+from src.blockchain.consensus.validator_registry import ValidatorRegistry
+from src.blockchain.contracts.vm import SmartContractVM
+from src.blockchain.db.state_db import StateDB
+from src.blockchain.db.undo_journal import UndoJournal
+from src.blockchain.executor import BlockExecutor, MultiVersionStore
+from src.blockchain.transaction import Transaction
+from src.utils.database import db_connection
+
+COUNTER = "SLOAD n count; ADD count n 1; SSTORE count count; RETURN count"
+
+KEYS = {f"acct{i}": ec.generate_private_key(ec.SECP256K1()) for i in range(6)}
+
+def _use_db(monkeypatch, path):
+    monkeypatch.setattr(database, "DB_FILE", str(path))
+    monkeypatch.setattr(database, "MIGRATION_DIR", str(path.parent))
+    database.init_db()
+    state = StateDB()
+    for address, key in KEYS.items():
+        pem = key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+        ValidatorRegistry.register_validator(address, pem, 1.0)
+        state.update_account(address, pem, nonce=0)
+        state.update_balance(address, 100.0)
+
+def _block(seed, count=40):
+    """Transfers between a few accounts: many share senders and recipients"""
+    rng = random.Random(seed)
+    nonces = {address: 0 for address in KEYS}
+    txs = []
+    for i in range(count):
+        sender, recipient = rng.sample(sorted(KEYS), 2)
+        nonces[sender] += 1
+        tx = Transaction(sender, recipient, rng.randint(1, 5), timestamp=1000.0 + i, nonce=nonces[sender])
+        tx.sign(KEYS[sender])
+        txs.append(tx)
+    return SimpleNamespace(index=1, timestamp=1000.0, transactions=txs)
+
+def _contract_block(address, calls):
+    """Calls to one contract; the VM doesn't bump nonces, so every call carries nonce 1"""
+    txs = [SimpleNamespace(contract_type="CALL", contract_address=address, contract_args={},
+                           sender=f"acct{i % 2}", amount=0, gas_limit=100000, nonce=1,
+                           tx_hash=f"call{i}", is_valid=lambda: True)
+           for i in range(calls)]
+    return SimpleNamespace(index=2, timestamp=1000.0, transactions=txs)
+
+def _deploy(code):
+    tx = SimpleNamespace(contract_type="CREATE", contract_code=code, contract_address=None,
+                         contract_args={}, sender="acct0", amount=0, gas_limit=100000, tx_hash="deploy")
+    ok, address = SmartContractVM(StateDB()).execute(tx, 1, 0.0)
+    assert ok
+    return address
+
+def _state():
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT address, balance FROM balances ORDER BY address")
+        balances = cursor.fetchall()
+        cursor.execute("SELECT address, nonce, public_key_pem != '' FROM accounts ORDER BY address")
+        return balances, cursor.fetchall()
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_parallel_execution_matches_serial(tmp_path, monkeypatch, seed):
+    _use_db(monkeypatch, tmp_path / "serial.db")
+    assert BlockExecutor(workers=1).execute(_block(seed))
+    serial = _state()
+
+    _use_db(monkeypatch, tmp_path / "parallel.db")
+    executor = BlockExecutor(workers=4)
+    try:
+        assert executor.execute(_block(seed))
+    finally:
+        executor.close()
+    assert _state() == serial
+    assert executor.get_stats()['executions'] >= 40
+
+def test_failing_transaction_rejects_batch_without_writes(tmp_path, monkeypatch):
+    _use_db(monkeypatch, tmp_path / "chain.db")
+    before = _state()
+    block = _block(1, count=10)
+    overdraw = Transaction("acct0", "acct1", 1000, timestamp=2000.0,
+                           nonce=sum(tx.sender == "acct0" for tx in block.transactions) + 1)
+    overdraw.sign(KEYS["acct0"])
+    block.transactions.append(overdraw)
+
+    executor = BlockExecutor(workers=4)
+    try:
+        assert not executor.execute(block)
+    finally:
+        executor.close()
+    assert _state() == before
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_block_loads_and_writes_contract_storage_once(tmp_path, monkeypatch, workers):
+    _use_db(monkeypatch, tmp_path / "chain.db")
+    address = _deploy(COUNTER)
+    calls = {'load_storage': 0, 'save_storage': 0, 'apply_changes': 0}
+    for name in calls:
+        def counted(self, *args, _name=name, _original=getattr(StateDB, name)):
+            calls[_name] += 1
+            return _original(self, *args)
+        monkeypatch.setattr(StateDB, name, counted)
+
+    executor = BlockExecutor(workers=workers)
+    try:
+        assert executor.execute(_contract_block(address, 5))
+    finally:
+        executor.close()
+    assert StateDB().load_storage(address) == {'count': 5}
+    assert calls == {'load_storage': 2, 'save_storage': 0, 'apply_changes': 1}  # one load is the assert's
+    assert executor.get_stats()['flushes'] == 1
+
+def test_failed_block_discards_buffered_contract_state(tmp_path, monkeypatch):
+    _use_db(monkeypatch, tmp_path / "chain.db")
+    address = _deploy(COUNTER)
+    block = _contract_block(address, 3)
+    block.transactions.append(_contract_block("missing", 1).transactions[0])
+
+    assert not BlockExecutor(workers=1).execute(block)
+    assert StateDB().load_storage(address) == {}
+
+def test_multi_version_store_tracks_latest_lower_writer():
+    store = MultiVersionStore()
+    key = ('balance', "alice")
+    store.record(0, 0, {key: 10.0})
+    store.record(3, 0, {key: 30.0})
+
+    assert store.read(key, 0) == (None, None)
+    assert store.read(key, 2) == ((0, 0), 10.0)
+    assert store.read(key, 5) == ((3, 0), 30.0)
+
+    # A new write below a reader invalidates what it saw
+    store.record(1, 0, {key: 11.0})
+    assert not store.is_current({key: (0, 0)}, 2)
+    assert store.is_current({key: (1, 0)}, 2)
+
+    # A re-execution that no longer writes the key withdraws the old value
+    store.record(1, 1, {})
+    assert store.read(key, 2) == ((0, 0), 10.0)
+
+def test_stake_registers_validator_in_the_journaled_flush(tmp_path, monkeypatch):
+    _use_db(monkeypatch, tmp_path / "chain.db")
+    key = ec.generate_private_key(ec.SECP256K1())
+    pem = key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    StateDB().update_account("staker", pem, nonce=0)
+    StateDB().update_balance("staker", 100.0)
+    stake = Transaction("staker", "staking", 40.0, contract_type="VEX_STAKE", nonce=1, timestamp=1000.0)
+    stake.sign(key)
+
+    executor = BlockExecutor(workers=4)
+    state = executor.run(SimpleNamespace(index=1, timestamp=1000.0, transactions=[stake]))
+    assert StateDB().load_validator("staker") is None  # nothing written before the flush
+    executor.flush(state, journal=("block-1", 1))
+    assert StateDB().load_validator("staker") == (pem, 40.0)
+    assert StateDB().get_balance("staker") == 60.0
+
+    UndoJournal.undo("block-1")
+    assert StateDB().load_validator("staker") is None
+    assert StateDB().get_balance("staker") == 100.0
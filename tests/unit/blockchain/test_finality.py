@@ -0,0 +1,129 @@
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from src.blockchain.block import Block
+from src.blockchain.chain import Blockchain
+from src.blockchain.consensus.finality import Attestation, FinalityGadget
+from src.blockchain.consensus.validator_registry import ValidatorRegistry
+from src.blockchain.consensus.validator_set import ValidatorSetCache
+from src.blockchain.db.undo_journal import UndoJournal
+
+STAKE = 1000000.0  # as much as the genesis validator, so test validators lead slots often
+
+def _validator(address, stake=10.0):
+    key = ec.generate_private_key(ec.SECP256K1())
+    pem = key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    ValidatorRegistry.register_validator(address, pem, stake)
+    return address, key
+
+def _sets(stakes, **kwargs):
+    """Validator sets with every epoch already pinned to stakes"""
+    return ValidatorSetCache(loader=lambda epoch: stakes, pinned_loader=lambda epoch: stakes, **kwargs)
+
+def _vote(validator, epoch, block_hash, height):
+    address, key = validator
+    attestation = Attestation(address, epoch, block_hash, height)
+    attestation.sign(key)
+    return attestation
+
+def _child(chain, parent, validator, stake=STAKE):
+    """A block by validator on parent, in the first later slot it leads"""
+    address, key = validator
+    nonce = chain.epoch_nonce(chain.chain[0], 1)  # every test block is in the genesis epoch
+    slot, proof = next((slot, proof) for slot in range(parent.slot + 1, parent.slot + 1000)
+                       for proof in [chain.election.elect(key, address, slot, parent.index + 1, nonce)] if proof)
+    block = Block(index=parent.index + 1, timestamp=chain.election.slot_start(slot), transactions=[],
+                  previous_hash=parent.hash, validator=address, stake_amount=stake,
+                  slot=slot, vrf_proof=proof)
+    block.sign_block(key, stake)
+    return block
+
+def test_checkpoint_needs_more_than_two_thirds_of_stake(tmp_db):
+    a, b, c = _validator("a"), _validator("b"), _validator("c")
+    gadget = FinalityGadget(_sets({"a": 40.0, "b": 30.0, "c": 30.0}), epoch_length=10)
+
+    assert gadget.add_attestation(_vote(b, 1, "h1", 10)) is True
+    assert gadget.add_attestation(_vote(c, 1, "h1", 10)) is True
+    assert gadget.supermajority(1) is None  # 60% of stake
+
+    assert gadget.add_attestation(_vote(a, 1, "h1", 10)) is True
+    vote = gadget.supermajority(1)
+    assert vote.block_hash == "h1"
+
+    gadget.finalize(1, "h1", 10)
+    assert gadget.finalized_height == 10 and gadget.is_final(10)
+    assert FinalityGadget.get_checkpoints()[0]['attested_stake'] == 100.0
+    assert gadget.add_attestation(_vote(a, 1, "h1", 10)) is False  # epoch already final
+
+def test_rejects_forged_and_equivocating_votes(tmp_db):
+    a = _validator("a")
+    _validator("b")
+    gadget = FinalityGadget(_sets({"a": 50.0, "b": 50.0}), epoch_length=10)
+
+    forged = _vote(a, 1, "h1", 10)
+    forged.validator = "b"
+    assert gadget.add_attestation(forged) is None
+    assert gadget.add_attestation(_vote(a, 1, "h1", 11)) is None  # not a checkpoint height
+    outsider = _validator("c")
+    assert gadget.add_attestation(_vote(outsider, 1, "h1", 10)) is None  # no stake in the epoch
+
+    assert gadget.add_attestation(_vote(a, 1, "h1", 10)) is True
+    assert gadget.add_attestation(_vote(a, 1, "h2", 10)) is False
+    assert gadget.get_status()['equivocations'] == 1
+    assert gadget.get_status()['attestations_rejected'] == 3
+
+def test_votes_wait_for_their_epochs_pinned_validator_set(tmp_db):
+    a = _validator("a")
+    pinned = {}
+    gadget = FinalityGadget(ValidatorSetCache(loader=lambda epoch: {"a": 10.0}, pinned_loader=pinned.get),
+                            epoch_length=10)
+
+    # Stake in the live registry or an older epoch doesn't count: epoch 1 isn't pinned yet
+    assert gadget.add_attestation(_vote(a, 1, "h1", 10)) is False
+    assert gadget.supermajority(1) is None
+    forged = _vote(a, 1, "h1", 10)
+    forged.signature = _vote(a, 1, "h2", 10).signature
+    assert gadget.add_attestation(forged) is None
+    assert gadget.get_status()['early_attestations'] == 1
+
+    pinned[1] = {"a": 10.0}
+    assert gadget.release_early() == 1
+    assert gadget.supermajority(1).block_hash == "h1"
+    assert gadget.get_status()['early_attestations'] == 0
+
+def test_finality_prunes_history_and_blocks_deep_reorgs(tmp_db):
+    # Registered before genesis pins the first epoch's validator set
+    a = _validator("validator-a", STAKE)
+    b = _validator("validator-b", STAKE)
+    chain = Blockchain()
+    genesis = chain.get_last_block()
+    chain.finality.epoch_length = 2
+    chain.finality.validator_sets = _sets({"validator-a": 10.0}, epoch_length=2)
+    chain.finality.set_signer(a[1], "validator-a")
+
+    main, parent = [], genesis
+    side = _child(chain, genesis, b)
+    for height in range(1, 5):
+        parent = _child(chain, parent, a)
+        assert chain.add_block(None, external_block=parent)
+        main.append(parent)
+        if height == 2:
+            chain.add_block(None, external_block=side)
+            assert chain.tree.contains(side.hash)
+            assert chain.finality.finalized_height == 0
+
+    # Our own vote is the whole stake: the checkpoint at height 2 became final at tip height 4
+    assert chain.finality.finalized_height == 2
+    assert chain.finality.finalized_hash == main[1].hash
+    assert not chain.tree.contains(side.hash) and not chain.tree.contains(genesis.hash)
+    assert not UndoJournal.has_entries(main[1].hash)
+
+    # A branch forking below the checkpoint is refused however heavy it gets
+    fork = _child(chain, main[0], b)
+    assert chain.add_block(None, external_block=fork) is None
+    assert chain.get_last_block().hash == main[-1].hash
+
+    restarted = Blockchain()
+    assert restarted.finality.finalized_height == 2
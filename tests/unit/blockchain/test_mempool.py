@@ -32,4 +32,16 @@ def test_mempool_clear_expired(sample_transaction):
     mempool.add_transaction(tx)
     mempool.clear_expired(expiry_seconds=1)
     
-    assert tx.tx_hash not in mempool.transactions
\ No newline at end of file
+    assert tx.tx_hash not in mempool.transactions
+
+
+def test_select_for_block_keeps_each_senders_nonce_order(tmp_db):
+    mempool = Mempool()
+    # a's later nonces pay more, but can't go before its first
+    for sender, nonce, fee in [("a", 3, 9.0), ("a", 2, 8.0), ("a", 1, 1.0), ("b", 1, 5.0)]:
+        tx = Transaction(sender, "c", 1.0, fee=fee, nonce=nonce)
+        mempool.transactions[tx.tx_hash] = tx
+
+    selected = mempool.select_for_block(10, 10 ** 6, 10 ** 9)
+    assert [(tx.sender, tx.nonce) for tx in selected] == [("b", 1), ("a", 1), ("a", 2), ("a", 3)]
+    assert [(tx.sender, tx.nonce) for tx in mempool.select_for_block(2, 10 ** 6, 10 ** 9)] == [("b", 1), ("a", 1)]
@@ -0,0 +1,179 @@
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+import src.utils.database as database
+from src.blockchain.block import Block
+from src.blockchain.block_tree import BlockTree
+from src.blockchain.chain import Blockchain
+from src.blockchain.consensus.consensus import Consensus
+from src.blockchain.consensus.pos import VRF, ProofOfStake
+from src.blockchain.consensus.validator_registry import ValidatorRegistry
+from src.blockchain.db.repositories import BlockRepository
+from src.blockchain.db.state_db import StateDB
+from src.blockchain.db.undo_journal import UndoJournal
+
+STAKE = 1000000.0  # as much as the genesis validator, so test validators lead slots often
+
+def _validator(address, stake=STAKE):
+    """Register before the chain is created: the genesis epoch's validator set is pinned at genesis"""
+    key = ec.generate_private_key(ec.SECP256K1())
+    pem = key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    ValidatorRegistry.register_validator(address, pem, stake)
+    return address, key, stake
+
+def _child(chain, parent, validator):
+    """A block by validator on parent, in the first later slot it leads"""
+    address, key, stake = validator
+    nonce = chain.epoch_nonce(chain.chain[0], 1)  # every test block is in the genesis epoch
+    slot, proof = next((slot, proof) for slot in range(parent.slot + 1, parent.slot + 1000)
+                       for proof in [chain.election.elect(key, address, slot, parent.index + 1, nonce)] if proof)
+    block = Block(index=parent.index + 1, timestamp=chain.election.slot_start(slot), transactions=[],
+                  previous_hash=parent.hash, validator=address, stake_amount=stake,
+                  slot=slot, vrf_proof=proof)
+    block.sign_block(key, stake)
+    return block
+
+def _branch(chain, parent, validator, length):
+    blocks = []
+    for _ in range(length):
+        parent = _child(chain, parent, validator)
+        blocks.append(parent)
+    return blocks
+
+def test_undo_journal_restores_rows(tmp_db):
+    state = StateDB()
+    state.update_balance("alice", 5.0)
+    state.update_account("alice", "pem", nonce=0)
+
+    state.apply_changes({('balance', "alice"): 7.0, ('balance', "bob"): 3.0, ('nonce', "alice"): 1},
+                        journal=("block-1", 1))
+    state.update_balance("carol", 1.0)  # not the block's write: another thread's, say
+
+    assert UndoJournal.undo("block-1") == 3
+    assert state.get_balance("alice") == 5.0
+    assert state.get_balance("bob") == 0
+    assert state.get_nonce("alice") == 0
+    assert state.get_balance("carol") == 1.0
+    assert not UndoJournal.has_entries("block-1")
+
+def test_heavier_branch_triggers_reorg_and_state_follows(tmp_db):
+    a = _validator("validator-a")
+    b = _validator("validator-b")
+    chain = Blockchain()
+    genesis = chain.get_last_block()
+    balance_a = StateDB().get_balance("validator-a")
+
+    for block in _branch(chain, genesis, a, 2):
+        assert chain.add_block(None, external_block=block)
+    assert StateDB().get_balance("validator-a") == balance_a + 100
+
+    side = _branch(chain, genesis, b, 3)
+    chain.add_block(None, external_block=side[0])
+    assert chain.get_last_block().hash == chain.chain[2].hash  # lighter branch is only stored
+    chain.add_block(None, external_block=side[1])  # equal weight: lower hash wins
+    chain.add_block(None, external_block=side[2])
+
+    assert chain.get_last_block().hash == side[2].hash
+    assert [block.hash for block in chain.chain[1:]] == [block.hash for block in side]
+    assert StateDB().get_balance("validator-a") == balance_a
+    assert StateDB().get_balance("validator-b") == 150
+    assert chain.reorgs >= 1
+
+    # Storage follows the new main chain
+    reloaded = Blockchain()
+    assert reloaded.get_last_block().hash == side[2].hash
+
+def test_failed_branch_restores_previous_chain(tmp_db):
+    a = _validator("validator-a")
+    b = _validator("validator-b", stake=5 * STAKE)
+    chain = Blockchain()
+    genesis = chain.get_last_block()
+    main = _branch(chain, genesis, a, 1)
+    chain.add_block(None, external_block=main[0])
+
+    heavy = _child(chain, genesis, b)
+    execute = chain._execute_transactions
+    chain._execute_transactions = lambda block: None if block.hash == heavy.hash else execute(block)
+    assert chain.add_block(None, external_block=heavy) is None
+
+    assert chain.get_last_block().hash == main[0].hash
+    assert not chain.tree.contains(heavy.hash)
+    assert StateDB().get_balance("validator-b") == 0
+
+def test_reorg_path_and_pruning():
+    tree = BlockTree(max_depth=3)
+    genesis = Block(index=0, timestamp=0.0, transactions=[], previous_hash="0")
+    tree.reset([genesis])
+    main = [genesis]
+    for i in range(1, 6):
+        main.append(Block(index=i, timestamp=float(i), transactions=[], previous_hash=main[-1].hash, stake_amount=1))
+        tree.add(main[-1])
+    fork = Block(index=4, timestamp=99.0, transactions=[], previous_hash=main[3].hash, stake_amount=5)
+    tree.add(fork)
+
+    undo, apply = tree.reorg_path(main[5].hash, fork.hash)
+    assert [b.index for b in undo] == [5, 4]
+    assert apply == [fork]
+    assert tree.best_tip() == fork.hash
+
+    tree.prune(tip_height=5)
+    assert not tree.contains(main[1].hash)
+    assert tree.contains(main[2].hash)
+
+def test_cumulative_weight_is_stored_and_survives_restart(tmp_db):
+    a = _validator("validator-a")
+    chain = Blockchain()
+    genesis = chain.get_last_block()
+    blocks = _branch(chain, genesis, a, 3)
+    for block in blocks:
+        assert chain.add_block(None, external_block=block)
+
+    base = genesis.cumulative_weight
+    assert BlockRepository.get_block_by_index(3).cumulative_weight == base + 3 * STAKE
+    assert Consensus.cumulative_weight(chain.chain) == base + 3 * STAKE
+
+    restarted = Blockchain()
+    assert restarted.get_last_block().cumulative_weight == base + 3 * STAKE
+    assert restarted.tree.get(blocks[-1].hash).weight == base + 3 * STAKE
+
+def test_cumulative_weight_backfilled_for_old_databases(tmp_db):
+    a = _validator("validator-a")
+    chain = Blockchain()
+    for block in _branch(chain, chain.get_last_block(), a, 2):
+        chain.add_block(None, external_block=block)
+    with database.db_connection() as conn:
+        conn.execute("ALTER TABLE blocks DROP COLUMN cumulative_weight")
+        conn.commit()
+
+    database.init_db()
+    assert BlockRepository.get_block_by_index(2).cumulative_weight == chain.chain[0].stake_amount + 2 * STAKE
+
+def test_slotless_and_unelected_blocks_are_rejected(tmp_db):
+    a = _validator("validator-a")
+    outsider = _validator("outsider", stake=0.0)
+    chain = Blockchain()
+    genesis = chain.get_last_block()
+
+    slotless = Block(index=1, timestamp=genesis.timestamp + 1, transactions=[], previous_hash=genesis.hash,
+                     validator="validator-a", stake_amount=STAKE)
+    slotless.sign_block(a[1], STAKE)
+    assert chain.add_block(None, external_block=slotless) is None
+
+    # A valid proof for a slot the outsider does not lead: it has no stake in the epoch
+    elected = _child(chain, genesis, a)
+    nonce = chain.epoch_nonce(genesis, 1)
+    proof = VRF(outsider[1]).prove(ProofOfStake.seed_for(elected.slot, nonce))[1].hex()
+    forged = Block(index=1, timestamp=elected.timestamp, transactions=[], previous_hash=genesis.hash,
+                   validator="outsider", stake_amount=STAKE, slot=elected.slot, vrf_proof=proof)
+    forged.sign_block(outsider[1], STAKE)
+    assert chain.add_block(None, external_block=forged) is None
+
+    # The elected producer, claiming more stake than its validator set gives it
+    inflated = Block(index=1, timestamp=elected.timestamp, transactions=[], previous_hash=genesis.hash,
+                     validator="validator-a", stake_amount=5 * STAKE, slot=elected.slot, vrf_proof=elected.vrf_proof)
+    inflated.sign_block(a[1], 5 * STAKE)
+    assert chain.add_block(None, external_block=inflated) is None
+
+    assert chain.add_block(None, external_block=elected)
@@ -0,0 +1,158 @@
+import shutil
+from types import SimpleNamespace
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives import serialization
+import src.utils.database as database
+from src.blockchain.block import Block
+from src.blockchain.chain import Blockchain
+from src.blockchain.consensus import vrf
+from src.blockchain.consensus.pos import VRF, ProofOfStake, leader_threshold
+from src.blockchain.consensus.validator_registry import ValidatorRegistry
+from src.blockchain.consensus.validator_set import ValidatorSetCache, validator_sets
+from src.blockchain.db.state_db import StateDB
+from src.blockchain.transaction import Transaction
+
+NONCE = b"\x01" * 32
+
+def _pem(key):
+    return key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+
+class StaticElection(ProofOfStake):
+    """Election over a fixed stake table with in-memory public keys"""
+
+    def __init__(self, stakes, keys, **kwargs):
+        super().__init__(validator_sets=ValidatorSetCache(loader=lambda epoch: dict(stakes)), **kwargs)
+        self.public_keys = {address: key.public_key() for address, key in keys.items()}
+
+def test_vrf_is_deterministic_and_verifiable():
+    key = ec.generate_private_key(ec.SECP256K1())
+    output, proof = VRF(key).prove(b"seed")
+
+    assert VRF(key).prove(b"seed") == (output, proof)
+    assert VRF.verify(key.public_key(), b"seed", proof) == output
+    assert VRF.verify(key.public_key(), b"other", proof) is None
+    other = ec.generate_private_key(ec.SECP256K1())
+    assert VRF.verify(other.public_key(), b"seed", proof) is None
+
+def test_vrf_output_does_not_depend_on_the_nonce(monkeypatch):
+    key = ec.generate_private_key(ec.SECP256K1())
+    output, proof = VRF(key).prove(b"seed")
+
+    # A prover picking its own nonce gets another valid proof, but never another output
+    monkeypatch.setattr(vrf, "nonce", lambda secret, h_string: 12345)
+    ground_output, ground_proof = VRF(key).prove(b"seed")
+    assert ground_proof != proof
+    assert VRF.verify(key.public_key(), b"seed", ground_proof) == output == ground_output
+
+    tampered = bytearray(proof)
+    tampered[-1] ^= 1
+    assert VRF.verify(key.public_key(), b"seed", bytes(tampered)) is None
+
+def test_leader_threshold_grows_with_stake():
+    assert leader_threshold(0, 100) == 0.0
+    assert leader_threshold(10, 100) < leader_threshold(50, 100) < leader_threshold(100, 100)
+    assert abs(leader_threshold(100, 100, active_slot_coeff=0.5) - 0.5) < 1e-9
+
+def test_elected_leaders_verify_and_others_do_not():
+    keys = {f"v{i}": ec.generate_private_key(ec.SECP256K1()) for i in range(4)}
+    election = StaticElection({address: 10.0 for address in keys}, keys)
+
+    leaders = 0
+    for slot in range(40):
+        for address, key in keys.items():
+            proof = election.elect(key, address, slot, 1, NONCE)
+            if proof is None:
+                continue
+            leaders += 1
+            assert election.verify_leader(address, slot, 1, NONCE, proof)
+            assert not election.verify_leader(address, slot + 1, 1, NONCE, proof)
+            assert not election.verify_leader(address, slot, 1, b"\x02" * 32, proof)
+            impostor = next(a for a in keys if a != address)
+            assert not election.verify_leader(impostor, slot, 1, NONCE, proof)
+    # f = 0.5: about half the slots have a leader, each validator leads ~16% of slots
+    assert 10 < leaders < 50
+
+def test_verification_results_are_cached():
+    key = ec.generate_private_key(ec.SECP256K1())
+    election = StaticElection({"solo": 1.0}, {"solo": key})
+    slot = next(s for s in range(100) if election.elect(key, "solo", s, 1, NONCE))
+    proof = election.elect(key, "solo", slot, 1, NONCE)
+
+    assert election.verify_leader("solo", slot, 1, NONCE, proof)
+    assert election.verify_leader("solo", slot, 1, NONCE, proof)
+    assert election.get_metrics()['cache_hits'] == 1
+    assert not election.verify_leader("solo", slot, 1, NONCE, "00" * 81)
+
+def test_blocks_need_a_slot_matching_their_timestamp():
+    key = ec.generate_private_key(ec.SECP256K1())
+    election = StaticElection({"solo": 1.0}, {"solo": key}, clock=lambda: 1000.0)
+    slot = next(s for s in range(1, 100) if election.elect(key, "solo", s, 1, NONCE))
+    proof = election.elect(key, "solo", slot, 1, NONCE)
+
+    def block(**fields):
+        values = dict(index=1, timestamp=election.slot_start(slot) + 0.5, transactions=[],
+                      previous_hash="0", validator="solo", slot=slot, vrf_proof=proof)
+        values.update(fields)
+        return Block(**values)
+
+    assert election.validate_block(block(), NONCE)
+    assert not election.validate_block(block(slot=-1, vrf_proof=""), NONCE)
+    assert not election.validate_block(block(timestamp=election.slot_start(slot + 1)), NONCE)
+    assert not election.validate_block(block(), b"\x02" * 32)
+
+    late = StaticElection({"solo": 1.0}, {"solo": key}, clock=lambda: election.slot_start(slot) - 60)
+    assert not late.validate_block(block(), NONCE)  # slot is a minute in the future
+
+def test_epoch_nonce_mixes_the_previous_epochs_vrf_outputs():
+    key = ec.generate_private_key(ec.SECP256K1())
+    election = StaticElection({"solo": 1.0}, {"solo": key})
+    assert election.nonce_heights(0) == (0, 1)
+    assert election.nonce_heights(3) == (200, 300)
+
+    def blocks(seed):
+        return [SimpleNamespace(slot=slot, vrf_proof=VRF(key).prove(seed + bytes([slot]))[1].hex(), hash="")
+                for slot in range(3)]
+
+    first = ProofOfStake.epoch_nonce(1, blocks(b"a"))
+    assert first == ProofOfStake.epoch_nonce(1, blocks(b"a"))
+    assert first != ProofOfStake.epoch_nonce(1, blocks(b"b"))
+    assert first != ProofOfStake.epoch_nonce(2, blocks(b"a"))
+
+def test_slot_is_part_of_the_block_hash():
+    legacy = Block(index=1, timestamp=100.0, transactions=[], previous_hash="0")
+    slotted = Block(index=1, timestamp=100.0, transactions=[], previous_hash="0", slot=7, vrf_proof="ab")
+
+    assert legacy.to_dict()['slot'] == -1
+    assert legacy.hash != slotted.hash
+    restored = Block.from_dict(slotted.to_dict())
+    assert (restored.slot, restored.vrf_proof) == (7, "ab")
+    assert restored.hash == restored.calculate_hash()
+
+def test_fresh_chain_elects_creates_and_adds_block_one(tmp_db, monkeypatch):
+    key = ec.generate_private_key(ec.SECP256K1())
+    address = ValidatorRegistry.get_validator_address(key)
+    producing = Blockchain(genesis_key=key)
+    alice = ec.generate_private_key(ec.SECP256K1())
+    sender = ValidatorRegistry.get_validator_address(alice)
+    StateDB().update_account(sender, _pem(alice), nonce=0)
+    StateDB().update_balance(sender, 10.0)
+    shutil.copy(tmp_db / "chain.db", tmp_db / "peer.db")  # another node on the same genesis
+    validator_sets.invalidate()
+
+    genesis = producing.get_last_block()
+    nonce = producing.epoch_nonce(genesis, 1)
+    slot, proof = next((slot, proof) for slot in range(1, 1000)
+                       for proof in [producing.election.elect(key, address, slot, 1, nonce)] if proof)
+    tx = Transaction(sender, "bob", 1.0, nonce=1)
+    tx.sign(alice)
+    block = producing.create_block([tx], key, slot, proof)
+    assert block is not None and producing.get_last_block().hash == block.hash
+
+    monkeypatch.setattr(database, "DB_FILE", str(tmp_db / "peer.db"))
+    validator_sets.invalidate()
+    peer = Blockchain()
+    assert peer.add_block(None, external_block=Block.from_dict(block.to_dict())) is not None
+    assert peer.get_last_block().hash == block.hash
@@ -0,0 +1,216 @@
+import time
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+import src.utils.database as database
+from src.blockchain.block import Block
+from src.blockchain.consensus.finality import FinalityGadget
+from src.blockchain.consensus.validator_registry import ValidatorRegistry
+from src.blockchain.consensus.validator_set import ValidatorSetCache
+from src.blockchain.snapshot import SnapshotManager, endorse
+from src.p2p.snapshot_sync import SnapshotSync
+
+def _seed_balances(count):
+    with database.db_connection() as conn:
+        conn.executemany(
+            "INSERT INTO balances (address, balance) VALUES (?, ?)",
+            [(f"addr{i:05d}", float(i)) for i in range(count)]
+        )
+        conn.commit()
+
+def _balances():
+    with database.db_connection() as conn:
+        return conn.execute("SELECT address, balance FROM balances ORDER BY address").fetchall()
+
+def _anchor(height=10):
+    return Block(index=height, timestamp=time.time(), transactions=[], previous_hash="ab" * 32)
+
+def _load_all(manager, manifest):
+    return {
+        entry['index']: manager.load_chunk(manifest['height'], entry['index'])
+        for entry in manifest['chunks']
+    }
+
+def test_produce_writes_verifiable_chunks(tmp_db):
+    _seed_balances(25)
+    manager = SnapshotManager(str(tmp_db / "snapshots"), interval=10, chunk_rows=10)
+
+    manifest = manager.produce(_anchor())
+
+    assert SnapshotManager.verify_manifest(manifest)
+    assert [c['rows'] for c in manifest['chunks'] if c['table'] == 'balances'] == [10, 10, 5]
+    assert manager.latest_manifest()['content_hash'] == manifest['content_hash']
+    for index, chunk in _load_all(manager, manifest).items():
+        assert SnapshotManager.verify_chunk(manifest, chunk)
+
+def test_tampered_data_is_rejected(tmp_db):
+    _seed_balances(5)
+    manager = SnapshotManager(str(tmp_db / "snapshots"), interval=10)
+    manifest = manager.produce(_anchor())
+    chunk = manager.load_chunk(manifest['height'], 0)
+
+    chunk['rows'][0][1] = 1e9
+    assert not SnapshotManager.verify_chunk(manifest, chunk)
+
+    forged = dict(manifest, height=manifest['height'] + 1)
+    assert not SnapshotManager.verify_manifest(forged)
+
+def test_only_recent_snapshots_are_kept(tmp_db):
+    manager = SnapshotManager(str(tmp_db / "snapshots"), interval=10, keep=2)
+    for height in (10, 20, 30):
+        manager.maybe_produce(_anchor(height))
+    assert manager.maybe_produce(_anchor(35)) is None
+    assert manager._heights() == [20, 30]
+
+def test_import_restores_state_and_anchor(tmp_db):
+    _seed_balances(25)
+    manager = SnapshotManager(str(tmp_db / "snapshots"), interval=10, chunk_rows=10)
+    anchor = _anchor()
+    manifest = manager.produce(anchor)
+    chunks = _load_all(manager, manifest)
+    expected = _balances()
+
+    with database.db_connection() as conn:
+        conn.execute("DELETE FROM balances")
+        conn.execute("INSERT INTO balances (address, balance) VALUES ('stale', 1.0)")
+        conn.commit()
+
+    imported = manager.import_snapshot(manifest, chunks)
+
+    assert imported.hash == anchor.hash
+    assert _balances() == expected
+    assert SnapshotManager.get_anchor() == (anchor.index, anchor.hash)
+
+def test_snapshot_carries_consensus_columns_only(tmp_db):
+    ValidatorRegistry.register_validator("v1", "pem", 5.0)
+    manager = SnapshotManager(str(tmp_db / "snapshots"), interval=10)
+    manifest = manager.produce(_anchor())
+
+    assert manifest['tables']['validators'] == ['address', 'public_key_pem', 'stake']
+    assert [chunk['rows'] for chunk in _load_all(manager, manifest).values()
+            if chunk['table'] == 'validators'] == [[["v1", "pem", 5.0]]]
+
+def test_import_refuses_incomplete_snapshot(tmp_db):
+    _seed_balances(25)
+    manager = SnapshotManager(str(tmp_db / "snapshots"), interval=10, chunk_rows=10)
+    manifest = manager.produce(_anchor())
+    chunks = _load_all(manager, manifest)
+    del chunks[1]
+
+    with pytest.raises(ValueError):
+        manager.import_snapshot(manifest, chunks)
+    assert SnapshotManager.get_anchor() is None
+
+
+def _validator(address, stake):
+    key = ec.generate_private_key(ec.SECP256K1())
+    pem = key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    ValidatorRegistry.register_validator(address, pem, stake)
+    return key, address
+
+def _sets(stakes):
+    return ValidatorSetCache(loader=lambda epoch: stakes, pinned_loader=lambda epoch: stakes)
+
+class FakeChain:
+    def __init__(self):
+        self.imported = None
+        self.finality = FinalityGadget()
+
+    def get_last_block(self):
+        return self.imported or Block(index=0, timestamp=0.0, transactions=[], previous_hash="0")
+
+    def import_snapshot(self, manifest, chunks):
+        self.imported = Block.from_dict(manifest['block'])
+        self.chunks = chunks
+        return self.imported
+
+class FakeScheduler:
+    def __init__(self):
+        self.heights = {}
+
+    def update_peer_height(self, peer, height):
+        self.heights[peer] = height
+
+class FakeNetwork:
+    running = True
+
+    def __init__(self):
+        self.blockchain = FakeChain()
+        self.sync_scheduler = FakeScheduler()
+        self.sent = []
+
+    def send_message(self, message, peer):
+        self.sent.append((peer, message))
+
+def test_sync_fetches_chunks_from_all_sources_then_hands_over(tmp_db):
+    _seed_balances(50)
+    signers = [_validator("v1", 50.0), _validator("v2", 50.0)]
+    manager = SnapshotManager(str(tmp_db / "snapshots"), interval=10, chunk_rows=10)
+    manifest = manager.produce(_anchor())
+    network = FakeNetwork()
+    sync = SnapshotSync(network, min_gap=5, max_inflight_per_peer=2, validator_sets=_sets({"v1": 50.0, "v2": 50.0}))
+    peers = [("10.0.0.1", 6000), ("10.0.0.2", 6000)]
+
+    for peer, signer in zip(peers, signers):
+        assert sync.on_status(peer, 12)
+        sync.on_manifest(peer, manifest, endorse(manifest, *signer))
+    assert len(sync.inflight) == 4
+    assert {owner for owner, _ in sync.inflight.values()} == set(peers)
+
+    while sync.inflight:
+        index, (peer, _) = next(iter(sync.inflight.items()))
+        sync.on_chunk(peer, manifest['height'], index, manager.load_chunk(manifest['height'], index))
+
+    assert sync.finished and not sync.active
+    assert network.blockchain.imported.hash == manifest['block']['hash']
+    assert network.sync_scheduler.heights == {peer: 12 for peer in peers}
+    assert not sync.on_status(peers[0], 20)
+
+def test_sync_is_skipped_when_gap_is_small(tmp_db):
+    sync = SnapshotSync(FakeNetwork(), min_gap=100)
+    assert not sync.on_status(("10.0.0.1", 6000), 50)
+    assert not sync.active
+
+def test_sync_waits_for_a_stake_majority_to_endorse_the_manifest(tmp_db):
+    _seed_balances(5)
+    v1, v2 = _validator("v1", 40.0), _validator("v2", 60.0)
+    manager = SnapshotManager(str(tmp_db / "snapshots"), interval=10)
+    manifest = manager.produce(_anchor())
+    sync = SnapshotSync(FakeNetwork(), min_gap=5, validator_sets=_sets({"v1": 40.0, "v2": 60.0}))
+    peers = [("10.0.0.1", 6000), ("10.0.0.2", 6000), ("10.0.0.3", 6000)]
+    for peer in peers:
+        sync.on_status(peer, 12)
+
+    # Unendorsed offers and a minority of the stake are not enough, however many peers agree
+    sync.on_manifest(peers[0], manifest)
+    sync.on_manifest(peers[1], manifest, endorse(manifest, *v1))
+    assert sync.manifest is None and not sync.inflight
+
+    forged = endorse(manifest, v1[0], "v2")
+    sync.on_manifest(peers[2], manifest, forged)
+    assert sync.manifest is None
+
+    sync.on_manifest(peers[2], manifest, endorse(manifest, *v2))
+    assert sync.manifest['content_hash'] == manifest['content_hash']
+    assert sync.sources == set(peers)
+
+def test_sync_trusts_a_manifest_anchored_at_a_final_checkpoint(tmp_db):
+    _seed_balances(5)
+    manager = SnapshotManager(str(tmp_db / "snapshots"), interval=10)
+    manifest = manager.produce(_anchor())
+    sync = SnapshotSync(FakeNetwork(), min_gap=5, validator_sets=_sets({"v1": 10.0}))
+    peer = ("10.0.0.1", 6000)
+    sync.on_status(peer, 12)
+
+    sync.on_manifest(peer, manifest)
+    assert sync.manifest is None
+
+    with database.db_connection() as conn:
+        conn.execute("INSERT INTO checkpoints (epoch, block_hash, height, attested_stake, total_stake, finalized_at) "
+                     "VALUES (1, ?, 10, 10.0, 10.0, 0)", (manifest['block']['hash'],))
+        conn.commit()
+    sync.on_manifest(peer, manifest)
+    assert sync.manifest['content_hash'] == manifest['content_hash']
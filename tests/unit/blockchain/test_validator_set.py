@@ -0,0 +1,110 @@
+import random
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+import src.utils.database as database
+from src.blockchain.chain import Blockchain
+from src.blockchain.consensus.consensus import Consensus
+from src.blockchain.consensus.stake_manager import StakeManager
+from src.blockchain.consensus.validator_registry import ValidatorRegistry
+from src.blockchain.consensus.validator_set import (ValidatorSet, ValidatorSetCache, load_epoch_stakes,
+                                                    record_epoch_stakes, validator_sets)
+from src.blockchain.db.state_db import StateDB
+from src.blockchain.transaction import Transaction
+
+def test_select_uses_stake_boundaries():
+    validators = ValidatorSet({"a": 1.0, "b": 3.0, "zero": 0.0, "c": 6.0})
+
+    assert validators.total_stake == 10.0
+    assert "zero" not in validators
+    assert validators.select(0.0) == "a"
+    assert validators.select(0.999) == "a"
+    assert validators.select(1.0) == "b"
+    assert validators.select(3.999) == "b"
+    assert validators.select(4.0) == "c"
+    assert validators.select(10.0) == "c"
+    assert ValidatorSet({}).select(0.5) is None
+
+def test_selection_is_proportional_to_stake():
+    validators = ValidatorSet({"a": 1.0, "b": 3.0})
+    rng = random.Random(7)
+    picks = [validators.select(rng.uniform(0, validators.total_stake)) for _ in range(20000)]
+    assert 0.72 < picks.count("b") / len(picks) < 0.78
+
+def test_cache_keeps_recent_epochs_apart():
+    pinned = {0: {"a": 1.0}, 1: {"a": 1.0, "b": 2.0}, 2: {"c": 1.0}}
+    loads = []
+    cache = ValidatorSetCache(loader=lambda epoch: loads.append(epoch) or dict(pinned[epoch]),
+                              epoch_length=10, size=2)
+
+    # Election and finality asking about neighbouring epochs in turn
+    for height in (3, 10, 9, 11, 0, 19):
+        cache.for_height(height)
+    assert loads == [0, 1]
+    assert cache.for_height(9).as_dict() == {"a": 1.0}
+    assert cache.for_height(10).as_dict() == {"a": 1.0, "b": 2.0}
+
+    cache.for_height(20)  # evicts epoch 0, the least recently used
+    cache.for_height(15)
+    assert loads == [0, 1, 2]
+
+    pinned[1]["b"] = 0.0
+    cache.invalidate()
+    assert cache.for_height(11).as_dict() == {"a": 1.0}
+    assert loads == [0, 1, 2, 1]
+
+def test_epoch_stakes_are_pinned_from_chain_state(tmp_db):
+    ValidatorRegistry.register_validator("early", "pem", 5.0)
+    record_epoch_stakes(0)
+    ValidatorRegistry.register_validator("late", "pem", 7.0)
+    with database.db_connection() as conn:
+        # Idle validators keep their stake: nothing depends on the wall clock
+        conn.execute("UPDATE validators SET last_active = datetime('now', '-30 days')")
+        conn.commit()
+
+    assert load_epoch_stakes(0) == {"early": 5.0}
+    assert load_epoch_stakes(3) == {"early": 5.0}  # boundary not reached yet
+    assert ValidatorSetCache().pinned(3) is None   # ...and no older set stands in for it
+    record_epoch_stakes(1)
+    assert load_epoch_stakes(1) == {"early": 5.0, "late": 7.0}
+    assert load_epoch_stakes(0) == {"early": 5.0}
+    assert ValidatorSetCache().pinned(1).as_dict() == {"early": 5.0, "late": 7.0}
+
+def test_stake_events_invalidate_consensus_selection(tmp_db):
+    consensus = Consensus(None, StakeManager())
+    ValidatorRegistry.register_validator("only", "pem", 5.0)
+
+    assert consensus.select_validator(height=1) == "only"
+    loads = validator_sets.loads
+    assert consensus.select_validator(height=2) == "only"
+    assert validator_sets.loads == loads
+
+    assert StakeManager.unstake("only", 5.0)
+    assert consensus.select_validator(height=3) is None
+
+def test_new_chain_is_led_by_its_genesis_key(tmp_db):
+    key = ec.generate_private_key(ec.SECP256K1())
+    address = ValidatorRegistry.get_validator_address(key)
+    chain = Blockchain(genesis_key=key)
+    validator_sets.invalidate()
+
+    # Epoch 0 is pinned at genesis, before any node could stake: the genesis key has to be in it
+    assert validator_sets.pinned(0).stake_of(address) > 0
+    genesis = chain.get_last_block()
+    nonce = chain.epoch_nonce(genesis, 1)
+    slot, proof = next((slot, proof) for slot in range(1, 1000)
+                       for proof in [chain.election.elect(key, address, slot, 1, nonce)] if proof)
+
+    alice = ec.generate_private_key(ec.SECP256K1())
+    pem = alice.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    sender = ValidatorRegistry.get_validator_address(alice)
+    StateDB().update_account(sender, pem, nonce=0)
+    StateDB().update_balance(sender, 10.0)
+    tx = Transaction(sender, "bob", 1.0, nonce=1)
+    tx.sign(alice)
+
+    block = chain.create_block([tx], key, slot, proof)
+    assert block is not None and block.index == 1
+    assert chain.get_last_block().hash == block.hash
@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+from src.blockchain.contracts.analyzer import ContractAnalysis, analyze
+from src.blockchain.contracts.compiler import GAS_COSTS, DEFAULT_GAS_COST, compile_code
+from src.blockchain.contracts.vm import SmartContractVM
+from src.blockchain.db.state_db import StateDB
+from src.blockchain.mempool import Mempool
+
+# Slow path stores a flag, fast path (taken when c is set) only adds
+BRANCHY = "JUMPI 3 c; SSTORE a 1; JUMP 4; ADD x 1 1; RETURN x"
+SUM_TO_TEN = "SSTORE i 0; SSTORE acc 0; ADD i i 1; ADD acc acc i; LT more i 10; JUMPI 2 more; RETURN acc"
+
+def _tx(contract_type, code=None, address=None, gas_limit=100000, tx_hash="tx1"):
+    return SimpleNamespace(contract_type=contract_type, contract_code=code, contract_address=address,
+                           contract_args={}, sender="alice", amount=0, gas_limit=gas_limit, tx_hash=tx_hash,
+                           is_valid=lambda: True)
+
+def test_gas_bounds_of_loop_free_code():
+    analysis = analyze(compile_code(BRANCHY))
+    assert not analysis.has_loops and not analysis.always_reverts
+    assert analysis.max_gas == GAS_COSTS['JUMPI'] + GAS_COSTS['SSTORE'] + GAS_COSTS['JUMP'] + DEFAULT_GAS_COST
+    assert analysis.min_gas == GAS_COSTS['JUMPI'] + GAS_COSTS['ADD'] + DEFAULT_GAS_COST
+    assert analysis.unreachable == ()
+    assert ContractAnalysis.from_json(analysis.to_json()) == analysis
+
+def test_loops_have_no_upper_bound():
+    analysis = analyze(compile_code(SUM_TO_TEN))
+    assert analysis.has_loops and analysis.max_gas is None
+    assert analysis.min_gas == 2 * GAS_COSTS['SSTORE'] + 2 * GAS_COSTS['ADD'] + GAS_COSTS['LT'] \
+        + GAS_COSTS['JUMPI'] + DEFAULT_GAS_COST
+
+def test_unreachable_code_and_reverts():
+    analysis = analyze(compile_code("JUMP 2; SSTORE never 1; REVERT stop"))
+    assert analysis.unreachable == (1,)
+    assert analysis.always_reverts and analysis.min_gas is None
+    assert analysis.max_gas == GAS_COSTS['JUMP']
+    assert 'SSTORE' not in analysis.opcodes
+
+def test_validate_code():
+    assert SmartContractVM.validate_code(BRANCHY)
+    assert not SmartContractVM.validate_code("REVERT no")
+    assert not SmartContractVM.validate_code("NOPE 1")
+
+def test_analysis_is_stored_with_the_contract(tmp_db):
+    ok, address = SmartContractVM(StateDB()).execute(_tx("CREATE", code=SUM_TO_TEN), 1, 0.0)
+    assert ok
+    stored = ContractAnalysis.from_json(StateDB().load_analysis(address))
+    assert stored == analyze(compile_code(SUM_TO_TEN))
+
+def test_mempool_rejects_transactions_that_cannot_succeed(tmp_db):
+    mempool = Mempool()
+    mempool.p2p_network = None
+    min_gas = analyze(compile_code(BRANCHY)).min_gas
+
+    assert not mempool.add_transaction(_tx("CREATE", code="REVERT no", tx_hash="revert"))
+    assert not mempool.add_transaction(_tx("CREATE", code="NOPE 1", tx_hash="invalid"))
+    assert not mempool.add_transaction(_tx("CREATE", code=BRANCHY, gas_limit=min_gas - 1, tx_hash="low"))
+    # Less than the worst case is still enough for the cheap branch
+    assert mempool.add_transaction(_tx("CREATE", code=BRANCHY, gas_limit=min_gas, tx_hash="cheap"))
+
+    ok, address = SmartContractVM(StateDB()).execute(_tx("CREATE", code=SUM_TO_TEN), 1, 0.0)
+    assert ok
+    assert not mempool.add_transaction(_tx("CALL", address=address, gas_limit=100, tx_hash="call-low"))
+    assert mempool.add_transaction(_tx("CALL", address=address, tx_hash="call"))
+    assert mempool.add_transaction(_tx("CALL", address="not-yet-deployed", tx_hash="pending"))
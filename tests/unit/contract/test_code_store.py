@@ -0,0 +1,63 @@
+import time
+from types import SimpleNamespace
+from src.blockchain.block import Block
+from src.blockchain.contracts.compiler import code_hash
+from src.blockchain.contracts.contract_repository import ContractRepository
+from src.blockchain.contracts.vm import SmartContractVM
+from src.blockchain.db.state_db import StateDB
+from src.blockchain.db.undo_journal import UndoJournal
+from src.blockchain.snapshot import SnapshotManager
+from src.utils.database import db_connection
+
+TOKEN = "SLOAD n supply; ADD supply n 100; SSTORE supply supply; RETURN supply"
+
+def _deploy(code, tx_hash):
+    tx = SimpleNamespace(contract_type="CREATE", contract_code=code, contract_address=None,
+                         contract_args={}, sender="alice", amount=0, gas_limit=100000, tx_hash=tx_hash)
+    ok, address = SmartContractVM(StateDB()).execute(tx, 1, 0.0)
+    assert ok
+    return address
+
+def _rows(query):
+    with db_connection() as conn:
+        return conn.execute(query).fetchall()
+
+def test_clones_share_one_code_row(tmp_db):
+    addresses = [_deploy(TOKEN, f"tx{i}") for i in range(5)]
+    assert ContractRepository.save_contract("repo-clone", TOKEN, "bob")
+
+    assert _rows("SELECT code_hash, code FROM contract_code") == [(code_hash(TOKEN), TOKEN)]
+    assert _rows("SELECT DISTINCT code_hash FROM contracts") == [(code_hash(TOKEN),)]
+    assert _rows("SELECT count(*) FROM contracts WHERE code != ''") == [(0,)]
+
+    state_db = StateDB()
+    code, compiled = state_db.load_contract(addresses[0])
+    assert code == TOKEN and compiled is not None
+    assert state_db.load_contract(addresses[4]) == (code, compiled)
+    assert state_db.load_analysis("repo-clone") == state_db.load_analysis(addresses[0])
+    assert ContractRepository.get_contract("repo-clone")['code'] == TOKEN
+
+def test_undoing_a_deploy_keeps_the_shared_code(tmp_db):
+    first = _deploy(TOKEN, "tx1")
+    StateDB().apply_changes({('contract', "second"): (TOKEN, None, "alice", None)}, journal=("block2", 2))
+    assert StateDB().load_contract_code("second") == TOKEN
+    UndoJournal.undo("block2")
+
+    assert StateDB().load_contract("second") is None
+    assert StateDB().load_contract_code(first) == TOKEN
+
+def test_snapshot_carries_only_code_in_use(tmp_db):
+    address = _deploy(TOKEN, "tx1")
+    with db_connection() as conn:
+        conn.execute("INSERT INTO contract_code (code_hash, code) VALUES ('orphan', 'RETURN 1')")
+        conn.commit()
+
+    manager = SnapshotManager(str(tmp_db / "snapshots"), interval=10)
+    anchor = Block(index=10, timestamp=time.time(), transactions=[], previous_hash="ab" * 32)
+    manifest = manager.produce(anchor)
+    chunks = {entry['index']: manager.load_chunk(10, entry['index']) for entry in manifest['chunks']}
+    code_rows = [chunk['rows'] for chunk in chunks.values() if chunk['table'] == 'contract_code']
+    assert code_rows == [[[code_hash(TOKEN), TOKEN]]]
+
+    manager.import_snapshot(manifest, chunks)
+    assert StateDB().load_contract_code(address) == TOKEN
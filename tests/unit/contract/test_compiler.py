@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+import pytest
+from src.blockchain.contracts.compiler import (
+    COMPILER_VERSION, CompileError, OPCODE_IDS, Program, ProgramCache, code_hash, compile_code
+)
+from src.blockchain.contracts.vm import SmartContractVM
+from src.blockchain.db.state_db import StateDB
+
+COUNTER = "SLOAD n count; ADD count n 1; SSTORE count count; RETURN count"
+
+def _tx(contract_type, code=None, address=None, sender="alice", tx_hash="tx1"):
+    return SimpleNamespace(contract_type=contract_type, contract_code=code, contract_address=address,
+                           contract_args={}, sender=sender, amount=0, gas_limit=100000, tx_hash=tx_hash)
+
+def test_compile_pre_parses_operands():
+    program = compile_code("add x 5 -2; ;SLOAD y x ; log hello  world; RETURN x")
+    assert [op for op, _, _ in program.instructions] == [
+        OPCODE_IDS['ADD'], OPCODE_IDS['SLOAD'], OPCODE_IDS['LOG'], OPCODE_IDS['RETURN']
+    ]
+    assert program.instructions[0] == (OPCODE_IDS['ADD'], 3, ('x', 5, -2))
+    assert program.instructions[1][2] == ('y', 'x')
+    assert program.instructions[2][2] == ("hello world",)
+    assert program.code_hash == code_hash("add x 5 -2; ;SLOAD y x ; log hello  world; RETURN x")
+
+    with pytest.raises(CompileError):
+        compile_code("FROB x")
+    with pytest.raises(CompileError):
+        compile_code("ADD x 1")
+    with pytest.raises(CompileError):
+        compile_code("JUMP start")
+
+def test_oversized_and_odd_literals_are_compile_errors():
+    assert compile_code("STORE a " + "9" * 78).instructions[0][2] == ('a', int("9" * 78))
+    for code in ("STORE a " + "9" * 5000, "STORE a -" + "9" * 79, "STORE a \u00b2", "JUMP " + "1" * 5000):
+        with pytest.raises(CompileError):
+            compile_code(code)
+    assert SmartContractVM.validate_code("STORE a " + "9" * 5000) is False
+
+def test_program_json_round_trip_and_versioning():
+    program = compile_code(COUNTER)
+    assert Program.from_json(program.to_json()) == program
+    stale = program.to_json().replace(f'"version":{COMPILER_VERSION}', f'"version":{COMPILER_VERSION - 1}')
+    assert Program.from_json(stale) is None
+    assert Program.from_json("not json") is None
+
+def test_cache_compiles_once_per_code_hash():
+    cache = ProgramCache(capacity=2)
+    first = cache.load(COUNTER)
+    assert cache.load(COUNTER) is first
+    assert cache.load("RETURN 1", compile_code("RETURN 1").to_json()).instructions
+    assert cache.get_stats()['compiles'] == 1  # the second program came precompiled
+
+    cache.load("RETURN 2")
+    cache.load(COUNTER)  # evicted by the two newer programs
+    assert cache.get_stats()['compiles'] == 3
+
+def test_calls_skip_parsing_after_deploy(tmp_db):
+    cache = ProgramCache()
+    vm = SmartContractVM(StateDB(), programs=cache)
+
+    ok, address = vm.execute(_tx("CREATE", code=COUNTER), 1, 0.0)
+    assert ok
+    assert StateDB().load_contract(address)[1] == cache.load(COUNTER).to_json()
+
+    for expected in (1, 2, 3):
+        ok, result = vm.execute(_tx("CALL", address=address), 2, 0.0)
+        assert ok and result == expected
+    assert StateDB().load_storage(address) == {'count': 3}
+    assert cache.get_stats()['compiles'] == 1
+
+def test_legacy_contract_is_compiled_on_first_load(tmp_db):
+    StateDB().save_contract("legacy", "SSTORE x 7", "alice")
+    cold = ProgramCache()
+    ok, _ = SmartContractVM(StateDB(), programs=cold).execute(_tx("CALL", address="legacy"), 1, 0.0)
+    assert ok
+    assert Program.from_json(StateDB().load_contract("legacy")[1]) == compile_code("SSTORE x 7")
+
+    restarted = ProgramCache()
+    SmartContractVM(StateDB(), programs=restarted).execute(_tx("CALL", address="legacy"), 2, 0.0)
+    assert restarted.get_stats()['compiles'] == 0
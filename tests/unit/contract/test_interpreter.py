@@ -0,0 +1,42 @@
+import pytest
+from src.blockchain.contracts.compiler import OPCODES, CompileError, compile_code
+from src.blockchain.contracts.optimizer import INTERNAL_OPCODES
+from src.blockchain.contracts.vm import SmartContractVM
+
+SUM_TO_TEN = "SSTORE i 0; SSTORE acc 0; ADD i i 1; ADD acc acc i; LT more i 10; JUMPI 2 more; RETURN acc"
+
+def _run(code, gas=1000000):
+    vm = SmartContractVM(state_db=None)
+    vm.gas_remaining = gas
+    context = {'sender': "alice", 'timestamp': 0.0, 'storage': {}, 'memory': {}}
+    return vm, context, vm._execute(context, compile_code(code))
+
+def test_dispatch_table_covers_every_opcode():
+    vm = SmartContractVM(state_db=None)
+    assert len(vm.dispatch) == len(OPCODES) + len(INTERNAL_OPCODES)
+    assert vm.dispatch[OPCODES.index('ADD')].__name__ == "_op_add"
+
+def test_backward_jump_runs_a_loop():
+    vm, context, result = _run(SUM_TO_TEN)
+    assert result == 55
+    assert context['storage']['i'] == 10
+    # 2 setup stores, 10 iterations of four instructions, then RETURN
+    assert vm.gas_remaining == 1000000 - 2 * 200 - 10 * (3 + 3 + 3 + 10) - 10
+
+def test_forward_jump_skips_and_end_target_stops():
+    _, context, _ = _run("JUMP 2; SSTORE skipped 1; SSTORE reached 1; JUMP 5; SSTORE never 1")
+    assert context['storage'] == {'reached': 1}
+
+    # Blank statements keep their index, so targets match the source layout
+    _, context, _ = _run("JUMP 3; SSTORE skipped 1; ; SSTORE reached 1")
+    assert context['storage'] == {'reached': 1}
+
+def test_jump_targets_are_checked_at_compile_time():
+    with pytest.raises(CompileError):
+        compile_code("JUMP 3; RETURN 1")
+    with pytest.raises(CompileError):
+        compile_code("JUMPI -1 1")
+
+def test_infinite_loop_runs_out_of_gas():
+    with pytest.raises(RuntimeError, match="Out of gas"):
+        _run("JUMP 0", gas=1000)
@@ -0,0 +1,105 @@
+import random
+import pytest
+from src.blockchain.contracts.compiler import GAS_COSTS, ProgramCache, compile_code
+from src.blockchain.contracts.limits import BoundedStore, ExecutionLimits
+from src.blockchain.contracts.optimizer import BLOCK, SET, SLOAD_ADD, TOUCH, optimize
+from src.blockchain.contracts.vm import SmartContractVM
+
+SUM_TO_TEN = "SSTORE i 0; SSTORE acc 0; ADD i i 1; ADD acc acc i; LT more i 10; JUMPI 2 more; RETURN acc"
+COUNTER = "SLOAD n count; ADD count n 1; SSTORE count count; RETURN count"
+
+PROGRAMS = [
+    SUM_TO_TEN,
+    COUNTER,
+    "ADD a 2 3; MUL b 4 5; SUB c 1 9; DIV d 9 2; EQ e 1 1; LT f 2 1; NOT g 0; RETURN a",
+    "STORE m 1; SSTORE x 5; STORE m 2; LOAD k m; RETURN k",
+    "STORE m 1; LOAD k m; STORE m 2; RETURN m",
+    "STORE m 1; STORE n 3; STORE m 2; RETURN m",
+    "SLOAD v k; ADD k v 2; SLOAD v k; ADD k v 2; JUMPI 6 k; REVERT no; LOG done; RETURN k",
+    "SSTORE x 1; DIV y x 0; RETURN y",
+    "ADD z missing 1",
+    "MUL a 2 200; MUL a a a; MUL a a a",
+    "SSTORE i 0; ADD i i 1; JUMP 1",
+    "JUMP 3; SSTORE skipped 1; ; SSTORE reached 1; REVERT",
+    "SHA3 h 7; SSTORE s h; AND a 6 3; OR o 6 3; GT g 3 2; RETURN h",
+]
+
+def _templates(rng, length):
+    statements = []
+    names = ["a", "b", "c", "m", "k"]
+    for _ in range(length):
+        n, x, y = rng.choice(names), rng.choice(names), rng.choice(names)
+        statements.append(rng.choice([
+            f"ADD {n} {x} {rng.randint(0, 9)}", f"ADD {n} {rng.randint(0, 9)} {rng.randint(0, 9)}",
+            f"MUL {n} {rng.randint(1, 3)} {rng.randint(1, 3)}", f"SUB {n} {x} {y}", f"LT {n} {x} 5",
+            f"STORE {n} {rng.randint(0, 9)}", f"STORE {n} {x}", f"LOAD {n} {x}", f"SSTORE {n} {x}",
+            f"SLOAD {n} {x}", f"SLOAD {n} {x}; ADD {x} {n} 1", f"RETURN {x}", f"LOG {n}",
+            f"JUMPI {rng.randint(0, length)} {x}", f"JUMP {rng.randint(0, length)}", "REVERT stop",
+        ]))
+    return "; ".join(statements)
+
+def _run(program, gas, limits):
+    vm = SmartContractVM(state_db=None, limits=limits)
+    vm.gas_remaining = gas
+    context = {'sender': "alice", 'timestamp': 0.0,
+               'storage': BoundedStore({'a': 1, 'k': 2}, "storage", limits.max_storage_slots,
+                                       limits.max_storage_writes),
+               'memory': BoundedStore({}, "memory", limits.max_memory_slots)}
+    try:
+        vm._execute(context, program)
+        outcome = (True, None)
+    except Exception as e:
+        outcome = (False, f"{type(e).__name__}: {e}")
+    # Memory is scratch space dropped with the context, so it only has to match on success
+    memory = dict(context['memory']) if outcome[0] else None
+    return outcome, vm.gas_remaining, vm.output, vm.logs, dict(context['storage']), memory
+
+def _assert_equivalent(code, limits=ExecutionLimits(max_instructions=300)):
+    plain = compile_code(code)
+    optimized = optimize(plain)
+    full = _run(plain, 10 ** 6, limits)
+    assert _run(optimized, 10 ** 6, limits) == full, code
+    # Every gas limit up to what the run used, so out-of-gas hits each instruction
+    used = 10 ** 6 - full[1]
+    for gas in range(0, used + 2):
+        assert _run(optimized, gas, limits) == _run(plain, gas, limits), (code, gas)
+
+@pytest.mark.parametrize("code", PROGRAMS)
+def test_optimized_execution_matches_plain(code):
+    _assert_equivalent(code)
+
+@pytest.mark.parametrize("seed", range(40))
+def test_random_programs_match_plain(seed):
+    rng = random.Random(seed)
+    _assert_equivalent(_templates(rng, rng.randint(1, 12)))
+
+@pytest.mark.parametrize("max_instructions, max_memory_slots", [(0, 8), (3, 8), (7, 8), (300, 1), (300, 2)])
+def test_limits_are_hit_at_the_same_instruction(max_instructions, max_memory_slots):
+    limits = ExecutionLimits(max_instructions=max_instructions, max_memory_slots=max_memory_slots)
+    for code in PROGRAMS:
+        _assert_equivalent(code, limits)
+
+def test_straight_line_code_becomes_one_block_with_the_same_gas():
+    optimized = optimize(compile_code(COUNTER)).optimized
+    assert len(optimized.instructions) == 1
+    opcode, needed, charged, parts, width = optimized.instructions[0]
+    assert (opcode, width, charged) == (BLOCK, 4, 0)
+    assert needed == GAS_COSTS['SLOAD'] + GAS_COSTS['ADD'] + GAS_COSTS['SSTORE'] + 10
+    assert parts[0][0] == SLOAD_ADD
+
+def test_folding_dead_stores_and_jump_targets():
+    code = "ADD a 2 3; STORE m 1; STORE m 2; JUMPI 0 a"
+    optimized = optimize(compile_code(code)).optimized
+    (opcode, _, _, parts, _), = optimized.instructions
+    assert opcode == BLOCK
+    assert parts[0] == (SET, GAS_COSTS['ADD'], ('a', 5))
+    assert parts[1] == (TOUCH, GAS_COSTS['STORE'], ('m',))
+    assert parts[3][2] == (0, 'a')  # jump retargeted to the block's own index
+
+    # A jump target starts a new entry, so the loop body is not merged with its setup
+    assert optimize(compile_code(SUM_TO_TEN)).optimized.origins == (0, 2, 6)
+
+def test_program_cache_optimizes_unless_disabled():
+    assert ProgramCache().load(COUNTER).optimized is not None
+    assert ProgramCache(optimize=False).load(COUNTER).optimized is None
+    assert ProgramCache().load(COUNTER) == compile_code(COUNTER)
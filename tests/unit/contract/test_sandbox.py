@@ -0,0 +1,102 @@
+import resource
+import threading
+from types import SimpleNamespace
+import pytest
+from src.blockchain.contracts.limits import ExecutionLimits
+from src.blockchain.contracts.sandbox import SandboxPool
+from src.blockchain.contracts.vm import SmartContractVM
+from src.blockchain.db.state_db import StateDB
+from src.blockchain.executor import BlockExecutor
+
+FOREVER = "SSTORE i 0; ADD i i 1; JUMP 1"
+
+def _tx(code, tx_hash="tx1", gas=10 ** 9):
+    return SimpleNamespace(contract_type="CREATE", contract_code=code, contract_address=None,
+                           contract_args={}, sender="alice", amount=0, gas_limit=gas, tx_hash=tx_hash)
+
+@pytest.mark.parametrize("code, limits, message", [
+    (FOREVER, ExecutionLimits(max_instructions=1000), "Instruction budget"),
+    ("STORE a 1; STORE b 2; STORE c 3", ExecutionLimits(max_memory_slots=2), "memory slots"),
+    ("SSTORE a 1; SSTORE a 2; SSTORE a 3", ExecutionLimits(max_storage_writes=2), "storage writes"),
+    ("SSTORE x 2; MUL x x x; JUMP 1", ExecutionLimits(), "bits"),
+])
+def test_interpreter_limits_stop_runaway_code(tmp_db, code, limits, message):
+    vm = SmartContractVM(StateDB(), limits=limits)
+    ok, error = vm.execute(_tx(code), 1, 0.0)
+    assert not ok
+    assert message in error
+
+def test_execute_leaves_process_limits_alone_and_runs_off_main_thread(tmp_db):
+    before = resource.getrlimit(resource.RLIMIT_AS)
+    results = []
+    worker = threading.Thread(target=lambda: results.append(
+        SmartContractVM(StateDB()).execute(_tx("SSTORE x 1; RETURN x"), 1, 0.0)))
+    worker.start()
+    worker.join()
+
+    assert results[0][0]
+    assert resource.getrlimit(resource.RLIMIT_AS) == before
+
+def test_sandbox_pool_kills_and_replaces_stuck_worker(tmp_db):
+    # Lift the interpreter's budgets so only the pool's timeout can stop the loop
+    unbounded = ExecutionLimits(max_instructions=10 ** 12, max_storage_writes=10 ** 12)
+    pool = SandboxPool(workers=1, timeout=0.5, limits=unbounded)
+    try:
+        ok, address, gas_remaining, _, writes, _ = pool.execute(_tx("SSTORE x 1"), 1, 0.0)
+        assert ok and gas_remaining < 10 ** 9
+        assert ('contract', address) in writes
+        assert StateDB().load_contract(address) is None  # the caller commits, not the worker
+
+        ok, error, _, _, writes, _ = pool.execute(_tx(FOREVER), 1, 0.0)
+        assert not ok and "timed out" in error and writes == {}
+
+        assert pool.execute(_tx("SSTORE x 1", tx_hash="tx2"), 1, 0.0)[0]
+        stats = pool.get_stats()
+        assert stats['timeouts'] == 1 and stats['respawns'] == 1 and stats['executed'] == 2
+    finally:
+        pool.close()
+
+@pytest.mark.parametrize("start_method", ["forkserver", "fork"])
+def test_sandbox_workers_read_the_nodes_database(tmp_db, start_method):
+    counter = "SLOAD n count; ADD count n 1; SSTORE count count; RETURN count"
+    ok, address = SmartContractVM(StateDB()).execute(_tx(counter), 1, 0.0)
+    assert ok
+
+    pool = SandboxPool(workers=1, start_method=start_method)
+    try:
+        ok, result, _, _, _, _ = pool.execute(_call(address, "call1"), 2, 0.0)
+        assert ok and result == 1
+    finally:
+        pool.close()
+
+def _valid():
+    return True
+
+def _call(address, tx_hash):
+    # Picklable: sandboxed calls are sent to the worker process
+    return SimpleNamespace(contract_type="CALL", contract_address=address, contract_args={},
+                           sender="alice", amount=0, gas_limit=100000, nonce=1,
+                           tx_hash=tx_hash, is_valid=_valid)
+
+@pytest.fixture
+def sandboxed(tmp_db, monkeypatch):
+    pool = SandboxPool(workers=1)
+    monkeypatch.setattr(SmartContractVM, "sandbox", pool)
+    yield pool
+    pool.close()
+
+def test_sandboxed_block_writes_only_when_every_transaction_succeeds(sandboxed):
+    counter = "SLOAD n count; ADD count n 1; SSTORE count count; RETURN count"
+    ok, address = SmartContractVM(StateDB()).execute(_tx(counter), 1, 0.0)
+    assert ok and StateDB().load_contract(address)
+
+    failing = SimpleNamespace(index=2, timestamp=0.0, transactions=[
+        _call(address, "call1"), _call(address, "call2"), _call("missing", "call3")])
+    assert not BlockExecutor(workers=1).execute(failing)
+    assert StateDB().load_storage(address) == {}
+
+    # Each sandboxed call sees the writes of the block's earlier transactions
+    block = SimpleNamespace(index=2, timestamp=0.0, transactions=[
+        _call(address, "call1"), _call(address, "call2")])
+    assert BlockExecutor(workers=4).execute(block)
+    assert StateDB().load_storage(address) == {'count': 2}
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+import pytest
+from src.blockchain.contracts.compiler import GAS_COSTS
+from src.blockchain.contracts.limits import ExecutionLimits
+from src.blockchain.contracts.tracer import MAX_TRACE_STEPS, GasProfiler
+from src.blockchain.contracts.vm import SmartContractVM
+from src.blockchain.db.state_db import StateDB
+
+COUNTER = "SLOAD n count; ADD count n 1; SSTORE count count; RETURN count"
+
+@pytest.fixture
+def profiler(monkeypatch):
+    profiler = GasProfiler(record_steps=True)
+    monkeypatch.setattr(SmartContractVM, "profiler", profiler)
+    return profiler
+
+def _tx(contract_type, code=None, address=None, tx_hash="tx1"):
+    return SimpleNamespace(contract_type=contract_type, contract_code=code, contract_address=address,
+                           contract_args={}, sender="alice", amount=0, gas_limit=100000, tx_hash=tx_hash)
+
+def test_profile_accumulates_per_contract_and_opcode(tmp_db, profiler):
+    vm = SmartContractVM(StateDB())
+    ok, address = vm.execute(_tx("CREATE", code=COUNTER), 1, 0.0)
+    assert ok
+    for i in range(3):
+        assert vm.execute(_tx("CALL", address=address, tx_hash=f"call{i}"), 2, 0.0)[0]
+
+    profile = profiler.get_contract_profile(address)
+    assert profile['calls'] == 4 and profile['failures'] == 0
+    assert profile['opcodes']['SSTORE']['count'] == 4
+    assert profile['opcodes']['ADD'] == {'count': 4, 'gas': 4 * GAS_COSTS['ADD'],
+                                         'seconds': profile['opcodes']['ADD']['seconds']}
+    assert profile['gas_used'] == sum(op['gas'] for op in profile['opcodes'].values())
+
+    stats = profiler.get_stats()
+    assert stats['executions'] == 4
+    assert stats['top_contracts'][0]['contract'] == address
+
+def test_step_trace_is_kept_per_transaction(tmp_db, profiler):
+    vm = SmartContractVM(StateDB())
+    _, address = vm.execute(_tx("CREATE", code=COUNTER), 1, 0.0)
+    vm.execute(_tx("CALL", address=address, tx_hash="call"), 2, 0.0)
+
+    trace = profiler.get_trace("call")
+    assert trace['success'] and trace['contract'] == address
+    assert [step['op'] for step in trace['steps']] == ['SLOAD', 'ADD', 'SSTORE', 'RETURN']
+    assert trace['steps'][1] == {'pc': 1, 'op': 'ADD', 'params': ['count', 'n', 1],
+                                 'gas_cost': GAS_COSTS['ADD'], 'gas_remaining': 100000 - GAS_COSTS['SLOAD']}
+
+    # Failures are traced too, up to the step that raised
+    assert not vm.execute(_tx("CREATE", code="SSTORE x 1; ADD y missing 1; RETURN y", tx_hash="bad"), 3, 0.0)[0]
+    failed = profiler.get_trace("bad")
+    assert not failed['success'] and failed['contract'] is None
+    assert [step['op'] for step in failed['steps']] == ['SSTORE']
+
+def test_long_traces_are_truncated(tmp_db, profiler):
+    loop = "SSTORE i 0; ADD i i 1; LT more i 100000; JUMPI 1 more"
+    vm = SmartContractVM(StateDB(), limits=ExecutionLimits(max_storage_writes=10 ** 6))
+    vm.execute(SimpleNamespace(**{**vars(_tx("CREATE", code=loop)), 'gas_limit': 10 ** 9}), 1, 0.0)
+    trace = profiler.get_trace("tx1")
+    assert trace['truncated'] and len(trace['steps']) == MAX_TRACE_STEPS
+
+def test_no_tracer_without_profiler(tmp_db):
+    assert SmartContractVM.profiler is None
+    vm = SmartContractVM(StateDB())
+    assert vm.execute(_tx("CREATE", code=COUNTER), 1, 0.0)[0]
+    assert vm.tracer is None
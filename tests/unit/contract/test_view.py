@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+from src.api.api_server import app
+from src.blockchain.contracts.contract_manager import ContractManager
+from src.blockchain.contracts.view import ViewResultCache, call_view
+from src.blockchain.contracts.vm import SmartContractVM
+from src.blockchain.db.state_db import StateDB
+from src.utils.database import db_connection
+
+COUNTER = "SLOAD n count; ADD count n 1; SSTORE count count; RETURN count"
+
+def _tx(contract_type, code=None, address=None, tx_hash="tx1"):
+    return SimpleNamespace(contract_type=contract_type, contract_code=code, contract_address=address,
+                           contract_args={}, sender="alice", amount=0, gas_limit=100000, tx_hash=tx_hash)
+
+def _deploy(code):
+    ok, address = SmartContractVM(StateDB()).execute(_tx("CREATE", code=code), 1, 0.0)
+    assert ok
+    return address
+
+def _changes():
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT (SELECT COUNT(*) FROM state_journal), "
+                       "(SELECT group_concat(storage) FROM contract_state), "
+                       "(SELECT group_concat(coalesce(compiled, '')) FROM contract_code)")
+        return cursor.fetchone()
+
+def test_view_call_never_persists(tmp_db):
+    address = _deploy(COUNTER)
+    before = _changes()
+
+    cache = ViewResultCache()
+    assert call_view(address, "next", cache=cache) == (True, 1, False)
+    assert call_view(address, "next", cache=cache) == (True, 1, True)
+    assert _changes() == before
+    assert StateDB().load_storage_json(address) is None
+
+def test_cached_result_is_dropped_when_storage_changes(tmp_db):
+    address = _deploy(COUNTER)
+    cache = ViewResultCache()
+    assert call_view(address, "next", cache=cache)[1] == 1
+    assert call_view(address, "next", {'page': 2}, cache=cache)[2] is False  # args are part of the key
+
+    assert SmartContractVM(StateDB()).execute(_tx("CALL", address=address, tx_hash="tx2"), 2, 0.0)[0]
+    assert call_view(address, "next", cache=cache) == (True, 2, False)
+    assert cache.get_stats()['invalidations'] == 1
+
+def test_results_depending_on_other_state_are_not_cached(tmp_db):
+    StateDB().update_balance("bob", 5.0)
+    address = _deploy("BALANCE b bob; LOAD r b; RETURN r")
+    cache = ViewResultCache()
+    assert call_view(address, cache=cache)[:2] == (True, 5.0)
+    assert call_view(address, cache=cache)[2] is False
+    assert cache.get_stats()['hits'] == 0
+
+def test_contract_manager_readonly_call(tmp_db):
+    address = _deploy(COUNTER)
+    assert ContractManager.call_contract("alice", address, "next", {}, readonly=True) == (True, 1)
+    assert ContractManager.call_contract("alice", "nowhere", "next", {}, readonly=True) == (False, "Contract not found")
+
+def test_readonly_contract_call_route(tmp_db):
+    address = _deploy(COUNTER)
+    mempool = SimpleNamespace(add_transaction=lambda tx: False)
+    app.config['node'] = SimpleNamespace(mempool=mempool)
+    try:
+        client = app.test_client()
+        call = {'transaction': {'contract_address': address, 'method': 'next', 'sender': 'alice'}}
+        response = client.post('/contracts/call?readonly=true', json=call)
+        assert response.status_code == 200
+        assert response.get_json()['result'] == 1
+        assert StateDB().load_storage_json(address) is None
+
+        response = client.post('/contracts/call?readonly=true', json={'transaction': {'method': 'next'}})
+        assert response.status_code == 400
+    finally:
+        app.config.pop('node', None)
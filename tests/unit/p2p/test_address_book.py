@@ -0,0 +1,73 @@
+import time
+import src.utils.database as database
+from src.p2p.address_book import AddressBook
+from src.p2p.peer_discovery import PeerDiscovery
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_best_prefers_reachable_low_latency_peers():
+    book = AddressBook(persist=False, clock=FakeClock())
+    for port in (2001, 2002, 2003):
+        book.add("10.0.0.1", port)
+
+    book.record_success(("10.0.0.1", 2001), latency=0.5)
+    book.record_success(("10.0.0.1", 2002), latency=0.05)
+    book.record_failure(("10.0.0.1", 2003))
+
+    assert book.best(3) == [("10.0.0.1", 2002), ("10.0.0.1", 2001)]
+
+def test_failed_peers_back_off_exponentially():
+    clock = FakeClock()
+    book = AddressBook(persist=False, clock=clock)
+    peer = ("10.0.0.1", 2001)
+    book.add(*peer)
+
+    book.record_failure(peer)
+    book.record_failure(peer)
+    assert book.best(1) == []
+
+    clock.now += 10
+    assert book.best(1) == [peer]
+
+def test_entries_survive_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_FILE", str(tmp_path / "chain.db"))
+    monkeypatch.setattr(database, "MIGRATION_DIR", str(tmp_path))
+    database.init_db()
+
+    book = AddressBook()
+    book.add("10.0.0.7", 2000)
+    book.record_success(("10.0.0.7", 2000), latency=0.02)
+
+    reloaded = AddressBook()
+    assert reloaded.best(1) == [("10.0.0.7", 2000)]
+    assert reloaded.entries[("10.0.0.7", 2000)].latency == 0.02
+
+class SlowNetwork:
+    host, port = "127.0.0.1", 2000
+
+    def __init__(self):
+        self.peers = set()
+        self.running = True
+
+    def connect_to_peer(self, host, port):
+        time.sleep(0.2)
+        self.peers.add((host, port))
+        return True
+
+def test_dials_run_in_parallel():
+    network = SlowNetwork()
+    book = AddressBook(persist=False)
+    discovery = PeerDiscovery(network, address_book=book, target_peers=8, max_parallel_dials=8)
+    for i in range(10):
+        book.add("10.0.1.%d" % i, 2000)
+
+    started = time.monotonic()
+    assert discovery.fill_peers(wait=True) == 8
+    assert time.monotonic() - started < 1.0
+    assert len(network.peers) == 8
+    assert all(book.entries[peer].latency is not None for peer in network.peers)
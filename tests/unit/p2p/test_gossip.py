@@ -0,0 +1,145 @@
+import math
+import random
+from collections import deque
+from types import SimpleNamespace
+from src.blockchain.block import Block
+from src.blockchain.transaction import Transaction
+from src.p2p.gossip import GossipRouter
+from src.p2p.message_handler import MessageHandler
+
+class SimNetwork:
+    """In-memory node: delivers gossip messages through a shared queue"""
+
+    def __init__(self, node_id, sim):
+        self.node_id = node_id
+        self.peers = set()
+        self.sim = sim
+        self.gossip = GossipRouter(self, rng=random.Random(node_id))
+
+    def send_message(self, message, peer):
+        self.sim.queue.append((peer, self.node_id, message, self.sim.current_hop + 1))
+        self.sim.messages += 1
+
+class Simulation:
+    def __init__(self, node_count, degree, seed=7):
+        rng = random.Random(seed)
+        self.queue = deque()
+        self.current_hop = 0
+        self.messages = 0
+        self.nodes = {i: SimNetwork(i, self) for i in range(node_count)}
+        self.received = {}
+
+        # Ring plus random chords keeps the graph connected
+        for i in range(node_count):
+            self._link(i, (i + 1) % node_count)
+        for i in range(node_count):
+            while len(self.nodes[i].peers) < degree:
+                j = rng.randrange(node_count)
+                if j != i:
+                    self._link(i, j)
+
+    def _link(self, a, b):
+        self.nodes[a].peers.add(b)
+        self.nodes[b].peers.add(a)
+
+    def diameter(self):
+        longest = 0
+        for start in self.nodes:
+            dist = {start: 0}
+            frontier = deque([start])
+            while frontier:
+                node = frontier.popleft()
+                for peer in self.nodes[node].peers:
+                    if peer not in dist:
+                        dist[peer] = dist[node] + 1
+                        frontier.append(peer)
+            longest = max(longest, max(dist.values()))
+        return longest
+
+    def run(self):
+        while self.queue:
+            peer, sender, message, hop = self.queue.popleft()
+            self.current_hop = hop
+            node = self.nodes[peer]
+            if message["type"] == "new_block":
+                block_hash = message["data"]["hash"]
+                if node.gossip.mark_seen(block_hash):
+                    self.received[peer] = hop
+                    node.gossip.publish_block(message, block_hash, exclude=[sender])
+            elif message["type"] == "ihave":
+                node.gossip.handle_ihave(message["ids"], sender)
+            elif message["type"] == "iwant":
+                node.gossip.handle_iwant(message["ids"], sender)
+
+def test_block_reaches_every_node_within_bounded_hops():
+    sim = Simulation(node_count=100, degree=16)
+    block = {"type": "new_block", "data": {"hash": "ab" * 32, "index": 1}}
+
+    sim.received[0] = 0
+    sim.nodes[0].gossip.publish_block(block, block["data"]["hash"])
+    sim.run()
+
+    assert len(sim.received) == 100
+    # Eager push covers a shortest path; a lazy pull costs at most three hops per edge
+    assert max(sim.received.values()) <= 3 * sim.diameter()
+
+def test_eager_fanout_is_bounded():
+    sim = Simulation(node_count=50, degree=25)
+    node = sim.nodes[0]
+    node.gossip.publish_block({"type": "new_block", "data": {"hash": "cd" * 32}}, "cd" * 32)
+
+    eager = [m for _, _, m, _ in sim.queue if m["type"] == "new_block"]
+    lazy = [m for _, _, m, _ in sim.queue if m["type"] == "ihave"]
+    assert len(eager) == math.ceil(math.sqrt(len(node.peers)))
+    assert len(eager) + len(lazy) == len(node.peers)
+
+def test_mesh_is_stable_between_blocks():
+    sim = Simulation(node_count=30, degree=10)
+    gossip = sim.nodes[0].gossip
+    assert gossip.refresh_mesh() == gossip.refresh_mesh()
+
+    gone = next(iter(gossip.mesh))
+    sim.nodes[0].peers.discard(gone)
+    mesh = gossip.refresh_mesh()
+    assert gone not in mesh
+    assert len(mesh) == math.ceil(math.sqrt(len(sim.nodes[0].peers)))
+
+def test_iwant_only_sent_once_per_id():
+    sim = Simulation(node_count=3, degree=2)
+    gossip = sim.nodes[0].gossip
+    gossip.handle_ihave(["ef" * 32], 1)
+    gossip.handle_ihave(["ef" * 32], 2)
+    assert [m["type"] for _, _, m, _ in sim.queue] == ["iwant"]
+
+def test_orphan_block_can_be_fetched_again():
+    sim = Simulation(node_count=2, degree=1)
+    network = sim.nodes[0]
+    tree = SimpleNamespace(contains=lambda block_hash: False, get=lambda block_hash: None)
+    handler = MessageHandler(network, blockchain=SimpleNamespace(tree=tree), mempool=None)
+    orphan = Block(index=5, timestamp=1000.0, transactions=[], previous_hash="00" * 32)
+
+    handler.handle_new_block(orphan.to_dict(), 1)
+    assert not network.gossip.has_seen(orphan.hash)
+
+    # A later announcement still pulls it, e.g. once its parent has been synced
+    network.gossip.handle_ihave([orphan.hash], 1)
+    assert [m["type"] for _, _, m, _ in sim.queue] == ["iwant"]
+
+def test_transactions_marked_seen_only_once_admitted():
+    sim = Simulation(node_count=2, degree=1)
+    network = sim.nodes[0]
+    accepted = []
+    mempool = SimpleNamespace(transactions={}, add_transaction=lambda tx: bool(accepted))
+    handler = MessageHandler(network, blockchain=None, mempool=mempool)
+    tx_data = Transaction("alice", "bob", 1.0, timestamp=1000.0, nonce=1).to_dict()
+    real_hash, tx_data['tx_hash'] = tx_data['tx_hash'], "00" * 32
+
+    # A forged id or a rejected tx must not stop the real one from being fetched later
+    handler.handle_transactions([tx_data])
+    assert not network.gossip.has_seen("00" * 32)
+    assert not network.gossip.has_seen(real_hash)
+
+    accepted.append(True)
+    handler.handle_transactions([tx_data])
+    assert network.gossip.has_seen(real_hash)
+    assert not network.gossip.has_seen("00" * 32)
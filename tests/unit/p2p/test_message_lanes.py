@@ -0,0 +1,67 @@
+import threading
+import src.p2p.message_handler as message_handler
+from src.p2p.message_handler import MessageHandler
+
+class FakeNetwork:
+    running = True
+
+PEER = ("10.0.0.1", 2000)
+
+def make_handler(workers=2):
+    return MessageHandler(FakeNetwork(), blockchain=None, mempool=None, workers=workers)
+
+def test_blocks_are_served_before_transactions():
+    handler = make_handler()
+    handler._ensure_workers = lambda: None
+
+    handler.submit({"type": "new_transaction"}, PEER)
+    handler.submit({"type": "get_peers"}, PEER)
+    handler.submit({"type": "new_block"}, PEER)
+
+    order = []
+    while True:
+        item = handler._next()
+        if item is None:
+            break
+        lane, message, _ = item
+        lane.busy = False
+        order.append(message["type"])
+    assert order == ["new_block", "new_transaction", "get_peers"]
+
+def test_full_lane_drops_messages(monkeypatch):
+    monkeypatch.setitem(message_handler.LANE_CAPACITY, "transactions", 3)
+    handler = make_handler()
+    handler._ensure_workers = lambda: None
+
+    results = [handler.submit({"type": "new_transaction"}, PEER) for _ in range(5)]
+    assert results == [True, True, True, False, False]
+    assert handler.get_queue_metrics()['lanes']['transactions']['dropped'] == 2
+
+def test_lowest_lane_is_shed_under_load(monkeypatch):
+    monkeypatch.setattr(message_handler, "SHED_WATERMARK", 2)
+    handler = make_handler()
+    handler._ensure_workers = lambda: None
+
+    assert handler.submit({"type": "get_peers"}, PEER) is True
+    for _ in range(3):
+        handler.submit({"type": "new_transaction"}, PEER)
+    assert handler.submit({"type": "get_peers"}, PEER) is False
+    assert handler.get_queue_metrics()['lanes']['peers']['shed'] == 1
+
+def test_slow_sync_message_does_not_block_new_blocks():
+    release = threading.Event()
+    block_handled = threading.Event()
+
+    class SlowHandler(MessageHandler):
+        def handle_message(self, message, addr):
+            if message["type"] == "blockchain":
+                release.wait(timeout=5)
+            elif message["type"] == "new_block":
+                block_handled.set()
+
+    handler = SlowHandler(FakeNetwork(), blockchain=None, mempool=None, workers=2)
+    handler.submit({"type": "blockchain"}, PEER)
+    handler.submit({"type": "new_block"}, PEER)
+
+    assert block_handled.wait(timeout=2)
+    release.set()
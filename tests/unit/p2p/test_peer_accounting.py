@@ -0,0 +1,69 @@
+from src.p2p.peer_accounting import PeerAccounting, TokenBucket, MESSAGE_COSTS, PENALTIES
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+PEER = ("10.0.0.5", 2000)
+
+def test_token_bucket_refills_over_time():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, capacity=20, clock=clock)
+
+    assert bucket.consume(20) is True
+    assert bucket.consume(1) is False
+
+    clock.now += 0.5
+    assert bucket.consume(5) is True
+    assert bucket.consume(1) is False
+
+def test_expensive_requests_are_limited_before_cheap_ones():
+    clock = FakeClock()
+    accounting = PeerAccounting(clock=clock)
+
+    full_chain_requests = 0
+    while accounting.allow(PEER, "get_blockchain"):
+        full_chain_requests += 1
+    assert full_chain_requests == 200 // MESSAGE_COSTS["get_blockchain"]
+
+    # Other message types have their own budget
+    assert accounting.allow(PEER, "get_status") is True
+
+def test_misbehavior_leads_to_temporary_ban():
+    clock = FakeClock()
+    accounting = PeerAccounting(clock=clock, ban_duration=60)
+
+    assert accounting.penalize(PEER, "invalid_block") is False
+    assert accounting.penalize(PEER, "invalid_block") is True
+    assert accounting.is_banned(PEER)
+    assert accounting.allow(PEER, "get_status") is False
+
+    # Another node on the same host (or behind the same NAT) is not affected
+    assert not accounting.is_banned((PEER[0], 2001))
+    assert accounting.allow((PEER[0], 2001), "get_status") is True
+
+    clock.now += 61
+    assert not accounting.is_banned(PEER)
+
+def test_score_decays_over_time():
+    clock = FakeClock()
+    accounting = PeerAccounting(clock=clock)
+
+    accounting.penalize(PEER, "invalid_block")
+    clock.now += 1000
+    assert accounting.penalize(PEER, "invalid_block") is False
+
+def test_bursts_over_the_rate_limit_do_not_ban():
+    clock = FakeClock()
+    accounting = PeerAccounting(clock=clock)
+
+    dropped = 0
+    for _ in range(1500):
+        dropped += not accounting.allow(PEER, "new_transaction")
+    assert dropped == 500
+    assert not accounting.is_banned(PEER)
+    # A protocol violation still weighs far more than the whole burst
+    assert accounting.get_stats()["10.0.0.5:2000"]['score'] < PENALTIES["bad_signature"]
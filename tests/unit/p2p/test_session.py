@@ -0,0 +1,64 @@
+from cryptography.hazmat.primitives.asymmetric import ec
+from src.p2p.session import SessionManager, SESSION_FRAME_MARKER
+
+ALICE = ("10.0.0.1", 2000)
+BOB = ("10.0.0.2", 2000)
+
+def make_pair():
+    alice = SessionManager(ec.generate_private_key(ec.SECP256K1()))
+    bob = SessionManager(ec.generate_private_key(ec.SECP256K1()))
+
+    handshake = alice.create_handshake(BOB)
+    ack = bob.accept_handshake(ALICE, handshake["data"])
+    assert ack is not None
+    assert alice.complete_handshake(ack["data"]) is not None
+    return alice, bob
+
+def test_handshake_establishes_matching_sessions():
+    alice, bob = make_pair()
+
+    frame = alice.session_for(BOB).seal(b'{"type": "get_status"}')
+    assert frame.startswith(SESSION_FRAME_MARKER)
+
+    session, body = bob.open_frame(frame)
+    assert body == b'{"type": "get_status"}'
+    assert session.peer == ALICE
+
+    # The responder only uses the session once the initiator has proven it has the key
+    reply = bob.session_for(ALICE).seal(b'{"type": "status"}')
+    assert alice.open_frame(reply)[1] == b'{"type": "status"}'
+
+def test_tampered_frame_is_rejected():
+    alice, bob = make_pair()
+    frame = bytearray(alice.session_for(BOB).seal(b'{"type": "get_status"}'))
+    frame[-2] ^= 1
+
+    session, body = bob.open_frame(bytes(frame))
+    assert session is not None
+    assert body is None
+
+def test_replayed_frame_is_rejected():
+    alice, bob = make_pair()
+    session = alice.session_for(BOB)
+    first = session.seal(b'{"n": 1}')
+    second = session.seal(b'{"n": 2}')
+
+    assert bob.open_frame(second)[1] == b'{"n": 2}'
+    assert bob.open_frame(first)[1] == b'{"n": 1}'  # out of order is fine
+    assert bob.open_frame(first)[1] is None
+
+def test_unknown_session_asks_for_new_handshake():
+    alice, _ = make_pair()
+    stranger = SessionManager(ec.generate_private_key(ec.SECP256K1()))
+
+    frame = alice.session_for(BOB).seal(b'{"type": "get_status"}')
+    assert stranger.open_frame(frame) == (None, None)
+
+def test_forged_handshake_signature_is_rejected():
+    alice = SessionManager(ec.generate_private_key(ec.SECP256K1()))
+    bob = SessionManager(ec.generate_private_key(ec.SECP256K1()))
+    mallory = SessionManager(ec.generate_private_key(ec.SECP256K1()))
+
+    handshake = alice.create_handshake(BOB)
+    handshake["data"]["public_key"] = mallory.public_key_pem
+    assert bob.accept_handshake(ALICE, handshake["data"]) is None
@@ -0,0 +1,141 @@
+import time
+from src.p2p.sync_scheduler import BlockDownloadScheduler
+
+class FakeBlock:
+    def __init__(self, index):
+        self.index = index
+
+class FakeBlockchain:
+    def __init__(self):
+        self.chain = [FakeBlock(0)]
+
+    def get_last_block(self):
+        return self.chain[-1]
+
+class FakeAccounting:
+    def __init__(self):
+        self.offenses = []
+
+    def penalize(self, addr, offense):
+        self.offenses.append((addr, offense))
+
+class FakeNetwork:
+    def __init__(self):
+        self.blockchain = FakeBlockchain()
+        self.peer_accounting = FakeAccounting()
+        self.sent = []
+        self.running = True
+
+    def send_message(self, message, peer):
+        self.sent.append((peer, dict(message)))
+
+def make_scheduler(network, **kwargs):
+    def apply_block(block_data):
+        if block_data.get('bad') or block_data['index'] != network.blockchain.get_last_block().index + 1:
+            return False
+        network.blockchain.chain.append(FakeBlock(block_data['index']))
+        return True
+
+    scheduler = BlockDownloadScheduler(network, apply_block=apply_block, **kwargs)
+    scheduler._ensure_worker = lambda: None  # drive the apply queue by hand
+    return scheduler
+
+def drain(scheduler):
+    while not scheduler.apply_queue.empty():
+        scheduler.apply_next(scheduler.apply_queue.get_nowait())
+
+def blocks(start, end):
+    return [{'index': i} for i in range(start, end + 1)]
+
+def test_chunks_are_spread_across_peers():
+    network = FakeNetwork()
+    scheduler = make_scheduler(network, chunk_size=10, max_inflight_per_peer=1)
+
+    scheduler.update_peer_height(("10.0.0.1", 2000), 40)
+    scheduler.update_peer_height(("10.0.0.2", 2000), 40)
+
+    requested = {(peer, msg['start']) for peer, msg in network.sent if msg['type'] == 'get_blocks'}
+    assert {peer for peer, _ in requested} == {("10.0.0.1", 2000), ("10.0.0.2", 2000)}
+    assert {start for _, start in requested} == {1, 11}
+
+def test_out_of_order_chunks_are_applied_in_order():
+    network = FakeNetwork()
+    peer_a, peer_b = ("10.0.0.1", 2000), ("10.0.0.2", 2000)
+    scheduler = make_scheduler(network, chunk_size=5, max_inflight_per_peer=1)
+    scheduler.update_peer_height(peer_a, 10)
+    scheduler.update_peer_height(peer_b, 10)
+
+    owner = {msg['start']: peer for peer, msg in network.sent if msg['type'] == 'get_blocks'}
+    scheduler.on_blocks(owner[6], 6, blocks(6, 10))
+    drain(scheduler)
+    assert network.blockchain.get_last_block().index == 0
+
+    scheduler.on_blocks(owner[1], 1, blocks(1, 5))
+    drain(scheduler)
+    assert network.blockchain.get_last_block().index == 10
+    assert scheduler.syncing is False
+
+def test_stalled_chunk_is_reassigned_to_another_peer():
+    network = FakeNetwork()
+    slow, fast = ("10.0.0.1", 2000), ("10.0.0.2", 2000)
+    scheduler = make_scheduler(network, chunk_size=5, max_inflight_per_peer=1, stall_timeout=0.01)
+    scheduler.update_peer_height(slow, 5)
+    assert scheduler.inflight[1].peer == slow
+
+    scheduler.update_peer_height(fast, 5)
+    time.sleep(0.02)
+    scheduler.check_stalls()
+
+    assert scheduler.inflight[1].peer == fast
+    assert scheduler.peer_stats[slow].stalls == 1
+
+def test_rejected_block_restarts_download_without_its_peer():
+    network = FakeNetwork()
+    bad, good = ("10.0.0.1", 2000), ("10.0.0.2", 2000)
+    scheduler = make_scheduler(network, chunk_size=5, max_inflight_per_peer=2)
+    scheduler.update_peer_height(bad, 10)
+
+    scheduler.on_blocks(bad, 1, [{'index': 1}, {'index': 2, 'bad': True}] + blocks(3, 5))
+    drain(scheduler)
+
+    assert network.blockchain.get_last_block().index == 1
+    assert scheduler.next_height == 2
+    assert network.peer_accounting.offenses == [(bad, "invalid_block")]
+    assert bad not in scheduler.healthy_peers()
+
+    scheduler.update_peer_height(good, 10)
+    assert {request.peer for request in scheduler.inflight.values()} == {good}
+    assert scheduler.inflight[2].start == 2
+
+def test_reply_with_wrong_heights_is_dropped():
+    network = FakeNetwork()
+    liar, honest = ("10.0.0.1", 2000), ("10.0.0.2", 2000)
+    scheduler = make_scheduler(network, chunk_size=5, max_inflight_per_peer=1)
+    scheduler.update_peer_height(liar, 5)
+
+    scheduler.on_blocks(liar, 1, [{'index': 1}, {'index': 3}])
+    assert scheduler.completed == {} and scheduler.apply_queue.empty()
+    assert network.peer_accounting.offenses == [(liar, "malformed_message")]
+
+    scheduler.update_peer_height(honest, 5)
+    assert scheduler.inflight[1].peer == honest
+
+def test_stale_replies_are_ignored():
+    network = FakeNetwork()
+    slow, fast = ("10.0.0.1", 2000), ("10.0.0.2", 2000)
+    scheduler = make_scheduler(network, chunk_size=5, max_inflight_per_peer=1, stall_timeout=0.01)
+    scheduler.update_peer_height(slow, 10)
+    scheduler.update_peer_height(fast, 10)
+    time.sleep(0.02)
+    scheduler.check_stalls()
+    assert scheduler.inflight[1].peer == fast
+
+    # The slow peer answers the chunk that was moved away from it
+    scheduler.on_blocks(slow, 1, blocks(1, 5))
+    assert scheduler.completed == {} and scheduler.inflight[1].peer == fast
+
+    # A repeated answer below the next height to apply is dropped too
+    scheduler.on_blocks(fast, 1, blocks(1, 5))
+    drain(scheduler)
+    scheduler.on_blocks(fast, 1, blocks(1, 5))
+    assert scheduler.completed == {} and scheduler.next_height == 6
@@ -0,0 +1,58 @@
+import time
+from src.p2p.tx_batcher import TransactionBatcher
+
+class FakeNetwork:
+    def __init__(self, peers):
+        self.peers = set(peers)
+        self.running = True
+        self.sent = []
+
+    def send_message(self, message, peer):
+        self.sent.append((peer, message))
+
+PEERS = [("10.0.0.1", 2000), ("10.0.0.2", 2000), ("10.0.0.3", 2000)]
+
+def tx(i):
+    return {'tx_hash': f"{i:064x}", 'amount': i}
+
+def test_many_transactions_become_one_message_per_peer():
+    network = FakeNetwork(PEERS)
+    batcher = TransactionBatcher(network, window=10, max_batch=1000)
+    batcher._ensure_worker = lambda: None
+
+    for i in range(500):
+        batcher.add(tx(i))
+    assert batcher.flush() == 500
+
+    assert len(network.sent) == len(PEERS)
+    assert all(msg['type'] == 'transactions' and len(msg['data']) == 500 for _, msg in network.sent)
+
+    metrics = batcher.get_metrics()
+    assert metrics['batches_sent'] == 1
+    assert metrics['avg_batch_size'] == 500
+
+def test_batches_are_capped_and_duplicates_dropped():
+    network = FakeNetwork(PEERS[:1])
+    batcher = TransactionBatcher(network, window=10, max_batch=100)
+    batcher._ensure_worker = lambda: None
+
+    for i in range(250):
+        batcher.add(tx(i))
+    batcher.add(tx(0))
+    batcher.flush()
+
+    assert [len(msg['data']) for _, msg in network.sent] == [100, 100, 50]
+
+def test_window_flushes_without_reaching_max_batch():
+    network = FakeNetwork(PEERS[:1])
+    batcher = TransactionBatcher(network, window=0.02, max_batch=1000)
+
+    batcher.add(tx(1))
+    batcher.add(tx(2))
+    deadline = time.time() + 2
+    while not network.sent and time.time() < deadline:
+        time.sleep(0.005)
+
+    assert len(network.sent) == 1
+    assert len(network.sent[0][1]['data']) == 2
+    assert batcher.get_metrics()['latency_ms']['max'] < 1000
@@ -0,0 +1,66 @@
+from collections import deque
+from src.sim.simulator import SimulationConfig, Simulator, build_topology, summarize
+
+def test_topology_is_connected_and_symmetric():
+    topology = build_topology(nodes=20, degree=4, seed=3)
+
+    for node, peers in topology.items():
+        assert len(peers) >= 2
+        assert all(node in topology[peer] for peer in peers)
+
+    seen = {0}
+    frontier = deque([0])
+    while frontier:
+        for peer in topology[frontier.popleft()]:
+            if peer not in seen:
+                seen.add(peer)
+                frontier.append(peer)
+    assert len(seen) == 20
+
+def test_summarize_reports_latency_and_throughput():
+    reports = [
+        {'node': 0, 'sent': {'a': 10.0, 'b': 11.0}, 'arrivals': {'a': 10.0, 'b': 11.0},
+         'traffic': {'bytes_sent': 1000, 'bytes_received': 500}},
+        {'node': 1, 'sent': {}, 'arrivals': {'a': 10.1, 'b': 11.2},
+         'traffic': {'bytes_sent': 500, 'bytes_received': 1000}},
+        {'node': 2, 'sent': {}, 'arrivals': {'a': 10.3},
+         'traffic': {'bytes_sent': 0, 'bytes_received': 0}},
+    ]
+    summary = summarize(reports, elapsed=10.0)
+
+    assert summary['transactions'] == 2
+    assert summary['fully_propagated'] == 1
+    assert summary['delivery_ratio'] == 0.75
+    assert summary['full_propagation_ms']['max'] == 300.0
+    assert summary['bandwidth']['0']['bytes_sent_per_sec'] == 100.0
+    assert summary['blocks']['produced'] == 0 and summary['blocks']['delivery_ratio'] == 1.0
+
+def test_summarize_reports_block_propagation():
+    reports = [
+        {'node': 0, 'sent': {}, 'arrivals': {}, 'produced': {'b1': 20.0, 'b2': 22.0}, 'produced_txs': 30,
+         'blocks': {'b1': 20.0, 'b2': 22.0}, 'traffic': {'bytes_sent': 0, 'bytes_received': 0}},
+        {'node': 1, 'sent': {}, 'arrivals': {}, 'blocks': {'b1': 20.05, 'b2': 22.1},
+         'traffic': {'bytes_sent': 0, 'bytes_received': 0}},
+        {'node': 2, 'sent': {}, 'arrivals': {}, 'blocks': {'b1': 20.2},
+         'traffic': {'bytes_sent': 0, 'bytes_received': 0}},
+    ]
+    blocks = summarize(reports, elapsed=10.0)['blocks']
+
+    assert blocks['produced'] == 2 and blocks['fully_propagated'] == 1
+    assert blocks['delivery_ratio'] == 0.75
+    assert blocks['propagation_ms']['max'] == 200.0
+    assert blocks['full_propagation_ms']['max'] == 200.0
+    assert blocks['tps'] == 3.0
+
+def test_small_network_propagates_every_transaction(tmp_path):
+    config = SimulationConfig(nodes=3, degree=2, tx_rate=15, duration=1.0, settle=2.0, block_time=0.25,
+                              base_port=17400, data_dir=str(tmp_path))
+    summary = Simulator(config).run()
+
+    assert summary['transactions'] == 15
+    assert summary['delivery_ratio'] == 1.0
+    assert summary['tps'] > 0
+    assert all(stats['bytes_sent'] > 0 for stats in summary['bandwidth'].values())
+    # Node 0's blocks reach and are accepted by every other node
+    assert summary['blocks']['produced'] > 0 and summary['blocks']['transactions'] > 0
+    assert summary['blocks']['delivery_ratio'] == 1.0